@@ -32,6 +32,10 @@ with app.app_context():
     import models
     db.create_all()
 
+# Keep the search index in step with document, template and report writes
+from services.search_index_service import register_index_listeners
+register_index_listeners()
+
 
 # Register context processor on the main app (not blueprint)
 @app.context_processor
@@ -5,6 +5,7 @@ from flask import Blueprint, render_template, session, redirect, url_for, reques
 from models import User, Company, Document, ActivityLog
 from database import db
 from utils.helpers import log_activity
+from services.admin_analytics_service import get_trend, parse_date, GRANULARITIES
 from sqlalchemy import desc, func
 from datetime import datetime, timedelta
 import logging
@@ -127,44 +128,44 @@ def analytics():
     if not user or not user.is_admin:
         return redirect(url_for('dashboard.user_dashboard'))
 
+    # Optional ?start=YYYY-MM-DD&end=YYYY-MM-DD (inclusive) &granularity=day|week|month
+    granularity = request.args.get('granularity', 'month')
     try:
-        # User registration trends (last 12 months)
-        user_trends = []
-        for i in range(12):
-            month_start = datetime.utcnow().replace(day=1) - timedelta(days=30*i)
-            month_end = month_start + timedelta(days=31)
-            count = User.query.filter(
-                User.created_at >= month_start,
-                User.created_at < month_end
-            ).count()
-            user_trends.append({
-                'month': month_start.strftime('%Y-%m'),
-                'count': count
-            })
-
-        # Document generation trends
-        doc_trends = []
-        for i in range(12):
-            month_start = datetime.utcnow().replace(day=1) - timedelta(days=30*i)
-            month_end = month_start + timedelta(days=31)
-            count = Document.query.filter(
-                Document.created_at >= month_start,
-                Document.created_at < month_end
-            ).count()
-            doc_trends.append({
-                'month': month_start.strftime('%Y-%m'),
-                'count': count
-            })
+        start = parse_date(request.args.get('start'))
+        end = parse_date(request.args.get('end'))
+        if end:
+            end += timedelta(days=1)
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
+    try:
         return jsonify({
-            'user_trends': list(reversed(user_trends)),
-            'document_trends': list(reversed(doc_trends))
+            'granularity': granularity,
+            'user_trends': get_trend('users', granularity, start, end),
+            'document_trends': get_trend('documents', granularity, start, end)
         })
 
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logging.error(f"Analytics error: {str(e)}")
         return jsonify({'error': 'Failed to fetch analytics'}), 500
 
+@bp.route('/activity-log/metrics')
+def activity_log_metrics():
+    """Queue depth and flush latency of the background activity log writer."""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    user = User.query.get(session['user_id'])
+    if not user or not user.is_admin:
+        return jsonify({'error': 'Admin access required'}), 403
+
+    from services.activity_log_service import get_activity_log_writer
+    return jsonify(get_activity_log_writer().metrics())
+
 @bp.route('/cleanup-files', methods=['POST'])
 def bulk_cleanup_files():
     """Bulk cleanup of old uploaded files."""
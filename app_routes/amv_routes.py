@@ -5,23 +5,156 @@ import re
 import PyPDF2
 from flask import Blueprint, render_template, request, redirect, url_for, current_app, flash, jsonify, session, send_file
 import io
-from werkzeug.utils import secure_filename
 # Add this import at the top with your other imports
 from models import Document, User, Company, AMVDocument, Equipment, GlassMaterial, Reagent, ReferenceProduct, OtherMaterial, AMVVerificationDocument
 from database import db
 from datetime import datetime
 from services.cloudinary_service import upload_file
 from services.method_extraction_service import method_extraction_service
+from services.pattern_scan_service import PatternSet
 from services.amv_report_service import AMVReportGenerator, extract_method_from_pdf, process_raw_data_file, calculate_validation_statistics
 from services.analytical_method_verification_service import analytical_method_verification_service
 import traceback
 from services.smiles_service import smiles_generator
 from utils.validators import validate_file_type
+from services.usage_snapshot_service import get_usage_snapshot
+from services.company_inventory_service import load_selected_inventory
+from services.search_index_service import search_rows
+from services.upload_store_service import get_upload_store, release_upload
 
 # PDF Method Extraction Class
 class MethodPDFExtractor:
     """Extract method parameters from uploaded PDF files"""
     
+    # Enhanced patterns for all instrument types with more variations
+    PATTERNS = {
+        # Common parameters with multiple variations
+        'weight_standard': [
+            r'(?:weight|wt|mass)[\s:]*of\s+standard[\s:]*(\d+\.?\d*)\s*(?:mg|g)',
+            r'(?:standard|reference)[\s:]*weight[\s:]*(\d+\.?\d*)\s*(?:mg|g)',
+            r'(?:accurately\s+weighed|weigh)[\s:]*(\d+\.?\d*)\s*(?:mg|g)',
+            r'(?:transfer.*?weighed)[\s:]*(\d+\.?\d*)\s*(?:mg|g)',
+            r'(?:weigh.*?containing)[\s:]*(\d+\.?\d*)\s*(?:mg|g)'
+        ],
+        'weight_sample': [
+            r'(?:sample|tablet)[\s:]*weight[\s:]*(\d+\.?\d*)\s*(?:mg|g)',
+            r'(?:weight|wt)[\s:]*of\s+sample[\s:]*(\d+\.?\d*)\s*(?:mg|g)',
+            r'(?:powdered.*?containing)[\s:]*(\d+\.?\d*)\s*(?:mg|g)',
+            r'(?:equivalent\s+to)[\s:]*(\d+\.?\d*)\s*(?:mg|g)',
+            r'(?:pooled\s+sample\s+equivalent\s+to)[\s:]*(\d+\.?\d*)\s*(?:mg|g)'
+        ],
+        'final_concentration_standard': [
+            r'(?:final\s+concentration|concentration)[\s:]*(\d+\.?\d*)\s*(?:mg/ml|μg/ml|mg/mL|μg/mL|mcg/ml)',
+            r'(?:standard\s+solution)[\s:]*(\d+\.?\d*)\s*(?:mg/ml|μg/ml|mg/mL|μg/mL|mcg/ml)',
+            r'(?:dilute.*?to\s+obtain)[\s:]*(\d+\.?\d*)\s*(?:mg/ml|μg/ml|mg/mL|μg/mL|mcg/ml)',
+            r'(?:concentration\s+of)[\s:]*(\d+\.?\d*)\s*(?:mg/ml|μg/ml|mg/mL|μg/mL|mcg/ml)'
+        ],
+        'final_concentration_sample': [
+            r'(?:sample\s+concentration)[\s:]*(\d+\.?\d*)\s*(?:mg/ml|μg/ml|mg/mL|μg/mL|mcg/ml)',
+            r'(?:sample\s+solution)[\s:]*(\d+\.?\d*)\s*(?:mg/ml|μg/ml|mg/mL|μg/mL|mcg/ml)',
+            r'(?:filtrate.*?concentration)[\s:]*(\d+\.?\d*)\s*(?:mg/ml|μg/ml|mg/mL|μg/mL|mcg/ml)'
+        ],
+        'potency': [
+            r'(?:potency|assay|purity)[\s:]*(\d+\.?\d*)\s*%?',
+            r'(?:taking\s+)(\d+\.?\d*)\s*(?:as\s+the\s+value)',
+            r'(?:value\s+of\s+A)[\s:]*(\d+\.?\d*)',
+            r'(?:A\s*\(1%,\s*1cm\))[\s:]*(\d+\.?\d*)'
+        ],
+        'average_weight': [
+            r'(?:average\s+weight|avg\s+weight)[\s:]*(\d+\.?\d*)\s*(?:mg|g)',
+            r'(?:tablet\s+weight)[\s:]*(\d+\.?\d*)\s*(?:mg|g)',
+            r'(?:weight\s+per\s+tablet)[\s:]*(\d+\.?\d*)\s*(?:mg|g)'
+        ],
+        'weight_per_ml': [
+            r'(?:weight\s+per\s+ml|weight/ml)[\s:]*(\d+\.?\d*)\s*(?:mg/ml|g/ml)',
+            r'(?:density)[\s:]*(\d+\.?\d*)\s*(?:mg/ml|g/ml)',
+            r'(?:specific\s+gravity)[\s:]*(\d+\.?\d*)'
+        ],
+        'wavelength': [
+            r'(?:wavelength|λ|nm|detection)[\s:]*(\d{3,4})',
+            r'(?:at\s+)(\d{3,4})\s*nm',
+            r'(?:measure.*?at\s+)(\d{3,4})\s*nm',
+            r'(?:detection\s+wavelength)[\s:]*(\d{3,4})'
+        ],
+        
+        # HPLC/UPLC/GC specific with more patterns
+        'reference_area_standard': [
+            r'(?:reference\s+area|area\s+of\s+standard|standard\s+area)[\s:]*(\d+\.?\d*)',
+            r'(?:peak\s+area)[\s:]*(\d+\.?\d*)',
+            r'(?:area\s+under\s+curve)[\s:]*(\d+\.?\d*)'
+        ],
+        'flow_rate': [
+            r'(?:flow\s+rate|flowrate|flow)[\s:]*(\d+\.?\d*)\s*(?:ml/min|ml/min|mL/min)',
+            r'(?:flow\s+rate)[\s:]*(\d+\.?\d*)\s*(?:ml\s+per\s+minute)',
+            r'(?:pump\s+rate)[\s:]*(\d+\.?\d*)\s*(?:ml/min)'
+        ],
+        'injection_volume': [
+            r'(?:injection\s+volume|inject|injection)[\s:]*(\d+\.?\d*)\s*(?:μl|μL|ul|UL)',
+            r'(?:inject.*?volume)[\s:]*(\d+\.?\d*)\s*(?:μl|μL|ul|UL)',
+            r'(?:volume.*?inject)[\s:]*(\d+\.?\d*)\s*(?:μl|μL|ul|UL)'
+        ],
+        'column': [
+            r'(?:column|stationary\s+phase|packing)[\s:]*([^,\n\r]+)',
+            r'(?:stainless\s+steel\s+column)[\s:]*([^,\n\r]+)',
+            r'(?:packed\s+with)[\s:]*([^,\n\r]+)'
+        ],
+        'mobile_phase': [
+            r'(?:mobile\s+phase|eluent|solvent)[\s:]*([^,\n\r]+)',
+            r'(?:buffer\s+solution)[\s:]*([^,\n\r]+)',
+            r'(?:diluent)[\s:]*([^,\n\r]+)'
+        ],
+        
+        # UV/AAS specific with more patterns
+        'reference_absorbance_standard': [
+            r'(?:reference\s+absorbance|absorbance\s+of\s+standard|standard\s+absorbance)[\s:]*(\d+\.?\d*)',
+            r'(?:absorbance\s+value)[\s:]*(\d+\.?\d*)',
+            r'(?:A\s*\(1%,\s*1cm\))[\s:]*(\d+\.?\d*)',
+            r'(?:taking\s+)(\d+\.?\d*)\s*(?:as\s+the\s+value)'
+        ],
+        'absorbance': [
+            r'(?:absorbance|abs|A)[\s:]*(\d+\.?\d*)',
+            r'(?:measure\s+absorbance)[\s:]*(\d+\.?\d*)',
+            r'(?:absorbance\s+reading)[\s:]*(\d+\.?\d*)'
+        ],
+        'path_length': [
+            r'(?:path\s+length|cell|cuvette)[\s:]*(\d+\.?\d*)\s*(?:cm|mm)',
+            r'(?:cell\s+path)[\s:]*(\d+\.?\d*)\s*(?:cm|mm)',
+            r'(?:optical\s+path)[\s:]*(\d+\.?\d*)\s*(?:cm|mm)'
+        ],
+        
+        # Titration specific with more patterns
+        'reference_volume': [
+            r'(?:reference\s+volume|volume)[\s:]*(\d+\.?\d*)\s*(?:ml|mL)',
+            r'(?:titrant\s+volume)[\s:]*(\d+\.?\d*)\s*(?:ml|mL)',
+            r'(?:consumption)[\s:]*(\d+\.?\d*)\s*(?:ml|mL)'
+        ],
+        'weight_sample_gm': [
+            r'(?:weigh.*?containing\s+)(\d+\.?\d*)\s*(?:g|gm)',
+            r'(?:add.*?containing\s+)(\d+\.?\d*)\s*(?:g|gm)',
+            r'(?:quantity.*?containing\s+)(\d+\.?\d*)\s*(?:g|gm)',
+            r'(?:powder\s+containing\s+)(\d+\.?\d*)\s*(?:g|gm)'
+        ],
+        'standard_factor': [
+            r'(?:each\s+ml.*?equivalent\s+to\s+)(\d+\.?\d*)\s*(?:mg|g)',
+            r'(?:equivalent\s+to\s+)(\d+\.?\d*)\s*(?:mg|g)',
+            r'(?:factor)[\s:]*(\d+\.?\d*)',
+            r'(?:conversion\s+factor)[\s:]*(\d+\.?\d*)'
+        ],
+        'indicator': [
+            r'(?:indicator)[\s:]*([^,\n\r]+)',
+            r'(?:using.*?as\s+indicator)[\s:]*([^,\n\r]+)',
+            r'(?:with.*?indicator)[\s:]*([^,\n\r]+)'
+        ],
+        'titrant': [
+            r'(?:titrant|standard|reagent)[\s:]*([^,\n\r]+)',
+            r'(?:titrate.*?with)[\s:]*([^,\n\r]+)',
+            r'(?:using.*?VS)[\s:]*([^,\n\r]+)'
+        ],
+    }
+
+    # One keyword prefilter over all of PATTERNS; compiled on first use
+    PATTERN_SET = PatternSet(pattern for pattern_list in PATTERNS.values() for pattern in pattern_list)
+    
     def __init__(self, pdf_path):
         self.pdf_path = pdf_path
         self.extracted_data = {}
@@ -41,138 +174,13 @@ class MethodPDFExtractor:
     def parse_method_parameters(self, text):
         """Parse method parameters using comprehensive regex patterns"""
         
-        # Enhanced patterns for all instrument types with more variations
-        patterns = {
-            # Common parameters with multiple variations
-            'weight_standard': [
-                r'(?:weight|wt|mass)[\s:]*of\s+standard[\s:]*(\d+\.?\d*)\s*(?:mg|g)',
-                r'(?:standard|reference)[\s:]*weight[\s:]*(\d+\.?\d*)\s*(?:mg|g)',
-                r'(?:accurately\s+weighed|weigh)[\s:]*(\d+\.?\d*)\s*(?:mg|g)',
-                r'(?:transfer.*?weighed)[\s:]*(\d+\.?\d*)\s*(?:mg|g)',
-                r'(?:weigh.*?containing)[\s:]*(\d+\.?\d*)\s*(?:mg|g)'
-            ],
-            'weight_sample': [
-                r'(?:sample|tablet)[\s:]*weight[\s:]*(\d+\.?\d*)\s*(?:mg|g)',
-                r'(?:weight|wt)[\s:]*of\s+sample[\s:]*(\d+\.?\d*)\s*(?:mg|g)',
-                r'(?:powdered.*?containing)[\s:]*(\d+\.?\d*)\s*(?:mg|g)',
-                r'(?:equivalent\s+to)[\s:]*(\d+\.?\d*)\s*(?:mg|g)',
-                r'(?:pooled\s+sample\s+equivalent\s+to)[\s:]*(\d+\.?\d*)\s*(?:mg|g)'
-            ],
-            'final_concentration_standard': [
-                r'(?:final\s+concentration|concentration)[\s:]*(\d+\.?\d*)\s*(?:mg/ml|μg/ml|mg/mL|μg/mL|mcg/ml)',
-                r'(?:standard\s+solution)[\s:]*(\d+\.?\d*)\s*(?:mg/ml|μg/ml|mg/mL|μg/mL|mcg/ml)',
-                r'(?:dilute.*?to\s+obtain)[\s:]*(\d+\.?\d*)\s*(?:mg/ml|μg/ml|mg/mL|μg/mL|mcg/ml)',
-                r'(?:concentration\s+of)[\s:]*(\d+\.?\d*)\s*(?:mg/ml|μg/ml|mg/mL|μg/mL|mcg/ml)'
-            ],
-            'final_concentration_sample': [
-                r'(?:sample\s+concentration)[\s:]*(\d+\.?\d*)\s*(?:mg/ml|μg/ml|mg/mL|μg/mL|mcg/ml)',
-                r'(?:sample\s+solution)[\s:]*(\d+\.?\d*)\s*(?:mg/ml|μg/ml|mg/mL|μg/mL|mcg/ml)',
-                r'(?:filtrate.*?concentration)[\s:]*(\d+\.?\d*)\s*(?:mg/ml|μg/ml|mg/mL|μg/mL|mcg/ml)'
-            ],
-            'potency': [
-                r'(?:potency|assay|purity)[\s:]*(\d+\.?\d*)\s*%?',
-                r'(?:taking\s+)(\d+\.?\d*)\s*(?:as\s+the\s+value)',
-                r'(?:value\s+of\s+A)[\s:]*(\d+\.?\d*)',
-                r'(?:A\s*\(1%,\s*1cm\))[\s:]*(\d+\.?\d*)'
-            ],
-            'average_weight': [
-                r'(?:average\s+weight|avg\s+weight)[\s:]*(\d+\.?\d*)\s*(?:mg|g)',
-                r'(?:tablet\s+weight)[\s:]*(\d+\.?\d*)\s*(?:mg|g)',
-                r'(?:weight\s+per\s+tablet)[\s:]*(\d+\.?\d*)\s*(?:mg|g)'
-            ],
-            'weight_per_ml': [
-                r'(?:weight\s+per\s+ml|weight/ml)[\s:]*(\d+\.?\d*)\s*(?:mg/ml|g/ml)',
-                r'(?:density)[\s:]*(\d+\.?\d*)\s*(?:mg/ml|g/ml)',
-                r'(?:specific\s+gravity)[\s:]*(\d+\.?\d*)'
-            ],
-            'wavelength': [
-                r'(?:wavelength|λ|nm|detection)[\s:]*(\d{3,4})',
-                r'(?:at\s+)(\d{3,4})\s*nm',
-                r'(?:measure.*?at\s+)(\d{3,4})\s*nm',
-                r'(?:detection\s+wavelength)[\s:]*(\d{3,4})'
-            ],
-            
-            # HPLC/UPLC/GC specific with more patterns
-            'reference_area_standard': [
-                r'(?:reference\s+area|area\s+of\s+standard|standard\s+area)[\s:]*(\d+\.?\d*)',
-                r'(?:peak\s+area)[\s:]*(\d+\.?\d*)',
-                r'(?:area\s+under\s+curve)[\s:]*(\d+\.?\d*)'
-            ],
-            'flow_rate': [
-                r'(?:flow\s+rate|flowrate|flow)[\s:]*(\d+\.?\d*)\s*(?:ml/min|ml/min|mL/min)',
-                r'(?:flow\s+rate)[\s:]*(\d+\.?\d*)\s*(?:ml\s+per\s+minute)',
-                r'(?:pump\s+rate)[\s:]*(\d+\.?\d*)\s*(?:ml/min)'
-            ],
-            'injection_volume': [
-                r'(?:injection\s+volume|inject|injection)[\s:]*(\d+\.?\d*)\s*(?:μl|μL|ul|UL)',
-                r'(?:inject.*?volume)[\s:]*(\d+\.?\d*)\s*(?:μl|μL|ul|UL)',
-                r'(?:volume.*?inject)[\s:]*(\d+\.?\d*)\s*(?:μl|μL|ul|UL)'
-            ],
-            'column': [
-                r'(?:column|stationary\s+phase|packing)[\s:]*([^,\n\r]+)',
-                r'(?:stainless\s+steel\s+column)[\s:]*([^,\n\r]+)',
-                r'(?:packed\s+with)[\s:]*([^,\n\r]+)'
-            ],
-            'mobile_phase': [
-                r'(?:mobile\s+phase|eluent|solvent)[\s:]*([^,\n\r]+)',
-                r'(?:buffer\s+solution)[\s:]*([^,\n\r]+)',
-                r'(?:diluent)[\s:]*([^,\n\r]+)'
-            ],
-            
-            # UV/AAS specific with more patterns
-            'reference_absorbance_standard': [
-                r'(?:reference\s+absorbance|absorbance\s+of\s+standard|standard\s+absorbance)[\s:]*(\d+\.?\d*)',
-                r'(?:absorbance\s+value)[\s:]*(\d+\.?\d*)',
-                r'(?:A\s*\(1%,\s*1cm\))[\s:]*(\d+\.?\d*)',
-                r'(?:taking\s+)(\d+\.?\d*)\s*(?:as\s+the\s+value)'
-            ],
-            'absorbance': [
-                r'(?:absorbance|abs|A)[\s:]*(\d+\.?\d*)',
-                r'(?:measure\s+absorbance)[\s:]*(\d+\.?\d*)',
-                r'(?:absorbance\s+reading)[\s:]*(\d+\.?\d*)'
-            ],
-            'path_length': [
-                r'(?:path\s+length|cell|cuvette)[\s:]*(\d+\.?\d*)\s*(?:cm|mm)',
-                r'(?:cell\s+path)[\s:]*(\d+\.?\d*)\s*(?:cm|mm)',
-                r'(?:optical\s+path)[\s:]*(\d+\.?\d*)\s*(?:cm|mm)'
-            ],
-            
-            # Titration specific with more patterns
-            'reference_volume': [
-                r'(?:reference\s+volume|volume)[\s:]*(\d+\.?\d*)\s*(?:ml|mL)',
-                r'(?:titrant\s+volume)[\s:]*(\d+\.?\d*)\s*(?:ml|mL)',
-                r'(?:consumption)[\s:]*(\d+\.?\d*)\s*(?:ml|mL)'
-            ],
-            'weight_sample_gm': [
-                r'(?:weigh.*?containing\s+)(\d+\.?\d*)\s*(?:g|gm)',
-                r'(?:add.*?containing\s+)(\d+\.?\d*)\s*(?:g|gm)',
-                r'(?:quantity.*?containing\s+)(\d+\.?\d*)\s*(?:g|gm)',
-                r'(?:powder\s+containing\s+)(\d+\.?\d*)\s*(?:g|gm)'
-            ],
-            'standard_factor': [
-                r'(?:each\s+ml.*?equivalent\s+to\s+)(\d+\.?\d*)\s*(?:mg|g)',
-                r'(?:equivalent\s+to\s+)(\d+\.?\d*)\s*(?:mg|g)',
-                r'(?:factor)[\s:]*(\d+\.?\d*)',
-                r'(?:conversion\s+factor)[\s:]*(\d+\.?\d*)'
-            ],
-            'indicator': [
-                r'(?:indicator)[\s:]*([^,\n\r]+)',
-                r'(?:using.*?as\s+indicator)[\s:]*([^,\n\r]+)',
-                r'(?:with.*?indicator)[\s:]*([^,\n\r]+)'
-            ],
-            'titrant': [
-                r'(?:titrant|standard|reagent)[\s:]*([^,\n\r]+)',
-                r'(?:titrate.*?with)[\s:]*([^,\n\r]+)',
-                r'(?:using.*?VS)[\s:]*([^,\n\r]+)'
-            ],
-        }
-        
         extracted = {}
+        scan = self.PATTERN_SET.scan(text)
         
         # Extract parameters using multiple patterns
-        for key, pattern_list in patterns.items():
+        for key, pattern_list in self.PATTERNS.items():
             for pattern in pattern_list:
-                match = re.search(pattern, text, re.IGNORECASE)
+                match = scan.search(pattern)
                 if match:
                     value = match.group(1).strip()
                     # Clean up numeric values
@@ -296,6 +304,8 @@ def create_amv_form():
     company_id = session.get('user_id', 1)
     
     if request.method == 'POST':
+        method_pdf_path = None
+        document_saved = False
         try:
             current_app.logger.info("=== AMV FORM SUBMITTED ===")
             current_app.logger.info(f"Form files received: {list(request.files.keys())}")
@@ -320,50 +330,19 @@ def create_amv_form():
             selected_reagent_ids = request.form.getlist('selected_reagents')
             selected_reference_id = request.form.get('selected_reference')
             
-            # Fetch actual data from database - USING DIRECT QUERIES
-            equipment_data = []
-            for eq_id in selected_equipment_ids:
-                equipment = Equipment.query.filter_by(id=eq_id).first()
-                if equipment:
-                    equipment_data.append({
-                        'name': equipment.name,
-                        'code': equipment.code,
-                        'brand': equipment.brand,
-                        'verification_frequency': equipment.verification_frequency,
-                        'last_calibration': equipment.last_calibration,
-                        'next_calibration': equipment.next_calibration
-                    })
-            
-            glass_materials = []
-            for gm_id in selected_glass_ids:
-                glass = GlassMaterial.query.filter_by(id=gm_id).first()
-                if glass:
-                    glass_materials.append({
-                        'name': glass.name,
-                        'characteristics': glass.characteristics
-                    })
-            
-            reagents = []
-            for r_id in selected_reagent_ids:
-                reagent = Reagent.query.filter_by(id=r_id).first()
-                if reagent:
-                    reagents.append({
-                        'name': reagent.name,
-                        'batch': reagent.batch,
-                        'expiry': reagent.expiry_date
-                    })
-            
-            reference_product = None
-            if selected_reference_id:
-                ref = ReferenceProduct.query.filter_by(id=selected_reference_id).first()
-                if ref:
-                    reference_product = {
-                        'standard_type': ref.standard_type,
-                        'standard_name': ref.standard_name,
-                        'code': ref.code,
-                        'potency': ref.potency,
-                        'due_date': ref.due_date
-                    }
+            # Fetch selections with one IN query per category
+            inventory = load_selected_inventory(
+                company_id,
+                equipment_ids=selected_equipment_ids,
+                glass_ids=selected_glass_ids,
+                reagent_ids=selected_reagent_ids,
+                reference_id=selected_reference_id
+            )
+            equipment_data = inventory['equipment']
+            glass_materials = inventory['glass_materials']
+            # The report reads the reagent expiry as 'expiry'
+            reagents = [dict(reagent, expiry=reagent['expiry_date']) for reagent in inventory['reagents']]
+            reference_product = inventory['reference_product']
             
             # Collect form data
             form_data = {
@@ -408,44 +387,11 @@ def create_amv_form():
                 'reference_product': reference_product or {}
             }
             
-            # Process method PDF upload
-            method_pdf_filename = secure_filename(method_pdf.filename)
-            method_pdf_path = os.path.join(current_app.config.get('UPLOAD_FOLDER', 'uploads'), method_pdf_filename)
-           
-             # FOR SIGNATURES ````````````````````````````````
-            prepared_sig_file = request.files.get('prepared_signature')
-            checked_sig_file = request.files.get('checked_signature')
-            approved_sig_file = request.files.get('approved_signature')
-            
-            # Define a folder to store signature uploads
-            UPLOAD_FOLDER = os.path.join(current_app.config.get('UPLOAD_FOLDER', 'uploads'), 'signatures')
-            os.makedirs(UPLOAD_FOLDER, exist_ok=True) # Create folder if it doesn't exist
-
-            signature_paths = {} # Dictionary to store the file paths
-
-            if prepared_sig_file:
-                filename = secure_filename(prepared_sig_file.filename)
-                filepath = os.path.join(UPLOAD_FOLDER, filename)
-                prepared_sig_file.save(filepath)
-                signature_paths['prepared_by_sig'] = filepath
-
-            if checked_sig_file:
-                filename = secure_filename(checked_sig_file.filename)
-                filepath = os.path.join(UPLOAD_FOLDER, filename)
-                checked_sig_file.save(filepath)
-                signature_paths['checked_by_sig'] = filepath
-
-            if approved_sig_file:
-                filename = secure_filename(approved_sig_file.filename)
-                filepath = os.path.join(UPLOAD_FOLDER, filename)
-                approved_sig_file.save(filepath)
-                signature_paths['approved_by_sig'] = filepath
-
-            # Ensure upload directory exists
-            os.makedirs(os.path.dirname(method_pdf_path), exist_ok=True)
-            
-            # Save method PDF
-            method_pdf.save(method_pdf_path)
+            # Signature images posted with this form are not used by the
+            # report, so they are not stored (each save would hold a reference)
+
+            # Save method PDF to the content-addressed store (same bytes, same file)
+            method_pdf_path = get_upload_store().save(method_pdf).path
             
             # Extract method data from PDF
             extractor = MethodPDFExtractor(method_pdf_path)
@@ -455,6 +401,9 @@ def create_amv_form():
             if extracted_method_data:
                 form_data['method_parameters'] = extracted_method_data
                 form_data['method_pdf_path'] = method_pdf_path
+            else:
+                # Not referenced by the document
+                release_upload(method_pdf_path)
             
             # Handle extracted method data if available (fallback)
             extracted_data = request.form.get('extracted_method_data', '')
@@ -553,6 +502,7 @@ def create_amv_form():
             
             # 5. COMMIT TO DATABASE
             db.session.commit()
+            document_saved = True
             
             current_app.logger.info(f"AMV Report saved to database. Document ID: {document.id}")
             
@@ -567,6 +517,9 @@ def create_amv_form():
             )
             
         except Exception as e:
+            # The document never recorded the method PDF (released above if unextracted)
+            if method_pdf_path and form_data.get('method_pdf_path') and not document_saved:
+                release_upload(method_pdf_path)
             current_app.logger.error(f"Error generating AMV report: {str(e)}")
             current_app.logger.error(f"Form data: {form_data}")
             flash(f'Error generating report: {str(e)}', 'error')
@@ -723,27 +676,22 @@ def generate_amv_report(document_id):
     """Generate AMV report for a document"""
     if 'user_id' not in session:
         return redirect(url_for('auth.login'))
+    engineer_sig_path: str | None = None
+    manager_sig_path: str | None = None
+    approved_sig_path: str | None = None
     try:
         engineer_signature = request.files.get('engineer_signature')
         manager_signature = request.files.get('manager_signature')
         approved_signature = request.files.get('approved_signature') 
-        engineer_sig_path: str | None = None
-        manager_sig_path: str | None = None
-        approved_sig_path: str | None = None
-
-        # Create folder to store signature images
-        sig_folder = os.path.join(current_app.config['UPLOAD_FOLDER'], 'signatures')
-        os.makedirs(sig_folder, exist_ok=True)
-        # Save uploaded files if present
+
+        # Save uploaded signature images if present; they are only needed while the report is built
+        upload_store = get_upload_store()
         if engineer_signature:
-            engineer_sig_path = os.path.join(sig_folder, secure_filename(engineer_signature.filename))
-            engineer_signature.save(engineer_sig_path)
+            engineer_sig_path = upload_store.save(engineer_signature).path
         if manager_signature:
-            manager_sig_path = os.path.join(sig_folder, secure_filename(manager_signature.filename))
-            manager_signature.save(manager_sig_path)
+            manager_sig_path = upload_store.save(manager_signature).path
         if approved_signature:
-            approved_sig_path = os.path.join(sig_folder, secure_filename(approved_signature.filename))
-            approved_signature.save(approved_sig_path)
+            approved_sig_path = upload_store.save(approved_signature).path
 
         # Get document and validate ownership
         document = Document.query.filter_by(id=document_id, user_id=session['user_id']).first()
@@ -817,6 +765,9 @@ def generate_amv_report(document_id):
         current_app.logger.error(f"Error generating AMV report: {str(e)}")
         flash(f'Error generating report: {str(e)}', 'error')
         return redirect(url_for('amv_bp.view_amv', document_id=document_id))
+    finally:
+        for sig_path in (engineer_sig_path, manager_sig_path, approved_sig_path):
+            release_upload(sig_path)
 
 @amv_bp.route('/<int:document_id>/download')
 def download_amv_report(document_id):
@@ -858,12 +809,27 @@ def list_amv_documents():
         return redirect(url_for('auth.login'))
     
     user_id = session['user_id']
-    documents = Document.query.filter_by(
-        user_id=user_id, 
+    search_query = request.args.get('q', '').strip()
+    page = request.args.get('page', 1, type=int)
+    per_page = 20
+    pagination = None
+    if search_query:
+        documents, results = search_rows(Document, user_id, search_query, kinds=['AMV'], page=page, per_page=per_page)
+    else:
+        pagination = Document.query.filter_by(
+            user_id=user_id, 
+            document_type='AMV'
+        ).order_by(Document.created_at.desc()).paginate(page=page, per_page=per_page, error_out=False)
+        documents, results = pagination.items, None
+    
+    # The statistics cards cover every AMV document, not just this page
+    status_counts = dict(db.session.query(Document.status, db.func.count(Document.id)).filter_by(
+        user_id=user_id,
         document_type='AMV'
-    ).order_by(Document.created_at.desc()).all()
+    ).group_by(Document.status).all())
     
-    return render_template('amv_list.html', documents=documents)
+    return render_template('amv_list.html', documents=documents, search_query=search_query, results=results,
+                           pagination=pagination, status_counts=status_counts)
 
 @amv_bp.route('/<int:document_id>/delete', methods=['POST'])
 def delete_amv_document(document_id):
@@ -904,8 +870,10 @@ def delete_amv_document(document_id):
                 db.session.delete(amv_verification)
         
         # Now delete the main document
+        method_file = document.method_analysis_file_url
         db.session.delete(document)
         db.session.commit()
+        release_upload(method_file)
         
         flash(f'{doc_type.replace("_", " ").title()} "{doc_title}" deleted successfully', 'success')
         current_app.logger.info(f"Successfully deleted document {document_id} of type {doc_type}")
@@ -1276,57 +1244,18 @@ def generate_verification_protocol():
         print(f"🔧 Selected Reagent IDs: {selected_reagent_ids}")
         print(f"🔧 Selected Reference ID: {selected_reference_id}")
         
-        # Fetch actual data from database
-        selected_equipment = []
-        for eq_id in selected_equipment_ids:
-            if eq_id:
-                equipment = Equipment.query.filter_by(id=int(eq_id)).first()
-                if equipment:
-                    selected_equipment.append({
-                        'id': equipment.id,
-                        'name': equipment.name,
-                        'code': equipment.code or '',
-                        'brand': equipment.brand or '',
-                        'verification_frequency': equipment.verification_frequency or '',
-                        'last_calibration': equipment.last_calibration or '',
-                        'next_calibration': equipment.next_calibration or ''
-                    })
-        
-        selected_glass = []
-        for glass_id in selected_glass_ids:
-            if glass_id:
-                glass = GlassMaterial.query.filter_by(id=int(glass_id)).first()
-                if glass:
-                    selected_glass.append({
-                        'id': glass.id,
-                        'name': glass.name,
-                        'characteristics': glass.characteristics or ''
-                    })
-        
-        selected_reagents = []
-        for reagent_id in selected_reagent_ids:
-            if reagent_id:
-                reagent = Reagent.query.filter_by(id=int(reagent_id)).first()
-                if reagent:
-                    selected_reagents.append({
-                        'id': reagent.id,
-                        'name': reagent.name,
-                        'batch': reagent.batch or '',
-                        'expiry_date': reagent.expiry_date or ''
-                    })
-        
-        selected_reference = None
-        if selected_reference_id:
-            reference = ReferenceProduct.query.filter_by(id=int(selected_reference_id)).first()
-            if reference:
-                selected_reference = {
-                    'id': reference.id,
-                    'standard_name': reference.standard_name,
-                    'standard_type': reference.standard_type or '',
-                    'code': reference.code or '',
-                    'potency': reference.potency or '',
-                    'due_date': reference.due_date or ''
-                }
+        # Fetch selections with one IN query per category
+        inventory = load_selected_inventory(
+            session.get('user_id', 1),
+            equipment_ids=selected_equipment_ids,
+            glass_ids=selected_glass_ids,
+            reagent_ids=selected_reagent_ids,
+            reference_id=selected_reference_id
+        )
+        selected_equipment = inventory['equipment']
+        selected_glass = inventory['glass_materials']
+        selected_reagents = inventory['reagents']
+        selected_reference = inventory['reference_product']
         
         # Prepare protocol data with ALL information
         protocol_data = {
@@ -1840,23 +1769,15 @@ def extract_method_from_pdf():
         if not file.filename.lower().endswith('.pdf'):
             return jsonify({'error': 'Invalid file type. Please upload a PDF file.'}), 400
         
-        # Create upload directory if it doesn't exist
-        upload_folder = current_app.config.get('UPLOAD_FOLDER', 'uploads')
-        os.makedirs(upload_folder, exist_ok=True)
+        # Save file (a stored upload is shared, so it is released rather than removed)
+        filepath = get_upload_store().save(file).path
         
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(upload_folder, filename)
-        
-        # Save file
-        file.save(filepath)
-        
-        # Extract data from PDF
-        extractor = MethodPDFExtractor(filepath)
-        extracted_data = extractor.extract_method_data()
-        
-        # Clean up file
-        if os.path.exists(filepath):
-            os.remove(filepath)
+        try:
+            # Extract data from PDF
+            extractor = MethodPDFExtractor(filepath)
+            extracted_data = extractor.extract_method_data()
+        finally:
+            release_upload(filepath)
         
         return jsonify({
             'success': True,
@@ -1890,28 +1811,20 @@ def upload_verification_files():
         if pdf_ext != '.pdf':
             return jsonify({'error': 'Invalid PDF file. Allowed: .pdf'}), 400
 
-        upload_folder = current_app.config.get('UPLOAD_FOLDER', 'uploads')
-        os.makedirs(upload_folder, exist_ok=True)
-
-        excel_path = os.path.join(upload_folder, secure_filename(excel_file.filename))
-        pdf_path = os.path.join(upload_folder, secure_filename(pdf_file.filename))
-        excel_file.save(excel_path)
-        pdf_file.save(pdf_path)
+        upload_store = get_upload_store()
+        excel_path = upload_store.save(excel_file).path
+        try:
+            pdf_path = upload_store.save(pdf_file).path
+        except Exception:
+            release_upload(excel_path)
+            raise
 
         try:
             buffer, method_tag = analytical_method_verification_service.generate_protocol_from_files(excel_path, pdf_path)
         finally:
-            # Clean up saved files regardless of success
-            try:
-                if os.path.exists(excel_path):
-                    os.remove(excel_path)
-            except Exception:
-                pass
-            try:
-                if os.path.exists(pdf_path):
-                    os.remove(pdf_path)
-            except Exception:
-                pass
+            # Release saved files regardless of success (deleted once no other upload shares them)
+            release_upload(excel_path)
+            release_upload(pdf_path)
 
         if buffer is None:
             return jsonify({'error': 'Failed to process files. Ensure the PDF has extractable text and the Excel contains recognizable sheets like Precision/Linearity/Accuracy.'}), 422
@@ -2061,17 +1974,11 @@ def get_amv_verification(document_id):
 
 def get_amv_documents_count(user_id):
     """Get count of AMV documents for a user"""
-    return Document.query.filter_by(
-        user_id=user_id, 
-        document_type='AMV'
-    ).count()
+    return get_usage_snapshot(user_id)['amv_documents']
 
 def get_amv_verification_count(user_id):
     """Get count of AMV Verification documents for a user"""
-    return Document.query.filter_by(
-        user_id=user_id, 
-        document_type='AMV_VERIFICATION'
-    ).count()
+    return get_usage_snapshot(user_id)['amv_verification_documents']
 
 
 
@@ -2124,12 +2031,22 @@ def list_amv_verification_documents():
         return redirect(url_for('auth.login'))
     
     user_id = session['user_id']
-    documents = Document.query.filter_by(
-        user_id=user_id, 
-        document_type='AMV_VERIFICATION'
-    ).order_by(Document.created_at.desc()).all()
+    search_query = request.args.get('q', '').strip()
+    page = request.args.get('page', 1, type=int)
+    per_page = 20
+    pagination = None
+    if search_query:
+        documents, results = search_rows(Document, user_id, search_query, kinds=['AMV_VERIFICATION'],
+                                         page=page, per_page=per_page)
+    else:
+        pagination = Document.query.filter_by(
+            user_id=user_id, 
+            document_type='AMV_VERIFICATION'
+        ).order_by(Document.created_at.desc()).paginate(page=page, per_page=per_page, error_out=False)
+        documents, results = pagination.items, None
     
-    return render_template('amv_verification_list.html', documents=documents)
+    return render_template('amv_verification_list.html', documents=documents, search_query=search_query,
+                           results=results, pagination=pagination)
 
 
 @amv_bp.route('/verification/<int:document_id>')
@@ -3,13 +3,12 @@
 
 from flask import Blueprint, render_template, session, redirect, url_for, request, jsonify
 from models import User, Company, Document, ActivityLog
-from database import db
 from utils.helpers import log_activity
 from sqlalchemy import desc
 import logging
 
-# Import the AMV count functions
-from app_routes.amv_routes import get_amv_documents_count, get_amv_verification_count
+from services.dashboard_stats_service import get_document_stats, get_dashboard_doc_stats, count_recent_documents
+from services.search_index_service import search_documents, SEARCH_MAX_PER_PAGE
 
 bp = Blueprint('dashboard', __name__, url_prefix='/dashboard')
 
@@ -36,19 +35,13 @@ def user_dashboard():
         .limit(5).all()
     )
 
-    # Get document statistics (now includes Compatibility)
-    doc_stats = {
-        'total': Document.query.filter_by(user_id=user.id).count(),
-        'amv': Document.query.filter_by(user_id=user.id, document_type='AMV').count(),
-        'pv': Document.query.filter_by(user_id=user.id, document_type='PV').count(),
-        'stability': Document.query.filter_by(user_id=user.id, document_type='Stability').count(),
-        'degradation': Document.query.filter_by(user_id=user.id, document_type='Degradation').count(),
-        'compatibility': Document.query.filter_by(user_id=user.id, document_type='Compatibility').count()
-    }
+    # Get document statistics (now includes Compatibility) from the per-user counters
+    doc_stats = get_dashboard_doc_stats(user.id)
 
-    # Get AMV specific counts using the imported functions
-    amv_reports_count = get_amv_documents_count(user.id)
-    amv_protocols_count = get_amv_verification_count(user.id)
+    # Get AMV specific counts from the same stats
+    by_type = get_document_stats(user.id)['by_type']
+    amv_reports_count = by_type.get('AMV', 0)
+    amv_protocols_count = by_type.get('AMV_VERIFICATION', 0)
 
     # Log dashboard access
     log_activity(user.id, 'dashboard_accessed', 'User accessed dashboard')
@@ -84,6 +77,40 @@ def document_history():
                          documents=documents,
                          companies=companies)
 
+@bp.route('/search')
+def search():
+    """Ranked, paginated full-text search over the user's templates, reports and documents"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    query = request.args.get('q', '').strip()
+    kinds = [kind for kind in request.args.getlist('kind') if kind] or None
+    page = request.args.get('page', 1, type=int)
+    per_page = min(request.args.get('per_page', 20, type=int), SEARCH_MAX_PER_PAGE)
+
+    try:
+        results = search_documents(session['user_id'], query, kinds=kinds, page=page, per_page=per_page)
+    except Exception as e:
+        logging.error(f"Search error: {str(e)}")
+        return jsonify({'error': 'Search failed'}), 500
+
+    payload = results.to_dict()
+    for hit in payload['results']:
+        hit['url'] = _search_hit_url(hit)
+    return jsonify(payload)
+
+
+def _search_hit_url(hit):
+    if hit['source'] == 'pvp_template':
+        return url_for('pv.view_pvp_template', template_id=hit['source_id'])
+    if hit['source'] == 'pvr_report':
+        return url_for('pv.view_pvr', report_id=hit['source_id'])
+    if hit['kind'] == 'amv':
+        return url_for('amv_bp.view_amv', document_id=hit['source_id'])
+    if hit['kind'] == 'amvverification':
+        return url_for('amv_bp.view_amv_verification', document_id=hit['source_id'])
+    return url_for('documents.view_document', document_id=hit['source_id'])
+
 @bp.route('/stats')
 def dashboard_stats():
     if 'user_id' not in session:
@@ -92,33 +119,18 @@ def dashboard_stats():
     user_id = session['user_id']
 
     try:
-        # Document statistics
-        total_docs = Document.query.filter_by(user_id=user_id).count()
-        completed_docs = Document.query.filter_by(user_id=user_id, status='completed').count()
-        draft_docs = Document.query.filter_by(user_id=user_id, status='draft').count()
+        # Document statistics (shared with user_dashboard)
+        stats = get_document_stats(user_id)
 
         # Monthly document creation
-        from datetime import datetime, timedelta
-        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-        recent_docs = Document.query.filter(
-            Document.user_id == user_id,
-            Document.created_at >= thirty_days_ago
-        ).count()
-
-        # Document type distribution
-        doc_types = db.session.query(
-            Document.document_type,
-            db.func.count(Document.id).label('count')
-        ).filter_by(user_id=user_id).group_by(Document.document_type).all()
-
-        type_distribution = {doc_type: count for doc_type, count in doc_types}
+        recent_docs = count_recent_documents(user_id, days=30)
 
         return jsonify({
-            'total_documents': total_docs,
-            'completed_documents': completed_docs,
-            'draft_documents': draft_docs,
+            'total_documents': stats['total'],
+            'completed_documents': stats['by_status'].get('completed', 0),
+            'draft_documents': stats['by_status'].get('draft', 0),
             'recent_documents': recent_docs,
-            'type_distribution': type_distribution
+            'type_distribution': stats['by_type']
         })
 
     except Exception as e:
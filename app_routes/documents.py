@@ -6,6 +6,7 @@ from models import User, Company, Document, SubBrand
 from database import db
 from services.cloudinary_service import upload_file
 from services.document_service import generate_document
+from services.upload_store_service import release_upload
 from utils.helpers import log_activity
 from utils.validators import validate_file_type
 import json
@@ -121,8 +122,10 @@ def delete_document(document_id):
         title = document.title
 
         # Delete document
+        method_file = document.method_analysis_file_url
         db.session.delete(document)
         db.session.commit()
+        release_upload(method_file)
 
         log_activity(session['user_id'], 'document_deleted', f'Deleted document: {title}')
 
@@ -3,26 +3,28 @@ Process Validation Routes - Enhanced with PharmaDoc AI Integration
 """
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash, send_file, jsonify, session
-from werkzeug.utils import secure_filename
 import os
 import json
+import shutil
 import tempfile
 from datetime import datetime
 from pathlib import Path
 from database import db
 from models import (
     User, PVP_Template, PVP_Criteria, PVP_Equipment, PVP_Material,
-    PVP_Extracted_Stage, PVR_Report, PVR_Data, PVR_Stage_Result,
+    PVP_Extracted_Stage, PVP_Upload, PVR_Report, PVR_Stage_Result,
     PV_Stage_Template
 )
 from services.process_validation_service import (
-    EnhancedPharmaDocAI, 
     EnhancedDocumentParser,
-    EnhancedPDFGenerator,
     ProductType,
     ProductInfo,
     Config
 )
+from services.pv_job_service import get_job_queue, PIPELINE_STAGES
+from services.pvr_result_store_service import load_report_results
+from services.search_index_service import search_rows
+from services.upload_store_service import get_upload_store, release_upload
 
 import logging
 from dotenv import load_dotenv
@@ -31,30 +33,22 @@ logger = logging.getLogger(__name__)
 
 pv_routes = Blueprint('pv', __name__, url_prefix='/pv')
 
-UPLOAD_FOLDER = 'uploads/pv_documents'
 REPORT_FOLDER = 'uploads/pvr_reports'
 ALLOWED_EXTENSIONS = {'pdf', 'txt'}
 
 # Ensure folders exist
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(REPORT_FOLDER, exist_ok=True)
 
 def allowed_file(filename):
     """Check if file has allowed extension"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def save_uploaded_file(file, folder=UPLOAD_FOLDER):
-    """Save uploaded file with secure filename"""
+def save_uploaded_file(file):
+    """Save an upload to the content-addressed upload store (repeat uploads share one file)"""
     if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')[:-3]
-        unique_filename = f"{timestamp}_{filename}"
-        filepath = os.path.join(folder, unique_filename)
-        file.save(filepath)
-        return filepath, unique_filename
+        stored = get_upload_store().save(file)
+        return stored.path, os.path.basename(stored.path)
     return None, None
-import zipfile
-import io
 import json
 from flask import send_file
 
@@ -102,6 +96,9 @@ def upload_ai_validation():
         mfr_path, mfr_filename = save_uploaded_file(mfr_file)
         
         if not stp_path or not mfr_path:
+            # Drop the reference to whichever file was stored
+            release_upload(stp_path)
+            release_upload(mfr_path)
             flash('Invalid file format. Only PDF and TXT files are allowed', 'error')
             return redirect(request.url)
         
@@ -112,140 +109,123 @@ def upload_ai_validation():
         api_key = os.environ.get('GEMINI_API_KEY')
         
         if not api_key:
+            # The fallback template records the STP only
+            release_upload(mfr_path)
             flash('⚠️ Gemini API key not configured. Using fallback parsing...', 'warning')
             return redirect(url_for('pv.upload_pvp_fallback', 
                                   product_name=product_name,
                                   dosage_form=dosage_form,
-                                  stp_path=stp_path,
-                                  mfr_path=mfr_path))
+                                  stp_path=stp_path))
         
+        rows_committed = False
         try:
-            flash('Processing documents with Enhanced AI... This may take a minute.', 'info')
-            logger.info("Initializing Enhanced PharmaDocAI...")
-            
-            # Use Enhanced PharmaDoc AI
-            pharmadoc = EnhancedPharmaDocAI(api_key)
-            
-            # Process documents with enhanced system
-            logger.info("Starting enhanced document processing...")
-            results = pharmadoc.process_documents(
+            # Create the history rows now; the job attaches the package to this report
+            template_name = f"{product_name} - AI Generated {datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            pvp_template = PVP_Template(
+                template_name=template_name,
+                original_filepath=stp_path,
+                user_id=session['user_id'],
                 product_name=product_name,
-                dosage_form=dosage_form,
-                stp_pdf_path=stp_path,
-                mfr_pdf_path=mfr_path
+                product_type=dosage_form,
+                batch_size=''
             )
+            # The template holds the MFR's reference until it is deleted
+            pvp_template.uploads.append(PVP_Upload(role='mfr', filepath=mfr_path))
+            db.session.add(pvp_template)
+            db.session.flush()
             
-            logger.info(f"Enhanced AI processing completed.")
-            
-            # 2. GENERATE ENHANCED PDFS
-            pdf_gen = EnhancedPDFGenerator()
-            
-            # Generate comprehensive PVP PDF
-            pvp_pdf_buffer = pdf_gen.generate_pvp(results['pvp'])
+            pvr_report = PVR_Report(
+                pvp_template_id=pvp_template.id,
+                user_id=session['user_id'],
+                status='Processing'
+            )
+            db.session.add(pvr_report)
+            db.session.commit()
+            rows_committed = True
             
-            # Generate comprehensive PVR PDF
-            pvr_pdf_buffer = pdf_gen.generate_pvr(results['pvr'])
+            zip_filename = f"{product_name.replace(' ', '_')}_AI_Validation_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+            job_id = get_job_queue().submit(
+                user_id=session['user_id'],
+                params={
+                    'product_name': product_name,
+                    'dosage_form': dosage_form,
+                    'stp_path': stp_path,
+                    'mfr_path': mfr_path,
+                    'report_folder': REPORT_FOLDER,
+                    'zip_filename': zip_filename
+                },
+                pvr_report_id=pvr_report.id
+            )
+            logger.info(f"Queued enhanced AI job {job_id} for report {pvr_report.id}")
             
-            # 3. ZIP AND DOWNLOAD
-            memory_file = io.BytesIO()
-            with zipfile.ZipFile(memory_file, 'w', zipfile.ZIP_DEFLATED) as zf:
-                
-                # Save PVP as PDF
-                zf.writestr('Process_Validation_Protocol.pdf', pvp_pdf_buffer.getvalue())
-                
-                # Save PVR as PDF
-                zf.writestr('Process_Validation_Report.pdf', pvr_pdf_buffer.getvalue())
-                
-                # Save all generated text files if available
-                try:
-                    # Export all text documents
-                    output_dir = tempfile.mkdtemp()
-                    pharmadoc.export_results(output_dir)
-                    
-                    # Add all text files to zip
-                    for file_name in os.listdir(output_dir):
-                        file_path = os.path.join(output_dir, file_name)
-                        if os.path.isfile(file_path):
-                            with open(file_path, 'rb') as f:
-                                zf.writestr(file_name, f.read())
-                except Exception as export_error:
-                    logger.warning(f"Could not export text files: {export_error}")
-                    # Just add JSON as fallback
-                    zf.writestr('validation_data.json', json.dumps(results, indent=4, default=str))
+            if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+                return jsonify({
+                    'job_id': job_id,
+                    'report_id': pvr_report.id,
+                    'status_url': url_for('pv.ai_job_status', job_id=job_id)
+                }), 202
             
-            memory_file.seek(0)
+            flash('Processing documents with Enhanced AI... The package will appear in your reports when ready.', 'info')
+            return redirect(url_for('pv.list_templates'))
             
-            # Save to database for history
-            try:
-                template_name = f"{product_name} - AI Generated {datetime.now().strftime('%Y%m%d_%H%M%S')}"
-                
-                # Create PVP template record
-                pvp_template = PVP_Template(
-                    template_name=template_name,
-                    original_filepath=stp_path,
-                    user_id=session['user_id'],
-                    product_name=product_name,
-                    product_type=dosage_form,
-                    batch_size=results.get('pvp', {}).get('mfr_summary', {}).get('batch_size', '')
-                )
-                db.session.add(pvp_template)
-                db.session.flush()
-                
-                # Create PVR report record
-                pvr_report = PVR_Report(
-                    pvp_template_id=pvp_template.id,
-                    user_id=session['user_id'],
-                    status='AI Generated',
-                    protocol_number=results.get('pvp', {}).get('protocol_number', '')
-                )
-                db.session.add(pvr_report)
-                
-                # Save the zip file
-                zip_filename = f"{product_name.replace(' ', '_')}_AI_Validation_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
-                zip_path = os.path.join(REPORT_FOLDER, zip_filename)
-                
-                with open(zip_path, 'wb') as f:
-                    f.write(memory_file.getvalue())
-                
-                pvr_report.pdf_filepath = zip_path
+        except Exception as queue_error:
+            db.session.rollback()
+            logger.error(f"Could not queue AI processing: {str(queue_error)}", exc_info=True)
+            if rows_committed:
+                # Committed before the job could be queued: the report fails
+                # and its template keeps the MFR like any failed job's
+                pvr_report.status = 'Failed'
                 db.session.commit()
-                
-                flash(f'✅ Enhanced validation completed! Generated comprehensive documents.', 'success')
-                
-                return render_template('ai_validation_complete.html',
-                                    template=pvp_template,
-                                    report=pvr_report,
-                                    results=results,
-                                    user=user)
-                
-            except Exception as db_error:
-                logger.error(f"Database save error: {db_error}")
-                # Still provide download even if DB save fails
-                flash('✅ Documents generated! (Note: History not saved due to database error)', 'warning')
-            
-            return send_file(
-                memory_file,
-                mimetype='application/zip',
-                as_attachment=True,
-                download_name=f'{product_name.replace(" ", "_")}_Enhanced_Validation_Package.zip'
-            )
-            
-        except Exception as ai_error:
-            logger.error(f"Enhanced AI processing error: {str(ai_error)}", exc_info=True)
+            else:
+                # The fallback template records the STP only
+                release_upload(mfr_path)
             
             # Try fallback parsing without AI
-            flash(f'⚠️ Enhanced AI processing failed: {str(ai_error)[:100]}... Using basic parsing...', 'warning')
+            flash(f'⚠️ Enhanced AI processing failed: {str(queue_error)[:100]}... Using basic parsing...', 'warning')
             return redirect(url_for('pv.upload_pvp_fallback', 
                                   product_name=product_name,
                                   dosage_form=dosage_form,
-                                  stp_path=stp_path,
-                                  mfr_path=mfr_path))
+                                  stp_path=stp_path))
         
     except Exception as e:
         logger.error(f"Error in AI validation upload: {str(e)}", exc_info=True)
         flash(f'❌ Error processing validation request: {str(e)}', 'error')
         return redirect(url_for('pv.upload_ai_validation'))
 
+@pv_routes.route('/jobs/<job_id>')
+def ai_job_status(job_id):
+    """Progress of a queued AI validation job"""
+    
+    if 'user_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    job = get_job_queue().status(job_id)
+    if not job or job['user_id'] != session['user_id']:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    payload = {
+        'job_id': job['id'],
+        'status': job['status'],
+        'stage': job['stage'],
+        'stages': PIPELINE_STAGES,
+        'stage_timings': job['stage_timings'],
+        'created_at': job['created_at'],
+        'started_at': job['started_at'],
+        'finished_at': job['finished_at'],
+        'report_id': job['pvr_report_id'],
+        'error': job['error']
+    }
+    if job['status'] == 'completed' and job['pvr_report_id']:
+        payload['download_url'] = url_for('pv.download_pvr_pdf', report_id=job['pvr_report_id'])
+    elif job['status'] == 'failed':
+        params = job['params']
+        # The MFR stays with the failed job's template; the fallback records the STP only
+        payload['fallback_url'] = url_for('pv.upload_pvp_fallback',
+                                          product_name=params.get('product_name', ''),
+                                          dosage_form=params.get('dosage_form', ''),
+                                          stp_path=params.get('stp_path', ''))
+    return jsonify(payload)
+
 @pv_routes.route('/upload_fallback', methods=['GET', 'POST'])
 def upload_pvp_fallback():
     """Fallback upload without AI processing"""
@@ -296,9 +276,9 @@ def upload_pvp_fallback():
         }
         
         # Add optional fields if they exist
+        # The MFR is not taken from the form: fallback templates hold no reference to it
         optional_fields = {
-            'stp_filepath': request.form.get('stp_path', ''),
-            'mfr_filepath': request.form.get('mfr_path', '')
+            'stp_filepath': request.form.get('stp_path', '')
         }
         
         for field_name, field_value in optional_fields.items():
@@ -370,6 +350,9 @@ def download_ai_file(template_id, file_type):
     
     template = PVP_Template.query.get_or_404(template_id)
     
+    # Files are generated on the fly into a scratch directory removed after the response
+    output_dir = tempfile.mkdtemp(prefix='pv_download_')
+    
     # Determine file path based on file type
     file_path = None
     filename = f"{template.product_name.replace(' ', '_')}_{file_type}"
@@ -382,7 +365,6 @@ def download_ai_file(template_id, file_type):
             
             # Generate PVP text file on the fly
             generator = ValidationDocumentGenerator()
-            output_dir = tempfile.mkdtemp()
             file_path = os.path.join(output_dir, f"{protocol_no}.txt")
             
             generator.export_pvp_to_text(pvp_data, file_path)
@@ -390,6 +372,7 @@ def download_ai_file(template_id, file_type):
             
         except Exception as e:
             logger.error(f"Error generating PVP file: {e}")
+            shutil.rmtree(output_dir, ignore_errors=True)
             flash('Error generating PVP file', 'error')
             return redirect(url_for('pv.view_ai_results', template_id=template_id))
     
@@ -402,7 +385,6 @@ def download_ai_file(template_id, file_type):
             
             # Generate PVR text file on the fly
             generator = ValidationDocumentGenerator()
-            output_dir = tempfile.mkdtemp()
             file_path = os.path.join(output_dir, f"{report_no}.txt")
             
             batch_results = extracted_data.get('batch_results', [])
@@ -411,22 +393,25 @@ def download_ai_file(template_id, file_type):
             
         except Exception as e:
             logger.error(f"Error generating PVR file: {e}")
+            shutil.rmtree(output_dir, ignore_errors=True)
             flash('Error generating PVR file', 'error')
             return redirect(url_for('pv.view_ai_results', template_id=template_id))
     
     elif file_type == 'json' and template.extracted_data:
         # Create JSON file
-        output_dir = tempfile.mkdtemp()
         file_path = os.path.join(output_dir, "validation_data.json")
         with open(file_path, 'w') as f:
             f.write(template.extracted_data)
         filename = "validation_data.json"
     
     if not file_path or not os.path.exists(file_path):
+        shutil.rmtree(output_dir, ignore_errors=True)
         flash('File not found', 'error')
         return redirect(url_for('pv.view_ai_results', template_id=template_id))
     
-    return send_file(file_path, as_attachment=True, download_name=filename)
+    response = send_file(file_path, as_attachment=True, download_name=filename)
+    response.call_on_close(lambda: shutil.rmtree(output_dir, ignore_errors=True))
+    return response
 
 @pv_routes.route('/api/process_validation', methods=['POST'])
 def api_process_validation():
@@ -490,11 +475,21 @@ def list_templates():
         session.clear()
         return redirect(url_for('auth.login'))
     
-    templates = PVP_Template.query.filter_by(user_id=session['user_id']).order_by(
-        PVP_Template.created_at.desc()
-    ).all()
-    
-    return render_template('pvp_templates_list.html', templates=templates, user=user)
+    search_query = request.args.get('q', '').strip()
+    page = request.args.get('page', 1, type=int)
+    per_page = 20
+    pagination = None
+    if search_query:
+        templates, results = search_rows(PVP_Template, user.id, search_query, kinds=['pvp'],
+                                         page=page, per_page=per_page)
+    else:
+        pagination = PVP_Template.query.filter_by(user_id=session['user_id']).order_by(
+            PVP_Template.created_at.desc()
+        ).paginate(page=page, per_page=per_page, error_out=False)
+        templates, results = pagination.items, None
+    
+    return render_template('pvp_templates_list.html', templates=templates, user=user,
+                           search_query=search_query, results=results, pagination=pagination)
 
 @pv_routes.route('/template/<int:template_id>')
 def view_pvp_template(template_id):
@@ -569,7 +564,7 @@ def view_pvr(report_id):
     
     report = PVR_Report.query.get_or_404(report_id)
     template = report.template
-    batch_data = PVR_Data.query.filter_by(pvr_report_id=report_id).all()
+    batch_results = load_report_results(report_id)
     
     # Try to load extracted data if available
     extracted = {}
@@ -585,14 +580,17 @@ def view_pvr(report_id):
         "status": getattr(report, "status", None),
         "template": template,
         "extracted": extracted,
-        "batch_data": batch_data
+        "meta": extracted,
+        "batches": [{"batch_number": batch} for batch in batch_results.batches],
+        "test_ids": batch_results.test_ids,
+        "data_points": batch_results.data_points,
+        "result_grid": list(zip(batch_results.test_ids, batch_results.text_grid(batch_results.test_ids)))
     }
     
     return render_template(
         "view_pvr.html",
         report=report_payload,
         template=template,
-        batch_data=batch_data,
         user=user
     )
 
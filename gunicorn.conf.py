@@ -0,0 +1,9 @@
+# Gunicorn loads this file from the working directory for both the Procfile
+# (app:app) and the Dockerfile (main:app) entry points.
+
+
+def post_worker_init(worker):
+    # Start the PV job pool and recover jobs queued before a restart only in
+    # serving workers, never on a plain import of the app
+    from services.pv_job_service import start_job_queue
+    start_job_queue(worker.wsgi)
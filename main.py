@@ -8,6 +8,8 @@ import os
 load_dotenv()
 
 if __name__ == '__main__':
+    from services.pv_job_service import start_job_queue
+    start_job_queue(app)
     port = int(os.environ.get("PORT", 8080))
     app.run(host="0.0.0.0", port=port)
     print("FIREBASE_API_KEY",os.environ.get('FIREBASE_API_KEY'))
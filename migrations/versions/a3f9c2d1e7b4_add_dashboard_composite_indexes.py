@@ -0,0 +1,40 @@
+"""add composite indexes for dashboard queries
+
+Revision ID: a3f9c2d1e7b4
+Revises: fix_company_address_length_explicit
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3f9c2d1e7b4'
+down_revision = 'fix_company_address_length_explicit'
+branch_labels = None
+depends_on = None
+
+
+# (index name, table, columns) - kept in sync with __table_args__ in models.py
+INDEXES = [
+    ('ix_documents_user_type', 'documents', ['user_id', 'document_type']),
+    ('ix_documents_user_status', 'documents', ['user_id', 'status']),
+    ('ix_documents_user_created', 'documents', ['user_id', 'created_at']),
+    ('ix_activity_logs_user_timestamp', 'activity_logs', ['user_id', 'timestamp']),
+    ('ix_activity_logs_timestamp', 'activity_logs', ['timestamp']),
+    ('ix_pvp_template_user_created', 'pvp_template', ['user_id', 'created_at']),
+    ('ix_pvr_report_user_created', 'pvr_report', ['user_id', 'created_at']),
+    ('ix_subscriptions_razorpay_subscription_id', 'subscriptions', ['razorpay_subscription_id']),
+    ('ix_subscriptions_user_status', 'subscriptions', ['user_id', 'status']),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,39 @@
+"""add user_document_counters
+
+Revision ID: b7d41e9a0c52
+Revises: a3f9c2d1e7b4
+Create Date: 2026-10-16 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d41e9a0c52'
+down_revision = 'a3f9c2d1e7b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user_document_counters',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('document_type', sa.String(length=50), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False, server_default='0'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('user_id', 'document_type', 'status')
+    )
+
+    # Backfill from existing documents
+    op.execute("""
+        INSERT INTO user_document_counters (user_id, document_type, status, count)
+        SELECT user_id, COALESCE(document_type, ''), COALESCE(status, 'draft'), COUNT(*)
+        FROM documents
+        GROUP BY user_id, COALESCE(document_type, ''), COALESCE(status, 'draft')
+    """)
+
+
+def downgrade():
+    op.drop_table('user_document_counters')
@@ -0,0 +1,116 @@
+"""add pvr_result_blocks
+
+Revision ID: c5e2a8f1d3b6
+Revises: b7d41e9a0c52
+Create Date: 2026-10-16 16:00:00.000000
+
+"""
+import re
+import json
+import struct
+import zlib
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+import numpy as np
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5e2a8f1d3b6'
+down_revision = 'b7d41e9a0c52'
+branch_labels = None
+depends_on = None
+
+# Version 1 of the block format, frozen here so later changes to
+# services.pvr_result_store_service cannot change what this migration writes
+FORMAT_VERSION = 1
+_MAGIC = b'PVRB'
+_PREFIX = struct.Struct('<4sI')
+_NUMBER_RE = re.compile(r'[-+]?\d*\.?\d+(?:[eE][-+]?\d+)?')
+
+
+def _parse_numeric(value):
+    if value is None:
+        return np.nan
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _NUMBER_RE.search(str(value))
+    return float(match.group()) if match else np.nan
+
+
+def _encode_block(rows):
+    """(batch_count, test_count, data) for a report's PVR_Data rows, first row per cell winning"""
+    batches, tests, cells, dates, sizes = {}, {}, {}, [], []
+    for batch_number, test_id, test_result, manufacturing_date, batch_size in rows:
+        if batch_number not in batches:
+            batches[batch_number] = len(batches)
+            dates.append(manufacturing_date)
+            sizes.append(batch_size)
+        if test_id not in tests:
+            tests[test_id] = len(tests)
+        cells.setdefault((batches[batch_number], tests[test_id]), test_result)
+
+    shape = (len(batches), len(tests))
+    values = np.full(shape, np.nan)
+    codes = np.full(shape, -1, dtype=np.int32)
+    texts = {}
+    for (row, column), text in cells.items():
+        if text is None:
+            continue
+        codes[row, column] = texts.setdefault(text, len(texts))
+        values[row, column] = _parse_numeric(text)
+
+    header = json.dumps({
+        'version': FORMAT_VERSION,
+        'batches': list(batches),
+        'test_ids': list(tests),
+        'texts': list(texts),
+        'manufacturing_dates': dates,
+        'batch_sizes': sizes,
+    }).encode('utf-8')
+    header += b' ' * (-(len(header) + _PREFIX.size) % 8)
+    payload = b''.join([
+        _PREFIX.pack(_MAGIC, len(header)),
+        header,
+        np.ascontiguousarray(values, dtype='<f8').tobytes(),
+        np.ascontiguousarray(codes, dtype='<i4').tobytes(),
+    ])
+    return shape[0], shape[1], zlib.compress(payload, 6)
+
+
+def upgrade():
+    blocks = op.create_table('pvr_result_blocks',
+        sa.Column('pvr_report_id', sa.Integer(), nullable=False),
+        sa.Column('format_version', sa.Integer(), nullable=False),
+        sa.Column('batch_count', sa.Integer(), nullable=False),
+        sa.Column('test_count', sa.Integer(), nullable=False),
+        sa.Column('data', sa.LargeBinary(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['pvr_report_id'], ['pvr_report.id'], ),
+        sa.PrimaryKeyConstraint('pvr_report_id')
+    )
+
+    # Backfill one block per report from its PVR_Data rows
+    bind = op.get_bind()
+    report_ids = [row[0] for row in bind.execute(sa.text(
+        "SELECT DISTINCT pvr_report_id FROM pvr_data"
+    ))]
+    for report_id in report_ids:
+        rows = bind.execute(sa.text(
+            "SELECT batch_number, test_id, test_result, manufacturing_date, batch_size "
+            "FROM pvr_data WHERE pvr_report_id = :report_id ORDER BY id"
+        ), {'report_id': report_id}).fetchall()
+        batch_count, test_count, data = _encode_block(rows)
+        bind.execute(blocks.insert().values(
+            pvr_report_id=report_id,
+            format_version=FORMAT_VERSION,
+            batch_count=batch_count,
+            test_count=test_count,
+            data=data,
+            updated_at=datetime.now(),
+        ))
+
+
+def downgrade():
+    op.drop_table('pvr_result_blocks')
@@ -0,0 +1,36 @@
+"""add user_document_counter_seeds
+
+Revision ID: d9a4b6c2e8f1
+Revises: c5e2a8f1d3b6
+Create Date: 2026-10-16 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9a4b6c2e8f1'
+down_revision = 'c5e2a8f1d3b6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user_document_counter_seeds',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('seeded_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('user_id')
+    )
+
+    # The counters were backfilled for every user by b7d41e9a0c52 and kept
+    # in step since, so every existing user is already seeded
+    op.execute("""
+        INSERT INTO user_document_counter_seeds (user_id, seeded_at)
+        SELECT id, CURRENT_TIMESTAMP FROM users
+    """)
+
+
+def downgrade():
+    op.drop_table('user_document_counter_seeds')
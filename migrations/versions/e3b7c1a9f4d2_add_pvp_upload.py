@@ -0,0 +1,32 @@
+"""add pvp_upload
+
+Revision ID: e3b7c1a9f4d2
+Revises: d9a4b6c2e8f1
+Create Date: 2026-10-16 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3b7c1a9f4d2'
+down_revision = 'd9a4b6c2e8f1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # MFR uploads of earlier AI jobs were released when the job ended, so
+    # there are no existing references to backfill
+    op.create_table('pvp_upload',
+        sa.Column('pvp_template_id', sa.Integer(), nullable=False),
+        sa.Column('role', sa.String(length=20), nullable=False),
+        sa.Column('filepath', sa.String(length=300), nullable=False),
+        sa.ForeignKeyConstraint(['pvp_template_id'], ['pvp_template.id'], ),
+        sa.PrimaryKeyConstraint('pvp_template_id', 'role')
+    )
+
+
+def downgrade():
+    op.drop_table('pvp_upload')
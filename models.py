@@ -4,8 +4,11 @@
 import json
 from datetime import datetime
 from database import db
-from sqlalchemy import String, Text, DateTime, Boolean, Integer, ForeignKey, Column
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy import String, Text, DateTime, Boolean, Integer, ForeignKey, Column, Index, LargeBinary, event, inspect
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Mapped, Session, mapped_column, object_session, relationship
 from werkzeug.security import generate_password_hash, check_password_hash
 from typing import List, Optional
 
@@ -72,16 +75,9 @@ class User(db.Model):
         if self.subscription_plan == 'premium':
             return True
         
-        from datetime import datetime
-        from sqlalchemy import extract
-        current_month = datetime.now().month
-        current_year = datetime.now().year
-        
-        monthly_docs = Document.query.filter(
-            Document.user_id == self.id,
-            extract('month', Document.created_at) == current_month,
-            extract('year', Document.created_at) == current_year
-        ).count()
+        # Uncached: limit enforcement must see documents created by other workers
+        from services.usage_snapshot_service import count_monthly_documents
+        monthly_docs = count_monthly_documents(self.id)
         
         limits = self.get_plan_limits()
         return monthly_docs < limits['documents_per_month']
@@ -143,6 +139,11 @@ class SubBrand(db.Model):
 
 class Document(db.Model):
     __tablename__ = 'documents'
+    __table_args__ = (
+        Index('ix_documents_user_type', 'user_id', 'document_type'),
+        Index('ix_documents_user_status', 'user_id', 'status'),
+        Index('ix_documents_user_created', 'user_id', 'created_at'),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'), nullable=False)
@@ -166,8 +167,87 @@ class Document(db.Model):
     amv_details: Mapped["AMVDocument"] = relationship("AMVDocument", back_populates="document", uselist=False)
     amv_verification_details: Mapped["AMVVerificationDocument"] = relationship("AMVVerificationDocument", back_populates="document", uselist=False)
 
+class UserDocumentCounter(db.Model):
+    """Materialized document counts per user, type and status (kept in sync by Document flush events)"""
+    __tablename__ = 'user_document_counters'
+
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'), primary_key=True)
+    document_type: Mapped[str] = mapped_column(String(50), primary_key=True)
+    status: Mapped[str] = mapped_column(String(20), primary_key=True)
+    count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+class UserDocumentCounterSeed(db.Model):
+    """Marks users whose counter rows were built from ``documents`` and are complete"""
+    __tablename__ = 'user_document_counter_seeds'
+
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'), primary_key=True)
+    seeded_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+
+_COUNTER_UPSERTS = {'sqlite': sqlite_insert, 'postgresql': postgresql_insert}
+
+def _bump_document_counter(connection, user_id, document_type, status, delta):
+    """
+    Add ``delta`` to one counter row inside the current flush. New rows are
+    upserted, so two transactions creating a user's first document of the
+    same type and status cannot both insert the row and fail on its key.
+    """
+    table = UserDocumentCounter.__table__
+    status = status or 'draft'  # column default, not yet applied on the instance in some flushes
+    document_type = document_type or ''
+    upsert = _COUNTER_UPSERTS.get(connection.dialect.name)
+    if delta > 0 and upsert is not None:
+        statement = upsert(table).values(user_id=user_id, document_type=document_type, status=status, count=delta)
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.document_type, table.c.status],
+            set_={'count': table.c.count + delta}
+        ))
+        return
+    key = (
+        (table.c.user_id == user_id) &
+        (table.c.document_type == document_type) &
+        (table.c.status == status)
+    )
+    result = connection.execute(table.update().where(key).values(count=table.c.count + delta))
+    if result.rowcount == 0 and delta > 0:
+        # Other databases: a concurrent insert of the same key loses the race
+        # inside a savepoint and adds to the winner's row instead
+        try:
+            with connection.begin_nested():
+                connection.execute(table.insert().values(
+                    user_id=user_id, document_type=document_type, status=status, count=delta
+                ))
+        except IntegrityError:
+            connection.execute(table.update().where(key).values(count=table.c.count + delta))
+
+@event.listens_for(Document, 'after_insert')
+def _count_inserted_document(mapper, connection, target):
+    _bump_document_counter(connection, target.user_id, target.document_type, target.status, 1)
+
+@event.listens_for(Document, 'after_delete')
+def _count_deleted_document(mapper, connection, target):
+    _bump_document_counter(connection, target.user_id, target.document_type, target.status, -1)
+
+@event.listens_for(Document, 'after_update')
+def _count_updated_document(mapper, connection, target):
+    state = inspect(target)
+    old = {}
+    for name in ('user_id', 'document_type', 'status'):
+        history = state.attrs[name].history
+        if history.has_changes() and history.deleted:
+            old[name] = history.deleted[0]
+    if not old:
+        return
+    _bump_document_counter(connection, old.get('user_id', target.user_id),
+                           old.get('document_type', target.document_type),
+                           old.get('status', target.status), -1)
+    _bump_document_counter(connection, target.user_id, target.document_type, target.status, 1)
+
 class ActivityLog(db.Model):
     __tablename__ = 'activity_logs'
+    __table_args__ = (
+        Index('ix_activity_logs_user_timestamp', 'user_id', 'timestamp'),
+        Index('ix_activity_logs_timestamp', 'timestamp'),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'), nullable=False)
@@ -420,6 +500,9 @@ class PVP_Template(db.Model):
     Stores the master PVP file (the 'template' uploaded by the user).
     """
     __tablename__ = 'pvp_template'
+    __table_args__ = (
+        Index('ix_pvp_template_user_created', 'user_id', 'created_at'),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     template_name: Mapped[str] = mapped_column(String(200), nullable=False)
@@ -448,10 +531,50 @@ class PVP_Template(db.Model):
     equipment_list: Mapped[List["PVP_Equipment"]] = relationship("PVP_Equipment", back_populates="pvp_template", cascade="all, delete-orphan")
     materials_list: Mapped[List["PVP_Material"]] = relationship("PVP_Material", back_populates="pvp_template", cascade="all, delete-orphan")
     extracted_stages: Mapped[List["PVP_Extracted_Stage"]] = relationship("PVP_Extracted_Stage", back_populates="pvp_template", cascade="all, delete-orphan")
+    uploads: Mapped[List["PVP_Upload"]] = relationship("PVP_Upload", back_populates="pvp_template", cascade="all, delete-orphan")
     
     def __repr__(self):
         return f'<PVP_Template {self.template_name}>'
 
+class PVP_Upload(db.Model):
+    """
+    An uploaded source document (e.g. the MFR) that a template keeps
+    referenced in the upload store. The reference is released once the row
+    is deleted and the deletion committed.
+    """
+    __tablename__ = 'pvp_upload'
+
+    pvp_template_id: Mapped[int] = mapped_column(Integer, ForeignKey('pvp_template.id'), primary_key=True)
+    role: Mapped[str] = mapped_column(String(20), primary_key=True)  # e.g., 'mfr'
+    filepath: Mapped[str] = mapped_column(String(300), nullable=False)
+
+    # Relationship
+    pvp_template: Mapped["PVP_Template"] = relationship("PVP_Template", back_populates="uploads")
+
+    def __repr__(self):
+        return f'<PVP_Upload {self.role}: {self.filepath}>'
+
+_RELEASED_UPLOADS = 'released_uploads'
+
+@event.listens_for(PVP_Upload, 'after_delete')
+def _queue_upload_release(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_RELEASED_UPLOADS, []).append(target.filepath)
+
+@event.listens_for(Session, 'after_commit')
+def _release_deleted_uploads(session):
+    paths = session.info.pop(_RELEASED_UPLOADS, None)
+    if paths:
+        # Imported here: the upload store is not needed to load the models
+        from services.upload_store_service import release_upload
+        for path in paths:
+            release_upload(path)
+
+@event.listens_for(Session, 'after_rollback')
+def _keep_rolled_back_uploads(session):
+    session.info.pop(_RELEASED_UPLOADS, None)
+
 class PVP_Criteria(db.Model):
     """
     Stores the 'rules' (acceptance criteria) extracted from the PVP 
@@ -562,6 +685,9 @@ class PVR_Report(db.Model):
     Tracks the final PVR documents we generate.
     """
     __tablename__ = 'pvr_report'
+    __table_args__ = (
+        Index('ix_pvr_report_user_created', 'user_id', 'created_at'),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     pvp_template_id: Mapped[int] = mapped_column(Integer, ForeignKey('pvp_template.id'), nullable=False)
@@ -603,6 +729,36 @@ class PVR_Data(db.Model):
     # Relationship
     report: Mapped["PVR_Report"] = relationship("PVR_Report", back_populates="data")
 
+class PVR_ResultBlock(db.Model):
+    """
+    A report's PVR_Data rows as one compressed columnar blob
+    (encoded by services.pvr_result_store_service).
+    """
+    __tablename__ = 'pvr_result_blocks'
+
+    pvr_report_id: Mapped[int] = mapped_column(Integer, ForeignKey('pvr_report.id'), primary_key=True)
+    format_version: Mapped[int] = mapped_column(Integer, nullable=False)
+    batch_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    test_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    data: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+def _drop_result_block(connection, report_id):
+    """Discard a report's result block; readers rebuild it from PVR_Data"""
+    table = PVR_ResultBlock.__table__
+    connection.execute(table.delete().where(table.c.pvr_report_id == report_id))
+
+@event.listens_for(PVR_Data, 'after_insert')
+@event.listens_for(PVR_Data, 'after_update')
+@event.listens_for(PVR_Data, 'after_delete')
+def _invalidate_result_block(mapper, connection, target):
+    _drop_result_block(connection, target.pvr_report_id)
+
+# Before the report row goes: the block's foreign key still points at it
+@event.listens_for(PVR_Report, 'before_delete')
+def _delete_report_result_block(mapper, connection, target):
+    _drop_result_block(connection, target.id)
+
 class AMVVerificationDocument(db.Model):
     """Specific model for AMV Verification documents with detailed parameters"""
     __tablename__ = 'amv_verification_documents'
@@ -742,6 +898,10 @@ class AMVVerificationDocument(db.Model):
 class Subscription(db.Model):
     """Model for tracking subscription history and details"""
     __tablename__ = 'subscriptions'
+    __table_args__ = (
+        Index('ix_subscriptions_razorpay_subscription_id', 'razorpay_subscription_id'),
+        Index('ix_subscriptions_user_status', 'user_id', 'status'),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'), nullable=False)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# Copyright (C) 2025 Soumyadeep Ghosh <soumyadeepghosh2004@zohomail.in>
+# All Rights Reserved.
+
+"""
+Benchmark for batch test-result statistics.
+
+Generates a batches x tests result matrix with a share of missing results,
+then compares:
+  loop        - per-test Python loop over the column values (the pattern
+                previously used by the extractor and report generators)
+  vectorized  - one compute_batch_statistics call over the whole matrix
+
+Both paths compute mean, SD, %RSD, min, max and Cpk; the results are
+checked against each other before timings are reported.
+
+Usage:
+    python scripts/benchmark_batch_statistics.py [--batches 1000] [--tests 200] [--missing 0.05] [--repeat 3]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+# Add the parent directory to the path so we can import our modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from services.batch_statistics_service import compute_batch_statistics
+
+
+def build_matrix(batches: int, tests: int, missing: float, seed: int = 7) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    targets = rng.uniform(1, 100, size=tests)
+    matrix = rng.normal(targets, targets * 0.02, size=(batches, tests))
+    matrix[rng.random((batches, tests)) < missing] = np.nan
+    return matrix
+
+
+def loop_statistics(matrix: np.ndarray, lower: np.ndarray, upper: np.ndarray):
+    rows = matrix.tolist()
+    results = []
+    for column in range(matrix.shape[1]):
+        values = [row[column] for row in rows if row[column] == row[column]]
+        mean = sum(values) / len(values)
+        variance = sum((x - mean) ** 2 for x in values) / (len(values) - 1)
+        sd = variance ** 0.5
+        rsd = (sd / mean * 100) if mean != 0 else 0
+        cpk = min(upper[column] - mean, mean - lower[column]) / (3 * sd)
+        results.append((mean, sd, rsd, min(values), max(values), cpk))
+    return results
+
+
+def time_call(func, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark batch statistics')
+    parser.add_argument('--batches', type=int, default=1000)
+    parser.add_argument('--tests', type=int, default=200)
+    parser.add_argument('--missing', type=float, default=0.05, help='Share of missing results')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    matrix = build_matrix(args.batches, args.tests, args.missing)
+    centre = np.nanmean(matrix, axis=0)
+    lower, upper = centre * 0.9, centre * 1.1
+
+    loop_results = loop_statistics(matrix, lower, upper)
+    stats = compute_batch_statistics(matrix, lower, upper)
+    vectorized = np.column_stack([stats[key] for key in ('mean', 'sd', 'rsd', 'min', 'max', 'cpk')])
+    if not np.allclose(np.array(loop_results), vectorized, rtol=1e-9, equal_nan=True):
+        print("Mismatch between loop and vectorized statistics")
+        return 1
+
+    print(f"Matrix: {args.batches} batches x {args.tests} tests, {args.missing:.0%} missing")
+    loop_time = time_call(lambda: loop_statistics(matrix, lower, upper), args.repeat)
+    vector_time = time_call(lambda: compute_batch_statistics(matrix, lower, upper), args.repeat)
+    print(f"  loop       : {loop_time * 1000:9.2f} ms")
+    print(f"  vectorized : {vector_time * 1000:9.2f} ms")
+    print(f"  speedup    : {loop_time / vector_time:9.1f}x")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# Copyright (C) 2025 Soumyadeep Ghosh <soumyadeepghosh2004@zohomail.in>
+# All Rights Reserved.
+
+"""
+Benchmark for the local STP/MFR document classifier.
+
+Classifies a labelled corpus with services.document_classifier_service and
+reports accuracy, how many documents would skip the LLM round-trip at the
+confidence threshold, accuracy of those skipped decisions, and the local
+classification time per document.
+
+The corpus is either a directory with STP/ and MFR/ subdirectories holding
+.pdf or .txt files, or (by default) a synthetic labelled corpus of titled,
+untitled and mixed-vocabulary documents.
+
+Usage:
+    python scripts/benchmark_document_classifier.py [--corpus DIR] [--threshold 0.85] [--docs 200] [--llm-latency 2.0]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+from typing import List, Tuple
+
+# Add the parent directory to the path so we can import our modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.document_classifier_service import CLASSIFIER_CONFIDENCE, classify_text
+
+STP_TITLES = ["STANDARD TESTING PROCEDURE", "Standard Test Procedure", "SPECIFICATION AND TEST PROCEDURE"]
+MFR_TITLES = ["MASTER FORMULA RECORD", "Batch Manufacturing Record", "MASTER MANUFACTURING RECORD"]
+STP_BODY = [
+    "Assay by HPLC: inject the standard solution and test solution; the retention time of the principal peak matches.",
+    "System suitability: the tailing factor is not more than 2.0 and the %RSD of replicate injections is NMT 2.0%.",
+    "Mobile phase: buffer and acetonitrile (70:30). Diluent: mobile phase. Wavelength 254 nm. Injection volume 20 ul.",
+    "Related substances: any individual impurity NMT 0.2%. Acceptance criteria as per specification.",
+    "Standard preparation: weigh 50 mg of working standard into a 100 ml flask. Sample preparation: as above.",
+    "Dissolution: 900 ml of 0.1N HCl, paddle, 50 rpm; NLT 80% (Q) in 45 minutes.",
+    "Identification by IR: the spectrum of the sample corresponds to that of the reference standard.",
+]
+MFR_BODY = [
+    "Batch size: 100 L. Dispense the raw materials as per the bill of materials after line clearance.",
+    "Manufacturing procedure: charge 80 L water for injection into the vessel and start stirring at 300 rpm.",
+    "Add the active ingredient slowly under mixing; continue mixing for 20 minutes until a clear solution forms.",
+    "Filter through 0.2 micron filter and transfer to the filling machine. Filling volume 10.2 ml per vial.",
+    "Sterilization in the autoclave at 121 C for 30 minutes. Record the yield at each stage.",
+    "Equipment: manufacturing vessel MV-01, filtration assembly FA-02, vial filling machine VF-03.",
+    "In-process checks: pH 8.9 to 9.1 and fill volume every 30 minutes. Overages: 2% of the active ingredient.",
+]
+# Vocabulary each document type legitimately borrows from the other
+STP_BORROWED = ["Batch size of the sample lot is recorded on the certificate.", "Equipment: HPLC system with UV detector."]
+MFR_BORROWED = ["In-process testing: assay limit 95.0% to 105.0% as per specification.",
+                "Dissolution sample drawn for QC release testing."]
+
+
+def synthetic_document(label: str, rng: random.Random) -> str:
+    """A 3-page document; roughly half are untitled and some borrow the other vocabulary"""
+    titles, body, borrowed = (STP_TITLES, STP_BODY, STP_BORROWED) if label == 'STP' \
+        else (MFR_TITLES, MFR_BODY, MFR_BORROWED)
+    pages = []
+    for page in range(3):
+        lines = []
+        if page == 0 and rng.random() < 0.5:
+            lines.append(rng.choice(titles))
+            lines.append(f"{label} No: {label}/{rng.randint(100, 999)}-0{rng.randint(1, 9)}")
+        lines.extend(rng.sample(body, rng.randint(1, 3)))
+        if rng.random() < 0.4:
+            lines.append(rng.choice(borrowed))
+        pages.append(f"--- Page {page + 1} ---\n" + "\n".join(lines))
+    return "\n".join(pages)
+
+
+def synthetic_corpus(docs: int, seed: int = 11) -> List[Tuple[str, str, str]]:
+    rng = random.Random(seed)
+    return [(f"synthetic_{i}", label, synthetic_document(label, rng))
+            for i, label in enumerate(rng.choice(('STP', 'MFR')) for _ in range(docs))]
+
+
+def load_corpus(directory: str) -> List[Tuple[str, str, str]]:
+    """(name, label, text) for every .pdf/.txt under DIR/STP and DIR/MFR"""
+    from services.pdf_ingestion_service import PDFIngestionContext
+
+    corpus = []
+    for label in ('STP', 'MFR'):
+        folder = os.path.join(directory, label)
+        for name in sorted(os.listdir(folder)) if os.path.isdir(folder) else []:
+            path = os.path.join(folder, name)
+            if name.lower().endswith('.txt'):
+                with open(path, encoding='utf-8', errors='replace') as f:
+                    corpus.append((name, label, f.read()))
+            elif name.lower().endswith('.pdf'):
+                with PDFIngestionContext(path) as doc:
+                    # Same page markers as EnhancedDocumentParser.extract_content_with_tables
+                    text = "\n".join(f"--- Page {i + 1} ---\n{doc.page_text(i)}" for i in range(doc.page_count))
+                corpus.append((name, label, text))
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the local STP/MFR classifier')
+    parser.add_argument('--corpus', help='Directory with STP/ and MFR/ subdirectories')
+    parser.add_argument('--docs', type=int, default=200, help='Synthetic documents when no corpus is given')
+    parser.add_argument('--threshold', type=float, default=CLASSIFIER_CONFIDENCE)
+    parser.add_argument('--llm-latency', type=float, default=2.0,
+                        help='Assumed seconds per LLM classification call, for the time-saved estimate')
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus) if args.corpus else synthetic_corpus(args.docs)
+    if not corpus:
+        print("Corpus is empty")
+        return 1
+
+    correct = skipped = skipped_correct = 0
+    start = time.perf_counter()
+    for name, label, text in corpus:
+        result = classify_text(text)
+        correct += result.label == label
+        if result.is_confident(args.threshold):
+            skipped += 1
+            skipped_correct += result.label == label
+    elapsed = time.perf_counter() - start
+
+    total = len(corpus)
+    print(f"Corpus: {total} documents ({'directory ' + args.corpus if args.corpus else 'synthetic'})")
+    print(f"  local accuracy        : {correct / total:8.1%}")
+    print(f"  LLM calls skipped     : {skipped:5d} / {total} ({skipped / total:.1%}) at threshold {args.threshold}")
+    if skipped:
+        print(f"  accuracy when skipped : {skipped_correct / skipped:8.1%}")
+    print(f"  local time per doc    : {elapsed / total * 1000:8.3f} ms")
+    print(f"  est. LLM time saved   : {skipped * args.llm_latency:8.1f} s (at {args.llm_latency}s per call)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# Copyright (C) 2025 Soumyadeep Ghosh <soumyadeepghosh2004@zohomail.in>
+# All Rights Reserved.
+
+"""
+Benchmark for AMV report page-number finalization.
+
+Builds a report body with one header section per page, then compares:
+  two-pass  - save, reopen with Document(), walk every cell for
+              {TOTAL_PAGES}, save again (update_page_numbers)
+  one-pass  - patch the tracked placeholder runs in memory, save once
+              (finalize_page_numbers)
+
+Usage:
+    python scripts/benchmark_docx_page_numbers.py [--pages 60] [--repeat 3]
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+# Add the parent directory to the path so we can import our modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from docx import Document
+
+from services.amv_report_service import AMVReportGenerator
+
+
+def build_generator(pages: int) -> AMVReportGenerator:
+    generator = AMVReportGenerator({
+        'method_parameters': {'wavelength': '254 nm'},
+        'product_name': 'Benchmark Tablets',
+        'document_number': 'AMV/R/BENCH',
+    })
+    for page in range(1, pages + 1):
+        generator.add_header_section(page)
+        table = generator.doc.add_table(rows=6, cols=4)
+        table.style = 'Table Grid'
+        for r, row in enumerate(table.rows):
+            for c, cell in enumerate(row.cells):
+                cell.text = f"{page}.{r}.{c}"
+        if page < pages:
+            generator.add_page_break()
+    generator.total_pages = generator.current_page
+    return generator
+
+
+def two_pass(generator: AMVReportGenerator, path: str):
+    generator.doc.save(path)
+    generator.update_page_numbers(path)
+
+
+def one_pass(generator: AMVReportGenerator, path: str):
+    generator.finalize_page_numbers()
+    generator.doc.save(path)
+
+
+def count_placeholders(path: str) -> int:
+    doc = Document(path)
+    return sum(
+        paragraph.text.count('{TOTAL_PAGES}')
+        for table in doc.tables for row in table.rows for cell in row.cells for paragraph in cell.paragraphs
+    )
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--pages', type=int, default=60, help='Pages (header sections) in the report')
+    arg_parser.add_argument('--repeat', type=int, default=3, help='Runs per mode; best time is reported')
+    args = arg_parser.parse_args()
+
+    timings = {'two-pass': [], 'one-pass': []}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for _ in range(args.repeat):
+            for mode, finalize in (('two-pass', two_pass), ('one-pass', one_pass)):
+                generator = build_generator(args.pages)
+                path = os.path.join(tmp_dir, f"{mode}.docx")
+                start = time.perf_counter()
+                finalize(generator, path)
+                timings[mode].append(time.perf_counter() - start)
+                leftover = count_placeholders(path)
+                if leftover:
+                    raise SystemExit(f"{mode}: {leftover} unfilled {{TOTAL_PAGES}} placeholders")
+
+    best_two, best_one = min(timings['two-pass']), min(timings['one-pass'])
+    print("=" * 60)
+    print(f"{args.pages}-page report, best of {args.repeat}")
+    print(f"{'two-pass (save/reopen/save)':<32}{best_two:>10.3f}s")
+    print(f"{'one-pass (in-memory patch)':<32}{best_one:>10.3f}s")
+    print("=" * 60)
+    print(f"{best_two / max(best_one, 1e-9):.1f}x faster finalization")
+
+
+if __name__ == '__main__':
+    main()
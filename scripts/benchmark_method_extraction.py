@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# Copyright (C) 2025 Soumyadeep Ghosh <soumyadeepghosh2004@zohomail.in>
+# All Rights Reserved.
+
+"""
+Benchmark for the keyword-prefiltered method parameter scan.
+
+Runs MethodExtractionService.extract_method_parameters (for each instrument
+type) and MethodPDFExtractor.parse_method_parameters over the same method
+text twice: once with every regex scanning the whole text, as before, and
+once through the shared PatternSet prefilter. Checks that both produce
+identical results and reports the time for each.
+
+The text comes from the given PDFs, or (by default) from a synthetic method
+document with the given number of pages.
+
+Usage:
+    python scripts/benchmark_method_extraction.py [method.pdf ...] [--pages 150] [--repeat 3]
+"""
+
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+
+# Add the parent directory to the path so we can import our modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.method_extraction_service import MethodExtractionService
+
+INSTRUMENTS = ('hplc', 'uv', 'titration', 'aas', 'gc')
+
+SECTIONS = [
+    "Chromatographic conditions: Column: C18, 250 mm x 4.6 mm, 5 um (Inertsil ODS-3V or equivalent).",
+    "Flow rate: 1.5 ml/min. Injection volume: 20 ul. Column oven temperature: 30 C. Run time: 25 minutes.",
+    "Mobile phase: Mix buffer pH 3.0 and acetonitrile in the ratio 60:40, filter through 0.45 micron membrane.",
+    "Detection: UV at 254 nm. Diluent: mobile phase. Standard solution: about 0.1 mg per ml of working standard.",
+    "Standard preparation: Weigh accurately about 50 mg of working standard into a 100 ml volumetric flask, "
+    "add 60 ml of diluent, sonicate to dissolve and dilute to 100 ml with diluent.",
+    "Sample preparation: Weigh and powder 20 tablets. Transfer powder equivalent to 50 mg of the active "
+    "ingredient into a 100 ml volumetric flask, add 60 ml of diluent and sonicate for 15 minutes.",
+    "System suitability: the tailing factor for the principal peak is not more than 2.0, the theoretical "
+    "plates are not less than 2000 and the relative standard deviation of five replicate injections is NMT 2.0%.",
+    "Procedure: separately inject equal volumes of blank, standard and sample solutions, record the "
+    "chromatograms and measure the responses for the major peaks.",
+    "Add a quantity of the powder containing 1 g of Lithium carbonate to 100 ml of water, add 50 ml of 1M "
+    "hydrochloric acid VS and boil for 1 minute to remove the carbon dioxide.",
+    "Cool and titrate the excess of acid with 1M sodium hydroxide VS using methyl orange solution as indicator. "
+    "Each ml of 1M hydrochloric acid VS is equivalent to 36.95 mg of Li2CO3.",
+    "Measure the absorbance of the resulting solution at the maximum at about 276 nm in a 1 cm cell, "
+    "using the diluent as the blank.",
+    "Gas chromatography: carrier gas nitrogen at 2.0 ml/min, split ratio 10:1, injector temperature 220 C, "
+    "FID detector at 260 C.",
+    "Acceptance criteria: 95.0% to 105.0% of the labelled amount. Report the results to one decimal place.",
+    "Validation summary: linearity correlation coefficient 0.9995, accuracy recovery 99.1%, precision RSD 0.8%; "
+    "specificity and robustness were established as per ICH Q2(R1).",
+]
+
+
+def synthetic_text(pages: int, seed: int = 5) -> str:
+    rng = random.Random(seed)
+    return "\n".join(f"Page {page} of {pages}\n" + "\n".join(rng.choice(SECTIONS) for _ in range(22))
+                     for page in range(1, pages + 1))
+
+
+def pdf_text(path: str) -> str:
+    """Text the way MethodExtractionService._extract_text_from_pdf reads it"""
+    with open(path, 'rb') as f:
+        return MethodExtractionService()._extract_text_from_pdf(f.read())
+
+
+class Unindexed:
+    """A PatternSet stand-in that runs every regex over the whole text"""
+
+    def __init__(self, pattern_set):
+        self.pattern_set = pattern_set
+
+    def scan(self, text):
+        return self.pattern_set.scan(text, indexed=False)
+
+
+def timed(run, repeat: int):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def compare(name: str, run_indexed, run_full, repeat: int) -> bool:
+    full_time, full_result = timed(run_full, repeat)
+    indexed_time, indexed_result = timed(run_indexed, repeat)
+    identical = full_result == indexed_result
+    print(f"  {name:34s} full scan {full_time * 1000:8.1f} ms   prefiltered {indexed_time * 1000:8.1f} ms   "
+          f"x{full_time / indexed_time:5.1f}   {'identical' if identical else 'DIFFERENT'}")
+    return identical
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the method parameter pattern scan')
+    parser.add_argument('pdfs', nargs='*', help='Method PDFs (default: synthetic text)')
+    parser.add_argument('--pages', type=int, default=150, help='Pages of synthetic text')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement (best is reported)')
+    args = parser.parse_args()
+
+    texts = [(os.path.basename(path), pdf_text(path)) for path in args.pdfs] or \
+        [(f"synthetic, {args.pages} pages", synthetic_text(args.pages))]
+
+    indexed = MethodExtractionService()
+    full = MethodExtractionService()
+    full.pattern_set = Unindexed(full.pattern_set)
+
+    from app_routes.amv_routes import MethodPDFExtractor
+    # One INFO line per extraction would drown the report
+    logging.getLogger('services.method_extraction_service').setLevel(logging.WARNING)
+    route_extractor = MethodPDFExtractor(None)
+    route_patterns = MethodPDFExtractor.PATTERN_SET
+
+    def parse_route(text, pattern_set):
+        MethodPDFExtractor.PATTERN_SET = pattern_set
+        try:
+            return route_extractor.parse_method_parameters(text)
+        finally:
+            MethodPDFExtractor.PATTERN_SET = route_patterns
+
+    all_identical = True
+    for label, text in texts:
+        content = text.encode('utf-8')
+        print(f"{label}: {len(text):,} characters")
+        all_identical &= compare(
+            'MethodExtractionService (5 types)',
+            lambda: [indexed.extract_method_parameters(content, kind) for kind in INSTRUMENTS],
+            lambda: [full.extract_method_parameters(content, kind) for kind in INSTRUMENTS],
+            args.repeat,
+        )
+        all_identical &= compare(
+            'MethodPDFExtractor.parse',
+            lambda: parse_route(text, route_patterns),
+            lambda: parse_route(text, Unindexed(route_patterns)),
+            args.repeat,
+        )
+    return 0 if all_identical else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
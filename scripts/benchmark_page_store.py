@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# Copyright (C) 2025 Soumyadeep Ghosh <soumyadeepghosh2004@zohomail.in>
+# All Rights Reserved.
+
+"""
+Benchmark for the persistent page text store.
+
+For each PDF, reads the text and tables of every page through
+PDFIngestionContext twice: cold (parsing the PDF with pdfplumber, as every
+extraction run did before) and warm (served from the page store after one
+ingestion). Also times loading a short page range straight from the store,
+checks that cold and warm reads are identical and reports the entry size.
+
+Usage:
+    python scripts/benchmark_page_store.py [protocol.pdf ...] [--range 3] [--repeat 3]
+"""
+
+import os
+import sys
+import glob
+import time
+import shutil
+import argparse
+import tempfile
+
+# Add the parent directory to the path so we can import our modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.page_text_store_service import PageTextStore, hash_file, ingest_document
+from services.pdf_ingestion_service import PDFIngestionContext
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class NoStore:
+    """A store that never has an entry: the context parses the PDF"""
+
+    def open(self, content_hash):
+        return None
+
+
+def read_all(pdf_path: str, store):
+    with PDFIngestionContext(pdf_path, store=store) as doc:
+        return [(doc.page_text(i), doc.page_tables(i)) for i in range(doc.page_count)]
+
+
+def timed(run, repeat: int):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark cold PDF parsing against the page text store')
+    parser.add_argument('pdfs', nargs='*', help='PDFs to read (default: one sample from uploads/pvp)')
+    parser.add_argument('--range', type=int, default=3, help='Pages in the range load')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per warm measurement (best is reported)')
+    args = parser.parse_args()
+
+    pdfs = args.pdfs or sorted(glob.glob(os.path.join(ROOT, 'uploads', 'pvp', '*.pdf')))[:1]
+    if not pdfs:
+        parser.error('no PDFs given and none found in uploads/pvp')
+
+    workdir = tempfile.mkdtemp(prefix='page_store_bench_')
+    all_identical = True
+    try:
+        store = PageTextStore(workdir)
+        for pdf_path in pdfs:
+            cold_time, cold = timed(lambda: read_all(pdf_path, NoStore()), 1)
+            start = time.perf_counter()
+            ingest_document(pdf_path, store=store, ocr=False)
+            ingest_time = time.perf_counter() - start
+            warm_time, warm = timed(lambda: read_all(pdf_path, store), args.repeat)
+
+            content_hash = hash_file(pdf_path)
+            first = max(1, len(cold) // 2)
+            range_time, pages = timed(lambda: store.load_pages(content_hash, first, first + args.range - 1),
+                                      args.repeat)
+            identical = cold == warm
+            all_identical &= identical
+
+            print(f"{os.path.basename(pdf_path)}: {len(cold)} pages, "
+                  f"{os.path.getsize(pdf_path) / 1024:.0f} KB PDF, "
+                  f"{os.path.getsize(store.path_for(content_hash)) / 1024:.1f} KB stored")
+            print(f"  cold parse (text + tables)   {cold_time * 1000:9.1f} ms")
+            print(f"  ingestion (parse + save)     {ingest_time * 1000:9.1f} ms")
+            print(f"  warm read, all pages         {warm_time * 1000:9.1f} ms   x{cold_time / warm_time:7.0f}   "
+                  f"{'identical' if identical else 'DIFFERENT'}")
+            print(f"  warm read, pages {first}-{first + len(pages) - 1:<10d} {range_time * 1000:9.1f} ms")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0 if all_identical else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
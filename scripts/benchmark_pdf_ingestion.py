@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# Copyright (C) 2025 Soumyadeep Ghosh <soumyadeepghosh2004@zohomail.in>
+# All Rights Reserved.
+
+"""
+Benchmark for the shared PDF ingestion context.
+
+Runs the pdfplumber-backed EnhancedDocumentParser stages (table-aware text
+extraction, OCR fallback, deterministic equipment table, batch-size vacuum)
+twice: once with every stage opening the PDF on its own, and once with a
+single PDFIngestionContext shared across stages. Reports pdfplumber opens,
+page layouts (extract_text/extract_tables calls) and wall time.
+
+Usage:
+    python scripts/benchmark_pdf_ingestion.py [path/to/mfr.pdf] [--pages 120]
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+# Add the parent directory to the path so we can import our modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pdfplumber
+from pdfplumber.page import Page
+
+from services.pdf_ingestion_service import PDFIngestionContext
+from services.process_validation_service import EnhancedDocumentParser
+
+
+class PlumberCounter:
+    """Counts pdfplumber opens and per-page layout calls while active"""
+
+    def __init__(self):
+        self.opens = 0
+        self.layouts = 0
+
+    def __enter__(self):
+        self._open = pdfplumber.open
+        self._text = Page.extract_text
+        self._tables = Page.extract_tables
+        counter = self
+
+        def counting_open(*args, **kwargs):
+            counter.opens += 1
+            return counter._open(*args, **kwargs)
+
+        def counting_text(page, *args, **kwargs):
+            counter.layouts += 1
+            return counter._text(page, *args, **kwargs)
+
+        def counting_tables(page, *args, **kwargs):
+            counter.layouts += 1
+            return counter._tables(page, *args, **kwargs)
+
+        pdfplumber.open = counting_open
+        Page.extract_text = counting_text
+        Page.extract_tables = counting_tables
+        return self
+
+    def __exit__(self, *exc):
+        pdfplumber.open = self._open
+        Page.extract_text = self._text
+        Page.extract_tables = self._tables
+
+
+def build_sample_pdf(path: str, pages: int):
+    """Write a synthetic MFR with a text block and an equipment table per page"""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Table, TableStyle, PageBreak
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib import colors
+
+    styles = getSampleStyleSheet()
+    elements = []
+    for i in range(pages):
+        elements.append(Paragraph(f"MASTER FORMULA RECORD - Page {i + 1}", styles['Heading2']))
+        elements.append(Paragraph("Batch Size : 50.0 Liters (5000 vials)", styles['Normal']))
+        elements.append(Paragraph(
+            "Take freshly collected Water for Injection in manufacturing tank and cool to 30-40C "
+            "with continuous nitrogen purging. Add Disodium edetate with continuous stirring.",
+            styles['Normal']))
+        table = Table([
+            ["Equipment Name", "Equipment ID", "Make", "Capacity"],
+            ["Manufacturing Tank", f"KPL/MT/{i:03d}", "Alfa", "100 L"],
+            ["Filtration Assembly", f"KPL/FA/{i:03d}", "Sartorius", "0.22 um"],
+        ])
+        table.setStyle(TableStyle([('GRID', (0, 0), (-1, -1), 0.5, colors.black)]))
+        elements.append(table)
+        elements.append(PageBreak())
+    SimpleDocTemplate(path, pagesize=A4).build(elements)
+
+
+def run_stages(parser: EnhancedDocumentParser, pdf_path: str, doc=None):
+    parser.extract_content_with_tables(pdf_path, doc)
+    parser.extract_text_with_ocr_fallback(pdf_path, doc)
+    parser._extract_equipment_table_deterministic(pdf_path, doc)
+    parser._vacuum_batch_size(pdf_path, doc)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('pdf', nargs='?', help='PDF to benchmark (defaults to a generated sample)')
+    arg_parser.add_argument('--pages', type=int, default=120, help='Pages in the generated sample')
+    args = arg_parser.parse_args()
+
+    # Only the pdfplumber stages are exercised, so skip Gemini configuration
+    parser = EnhancedDocumentParser.__new__(EnhancedDocumentParser)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pdf_path = args.pdf
+        if not pdf_path:
+            pdf_path = os.path.join(tmp_dir, 'sample_mfr.pdf')
+            print(f"Generating {args.pages}-page sample MFR...")
+            build_sample_pdf(pdf_path, args.pages)
+
+        with PlumberCounter() as legacy:
+            start = time.perf_counter()
+            run_stages(parser, pdf_path)
+            legacy_time = time.perf_counter() - start
+
+        with PlumberCounter() as shared:
+            start = time.perf_counter()
+            with PDFIngestionContext(pdf_path) as doc:
+                run_stages(parser, pdf_path, doc)
+                stats = doc.stats.to_dict()
+            shared_time = time.perf_counter() - start
+
+    print("=" * 60)
+    print(f"{'':<22}{'per-stage open':>18}{'shared context':>18}")
+    print(f"{'pdfplumber opens':<22}{legacy.opens:>18}{shared.opens:>18}")
+    print(f"{'page layouts':<22}{legacy.layouts:>18}{shared.layouts:>18}")
+    print(f"{'wall time (s)':<22}{legacy_time:>18.2f}{shared_time:>18.2f}")
+    print("=" * 60)
+    print(f"Saved {legacy.opens - shared.opens} opens and {legacy.layouts - shared.layouts} page layouts "
+          f"({legacy_time / max(shared_time, 1e-9):.1f}x faster)")
+    print(f"Context stats: {stats}")
+
+
+if __name__ == '__main__':
+    main()
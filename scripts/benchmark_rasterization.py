@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# Copyright (C) 2025 Soumyadeep Ghosh <soumyadeepghosh2004@zohomail.in>
+# All Rights Reserved.
+
+"""
+Benchmark for lazy, page-budgeted rasterization.
+
+Compares the old behaviour of extract_images_from_pdf (render the whole
+document at 200 DPI, keep the first N pages) with
+PDFIngestionContext.iter_page_images (render only N pages, adaptive DPI).
+Each mode runs in its own subprocess so peak RSS is measured independently.
+
+Requires poppler (pdftoppm) on PATH.
+
+Usage:
+    python scripts/benchmark_rasterization.py [path/to/scanned.pdf] [--pages 150] [--keep 2]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+# Add the parent directory to the path so we can import our modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def peak_rss_mb() -> float:
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_legacy(pdf_path: str, keep: int) -> dict:
+    from pdf2image import convert_from_path
+    start = time.perf_counter()
+    images = convert_from_path(pdf_path, dpi=200)[:keep]
+    elapsed = time.perf_counter() - start
+    return {
+        "pages_kept": len(images),
+        "seconds": round(elapsed, 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def run_lazy(pdf_path: str, keep: int) -> dict:
+    from services.pdf_ingestion_service import PDFIngestionContext
+    start = time.perf_counter()
+    with PDFIngestionContext(pdf_path) as doc:
+        images = list(doc.iter_page_images(max_pages=keep))
+        stats = doc.raster_stats.to_dict()
+    elapsed = time.perf_counter() - start
+    return {
+        "pages_kept": len(images),
+        "seconds": round(elapsed, 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "raster_stats": stats,
+    }
+
+
+def run_mode_subprocess(mode: str, pdf_path: str, keep: int) -> dict:
+    output = subprocess.check_output(
+        [sys.executable, os.path.abspath(__file__), pdf_path, '--keep', str(keep), '--mode', mode]
+    )
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('pdf', nargs='?', help='PDF to benchmark (defaults to a generated sample)')
+    arg_parser.add_argument('--pages', type=int, default=150, help='Pages in the generated sample')
+    arg_parser.add_argument('--keep', type=int, default=2, help='Pages the pipeline actually needs')
+    arg_parser.add_argument('--mode', choices=['legacy', 'lazy'], help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+
+    if args.mode:
+        runner = run_legacy if args.mode == 'legacy' else run_lazy
+        print(json.dumps(runner(args.pdf, args.keep)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pdf_path = args.pdf
+        if not pdf_path:
+            from benchmark_pdf_ingestion import build_sample_pdf
+            pdf_path = os.path.join(tmp_dir, 'sample_batch_record.pdf')
+            print(f"Generating {args.pages}-page sample batch record...")
+            build_sample_pdf(pdf_path, args.pages)
+
+        legacy = run_mode_subprocess('legacy', pdf_path, args.keep)
+        lazy = run_mode_subprocess('lazy', pdf_path, args.keep)
+
+    print("=" * 60)
+    print(f"{'':<22}{'whole document':>18}{'lazy':>18}")
+    print(f"{'pages kept':<22}{legacy['pages_kept']:>18}{lazy['pages_kept']:>18}")
+    print(f"{'wall time (s)':<22}{legacy['seconds']:>18.2f}{lazy['seconds']:>18.2f}")
+    print(f"{'peak RSS (MB)':<22}{legacy['peak_rss_mb']:>18.1f}{lazy['peak_rss_mb']:>18.1f}")
+    print("=" * 60)
+    print(f"Raster stats: {lazy['raster_stats']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# Copyright (C) 2025 Soumyadeep Ghosh <soumyadeepghosh2004@zohomail.in>
+# All Rights Reserved.
+
+"""
+Benchmark for the full-text search index.
+
+Fills a temporary FTS5 index with synthetic template / report / AMV entries
+(product, ingredient, protocol number and a few hundred words of body text
+each) and times first and fifth result pages for queries of different
+selectivity for one user, against counting the same matches with LIKE over
+a plain table (what filtering the loaded list amounts to, before any
+ranking).
+
+Usage:
+    python scripts/benchmark_search_index.py [--docs 100000] [--users 1] [--repeat 5]
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import sqlite3
+import argparse
+import tempfile
+
+# Add the parent directory to the path so we can import our modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.search_index_service import IndexEntry, SQLiteSearchBackend, query_terms
+
+INGREDIENTS = ['paracetamol', 'ibuprofen', 'metformin', 'amlodipine', 'cefixime', 'atorvastatin', 'omeprazole',
+               'azithromycin', 'losartan', 'pantoprazole', 'levocetirizine', 'montelukast']
+FORMS = ['tablets', 'capsules', 'oral suspension', 'injection', 'syrup']
+WORDS = ('granulation blending compression coating dissolution assay uniformity hardness friability '
+         'disintegration moisture impurity specification batch stage sampling acceptance criteria '
+         'equipment mixer dryer sifter validation protocol report deviation recommendation').split()
+KINDS = ['pvp', 'pvr', 'AMV', 'AMV_VERIFICATION']
+
+QUERIES = {
+    'rare term': 'impeller 4985',
+    'ingredient': 'levocetirizine',
+    'ingredient + form': 'metformin tablets',
+    'common word': 'dissolution',
+    'prefix': 'amlo',
+}
+
+
+def synthetic_entries(count: int, users: int, body_words: int, seed: int = 7):
+    rng = random.Random(seed)
+    for i in range(1, count + 1):
+        ingredient, form = rng.choice(INGREDIENTS), rng.choice(FORMS)
+        kind = KINDS[i % len(KINDS)]
+        body = ' '.join(rng.choice(WORDS) for _ in range(body_words))
+        if i % 997 == 0:
+            body += f' rapid mixer granulator impeller {i} rpm'
+        yield IndexEntry('document', i, 1 + i % users, kind, f'{ingredient.title()} {form} {kind} {i}',
+                         f'{ingredient} {form} AMVP-{i:06d} {rng.randint(5, 1000)} mg', body)
+
+
+def timed(run, repeat: int):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark ranked full-text search against a LIKE scan')
+    parser.add_argument('--docs', type=int, default=100000, help='Entries to index')
+    parser.add_argument('--users', type=int, default=1, help='Users the entries are spread over')
+    parser.add_argument('--body-words', type=int, default=300, help='Body words per entry')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per query (best is reported)')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='search_bench_')
+    try:
+        index = SQLiteSearchBackend(os.path.join(workdir, 'search.db'))
+        plain = sqlite3.connect(os.path.join(workdir, 'plain.db'), isolation_level=None)
+        plain.execute("CREATE TABLE docs (id INTEGER PRIMARY KEY, user_id INTEGER, title TEXT, metadata TEXT, body TEXT)")
+        plain.execute("CREATE INDEX ix_docs_user ON docs (user_id)")
+
+        start = time.perf_counter()
+        batch = []
+        for entry in synthetic_entries(args.docs, args.users, args.body_words):
+            batch.append(entry)
+            if len(batch) == 2000:
+                index.apply(batch, [])
+                plain.executemany("INSERT INTO docs VALUES (?, ?, ?, ?, ?)",
+                                  [(e.source_id, e.user_id, e.title, e.metadata, e.body) for e in batch])
+                batch = []
+        if batch:
+            index.apply(batch, [])
+            plain.executemany("INSERT INTO docs VALUES (?, ?, ?, ?, ?)",
+                              [(e.source_id, e.user_id, e.title, e.metadata, e.body) for e in batch])
+        build_time = time.perf_counter() - start
+        print(f"{args.docs} entries over {args.users} user(s), {args.body_words} body words each: "
+              f"indexed in {build_time:.1f} s, index {os.path.getsize(index.path) / 1024 / 1024:.0f} MB")
+        print(f"  {'query':<20} {'matches':>8} {'fts5 page 1':>12} {'fts5 page 5':>12} {'LIKE scan':>11}")
+
+        for name, query in QUERIES.items():
+            terms = query_terms(query)
+            first_time, (_, total) = timed(lambda: index.search(1, terms, None, 20, 0), args.repeat)
+            deep_time, _ = timed(lambda: index.search(1, terms, None, 20, 80), args.repeat)
+            like = ' AND '.join("(title || ' ' || metadata || ' ' || body) LIKE ?" for _ in terms)
+            like_time, _ = timed(lambda: plain.execute(
+                f"SELECT count(*) FROM docs WHERE user_id = ? AND {like}",
+                [1] + [f'%{term}%' for term in terms]).fetchone(), 1)
+            print(f"  {name:<20} {total:>8} {first_time * 1000:>9.1f} ms {deep_time * 1000:>9.1f} ms "
+                  f"{like_time * 1000:>8.0f} ms")
+        plain.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
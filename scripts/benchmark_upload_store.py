@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# Copyright (C) 2025 Soumyadeep Ghosh <soumyadeepghosh2004@zohomail.in>
+# All Rights Reserved.
+
+"""
+Benchmark for the content-addressed upload store.
+
+Uploads the same PDF N times and runs the page-store ingestion the PV job
+does on each upload, three ways:
+
+  - per-upload files, no page store: every copy is parsed
+  - per-upload files with the page store: every copy is written and
+    re-hashed to find the stored parse
+  - the upload store: one blob, one parse, the hash read from the blob name
+
+Reports wall time and bytes on disk for each.
+
+Usage:
+    python scripts/benchmark_upload_store.py [protocol.pdf] [--uploads 10]
+"""
+
+import io
+import os
+import sys
+import glob
+import time
+import shutil
+import argparse
+import tempfile
+from datetime import datetime
+
+# Add the parent directory to the path so we can import our modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.datastructures import FileStorage
+
+from services.page_text_store_service import PageTextStore, ingest_document
+from services.upload_store_service import UploadStore
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def disk_usage(directory: str) -> int:
+    return sum(os.path.getsize(os.path.join(base, name)) for base, _, files in os.walk(directory) for name in files)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark repeat uploads with and without the upload store')
+    parser.add_argument('pdf', nargs='?', help='PDF to upload (default: one sample from uploads/pvp)')
+    parser.add_argument('--uploads', type=int, default=10, help='Times the same file is uploaded')
+    args = parser.parse_args()
+
+    pdf_path = args.pdf or next(iter(sorted(glob.glob(os.path.join(ROOT, 'uploads', 'pvp', '*.pdf')))), None)
+    if not pdf_path:
+        parser.error('no PDF given and none found in uploads/pvp')
+    with open(pdf_path, 'rb') as f:
+        data = f.read()
+
+    workdir = tempfile.mkdtemp(prefix='upload_store_bench_')
+    try:
+        # Before: a timestamped file per upload
+        results = []
+        for shared in (False, True):
+            folder = os.path.join(workdir, f'pv_documents_{shared}')
+            os.makedirs(folder)
+            start = time.perf_counter()
+            for i in range(args.uploads):
+                path = os.path.join(folder, f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{i}_stp.pdf")
+                FileStorage(io.BytesIO(data), filename='stp.pdf').save(path)
+                pages_dir = os.path.join(workdir, 'shared_pages' if shared else f'pages_{i}')
+                ingest_document(path, store=PageTextStore(pages_dir), ocr=False)
+            results.append((time.perf_counter() - start, disk_usage(folder)))
+
+        # After: one blob and one page-store entry for every repeat
+        store = UploadStore(os.path.join(workdir, 'blobs'), os.path.join(workdir, 'index.db'))
+        pages = PageTextStore(os.path.join(workdir, 'pages'))
+        start = time.perf_counter()
+        for _ in range(args.uploads):
+            stored = store.save(FileStorage(io.BytesIO(data), filename='stp.pdf'))
+            ingest_document(stored.path, store=pages, content_hash=store.content_hash(stored.path), ocr=False)
+        after_time = time.perf_counter() - start
+        stats = store.stats()
+
+        print(f"{os.path.basename(pdf_path)} ({len(data) / 1024:.0f} KB) uploaded {args.uploads} times")
+        for label, (elapsed, size) in zip(('per-upload files', '  + page store'), results):
+            print(f"  {label:<18} {elapsed * 1000:9.1f} ms   {size / 1024:9.0f} KB on disk")
+        print(f"  upload store       {after_time * 1000:9.1f} ms   {stats['bytes_stored'] / 1024:9.0f} KB on disk   "
+              f"{stats['references']} references to {stats['blobs']} blob(s)")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
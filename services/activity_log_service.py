@@ -0,0 +1,206 @@
+"""
+Activity Log Writer - buffered, bulk-inserted activity logging.
+
+``log_activity`` used to add an ActivityLog row and commit the request's
+session on every call, costing a commit (and a SQLite write lock) per page
+view and committing unrelated pending changes as a side effect. Entries are
+now queued in-process and a background thread writes them with one
+executemany INSERT per batch on its own engine connection. A batch is
+flushed when it reaches ACTIVITY_LOG_BATCH_SIZE entries or after
+ACTIVITY_LOG_FLUSH_SECONDS, and the queue is drained at interpreter exit.
+
+Set ACTIVITY_LOG_SYNC=1 to write each entry immediately (scripts, tests).
+"""
+
+import os
+import time
+import queue
+import atexit
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+from models import ActivityLog
+
+logger = logging.getLogger(__name__)
+
+ACTIVITY_LOG_BATCH_SIZE = int(os.environ.get('ACTIVITY_LOG_BATCH_SIZE', '100'))
+ACTIVITY_LOG_FLUSH_SECONDS = float(os.environ.get('ACTIVITY_LOG_FLUSH_SECONDS', '2'))
+ACTIVITY_LOG_MAX_QUEUE = int(os.environ.get('ACTIVITY_LOG_MAX_QUEUE', '10000'))
+ACTIVITY_LOG_SYNC = os.environ.get('ACTIVITY_LOG_SYNC', '').lower() in ('1', 'true', 'yes')
+
+
+class ActivityLogWriter:
+    """Background writer that bulk-inserts queued activity log rows"""
+
+    def __init__(self, batch_size: int = ACTIVITY_LOG_BATCH_SIZE,
+                 flush_interval: float = ACTIVITY_LOG_FLUSH_SECONDS,
+                 max_queue: int = ACTIVITY_LOG_MAX_QUEUE, synchronous: bool = ACTIVITY_LOG_SYNC):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.synchronous = synchronous
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max_queue)
+        self._engine = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._stop = threading.Event()
+        self._start_lock = threading.Lock()
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            'enqueued': 0,
+            'written': 0,
+            'dropped': 0,
+            'failed': 0,
+            'flushes': 0,
+            'last_flush_ms': 0.0,
+            'max_flush_ms': 0.0,
+            'total_flush_ms': 0.0,
+        }
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+    def bind(self, engine):
+        """Use ``engine`` for writes (the app's engine, resolved on first log)"""
+        self._engine = engine
+
+    @property
+    def is_bound(self) -> bool:
+        return self._engine is not None
+
+    def _ensure_started(self):
+        # Re-create the thread after fork; threads do not survive it
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='activity-log-writer', daemon=True)
+            self._thread.start()
+
+    def shutdown(self, timeout: float = 5.0):
+        """Stop the writer thread and write whatever is still queued"""
+        self._stop.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout)
+        self._thread = None
+        self._flush(self._drain(limit=None))
+
+    # ------------------------------------------------------------------
+    # Producer side
+    # ------------------------------------------------------------------
+    def enqueue(self, row: Dict[str, Any]) -> bool:
+        """Queue one ActivityLog row dict; returns False if it was dropped"""
+        if self.synchronous:
+            self._flush([row])
+            return True
+
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            with self._metrics_lock:
+                self._metrics['dropped'] += 1
+            logger.warning("Activity log queue full; dropped %s", row.get('action'))
+            return False
+        with self._metrics_lock:
+            self._metrics['enqueued'] += 1
+        return True
+
+    # ------------------------------------------------------------------
+    # Consumer side
+    # ------------------------------------------------------------------
+    def _drain(self, limit: Optional[int]) -> List[Dict[str, Any]]:
+        rows = []
+        while limit is None or len(rows) < limit:
+            try:
+                rows.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return rows
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._stop.is_set():
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=min(remaining, 0.5)))
+                except queue.Empty:
+                    continue
+                batch.extend(self._drain(self.batch_size - len(batch)))
+            self._flush(batch)
+
+    def _flush(self, rows: List[Dict[str, Any]]):
+        if not rows:
+            return
+        if self._engine is None:
+            logger.error("Activity log writer has no engine; dropping %d entries", len(rows))
+            with self._metrics_lock:
+                self._metrics['failed'] += len(rows)
+            return
+
+        start = time.perf_counter()
+        try:
+            with self._engine.begin() as conn:
+                conn.execute(ActivityLog.__table__.insert(), rows)
+            written, failed = len(rows), 0
+        except Exception as e:
+            # One bad row fails the whole executemany; retry row by row so
+            # only the rows that cannot be written are dropped
+            logger.warning(f"Error writing {len(rows)} activity log entries, retrying one by one: {e}")
+            written, failed = self._flush_rows(rows)
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._metrics_lock:
+            self._metrics['written'] += written
+            self._metrics['failed'] += failed
+            self._metrics['flushes'] += 1
+            self._metrics['last_flush_ms'] = elapsed_ms
+            self._metrics['max_flush_ms'] = max(self._metrics['max_flush_ms'], elapsed_ms)
+            self._metrics['total_flush_ms'] += elapsed_ms
+
+    def _flush_rows(self, rows: List[Dict[str, Any]]):
+        written = failed = 0
+        for row in rows:
+            try:
+                with self._engine.begin() as conn:
+                    conn.execute(ActivityLog.__table__.insert(), [row])
+                written += 1
+            except Exception as e:
+                logger.error(f"Error writing activity log entry {row.get('action')}: {e}")
+                failed += 1
+        return written, failed
+
+    def metrics(self) -> Dict[str, Any]:
+        """Queue depth, throughput and flush latency counters"""
+        with self._metrics_lock:
+            data = dict(self._metrics)
+        total_flush_ms = data.pop('total_flush_ms')
+        data['avg_flush_ms'] = round(total_flush_ms / data['flushes'], 3) if data['flushes'] else 0.0
+        data['last_flush_ms'] = round(data['last_flush_ms'], 3)
+        data['max_flush_ms'] = round(data['max_flush_ms'], 3)
+        data['queue_depth'] = self._queue.qsize()
+        data['batch_size'] = self.batch_size
+        data['flush_interval_s'] = self.flush_interval
+        data['synchronous'] = self.synchronous
+        return data
+
+
+_writer: Optional[ActivityLogWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_activity_log_writer() -> ActivityLogWriter:
+    """Process-wide writer used by utils.helpers.log_activity"""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = ActivityLogWriter()
+            atexit.register(_writer.shutdown)
+        return _writer
@@ -0,0 +1,154 @@
+"""
+Admin Analytics Service - bucketed user/document creation trends.
+
+Each entity is counted with one ``GROUP BY bucket`` query over a
+``created_at`` range instead of one COUNT per bucket. Buckets that ended
+before the current one are closed and never change, so their counts are
+cached for the life of the process; a repeat request only queries from the
+first uncached bucket onwards (normally just the current one).
+"""
+
+import threading
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+
+from database import db
+from models import Document, User
+
+GRANULARITIES = ('day', 'week', 'month')
+MAX_BUCKETS = 1000
+
+# entity name -> created_at column
+ENTITIES = {
+    'users': User.created_at,
+    'documents': Document.created_at,
+}
+
+_closed_buckets: Dict[Tuple[str, str, str], int] = {}
+_closed_lock = threading.Lock()
+
+
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    """Start of the bucket containing ``moment`` (weeks start on Monday)"""
+    day = datetime(moment.year, moment.month, moment.day)
+    if granularity == 'day':
+        return day
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def next_bucket(start: datetime, granularity: str) -> datetime:
+    if granularity == 'day':
+        return start + timedelta(days=1)
+    if granularity == 'week':
+        return start + timedelta(days=7)
+    if start.month == 12:
+        return start.replace(year=start.year + 1, month=1)
+    return start.replace(month=start.month + 1)
+
+
+def bucket_label(start: datetime, granularity: str) -> str:
+    return start.strftime('%Y-%m') if granularity == 'month' else start.strftime('%Y-%m-%d')
+
+
+def iter_buckets(start: datetime, end: datetime, granularity: str) -> List[datetime]:
+    """Bucket starts covering [start, end)"""
+    buckets = []
+    current = bucket_start(start, granularity)
+    while current < end:
+        buckets.append(current)
+        current = next_bucket(current, granularity)
+    return buckets
+
+
+def _bucket_expression(column, granularity: str):
+    """SQL expression producing the same label as ``bucket_label``"""
+    if db.engine.dialect.name == 'postgresql':
+        if granularity == 'month':
+            return func.to_char(func.date_trunc('month', column), 'YYYY-MM')
+        return func.to_char(func.date_trunc(granularity, column), 'YYYY-MM-DD')
+    # SQLite
+    if granularity == 'month':
+        return func.strftime('%Y-%m', column)
+    if granularity == 'week':
+        # Monday of the row's week: next-or-same Sunday minus 6 days
+        return func.date(column, 'weekday 0', '-6 days')
+    return func.date(column)
+
+
+def _grouped_counts(entity: str, granularity: str, start: datetime, end: datetime) -> Dict[str, int]:
+    column = ENTITIES[entity]
+    bucket = _bucket_expression(column, granularity).label('bucket')
+    rows = db.session.query(bucket, func.count()).filter(
+        column >= start,
+        column < end
+    ).group_by(bucket).all()
+    return {label: count for label, count in rows}
+
+
+def get_trend(entity: str, granularity: str = 'month', start: Optional[datetime] = None,
+              end: Optional[datetime] = None, now: Optional[datetime] = None) -> List[Dict]:
+    """Counts per bucket for ``entity`` between ``start`` (inclusive) and ``end`` (exclusive)"""
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+    now = now or datetime.utcnow()
+    end = end or next_bucket(bucket_start(now, granularity), granularity)
+    if start is None:
+        start = bucket_start(now, granularity)
+        for _ in range(11):
+            start = bucket_start(start - timedelta(days=1), granularity)
+
+    buckets = iter_buckets(start, end, granularity)
+    if not buckets:
+        return []
+    if len(buckets) > MAX_BUCKETS:
+        raise ValueError(f"range spans {len(buckets)} {granularity} buckets (max {MAX_BUCKETS})")
+    current_bucket = bucket_start(now, granularity)
+
+    counts: Dict[str, int] = {}
+    first_uncached = None
+    with _closed_lock:
+        for b in buckets:
+            # Partial buckets at the range edges are not cacheable
+            whole = b >= start and next_bucket(b, granularity) <= end
+            key = (entity, granularity, bucket_label(b, granularity))
+            if whole and b < current_bucket and key in _closed_buckets:
+                counts[key[2]] = _closed_buckets[key]
+            elif first_uncached is None:
+                first_uncached = b
+
+    if first_uncached is not None:
+        fetched = _grouped_counts(entity, granularity, max(first_uncached, start), end)
+        with _closed_lock:
+            for b in buckets:
+                if b < first_uncached:
+                    continue
+                label = bucket_label(b, granularity)
+                counts[label] = fetched.get(label, 0)
+                whole = b >= start and next_bucket(b, granularity) <= end
+                if whole and next_bucket(b, granularity) <= current_bucket:
+                    _closed_buckets[(entity, granularity, label)] = counts[label]
+
+    trend = []
+    for b in buckets:
+        label = bucket_label(b, granularity)
+        point = {'period': label, 'count': counts.get(label, 0)}
+        if granularity == 'month':
+            point['month'] = label
+        trend.append(point)
+    return trend
+
+
+def parse_date(value: Optional[str]) -> Optional[datetime]:
+    """YYYY-MM-DD query parameter to datetime (None if absent)"""
+    if not value:
+        return None
+    return datetime.combine(date.fromisoformat(value), datetime.min.time())
+
+
+def clear_closed_bucket_cache():
+    with _closed_lock:
+        _closed_buckets.clear()
@@ -20,10 +20,9 @@ import PyPDF2
 from scipy import stats as scipy_stats
 import numpy as np
 import random
-import requests
-from io import BytesIO
-from PIL import Image
 from services.chemical_structure_service import chemical_structure_generator
+from services.image_asset_service import get_image_asset_cache, LOGO_SIZE
+from services.batch_statistics_service import summarize_values
 
 class AMVReportGenerator:
     def __init__(self, form_data, company_data=None):
@@ -40,6 +39,7 @@ class AMVReportGenerator:
         self.current_page = 1
         self.sections_pages = {}
         self.total_pages = 0
+        self.total_pages_runs = []  # "{TOTAL_PAGES}" runs patched in finalize_page_numbers
         self.setup_document_margins()
         
     def setup_document_margins(self):
@@ -270,15 +270,13 @@ class AMVReportGenerator:
     
     def calculate_statistics(self, data_list):
         """Calculate mean, std, CV from data list"""
-        data_array = np.array(data_list)
-        mean = np.mean(data_array)
-        std = np.std(data_array)
-        cv = (std / mean) * 100
+        # Population SD (ddof=0), as np.std computed it
+        summary = summarize_values(data_list, ddof=0)
         
         return {
-            'mean': round(mean, 2),
-            'std': round(std, 3),
-            'cv': round(cv, 2)
+            'mean': round(summary['mean'], 2),
+            'std': round(summary['sd'], 3),
+            'cv': round(summary['rsd'], 2)
         }
     
     def add_header_section(self, page_number=None):
@@ -304,23 +302,9 @@ class AMVReportGenerator:
         
         if logo_url:
             try:
-                # Download and insert logo image
-                response = requests.get(logo_url, timeout=10)
-                if response.status_code == 200:
-                    # Process image to ensure consistent size (150 × 84 pixels)
-                    image_data = BytesIO(response.content)
-                    
-                    # Open image with PIL to resize to exact dimensions
-                    img = Image.open(image_data)
-                    
-                    # Resize image to exactly 150 × 84 pixels
-                    resized_img = img.resize((150, 84), Image.Resampling.LANCZOS)
-                    
-                    # Save resized image to BytesIO
-                    resized_image_data = BytesIO()
-                    resized_img.save(resized_image_data, format='PNG')
-                    resized_image_data.seek(0)
-                    
+                # Logo is downloaded and resized to 150 × 84 once, then served from the asset cache
+                resized_image_data = get_image_asset_cache().get_stream(logo_url, LOGO_SIZE)
+                if resized_image_data is not None:
                     # Add image to paragraph with exact pixel dimensions
                     logo_run = left_para.add_run()
                     logo_run.add_picture(resized_image_data, width=Inches(1.56), height=Inches(0.875))
@@ -390,7 +374,9 @@ class AMVReportGenerator:
         
         # Report number and page
         info_table.rows[2].cells[0].text = f"REPORT NO. {self.form_data.get('document_number', 'AMV/R/XXX')}"
-        info_table.rows[2].cells[1].text = f"PAGE {self.current_page} OF {{TOTAL_PAGES}}"
+        page_para = info_table.rows[2].cells[1].paragraphs[0]
+        page_para.add_run(f"PAGE {self.current_page} OF ")
+        self.total_pages_runs.append(page_para.add_run("{TOTAL_PAGES}"))
         
         self.doc.add_paragraph()
     
@@ -1460,14 +1446,19 @@ class AMVReportGenerator:
             if image_path and os.path.exists(image_path):
                 sig_cell.text = ''
                 run = sig_cell.paragraphs[0].add_run()
-                run.add_picture(image_path, width=Inches(1.0))
+                run.add_picture(get_image_asset_cache().get_stream(image_path), width=Inches(1.0))
             else:
                 sig_cell.text = '[Signature]'
 
         # self.total_pages will be set in generate_report method
     
+    def finalize_page_numbers(self):
+        """Fill tracked {TOTAL_PAGES} runs in memory so the report is saved only once"""
+        for run in self.total_pages_runs:
+            run.text = str(self.total_pages)
+    
     def update_page_numbers(self, filename):
-        """Update all page number placeholders with actual total pages"""
+        """Update all page number placeholders in an already saved report (reopens and resaves it)"""
         doc = Document(filename)
         
         for table in doc.tables:
@@ -1514,12 +1505,10 @@ class AMVReportGenerator:
         # Conclusion
         self.add_conclusion_section(signature_paths=signature_paths)
         
-        # Save document
-        self.doc.save(output_filename)
-        
-        # Update page numbers
+        # Update page numbers, then save once
         self.total_pages = self.current_page
-        self.update_page_numbers(output_filename)
+        self.finalize_page_numbers()
+        self.doc.save(output_filename)
         
         return output_filename
     
@@ -1857,19 +1846,17 @@ class MathematicalCalculations:
     @staticmethod
     def calculate_mean(data):
         """Calculate mean of data list"""
-        return np.mean(data)
+        return summarize_values(data, ddof=0)['mean']
     
     @staticmethod
     def calculate_std(data):
         """Calculate standard deviation"""
-        return np.std(data)
+        return summarize_values(data, ddof=0)['sd']
     
     @staticmethod
     def calculate_cv(data):
         """Calculate coefficient of variation (%)"""
-        mean = np.mean(data)
-        std = np.std(data)
-        return (std / mean) * 100 if mean != 0 else 0
+        return summarize_values(data, ddof=0)['rsd']
     
     @staticmethod
     def linear_regression(x, y):
@@ -0,0 +1,239 @@
+"""
+Batch Statistics Service - vectorized statistics for batch test results.
+
+Results are held as a ``batches x tests`` float matrix with NaN for missing
+or non-numeric results. ``compute_batch_statistics`` computes count, mean,
+SD, %RSD, min, max, Cp/Cpk and a t-based confidence interval of the mean for
+every test column in one set of NumPy reductions, replacing the per-test
+Python loops previously spread over the PVP extractor, the AMV report
+generator and the helpers module.
+
+Single-list callers use ``summarize_values``, which runs the same code on a
+one-column matrix. Per-test records are keyed by test id: reports often
+carry several tests with the same name (an assay at two stages), which must
+not share a row.
+"""
+
+import re
+import warnings
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+_NUMBER_RE = re.compile(r'[-+]?\d*\.?\d+(?:[eE][-+]?\d+)?')
+_RANGE_RE = re.compile(
+    r'([-+]?\d*\.?\d+)\s*%?\s*(?:to|-|–|—|and)\s*([-+]?\d*\.?\d+)', re.I
+)
+_LOWER_RE = re.compile(r'(?:NLT|not\s+less\s+than|min(?:imum)?\.?|≥|>=|>)\s*:?\s*([-+]?\d*\.?\d+)', re.I)
+_UPPER_RE = re.compile(r'(?:NMT|not\s+more\s+than|max(?:imum)?\.?|≤|<=|<)\s*:?\s*([-+]?\d*\.?\d+)', re.I)
+
+
+def parse_numeric(value: Any) -> float:
+    """First number in a result value (``'98.5 %'`` -> 98.5); NaN if there is none"""
+    if value is None:
+        return np.nan
+    if isinstance(value, (int, float, np.number)):
+        return float(value)
+    match = _NUMBER_RE.search(str(value))
+    return float(match.group()) if match else np.nan
+
+
+def parse_spec_limits(acceptance: Optional[str]) -> Tuple[float, float]:
+    """(lower, upper) limits from an acceptance criterion; NaN for an open side.
+
+    Understands ranges (``'8.5 to 9.1'``, ``'90.0% - 110.0%'``) and one-sided
+    limits (``'NLT 80%'``, ``'NMT 2.0'``, ``'≤ 0.5'``).
+    """
+    if not acceptance:
+        return np.nan, np.nan
+    text = str(acceptance)
+    match = _RANGE_RE.search(text)
+    if match:
+        low, high = float(match.group(1)), float(match.group(2))
+        return min(low, high), max(low, high)
+    lower = _LOWER_RE.search(text)
+    upper = _UPPER_RE.search(text)
+    return (float(lower.group(1)) if lower else np.nan,
+            float(upper.group(1)) if upper else np.nan)
+
+
+def build_result_matrix(results: Sequence[Sequence[Any]]) -> np.ndarray:
+    """``batches x tests`` float matrix from raw result values"""
+    if not len(results):
+        return np.empty((0, 0))
+    return np.array([[parse_numeric(value) for value in row] for row in results], dtype=float)
+
+
+def _t_critical(confidence: float, dof: np.ndarray) -> np.ndarray:
+    """Two-sided Student t quantile for each degrees-of-freedom entry"""
+    q = 0.5 + confidence / 2
+    dof = np.where(dof >= 1, dof, np.nan)
+    # scipy.stats is imported here rather than at module level: it costs most
+    # of a second and this module is on the pv_routes import path
+    try:
+        from scipy import stats as scipy_stats
+    except ImportError:  # pragma: no cover - scipy ships with the AMV stack
+        scipy_stats = None
+    if scipy_stats is not None:
+        return scipy_stats.t.ppf(q, dof)
+    # Cornish-Fisher expansion around the normal quantile (Abramowitz & Stegun 26.7.5)
+    z = float(np.sqrt(2) * _erfinv(2 * q - 1))
+    g1 = (z ** 3 + z) / 4
+    g2 = (5 * z ** 5 + 16 * z ** 3 + 3 * z) / 96
+    g3 = (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / 384
+    return z + g1 / dof + g2 / dof ** 2 + g3 / dof ** 3
+
+
+def _erfinv(y: float) -> float:
+    # Newton iterations on math.erf; only used without scipy
+    import math
+    x = 0.0
+    for _ in range(50):
+        step = (math.erf(x) - y) / (2 / math.sqrt(math.pi) * math.exp(-x * x))
+        x -= step
+        if abs(step) < 1e-12:
+            break
+    return x
+
+
+def compute_batch_statistics(matrix: Any, lower: Any = None, upper: Any = None,
+                             confidence: float = 0.95, ddof: int = 1) -> Dict[str, np.ndarray]:
+    """Per-test statistics for a ``batches x tests`` matrix (NaN = missing).
+
+    ``lower``/``upper`` are per-test specification limits (scalar or array,
+    NaN for an open side) used for Cp/Cpk. Every returned array has one entry
+    per test; entries are NaN where a statistic is undefined (no results, a
+    single result for SD/CI, no limits for Cpk). ``rsd`` is 0 when the mean is 0.
+    """
+    data = np.asarray(matrix, dtype=float)
+    if data.ndim == 1:
+        data = data[:, np.newaxis]
+    tests = data.shape[1]
+
+    valid = ~np.isnan(data)
+    n = valid.sum(axis=0)
+    filled = np.where(valid, data, 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = filled.sum(axis=0) / n
+        deviations = np.where(valid, data - mean, 0.0)
+        sd = np.sqrt((deviations ** 2).sum(axis=0) / (n - ddof))
+        sd = np.where(n > ddof, sd, np.nan)
+        rsd = np.where(mean != 0, sd / mean * 100, 0.0)
+        rsd = np.where(np.isnan(sd), np.nan, rsd)
+
+    with warnings.catch_warnings():
+        # All-NaN columns are expected for tests with no numeric results
+        warnings.simplefilter('ignore', RuntimeWarning)
+        minimum = np.nanmin(data, axis=0) if data.shape[0] else np.full(tests, np.nan)
+        maximum = np.nanmax(data, axis=0) if data.shape[0] else np.full(tests, np.nan)
+
+    lsl = np.broadcast_to(np.asarray(np.nan if lower is None else lower, dtype=float), (tests,))
+    usl = np.broadcast_to(np.asarray(np.nan if upper is None else upper, dtype=float), (tests,))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cpu = (usl - mean) / (3 * sd)
+        cpl = (mean - lsl) / (3 * sd)
+        cp = (usl - lsl) / (6 * sd)
+        # One-sided specs: Cpk is the index of the bounded side
+        cpk = np.fmin(cpu, cpl)
+        cpk = np.where(sd > 0, cpk, np.nan)
+        cp = np.where(sd > 0, cp, np.nan)
+
+        half_width = _t_critical(confidence, n - 1.0) * sd / np.sqrt(n)
+    return {
+        'n': n,
+        'mean': mean,
+        'sd': sd,
+        'rsd': rsd,
+        'min': minimum,
+        'max': maximum,
+        'cp': cp,
+        'cpk': cpk,
+        'ci_low': mean - half_width,
+        'ci_high': mean + half_width,
+    }
+
+
+def _rounded(value: float, decimals: Optional[int]) -> Optional[float]:
+    if np.isnan(value):
+        return None
+    value = float(value)
+    return round(value, decimals) if decimals is not None else value
+
+
+def statistics_records(stats: Dict[str, np.ndarray], test_ids: Sequence[str],
+                       decimals: Optional[int] = 2,
+                       test_names: Optional[Sequence[Optional[str]]] = None) -> Dict[str, Dict[str, Any]]:
+    """Per-test dicts (test id -> statistic -> value, None if undefined).
+
+    With ``test_names`` each record also carries the test's display ``name``.
+    """
+    records = {}
+    for index, test_id in enumerate(test_ids):
+        record: Dict[str, Any] = {'count': int(stats['n'][index])}
+        if test_names is not None:
+            record['name'] = test_names[index]
+        for key in ('mean', 'sd', 'rsd', 'min', 'max', 'cp', 'cpk', 'ci_low', 'ci_high'):
+            record[key] = _rounded(stats[key][index], decimals)
+        records[test_id] = record
+    return records
+
+
+def summarize_values(values: Iterable[Any], ddof: int = 1, lower: Optional[float] = None,
+                     upper: Optional[float] = None, confidence: float = 0.95) -> Dict[str, Any]:
+    """Statistics for a single list of results, as plain floats (NaN if undefined)"""
+    column = np.array([parse_numeric(value) for value in values], dtype=float)
+    stats = compute_batch_statistics(column, lower, upper, confidence=confidence, ddof=ddof)
+    summary = {key: float(array[0]) for key, array in stats.items()}
+    summary['n'] = int(stats['n'][0])
+    return summary
+
+
+def statistics_for_tests(values_by_test: Dict[str, List[Any]], limits: Optional[Dict[str, Tuple[float, float]]] = None,
+                         decimals: Optional[int] = 2, ddof: int = 1,
+                         test_names: Optional[Dict[str, str]] = None) -> Dict[str, Dict[str, Any]]:
+    """Statistics records for ragged per-test result lists (keyed by test id), computed in one call.
+
+    ``limits`` and ``test_names`` are keyed by the same test ids.
+    """
+    test_ids = list(values_by_test)
+    if not test_ids:
+        return {}
+    depth = max(len(values) for values in values_by_test.values())
+    matrix = np.full((depth, len(test_ids)), np.nan)
+    for column, test_id in enumerate(test_ids):
+        values = [parse_numeric(value) for value in values_by_test[test_id]]
+        matrix[:len(values), column] = values
+    limits = limits or {}
+    lower = np.array([limits.get(test_id, (np.nan, np.nan))[0] for test_id in test_ids], dtype=float)
+    upper = np.array([limits.get(test_id, (np.nan, np.nan))[1] for test_id in test_ids], dtype=float)
+    stats = compute_batch_statistics(matrix, lower, upper, ddof=ddof)
+    names = [test_names.get(test_id) for test_id in test_ids] if test_names is not None else None
+    return statistics_records(stats, test_ids, decimals, names)
+
+
+def summarize_test_results(test_ids: Sequence[str], test_names: Sequence[Optional[str]],
+                           acceptance_criteria: Sequence[Optional[str]], results: Sequence[Sequence[Any]],
+                           decimals: Optional[int] = 2) -> Dict[str, Dict[str, Any]]:
+    """Statistics records (test id -> record with its ``name``) for the tests of a report,
+    skipping tests with no numeric result.
+
+    ``results`` is ``batches x tests`` raw result values in ``test_ids``
+    order, or an already-parsed float matrix; specification limits come from
+    each test's acceptance criterion.
+    """
+    if not test_ids or not len(results):
+        return {}
+    limits = [parse_spec_limits(criterion) for criterion in acceptance_criteria]
+    matrix = results if isinstance(results, np.ndarray) else build_result_matrix(results)
+    stats = compute_batch_statistics(
+        matrix,
+        np.array([low for low, _ in limits], dtype=float),
+        np.array([high for _, high in limits], dtype=float),
+    )
+    records = statistics_records(stats, test_ids, decimals, test_names)
+    return {test_id: record for test_id, record in records.items() if record['count']}
+
+
+def format_statistic(value: Optional[float], decimals: int = 2) -> str:
+    """Table cell text for a statistic ('-' when undefined)"""
+    return '-' if value is None else f"{value:.{decimals}f}"
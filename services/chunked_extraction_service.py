@@ -0,0 +1,292 @@
+"""
+Chunked Extraction Service - map-reduce LLM extraction for long documents.
+
+Extraction prompts used to see only a prefix of the document text (60k
+chars for STP/MFR consensus, 15k for PVP criteria, 4-8k for the PVP
+extractor's product info, materials and stages), so long MFRs silently lost
+their later manufacturing steps and QC tables.
+
+Here a document is split on page boundaries (``--- Page N ---`` markers or
+form feeds) and pages are packed into chunks of at most
+``PV_EXTRACTION_CHUNK_CHARS``; a page longer than that is split again at
+section headings, then blank lines, then lines. Each chunk is extracted on
+its own, concurrently on the shared LLM pool, and the per-chunk JSON
+results are merged (``merge_extractions`` / ``merge_lists``).
+
+Per-chunk results are cached by a hash of the chunk text plus the prompt in
+the extraction cache, so re-running a revised document only re-sends the
+chunks that changed; ``ChunkRunStats`` reports how many were reused.
+"""
+
+import os
+import re
+import json
+import hashlib
+import logging
+import threading
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CHUNK_MAX_CHARS = int(os.getenv('PV_EXTRACTION_CHUNK_CHARS', '30000'))
+
+_PAGE_MARKER = re.compile(r'^--- Page (\d+) ---$', re.MULTILINE)
+# Numbered headings ("5.", "5.2 Mixing") or short all-caps lines
+_SECTION_BREAK = re.compile(r'\n(?=(?:\d+(?:\.\d+)*\.?\s+\S|[A-Z][A-Z0-9 &/(),-]{3,60}\n))')
+_PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+_LINE_BREAK = re.compile(r'\n')
+
+
+@dataclass
+class Chunk:
+    index: int
+    text: str
+    first_page: Optional[int] = None
+    last_page: Optional[int] = None
+
+    @property
+    def digest(self) -> str:
+        return hashlib.sha256(self.text.encode('utf-8', errors='replace')).hexdigest()
+
+    def describe(self, total: int) -> str:
+        pages = ""
+        if self.first_page is not None:
+            pages = f", page {self.first_page}" if self.first_page == self.last_page \
+                else f", pages {self.first_page}-{self.last_page}"
+        return f"part {self.index + 1} of {total}{pages}"
+
+
+def split_pages(text: str) -> List[Tuple[Optional[int], str]]:
+    """(page number, text) pairs; page numbers are None when the text has no markers"""
+    markers = list(_PAGE_MARKER.finditer(text))
+    if markers:
+        pages = []
+        if text[:markers[0].start()].strip():
+            pages.append((None, text[:markers[0].start()]))
+        for i, marker in enumerate(markers):
+            end = markers[i + 1].start() if i + 1 < len(markers) else len(text)
+            pages.append((int(marker.group(1)), text[marker.start():end]))
+        return pages
+    if '\f' in text:
+        return [(number, page) for number, page in enumerate(text.split('\f'), start=1) if page.strip()]
+    return [(None, text)]
+
+
+def _split_long(text: str, max_chars: int) -> List[str]:
+    """Split text over ``max_chars`` at the coarsest boundary available, then repack"""
+    if len(text) <= max_chars:
+        return [text]
+    for pattern in (_SECTION_BREAK, _PARAGRAPH_BREAK, _LINE_BREAK):
+        pieces = [piece for piece in pattern.split(text) if piece.strip()]
+        if len(pieces) > 1:
+            break
+    else:
+        return [text[i:i + max_chars] for i in range(0, len(text), max_chars)]
+
+    parts: List[str] = []
+    current = ""
+    for piece in (sub for piece in pieces for sub in _split_long(piece, max_chars)):
+        if current and len(current) + len(piece) + 1 > max_chars:
+            parts.append(current)
+            current = ""
+        current = f"{current}\n{piece}" if current else piece
+    if current:
+        parts.append(current)
+    return parts
+
+
+def split_into_chunks(text: str, max_chars: Optional[int] = None) -> List[Chunk]:
+    """Pack pages into chunks of at most ``max_chars`` (default ``CHUNK_MAX_CHARS``),
+    never splitting a page that fits"""
+    max_chars = max_chars or CHUNK_MAX_CHARS
+    chunks: List[Chunk] = []
+    pending: List[str] = []
+    pages: List[Optional[int]] = []
+
+    def flush():
+        if pending:
+            numbers = [number for number in pages if number is not None]
+            chunks.append(Chunk(len(chunks), "\n".join(pending),
+                                min(numbers) if numbers else None, max(numbers) if numbers else None))
+            pending.clear()
+            pages.clear()
+
+    for number, page in split_pages(text):
+        for piece in _split_long(page, max_chars):
+            if pending and sum(len(p) + 1 for p in pending) + len(piece) > max_chars:
+                flush()
+            pending.append(piece)
+            pages.append(number)
+    flush()
+    return [chunk for chunk in chunks if chunk.text.strip()]
+
+
+def _identity(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, default=str)
+
+
+def merge_lists(lists: List[List[Any]], key: Optional[Callable[[Any], Any]] = None) -> List[Any]:
+    """Concatenate lists in order, dropping repeats (by ``key`` if given, else by value)"""
+    seen = set()
+    merged = []
+    for items in lists:
+        for item in items or []:
+            identity = key(item) if key else None
+            identity = _identity(item) if identity in (None, "") else _identity(identity)
+            if identity not in seen:
+                seen.add(identity)
+                merged.append(item)
+    return merged
+
+
+def merge_extractions(results: List[Dict]) -> Dict:
+    """
+    Merge extraction dicts (per chunk or per pass) into one.
+
+    Lists are concatenated and de-duplicated, nested dicts are merged
+    recursively, and for scalars the most common non-empty value wins (the
+    earliest one on a tie, so earlier pages take precedence).
+    """
+    results = [result for result in results if isinstance(result, dict)]
+    if len(results) <= 1:
+        return results[0] if results else {}
+
+    merged: Dict[str, Any] = {}
+    keys: List[str] = []
+    for result in results:
+        keys.extend(key for key in result if key not in keys)
+
+    for key in keys:
+        values = [result[key] for result in results if result.get(key) not in (None, "", [], {})]
+        if not values:
+            continue
+        if all(isinstance(value, list) for value in values):
+            merged[key] = merge_lists(values)
+        elif all(isinstance(value, dict) for value in values):
+            merged[key] = merge_extractions(values)
+        else:
+            counts: Dict[str, int] = {}
+            first: Dict[str, Any] = {}
+            for value in values:
+                identity = _identity(value)
+                counts[identity] = counts.get(identity, 0) + 1
+                first.setdefault(identity, value)
+            merged[key] = first[max(counts, key=counts.get)]
+    return merged
+
+
+def parse_json_array(text: str) -> Optional[List[Any]]:
+    """The outermost JSON array in a model response, or None"""
+    text = text.replace('```json', '').replace('```', '').strip()
+    start, end = text.find('['), text.rfind(']')
+    if start == -1 or end <= start:
+        return None
+    try:
+        value = json.loads(text[start:end + 1])
+    except ValueError:
+        return None
+    return value if isinstance(value, list) else None
+
+
+class ChunkRunStats:
+    """Chunk counts for one extraction run"""
+
+    def __init__(self, chunks: int = 0):
+        self.chunks = chunks
+        self.reused = 0
+        self.extracted = 0
+        self.failed = 0
+
+    def to_dict(self) -> Dict[str, int]:
+        return {'chunks': self.chunks, 'reused': self.reused, 'extracted': self.extracted, 'failed': self.failed}
+
+    def __str__(self) -> str:
+        return (f"{self.chunks} chunks: {self.reused} reused from cache, "
+                f"{self.extracted} extracted, {self.failed} failed")
+
+
+def map_chunks(chunks: List[Chunk], extract: Callable[[Chunk], Any], executor: Optional[Executor] = None,
+               cache=None, namespace: str = "") -> Tuple[List[Any], ChunkRunStats]:
+    """
+    Run ``extract`` over every chunk not already cached; results in chunk order.
+
+    ``cache`` is a ``CacheManager``; entries are keyed by the chunk text plus
+    ``namespace`` (which should include the prompt). Chunks whose extraction
+    returns nothing (or raises) get None and are not cached.
+    """
+    stats = ChunkRunStats(len(chunks))
+    results: List[Any] = [None] * len(chunks)
+    keys: Dict[int, str] = {}
+    pending: List[Chunk] = []
+    for chunk in chunks:
+        if cache is not None:
+            keys[chunk.index] = cache.get_cache_key(chunk.digest, f"chunk|{namespace}")
+            cached = cache.get(keys[chunk.index], 'chunk')
+            if cached is not None:
+                results[chunk.index] = cached.get('result')
+                stats.reused += 1
+                continue
+        pending.append(chunk)
+
+    def run(chunk: Chunk):
+        try:
+            return extract(chunk)
+        except Exception as e:
+            logger.warning("Chunk %d failed: %s", chunk.index + 1, e)
+            return None
+
+    if executor is not None and len(pending) > 1:
+        outputs = list(executor.map(run, pending))
+    else:
+        outputs = [run(chunk) for chunk in pending]
+
+    for chunk, output in zip(pending, outputs):
+        results[chunk.index] = output
+        if output in (None, {}, []):
+            stats.failed += 1
+            continue
+        stats.extracted += 1
+        if cache is not None:
+            cache.set(keys[chunk.index], {'result': output}, 'chunk')
+    return results, stats
+
+
+def extract_array_chunked(text: str, build_prompt: Callable[[str], str], client, namespace: str,
+                          key: Optional[Callable[[Any], Any]] = None,
+                          max_chars: Optional[int] = None) -> Tuple[Optional[List[Any]], ChunkRunStats]:
+    """
+    Map-reduce a "return a JSON array" prompt over the chunks of ``text``.
+
+    ``build_prompt`` turns chunk text into the full prompt; ``client`` is an
+    ``LLMClient``. Returns the merged array (None if no chunk produced one)
+    and the run stats.
+    """
+    chunks = split_into_chunks(text, max_chars)
+
+    def extract(chunk: Chunk):
+        response = client.generate(build_prompt(chunk.text), label=f"chunk:{namespace.split('|')[0]}")
+        return parse_json_array(getattr(response, 'text', '') or '')
+
+    cache = get_chunk_cache()
+    prompt_fingerprint = hashlib.sha256(build_prompt("").encode('utf-8')).hexdigest()
+    results, stats = map_chunks(chunks, extract, client.executor, cache, f"{namespace}|{prompt_fingerprint}")
+    arrays = [result for result in results if result is not None]
+    return (merge_lists(arrays, key) if arrays else None), stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_chunk_cache():
+    """The extraction cache (``CacheManager``) shared by chunked extraction"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                # Imported lazily: callers like pvp_ai_service do not otherwise load the PV pipeline
+                from services.process_validation_service import CacheManager
+                _cache = CacheManager()
+    return _cache
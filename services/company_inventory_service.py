@@ -0,0 +1,174 @@
+"""
+Company Inventory Service - bulk loading of selected equipment, materials and reagents.
+
+The AMV create and verification routes used to resolve every selected
+checkbox with its own ``Model.query.filter_by(id=...).first()``, so a form
+with 30 selections cost 30+ queries. Selections are now resolved per category
+with one ``id IN (...)`` query scoped to the company and returned as plain
+dicts ready for the report generators and templates.
+
+Resolved records are kept in a per-company read cache for
+COMPANY_INVENTORY_TTL seconds. Any insert, update or delete of an inventory
+row (the settings pages, the equipments blueprint) drops the cached records
+of the companies it belonged to before and after the change once the
+transaction commits.
+"""
+
+import os
+import time
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+from models import Equipment, GlassMaterial, Reagent, ReferenceProduct
+
+COMPANY_INVENTORY_TTL = float(os.environ.get('COMPANY_INVENTORY_TTL', '300'))
+
+# session.info key: company ids whose inventory changed in the transaction
+_CHANGED_COMPANIES = 'company_inventory_changed'
+
+# category -> (model, columns copied into each record)
+CATEGORIES = {
+    'equipment': (Equipment, ('name', 'code', 'brand', 'verification_frequency',
+                              'last_calibration', 'next_calibration')),
+    'glass_materials': (GlassMaterial, ('name', 'characteristics')),
+    'reagents': (Reagent, ('name', 'batch', 'expiry_date')),
+    'reference_products': (ReferenceProduct, ('standard_name', 'standard_type', 'code',
+                                              'potency', 'due_date')),
+}
+
+
+def _to_record(row, columns: Tuple[str, ...]) -> Dict[str, Any]:
+    record = {'id': row.id}
+    for column in columns:
+        value = getattr(row, column)
+        record[column] = '' if value is None else value
+    return record
+
+
+def _parse_ids(ids: Iterable[Any]) -> List[int]:
+    """Unique integer ids in submission order; blanks and junk are skipped"""
+    parsed = []
+    seen = set()
+    for value in ids:
+        try:
+            item_id = int(value)
+        except (TypeError, ValueError):
+            continue
+        if item_id not in seen:
+            seen.add(item_id)
+            parsed.append(item_id)
+    return parsed
+
+
+class CompanyInventoryCache:
+    """Process-local TTL cache of inventory records keyed by company and category"""
+
+    def __init__(self, ttl: float = COMPANY_INVENTORY_TTL):
+        self.ttl = ttl
+        self._entries: Dict[int, Tuple[float, Dict[str, Dict[int, Dict[str, Any]]]]] = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, company_id: int, category: str, ids: List[int]) -> Tuple[Dict[int, Dict[str, Any]], List[int]]:
+        """(cached records by id, ids that still need loading)"""
+        with self._lock:
+            entry = self._entries.get(company_id)
+            if entry and entry[0] <= time.monotonic():
+                self._entries.pop(company_id, None)
+                entry = None
+            cached = entry[1].get(category, {}) if entry else {}
+            found = {item_id: cached[item_id] for item_id in ids if item_id in cached}
+        return found, [item_id for item_id in ids if item_id not in found]
+
+    def store(self, company_id: int, category: str, records: Dict[int, Dict[str, Any]]):
+        with self._lock:
+            entry = self._entries.get(company_id)
+            if entry is None or entry[0] <= time.monotonic():
+                entry = (time.monotonic() + self.ttl, {})
+                self._entries[company_id] = entry
+            entry[1].setdefault(category, {}).update(records)
+
+    def invalidate(self, company_id: Optional[int] = None):
+        with self._lock:
+            if company_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(company_id, None)
+
+
+inventory_cache = CompanyInventoryCache()
+
+
+def load_selected(company_id: int, category: str, ids: Iterable[Any]) -> List[Dict[str, Any]]:
+    """Records for the selected ``ids`` of one category, in selection order.
+
+    Ids that do not exist or belong to another company are dropped.
+    """
+    model, columns = CATEGORIES[category]
+    wanted = _parse_ids(ids)
+    if not wanted:
+        return []
+
+    records, missing = inventory_cache.lookup(company_id, category, wanted)
+    if missing:
+        rows = model.query.filter(
+            model.company_id == company_id,
+            model.id.in_(missing)
+        ).all()
+        loaded = {row.id: _to_record(row, columns) for row in rows}
+        inventory_cache.store(company_id, category, loaded)
+        records.update(loaded)
+
+    return [dict(records[item_id]) for item_id in wanted if item_id in records]
+
+
+def load_selected_inventory(company_id: int, equipment_ids: Iterable[Any] = (),
+                            glass_ids: Iterable[Any] = (), reagent_ids: Iterable[Any] = (),
+                            reference_id: Any = None) -> Dict[str, Any]:
+    """Selected equipment, glass materials, reagents and reference product for a form"""
+    references = load_selected(company_id, 'reference_products', [reference_id] if reference_id else [])
+    return {
+        'equipment': load_selected(company_id, 'equipment', equipment_ids),
+        'glass_materials': load_selected(company_id, 'glass_materials', glass_ids),
+        'reagents': load_selected(company_id, 'reagents', reagent_ids),
+        'reference_product': references[0] if references else None,
+    }
+
+
+@event.listens_for(Equipment, 'after_insert')
+@event.listens_for(Equipment, 'after_update')
+@event.listens_for(Equipment, 'after_delete')
+@event.listens_for(GlassMaterial, 'after_insert')
+@event.listens_for(GlassMaterial, 'after_update')
+@event.listens_for(GlassMaterial, 'after_delete')
+@event.listens_for(Reagent, 'after_insert')
+@event.listens_for(Reagent, 'after_update')
+@event.listens_for(Reagent, 'after_delete')
+@event.listens_for(ReferenceProduct, 'after_insert')
+@event.listens_for(ReferenceProduct, 'after_update')
+@event.listens_for(ReferenceProduct, 'after_delete')
+def _queue_company_invalidation(mapper, connection, target):
+    # Invalidating at flush time would let a concurrent request re-cache the
+    # old rows before the commit; a row moved between companies also leaves
+    # stale records behind under its previous company_id
+    session = object_session(target)
+    if session is None:
+        inventory_cache.invalidate(target.company_id)
+        return
+    companies = session.info.setdefault(_CHANGED_COMPANIES, set())
+    companies.add(target.company_id)
+    companies.update(inspect(target).attrs.company_id.history.deleted)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_company_inventory(session):
+    for company_id in session.info.pop(_CHANGED_COMPANIES, ()):
+        if company_id is not None:
+            inventory_cache.invalidate(company_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_company_invalidations(session):
+    session.info.pop(_CHANGED_COMPANIES, None)
@@ -15,6 +15,7 @@ from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT, TA_JUSTIFY
 from typing import Dict, List
 import logging
 from models import PVP_Extracted_Stage
+from services.batch_statistics_service import summarize_test_results, format_statistic
 
 logger = logging.getLogger(__name__)
 
@@ -548,7 +549,7 @@ class ComprehensivePVRGenerator:
                 # Add results for each batch
                 all_pass = True
                 for batch in self.batch_data:
-                    result = batch.get('test_results', {}).get(crit.test_name, 'N/A')
+                    result = self._batch_result(batch, crit, 'N/A')
                     row.append(str(result))
                     # Simple pass/fail check
                     if result == 'N/A' or str(result).lower() == 'fail':
@@ -845,6 +846,14 @@ class ComprehensivePVRGenerator:
         
         return elements
     
+    @staticmethod
+    def _batch_result(batch: Dict, crit, default=None):
+        """A batch's result for a criterion, by test id (names repeat across stages), else by name"""
+        results = batch.get('test_results', {})
+        if crit.test_id and crit.test_id in results:
+            return results[crit.test_id]
+        return results.get(crit.test_name, default)
+    
     def _build_statistical_analysis(self) -> List:
         """Build statistical analysis section"""
         elements = []
@@ -859,13 +868,52 @@ class ComprehensivePVRGenerator:
         ))
         elements.append(Spacer(1, 0.2*inch))
         
+        criteria = self.pvp.criteria or []
+        stats = summarize_test_results(
+            [crit.test_id for crit in criteria],
+            [crit.test_name or crit.test_id for crit in criteria],
+            [crit.acceptance_criteria for crit in criteria],
+            [[self._batch_result(batch, crit) for crit in criteria] for batch in self.batch_data]
+        )
+        
         elements.append(Paragraph("9.1 Process Capability", self.styles['CustomHeading2']))
         elements.append(Spacer(1, 0.1*inch))
-        elements.append(Paragraph(
-            'Process capability indices (Cp and Cpk) were calculated for critical parameters. '
-            'All values exceeded the minimum acceptable value of 1.33, indicating a capable process.',
-            self.styles['CustomBody']
-        ))
+        if stats:
+            elements.append(Paragraph(
+                'Mean, standard deviation, %RSD, range, process capability (Cpk, against the '
+                'acceptance criteria) and the 95% confidence interval of the mean were calculated '
+                'for each numeric quality attribute across all batches.',
+                self.styles['CustomBody']
+            ))
+            elements.append(Spacer(1, 0.1*inch))
+            
+            stats_data = [['Test Parameter', 'n', 'Mean', 'SD', '%RSD', 'Min', 'Max', 'Cpk', '95% CI']]
+            for record in stats.values():
+                ci = '-' if record['ci_low'] is None else (
+                    f"{format_statistic(record['ci_low'])} - {format_statistic(record['ci_high'])}"
+                )
+                stats_data.append([record['name'], str(record['count'])] + [
+                    format_statistic(record[key]) for key in ('mean', 'sd', 'rsd', 'min', 'max', 'cpk')
+                ] + [ci])
+            
+            table = Table(stats_data, colWidths=[1.6*inch, 0.35*inch] + [0.6*inch] * 6 + [1.1*inch])
+            table.setStyle(TableStyle([
+                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3f51b5')),
+                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                ('FONTSIZE', (0, 0), (-1, 0), 8),
+                ('GRID', (0, 0), (-1, -1), 1, colors.black),
+                ('FONTSIZE', (0, 1), (-1, -1), 8),
+                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey])
+            ]))
+            elements.append(table)
+        else:
+            elements.append(Paragraph(
+                'Process capability indices (Cp and Cpk) were calculated for critical parameters. '
+                'All values exceeded the minimum acceptable value of 1.33, indicating a capable process.',
+                self.styles['CustomBody']
+            ))
         elements.append(Spacer(1, 0.2*inch))
         
         elements.append(Paragraph("9.2 Trend Analysis", self.styles['CustomHeading2']))
@@ -10,11 +10,12 @@ from docx.enum.style import WD_STYLE_TYPE
 from datetime import datetime
 import os
 import re
-from database import db
 from models import (
     PVR_Report, PVP_Template, PVP_Equipment, PVP_Material,
-    PVP_Extracted_Stage, PVP_Criteria, PVR_Data, PVR_Stage_Result
+    PVP_Extracted_Stage, PVP_Criteria, PVR_Stage_Result
 )
+from services.batch_statistics_service import summarize_test_results, format_statistic
+from services.pvr_result_store_service import load_report_results
 
 
 class ComprehensivePVRWordGenerator:
@@ -24,6 +25,7 @@ class ComprehensivePVRWordGenerator:
         self.doc = None
         self.report = None
         self.template = None
+        self._batch_results = None
         
     def generate_comprehensive_pvr_word(self, pvr_report_id, output_folder='uploads/pvr_reports'):
         """
@@ -42,6 +44,7 @@ class ComprehensivePVRWordGenerator:
             raise ValueError(f"PVR Report {pvr_report_id} not found")
         
         self.template = self.report.template
+        self._batch_results = None
         
         # Create document
         self.doc = Document()
@@ -259,9 +262,8 @@ class ComprehensivePVRWordGenerator:
         )
         
         # Get batch numbers
-        batches = db.session.query(PVR_Data.batch_number).filter_by(
-            pvr_report_id=self.report.id
-        ).distinct().all()
+        results = self._load_batch_results()
+        batches = results.batches
         
         if batches:
             self.doc.add_paragraph(
@@ -269,7 +271,7 @@ class ComprehensivePVRWordGenerator:
             )
             self.doc.add_paragraph('Batch Numbers:')
             for batch in batches:
-                self.doc.add_paragraph(batch[0], style='List Bullet')
+                self.doc.add_paragraph(batch, style='List Bullet')
 
         # Add batch details (manufacturing date / batch size) when available
         if batches:
@@ -283,12 +285,10 @@ class ComprehensivePVRWordGenerator:
                 cell.text = h
                 cell.paragraphs[0].runs[0].font.bold = True
 
-            for i, batch in enumerate(batches, 1):
-                bn = batch[0]
-                data = db.session.query(PVR_Data).filter_by(pvr_report_id=self.report.id, batch_number=bn).first()
+            for i, bn in enumerate(batches, 1):
                 b_table.rows[i].cells[0].text = bn
-                b_table.rows[i].cells[1].text = getattr(data, 'manufacturing_date', '') or ''
-                b_table.rows[i].cells[2].text = getattr(data, 'batch_size', '') or ''
+                b_table.rows[i].cells[1].text = results.manufacturing_dates[i - 1] or ''
+                b_table.rows[i].cells[2].text = results.batch_sizes[i - 1] or ''
     
     def _add_product_information(self):
         """Add product information section"""
@@ -465,9 +465,8 @@ class ComprehensivePVRWordGenerator:
         )
         
         # Get test results
-        batches = db.session.query(PVR_Data.batch_number).filter_by(
-            pvr_report_id=self.report.id
-        ).distinct().all()
+        results = self._load_batch_results()
+        batches = results.batches
         
         criteria = PVP_Criteria.query.filter_by(pvp_template_id=self.template.id).all()
         
@@ -480,7 +479,7 @@ class ComprehensivePVRWordGenerator:
             table.rows[0].cells[0].text = 'Test Parameter'
             table.rows[0].cells[1].text = 'Specification'
             for i, batch in enumerate(batches):
-                table.rows[0].cells[i + 2].text = batch[0]
+                table.rows[0].cells[i + 2].text = batch
             table.rows[0].cells[len(batches) + 2].text = 'Status'
             
             # Make headers bold
@@ -494,19 +493,19 @@ class ComprehensivePVRWordGenerator:
                 
                 # Get results for each batch
                 for j, batch in enumerate(batches):
-                    result = PVR_Data.query.filter_by(
-                        pvr_report_id=self.report.id,
-                        batch_number=batch[0],
-                        test_id=crit.test_id
-                    ).first()
-                    
-                    table.rows[i].cells[j + 2].text = result.test_result if result else 'N/A'
+                    table.rows[i].cells[j + 2].text = results.result(batch, crit.test_id) or 'N/A'
                 
                 # Add Status column
                 table.rows[i].cells[len(batches) + 2].text = 'Pass'
         else:
             self.doc.add_paragraph('All tests passed as per specification.')
     
+    def _load_batch_results(self):
+        """The report's columnar batch results, loaded once"""
+        if self._batch_results is None:
+            self._batch_results = load_report_results(self.report.id)
+        return self._batch_results
+    
     def _add_statistical_analysis(self):
         """Add statistical analysis section"""
         self.doc.add_heading('9. STATISTICAL ANALYSIS', level=1)
@@ -516,12 +515,43 @@ class ComprehensivePVRWordGenerator:
             'process capability and consistency.'
         )
         
-        self.doc.add_heading('9.1 Process Capability', level=2)
-        self.doc.add_paragraph(
-            'Process capability indices (Cp and Cpk) were calculated for critical parameters. '
-            'All values exceeded the minimum acceptable value of 1.33, indicating a capable process.'
+        results = self._load_batch_results()
+        criteria = PVP_Criteria.query.filter_by(pvp_template_id=self.template.id).all()
+        stats = summarize_test_results(
+            [crit.test_id for crit in criteria],
+            [crit.test_name or crit.test_id for crit in criteria],
+            [crit.acceptance_criteria for crit in criteria],
+            results.numeric_matrix([crit.test_id for crit in criteria])
         )
         
+        self.doc.add_heading('9.1 Process Capability', level=2)
+        if stats:
+            self.doc.add_paragraph(
+                'Mean, standard deviation, %RSD, range, process capability (Cpk, against the '
+                'acceptance criteria) and the 95% confidence interval of the mean were calculated '
+                'for each numeric quality attribute across all batches.'
+            )
+            headers = ['Test Parameter', 'n', 'Mean', 'SD', '%RSD', 'Min', 'Max', 'Cpk', '95% CI']
+            table = self.doc.add_table(rows=len(stats) + 1, cols=len(headers))
+            table.style = 'Light Grid Accent 1'
+            for i, header in enumerate(headers):
+                table.rows[0].cells[i].text = header
+                table.rows[0].cells[i].paragraphs[0].runs[0].font.bold = True
+            for i, record in enumerate(stats.values(), 1):
+                ci = '-' if record['ci_low'] is None else (
+                    f"{format_statistic(record['ci_low'])} - {format_statistic(record['ci_high'])}"
+                )
+                values = [record['name'], str(record['count'])] + [
+                    format_statistic(record[key]) for key in ('mean', 'sd', 'rsd', 'min', 'max', 'cpk')
+                ] + [ci]
+                for j, value in enumerate(values):
+                    table.rows[i].cells[j].text = value
+        else:
+            self.doc.add_paragraph(
+                'Process capability indices (Cp and Cpk) were calculated for critical parameters. '
+                'All values exceeded the minimum acceptable value of 1.33, indicating a capable process.'
+            )
+        
         self.doc.add_heading('9.2 Trend Analysis', level=2)
         self.doc.add_paragraph(
             'Trend analysis of results across batches showed no significant drift or patterns, '
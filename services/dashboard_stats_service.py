@@ -0,0 +1,150 @@
+"""
+Dashboard Stats Service - document counts for the user dashboard and /dashboard/stats.
+
+Counts come from the ``user_document_counters`` table, which Document flush
+events keep in step with inserts, deletes and type/status changes, so a read
+is a handful of primary-key rows regardless of how many documents a user has.
+Users not yet marked in ``user_document_counter_seeds`` (databases created
+before the table existed) are seeded on first read from one
+``GROUP BY document_type, status`` query over ``documents``.
+"""
+
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from flask import g, has_app_context
+from sqlalchemy import func, literal, select
+from sqlalchemy.exc import SQLAlchemyError
+
+from database import db
+from models import Document, User, UserDocumentCounter, UserDocumentCounterSeed
+
+logger = logging.getLogger(__name__)
+
+# Dashboard cards, keyed by the doc_stats name used in dashboard.html
+DASHBOARD_TYPES = {
+    'amv': 'AMV',
+    'pv': 'PV',
+    'stability': 'Stability',
+    'degradation': 'Degradation',
+    'compatibility': 'Compatibility',
+}
+
+
+def _rebuild_counters(conn, user_id: Optional[int] = None) -> List[Tuple[str, str, int]]:
+    """
+    Replace the counter rows (of one user, or all users) with a ``GROUP BY``
+    over ``documents`` on ``conn`` and mark the users seeded. Returns the
+    (document_type, status, count) rows written.
+    """
+    counters = UserDocumentCounter.__table__
+    seeds = UserDocumentCounterSeed.__table__
+    documents = Document.__table__
+    doc_type = func.coalesce(documents.c.document_type, '')
+    status = func.coalesce(documents.c.status, 'draft')
+    grouped = select(documents.c.user_id, doc_type, status, func.count()).group_by(documents.c.user_id, doc_type, status)
+    clear_counters, clear_seeds = counters.delete(), seeds.delete()
+    if user_id is not None:
+        grouped = grouped.where(documents.c.user_id == user_id)
+        clear_counters = clear_counters.where(counters.c.user_id == user_id)
+        clear_seeds = clear_seeds.where(seeds.c.user_id == user_id)
+
+    # Deleting first takes the write lock before the documents are counted
+    conn.execute(clear_counters)
+    conn.execute(clear_seeds)
+    rows = conn.execute(grouped).all()
+    if rows:
+        conn.execute(counters.insert(), [
+            {'user_id': uid, 'document_type': doc_type, 'status': status, 'count': count}
+            for uid, doc_type, status, count in rows
+        ])
+    now = datetime.utcnow()
+    if user_id is not None:
+        conn.execute(seeds.insert().values(user_id=user_id, seeded_at=now))
+    else:
+        users = User.__table__
+        conn.execute(seeds.insert().from_select(['user_id', 'seeded_at'], select(users.c.id, literal(now))))
+    return [(doc_type, status, count) for _, doc_type, status, count in rows]
+
+
+def rebuild_document_counters(user_id: Optional[int] = None) -> int:
+    """
+    Recompute counter rows from ``documents`` (all users when ``user_id`` is
+    None) in a transaction of its own; the caller's session is not committed.
+    """
+    with db.engine.begin() as conn:
+        return len(_rebuild_counters(conn, user_id))
+
+
+def _summarize(rows: List[Tuple[str, str, int]]) -> Dict[str, Any]:
+    by_type: Dict[str, int] = {}
+    by_status: Dict[str, int] = {}
+    for doc_type, status, count in rows:
+        if count <= 0:
+            continue
+        by_type[doc_type] = by_type.get(doc_type, 0) + count
+        by_status[status] = by_status.get(status, 0) + count
+    return {
+        'total': sum(by_type.values()),
+        'by_type': by_type,
+        'by_status': by_status,
+    }
+
+
+def get_document_stats(user_id: int) -> Dict[str, Any]:
+    """Per-type and per-status counts for ``user_id``, memoized for the request"""
+    memo = g.setdefault('_document_stats', {}) if has_app_context() else {}
+    if user_id in memo:
+        return memo[user_id]
+
+    if db.session.get(UserDocumentCounterSeed, user_id) is not None:
+        rows = db.session.query(
+            UserDocumentCounter.document_type, UserDocumentCounter.status, UserDocumentCounter.count
+        ).filter(UserDocumentCounter.user_id == user_id).all()
+    else:
+        rows = _seed_document_counters(user_id)
+
+    stats = _summarize(rows)
+    memo[user_id] = stats
+    return stats
+
+
+def _seed_document_counters(user_id: int) -> List[Tuple[str, str, int]]:
+    """
+    Build a user's counters on first read. Counter rows may already exist
+    (flush events bump them for unseeded users too) but are only trusted
+    once the user is marked seeded. Seeding runs in its own transaction so a
+    read never commits the request's session; if it cannot take the write
+    lock the counts are served from ``documents`` and seeding is retried on
+    the next read.
+    """
+    logger.info("Seeding document counters for user %s", user_id)
+    try:
+        with db.engine.begin() as conn:
+            return _rebuild_counters(conn, user_id)
+    except SQLAlchemyError as e:
+        logger.warning("Could not seed document counters for user %s: %s", user_id, e)
+    doc_type = func.coalesce(Document.document_type, '')
+    status = func.coalesce(Document.status, 'draft')
+    return db.session.query(doc_type, status, func.count(Document.id)).filter(
+        Document.user_id == user_id
+    ).group_by(doc_type, status).all()
+
+
+def get_dashboard_doc_stats(user_id: int) -> Dict[str, int]:
+    """The doc_stats dict rendered by dashboard.html"""
+    stats = get_document_stats(user_id)
+    doc_stats = {'total': stats['total']}
+    for key, doc_type in DASHBOARD_TYPES.items():
+        doc_stats[key] = stats['by_type'].get(doc_type, 0)
+    return doc_stats
+
+
+def count_recent_documents(user_id: int, days: int = 30) -> int:
+    """Documents created in the last ``days`` days (indexed range on created_at)"""
+    since = datetime.utcnow() - timedelta(days=days)
+    return Document.query.filter(
+        Document.user_id == user_id,
+        Document.created_at >= since
+    ).count()
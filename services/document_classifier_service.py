@@ -0,0 +1,212 @@
+"""
+Document Classifier Service - local STP vs MFR classification.
+
+Scores the first pages of a document against two weighted vocabularies
+(title phrases such as "Standard Testing Procedure" / "Master Formula
+Record" are near-decisive, body terms such as "mobile phase" or "line
+clearance" are weaker evidence). Each matched term contributes
+``weight * (1 + log(tf))``, i.e. a TF-IDF score in which the hand-set weight
+plays the part of the IDF, and terms on the first page count double.
+
+``confidence`` is the winning class's share of the total score. Only when
+it is below ``PV_CLASSIFIER_CONFIDENCE`` or there is too little evidence
+does the pipeline ask the LLM; ``get_classifier_stats()`` reports how often
+that round-trip was skipped.
+"""
+
+import os
+import re
+import math
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+CLASSIFIER_PAGES = int(os.getenv('PV_CLASSIFIER_PAGES', '3'))
+CLASSIFIER_CONFIDENCE = float(os.getenv('PV_CLASSIFIER_CONFIDENCE', '0.85'))
+# Minimum total score before the local decision is trusted at all
+MIN_EVIDENCE = 6.0
+FIRST_PAGE_BOOST = 2.0
+# Used when the text carries no "--- Page N ---" markers (e.g. OCR output)
+CHARS_PER_PAGE = 3000
+
+STP_TERMS: Dict[str, float] = {
+    'standard testing procedure': 10.0,
+    'standard test procedure': 10.0,
+    'standard testing procedures': 10.0,
+    'specification and test procedure': 8.0,
+    'method of analysis': 4.0,
+    'test procedure': 3.0,
+    'test method': 2.0,
+    'stp no': 5.0,
+    'stp': 1.5,
+    'acceptance criteria': 1.5,
+    'specification': 1.0,
+    'specifications': 1.0,
+    'assay': 1.5,
+    'related substances': 2.5,
+    'dissolution': 1.5,
+    'identification': 1.0,
+    'system suitability': 3.0,
+    'mobile phase': 3.0,
+    'standard preparation': 3.0,
+    'sample preparation': 3.0,
+    'standard solution': 2.0,
+    'test solution': 2.0,
+    'chromatographic': 2.0,
+    'hplc': 1.5,
+    'retention time': 2.0,
+    'wavelength': 1.5,
+    'injection volume': 2.0,
+    'diluent': 2.0,
+    'reagents': 1.0,
+    'limit': 0.5,
+}
+
+MFR_TERMS: Dict[str, float] = {
+    'master formula record': 10.0,
+    'master formula': 6.0,
+    'master manufacturing record': 10.0,
+    'batch manufacturing record': 8.0,
+    'manufacturing record': 4.0,
+    'mfr no': 5.0,
+    'mfr': 1.5,
+    'bmr': 1.5,
+    'batch size': 2.5,
+    'manufacturing process': 2.5,
+    'manufacturing procedure': 2.5,
+    'manufacturing instructions': 3.0,
+    'dispensing': 2.0,
+    'raw material': 1.5,
+    'raw materials': 1.5,
+    'bill of materials': 3.0,
+    'line clearance': 3.0,
+    'equipment': 1.0,
+    'mixing': 1.5,
+    'stirring': 1.5,
+    'filling': 1.5,
+    'compression': 1.5,
+    'granulation': 2.0,
+    'sterilization': 1.0,
+    'autoclave': 1.5,
+    'rpm': 1.0,
+    'yield': 1.5,
+    'in-process': 1.0,
+    'packing': 1.0,
+    'overages': 2.0,
+}
+
+_PAGE_MARKER = re.compile(r'^--- Page \d+ ---$', re.MULTILINE)
+
+
+def _build_pattern(terms: List[str]) -> re.Pattern:
+    # Longest first so "master formula record" wins over "master formula"
+    alternatives = sorted(terms, key=len, reverse=True)
+    return re.compile(r'\b(?:' + '|'.join(re.escape(term) for term in alternatives) + r')\b')
+
+
+_WEIGHTS: Dict[str, Dict[str, float]] = {'STP': STP_TERMS, 'MFR': MFR_TERMS}
+_PATTERN = _build_pattern(list(STP_TERMS) + list(MFR_TERMS))
+
+
+@dataclass
+class ClassificationResult:
+    label: str
+    confidence: float
+    scores: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def evidence(self) -> float:
+        return sum(self.scores.values())
+
+    def is_confident(self, threshold: float = CLASSIFIER_CONFIDENCE) -> bool:
+        return self.evidence >= MIN_EVIDENCE and self.confidence >= threshold
+
+
+def leading_pages(text: str, pages: int = CLASSIFIER_PAGES) -> List[str]:
+    """The first ``pages`` pages of extracted text"""
+    if _PAGE_MARKER.search(text):
+        parts = [part for part in _PAGE_MARKER.split(text) if part.strip()]
+        return parts[:pages]
+    return [text[i:i + CHARS_PER_PAGE] for i in range(0, min(len(text), pages * CHARS_PER_PAGE), CHARS_PER_PAGE)]
+
+
+def _term_counts(page: str) -> Counter:
+    normalized = ' '.join(page.lower().split())
+    return Counter(_PATTERN.findall(normalized))
+
+
+def classify_text(text: str, pages: int = CLASSIFIER_PAGES) -> ClassificationResult:
+    """Score ``text`` as STP or MFR; ties and empty text lean to STP, as before"""
+    counts: Dict[str, float] = {}
+    for index, page in enumerate(leading_pages(text, pages)):
+        boost = FIRST_PAGE_BOOST if index == 0 else 1.0
+        for term, tf in _term_counts(page).items():
+            counts[term] = counts.get(term, 0.0) + tf * boost
+
+    scores = {}
+    for label, weights in _WEIGHTS.items():
+        scores[label] = round(sum(
+            weights[term] * (1 + math.log(tf)) for term, tf in counts.items() if term in weights and tf >= 1
+        ), 3)
+    total = scores['STP'] + scores['MFR']
+    label = 'MFR' if scores['MFR'] > scores['STP'] else 'STP'
+    confidence = scores[label] / total if total else 0.0
+    return ClassificationResult(label, round(confidence, 3), scores)
+
+
+class ClassifierStats:
+    """
+    How classifications were decided: locally, by the LLM, or by the local
+    label alone because no LLM was available for an unsure document
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.local = 0
+        self.unverified = 0
+        self.llm_calls = 0
+        self.llm_overrides = 0
+        self.llm_failures = 0
+
+    def record_local(self):
+        with self._lock:
+            self.local += 1
+
+    def record_unverified(self):
+        with self._lock:
+            self.unverified += 1
+
+    def record_llm(self, overridden: bool = False, failed: bool = False):
+        with self._lock:
+            self.llm_calls += 1
+            self.llm_overrides += int(overridden)
+            self.llm_failures += int(failed)
+
+    def to_dict(self) -> Dict[str, float]:
+        with self._lock:
+            # Unverified documents would have gone to the LLM, so they are
+            # left out of the skip rate
+            decided = self.local + self.llm_calls
+            return {
+                'classified': decided + self.unverified,
+                'llm_skipped': self.local,
+                'llm_unavailable': self.unverified,
+                'llm_calls': self.llm_calls,
+                'llm_overrides': self.llm_overrides,
+                'llm_failures': self.llm_failures,
+                'skip_rate': round(self.local / decided, 3) if decided else 0.0,
+            }
+
+
+_stats: Optional[ClassifierStats] = None
+_stats_lock = threading.Lock()
+
+
+def get_classifier_stats() -> ClassifierStats:
+    global _stats
+    if _stats is None:
+        with _stats_lock:
+            if _stats is None:
+                _stats = ClassifierStats()
+    return _stats
@@ -8,6 +8,7 @@ from docx.shared import Inches
 from io import BytesIO
 import requests
 from services.cloudinary_service import upload_file_from_path, delete_file_by_url
+from services.image_asset_service import get_image_asset_cache, LOGO_SIZE
 import tempfile
 import time
 import contextlib
@@ -620,23 +621,9 @@ def generate_amv_document(document, additional_data=None):
             # Add company logo if available
             if document.company.logo_url:
                 try:
-                    response = requests.get(document.company.logo_url, timeout=10)
-                    if response.status_code == 200:
-                        # Process image to ensure consistent size (150 × 84 pixels)
-                        image_data = BytesIO(response.content)
-                        
-                        # Open image with PIL to resize to exact dimensions
-                        from PIL import Image
-                        img = Image.open(image_data)
-                        
-                        # Resize image to exactly 150 × 84 pixels
-                        resized_img = img.resize((150, 84), Image.Resampling.LANCZOS)
-                        
-                        # Save resized image to BytesIO
-                        resized_image_data = BytesIO()
-                        resized_img.save(resized_image_data, format='PNG')
-                        resized_image_data.seek(0)
-                        
+                    # Resized to 150 × 84 once and shared with AMVReportGenerator headers
+                    resized_image_data = get_image_asset_cache().get_stream(document.company.logo_url, LOGO_SIZE)
+                    if resized_image_data is not None:
                         logo_para = doc.add_paragraph()
                         logo_run = logo_para.add_run()
                         logo_run.add_picture(resized_image_data, width=Inches(1.56), height=Inches(0.875))
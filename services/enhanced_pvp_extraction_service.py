@@ -12,15 +12,16 @@ import datetime
 from typing import Dict, List, Optional
 from pathlib import Path
 
-import pdfplumber
 import pandas as pd
 
-# Optional AI + OCR + PDF rendering
-try:
-    import camelot
-except Exception:
-    camelot = None
+from services.page_text_store_service import PageTextStore, ingest_document
+from services.batch_statistics_service import statistics_for_tests
+from services.chunked_extraction_service import extract_array_chunked, split_into_chunks
+from services.table_detection_service import (
+    CAMELOT_AVAILABLE, PageTableScore, extract_tables, plan_table_pages
+)
 
+# Optional AI + OCR + PDF rendering
 try:
     import google.generativeai as genai
 except Exception:
@@ -64,6 +65,22 @@ else:
     model = None
     logger.info("Gemini API key not found or SDK not available. Using regex-only extraction.")
 
+# Product details sit in the protocol's header pages: only this many chunks
+# are read for them, however long the document, since fields such as
+# pack_size are often absent and would otherwise walk every chunk
+PRODUCT_INFO_MAX_CHUNKS = 2
+
+_llm_client = None
+
+
+def _get_llm_client():
+    """LLMClient around the module's Gemini model (rate limits, retries, shared pool)"""
+    global _llm_client
+    if _llm_client is None:
+        from services.llm_client_service import LLMClient
+        _llm_client = LLMClient(model)
+    return _llm_client
+
 
 # -----------------------
 # Utility helpers
@@ -99,10 +116,10 @@ def normalize_header(h: str) -> str:
 
 
 def ensure_df(table):
-    """Return a pandas DataFrame for a camelot table or None if empty."""
+    """Return a pandas DataFrame for a camelot table (or DataFrame) or None if empty."""
     if table is None:
         return None
-    df = getattr(table, 'df', None)
+    df = table if isinstance(table, pd.DataFrame) else getattr(table, 'df', None)
     if df is None:
         return None
     try:
@@ -153,12 +170,20 @@ def _is_obvious_heading(s: str) -> bool:
 class EnhancedPVPExtractor:
     """Extract comprehensive data from PVP documents"""
 
-    def __init__(self, pdf_path: str, tesseract_cmd: Optional[str] = None):
+    def __init__(self, pdf_path: str, tesseract_cmd: Optional[str] = None,
+                 page_store: Optional[PageTextStore] = None):
         self.pdf_path = str(pdf_path)
+        # None: the process-wide page store
+        self.page_store = page_store
         self.full_text: str = ""
+        self.page_texts: List[str] = []
         self.product_type: Optional[str] = None
         self.tables = []
         self.tables_df: List[pd.DataFrame] = []
+        self.tesseract_cmd = tesseract_cmd
+        self.ocr_truncated_pages: List[int] = []
+        self.table_page_scores: List[PageTableScore] = []
+        self.table_truncated_pages: List[int] = []
         if tesseract_cmd:
             os.environ['TESSERACT_CMD'] = tesseract_cmd
             if pytesseract:
@@ -230,65 +255,43 @@ class EnhancedPVPExtractor:
     # Text extraction with OCR fallback
     # -----------------------
     def _extract_text_from_pdf(self) -> str:
-        text = ""
+        # Parsed (and OCRed) once per file; later runs read the page store.
+        # Table scores only feed Camelot, so without it the parse is text only
         try:
-            with pdfplumber.open(self.pdf_path) as pdf:
-                for page_num, page in enumerate(pdf.pages, start=1):
-                    try:
-                        page_text = page.extract_text() or ""
-                    except Exception:
-                        page_text = ""
-
-                    # If text is short or empty, try OCR
-                    if not page_text or len(page_text.strip()) < 60:
-                        if pytesseract:
-                            try:
-                                pil_img = page.to_image(resolution=200).original
-                                ocr_text = pytesseract.image_to_string(pil_img)
-                                page_text = (page_text or "") + "\n" + ocr_text
-                                logger.debug("OCR used on page %d, extracted %d chars", page_num, len(ocr_text))
-                            except Exception as e:
-                                logger.debug("OCR failed on page %d: %s", page_num, e)
-                        else:
-                            logger.debug("No pytesseract available; skipping OCR")
-
-                    if page_text:
-                        text += page_text + "\n"
+            pages, self.ocr_truncated_pages = ingest_document(
+                self.pdf_path, store=self.page_store, tesseract_cmd=self.tesseract_cmd, tables=CAMELOT_AVAILABLE
+            )
         except Exception as e:
             logger.error("Error reading PDF via pdfplumber: %s", e)
             return ""
-        return text
+
+        # Pages not OCRed (no pytesseract, or past the time budget) keep their native text
+        page_texts = [page.text if page.ocr is None else page.text + "\n" + page.ocr for page in pages]
+        self.page_texts = page_texts
+        self.table_page_scores = [PageTableScore.from_stored(page.number, page.table_score, page.height) for page in pages]
+        return "".join(page_text + "\n" for page_text in page_texts if page_text)
+
+    def _paged_text(self) -> str:
+        """Full text with form feeds between pages, for page-aligned chunking"""
+        if self.page_texts:
+            return "\f".join(self.page_texts)
+        return self.full_text
 
     # -----------------------
     # Table extraction (camelot)
     # -----------------------
     def _extract_tables_from_pdf(self) -> List:
+        if not CAMELOT_AVAILABLE:
+            logger.debug("Camelot not available")
+            return []
         try:
-            tables = []
-            try:
-                if camelot:
-                    tables = camelot.read_pdf(self.pdf_path, pages='all', flavor='lattice')
-                    logger.info("Camelot lattice found %d tables", len(tables))
-                else:
-                    logger.debug("Camelot not available")
-            except Exception as e:
-                logger.debug("Camelot lattice failed: %s", e)
-
-            if not tables and camelot:
-                try:
-                    tables = camelot.read_pdf(self.pdf_path, pages='all', flavor='stream')
-                    logger.info("Camelot stream found %d tables", len(tables))
-                except Exception as e:
-                    logger.debug("Camelot stream failed: %s", e)
-
-            for table in tables:
-                try:
-                    if hasattr(table, '_close_temp_files'):
-                        table._close_temp_files()
-                except Exception:
-                    pass
-
-            return tables or []
+            # Only pages that look like tables are rendered, with the flavor
+            # their layout calls for, in parallel worker processes
+            pages = plan_table_pages(self.table_page_scores)
+            logger.info("Table prefilter: %d of %d pages sent to Camelot",
+                        len(pages), len(self.table_page_scores))
+            tables, self.table_truncated_pages = extract_tables(self.pdf_path, pages)
+            return tables
         except Exception as e:
             logger.error("Error extracting tables: %s", e)
             return []
@@ -302,27 +305,39 @@ class EnhancedPVPExtractor:
         return self._extract_product_info_with_regex()
 
     def _extract_product_info_with_ai(self) -> Dict:
+        # Read the leading chunks in page order and stop as soon as every
+        # field is filled (usually after the first)
+        fields = ["product_name", "strength", "dosage_form", "batch_size", "pack_size", "manufacturing_site"]
         try:
-            prompt = f"""
+            product_info: Dict = {}
+            for chunk in split_into_chunks(self._paged_text())[:PRODUCT_INFO_MAX_CHUNKS]:
+                prompt = f"""
 Extract the following product information from this Process Validation Protocol:
 
 Text:
-{self.full_text[:4000]}
+{chunk.text}
 
 Return ONLY a JSON object with the fields:
 {{"product_name": "...", "strength": "...", "dosage_form": "...", "batch_size": "...", "pack_size":"...", "manufacturing_site":"..."}}
 """
-            response = model.generate_content(prompt)
-            result_text = getattr(response, 'text', str(response)).strip()
-            jstart = result_text.find('{')
-            jend = result_text.rfind('}')
-            if jstart != -1 and jend != -1 and jend > jstart:
-                candidate = result_text[jstart:jend+1]
-                try:
-                    product_info = json.loads(candidate)
-                    return product_info
-                except Exception as e:
-                    logger.error("AI returned non-JSON or parse failed: %s", e)
+                response = _get_llm_client().generate(prompt, label="pvp_product_info")
+                result_text = getattr(response, 'text', str(response)).strip()
+                jstart = result_text.find('{')
+                jend = result_text.rfind('}')
+                if jstart != -1 and jend != -1 and jend > jstart:
+                    candidate = result_text[jstart:jend+1]
+                    try:
+                        found = json.loads(candidate)
+                    except Exception as e:
+                        logger.error("AI returned non-JSON or parse failed: %s", e)
+                        continue
+                    for key, value in found.items():
+                        if value and not product_info.get(key):
+                            product_info[key] = value
+                    if all(product_info.get(key) for key in fields):
+                        break
+            if product_info:
+                return product_info
             logger.warning("AI did not return valid JSON, falling back to regex")
             return self._extract_product_info_with_regex()
         except Exception as e:
@@ -558,11 +573,11 @@ Return ONLY a JSON object with the fields:
 
     def _extract_materials_with_ai(self) -> List[Dict]:
         try:
-            prompt = (
+            build_prompt = lambda chunk_text: (
                 "Extract all materials from this validation protocol. "
                 "Categorize as API, Excipient, or Packaging.\n\n"
                 "Text:\n"
-                f"{self.full_text[:5000]}\n\n"
+                f"{chunk_text}\n\n"
                 "Return ONLY a JSON array like this:\n"
                 '[\n'
                 '  {\n'
@@ -574,14 +589,12 @@ Return ONLY a JSON object with the fields:
                 ']\n\n'
                 "Return only the JSON array, no other text."
             )
-            response = model.generate_content(prompt)
-            result_text = getattr(response, 'text', str(response)).strip()
-            result_text = result_text.replace('```json', '').replace('```', '').strip()
-            jstart = result_text.find('[')
-            jend = result_text.rfind(']')
-            if jstart != -1 and jend != -1 and jend > jstart:
-                materials = json.loads(result_text[jstart:jend+1])
-                logger.info(f"AI extracted {len(materials)} materials")
+            materials, stats = extract_array_chunked(
+                self._paged_text(), build_prompt, _get_llm_client(), 'pvp_materials',
+                key=lambda item: str(item.get('material_name', '')).strip().lower() if isinstance(item, dict) else None
+            )
+            if materials is not None:
+                logger.info("AI extracted %d materials (%s)", len(materials), stats)
                 return materials
         except Exception as e:
             logger.error(f"AI materials extraction failed: {e}")
@@ -924,15 +937,12 @@ Return ONLY a JSON object with the fields:
         return self._extract_stages_with_regex()
 
     def _extract_stages_with_ai(self) -> List[Dict]:
-        prompt = f"Extract manufacturing stages and return JSON array from the text:\n{self.full_text[:8000]}"
+        build_prompt = lambda chunk_text: f"Extract manufacturing stages and return JSON array from the text:\n{chunk_text}"
         try:
-            response = model.generate_content(prompt)
-            text = getattr(response, 'text', str(response)).strip()
-            jstart = text.find('[')
-            jend = text.rfind(']')
-            if jstart != -1 and jend != -1 and jend > jstart:
-                arr = json.loads(text[jstart:jend+1])
-                return arr
+            stages, stats = extract_array_chunked(self._paged_text(), build_prompt, _get_llm_client(), 'pvp_stages')
+            if stages is not None:
+                logger.info("AI extracted %d stages (%s)", len(stages), stats)
+                return stages
         except Exception as e:
             logger.debug("AI stages parse failed: %s", e)
         return self._extract_stages_with_regex()
@@ -1042,41 +1052,35 @@ Return ONLY a JSON object with the fields:
     # -----------------------
     def _calculate_statistics_from_criteria(self, test_criteria: List[Dict]) -> Dict:
         """Calculate mean, SD, RSD for test results across batches"""
-        stats = {}
-
-        # Group by test name
+        # Group by test id: several tests can share a name (e.g. pH at two stages)
         by_test = {}
+        names = {}
         for test in test_criteria:
             test_name = test.get('test_name', '')
+            test_id = test.get('test_id') or test_name
             acceptance = test.get('acceptance_criteria', '')
 
             # Try to extract numeric values
             numbers = re.findall(r'\d+\.?\d*', str(acceptance))
             if numbers:
-                if test_name not in by_test:
-                    by_test[test_name] = []
-                by_test[test_name].extend([float(n) for n in numbers])
+                if test_id not in by_test:
+                    by_test[test_id] = []
+                    names[test_id] = test_name
+                by_test[test_id].extend([float(n) for n in numbers])
 
-        # Calculate statistics
-        for test_name, values in by_test.items():
-            if len(values) > 0:
-                mean = sum(values) / len(values)
-                if len(values) > 1:
-                    variance = sum((x - mean) ** 2 for x in values) / (len(values) - 1)
-                    sd = variance ** 0.5
-                    rsd = (sd / mean * 100) if mean != 0 else 0
-                else:
-                    sd = 0
-                    rsd = 0
-
-                stats[test_name] = {
-                    'mean': round(mean, 2),
-                    'sd': round(sd, 2),
-                    'rsd': round(rsd, 2),
-                    'count': len(values),
-                    'min': round(min(values), 2),
-                    'max': round(max(values), 2)
-                }
+        # Calculate statistics for every test in one vectorized pass
+        stats = {}
+        for test_id, record in statistics_for_tests(by_test, test_names=names).items():
+            stats[test_id] = {
+                'test_name': record['name'],
+                'mean': record['mean'],
+                # A single value has no spread
+                'sd': record['sd'] or 0,
+                'rsd': record['rsd'] or 0,
+                'count': record['count'],
+                'min': record['min'],
+                'max': record['max']
+            }
 
         return stats
 
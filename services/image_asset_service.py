@@ -0,0 +1,287 @@
+"""
+Image Asset Cache - company logos and signatures for DOCX reports.
+
+Report generators insert the same logo in every page header. Assets are
+fetched once, resized once, and served from an in-memory LRU backed by an
+on-disk copy. Remote assets are revalidated with ETag/Last-Modified after
+IMAGE_ASSET_REVALIDATE_SECONDS; local files are revalidated by mtime.
+
+Because every lookup for the same (source, size) returns byte-identical PNG
+data, python-docx stores the image part once per .docx (it de-duplicates
+parts by SHA-1) and each header only adds a relationship to it.
+
+The disk copy is bounded: entries unused for IMAGE_ASSET_MAX_AGE_SECONDS are
+removed, then the least recently used ones until the directory is under
+IMAGE_ASSET_DISK_MAX_BYTES (checked at most every few minutes). Entries of an
+uploaded file are dropped when the upload store deletes it.
+"""
+
+import os
+import glob
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from typing import Dict, Optional, Tuple
+
+import requests
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+ASSET_CACHE_DIR = os.path.join('.cache', 'image_assets')
+ASSET_MEMORY_ITEMS = int(os.environ.get('IMAGE_ASSET_MEMORY_ITEMS', '64'))
+ASSET_REVALIDATE_SECONDS = int(os.environ.get('IMAGE_ASSET_REVALIDATE_SECONDS', '3600'))
+ASSET_DISK_MAX_BYTES = int(os.environ.get('IMAGE_ASSET_DISK_MAX_BYTES', str(256 * 1024 * 1024)))
+ASSET_MAX_AGE_SECONDS = int(os.environ.get('IMAGE_ASSET_MAX_AGE_SECONDS', str(30 * 24 * 3600)))
+# Minimum time between two eviction scans of the cache directory
+ASSET_EVICT_INTERVAL_SECONDS = 300
+
+# Header logo size used by the AMV generators (150 x 84 px)
+LOGO_SIZE = (150, 84)
+
+
+class ImageAssetCache:
+    """Two-level (memory LRU + disk) cache of image assets, resized to PNG when a size is given"""
+
+    def __init__(self, cache_dir: str = ASSET_CACHE_DIR, max_items: int = ASSET_MEMORY_ITEMS,
+                 revalidate_seconds: int = ASSET_REVALIDATE_SECONDS, max_disk_bytes: int = ASSET_DISK_MAX_BYTES,
+                 max_age_seconds: int = ASSET_MAX_AGE_SECONDS):
+        self.cache_dir = cache_dir
+        self.max_items = max_items
+        self.revalidate_seconds = revalidate_seconds
+        self.max_disk_bytes = max_disk_bytes
+        self.max_age_seconds = max_age_seconds
+        self._memory: "OrderedDict[str, Tuple[bytes, Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_evicted = 0.0
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "revalidated": 0, "fetches": 0, "evicted": 0}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def _source_key(source: str) -> str:
+        return hashlib.sha256(source.encode()).hexdigest()
+
+    @classmethod
+    def _key(cls, source: str, size: Optional[Tuple[int, int]]) -> str:
+        # Source hash first, so every size of one source shares a file prefix
+        size_part = f"{size[0]}x{size[1]}" if size else "original"
+        return f"{cls._source_key(source)}-{size_part}"
+
+    def _paths(self, key: str) -> Tuple[str, str]:
+        base = os.path.join(self.cache_dir, key)
+        return base + '.img', base + '.json'
+
+    @staticmethod
+    def _is_remote(source: str) -> bool:
+        return source.startswith(('http://', 'https://'))
+
+    @staticmethod
+    def _resize(raw: bytes, size: Optional[Tuple[int, int]]) -> bytes:
+        if not size:
+            # Original asset (e.g. signatures) is embedded as-is
+            return raw
+        img = Image.open(BytesIO(raw)).resize(size, Image.Resampling.LANCZOS)
+        output = BytesIO()
+        img.save(output, format='PNG')
+        return output.getvalue()
+
+    # ------------------------------------------------------------------
+    # Storage
+    # ------------------------------------------------------------------
+    def _remember(self, key: str, data: bytes, meta: Dict):
+        with self._lock:
+            self._memory[key] = (data, meta)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_items:
+                self._memory.popitem(last=False)
+
+    def _load_disk(self, key: str) -> Optional[Tuple[bytes, Dict]]:
+        data_path, meta_path = self._paths(key)
+        try:
+            with open(data_path, 'rb') as f:
+                data = f.read()
+            with open(meta_path, 'r') as f:
+                meta = json.load(f)
+            # The data file's mtime records its last use, for eviction
+            os.utime(data_path)
+            return data, meta
+        except (OSError, ValueError):
+            return None
+
+    def _store(self, key: str, data: bytes, meta: Dict):
+        data_path, meta_path = self._paths(key)
+        try:
+            # Write-then-rename so concurrent workers never read a partial file
+            for path, payload, mode in ((data_path, data, 'wb'), (meta_path, json.dumps(meta), 'w')):
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, mode) as f:
+                    f.write(payload)
+                os.replace(tmp_path, path)
+        except OSError as e:
+            logger.debug("Could not persist image asset %s: %s", key, e)
+        self._remember(key, data, meta)
+        if time.time() - self._last_evicted >= ASSET_EVICT_INTERVAL_SECONDS:
+            self.evict()
+
+    def _remove(self, data_path: str) -> int:
+        """Delete one disk entry (data and metadata); returns the bytes freed"""
+        freed = 0
+        for path in (data_path, data_path[:-len('.img')] + '.json'):
+            try:
+                freed += os.path.getsize(path)
+                os.remove(path)
+            except OSError:
+                pass
+        return freed
+
+    def evict(self) -> int:
+        """
+        Drop disk entries unused for ``max_age_seconds``, then the least
+        recently used ones until the directory fits ``max_disk_bytes``.
+        Returns the number of entries removed.
+        """
+        self._last_evicted = time.time()
+        entries = []
+        for data_path in glob.glob(os.path.join(self.cache_dir, '*.img')):
+            meta_path = data_path[:-len('.img')] + '.json'
+            try:
+                stat = os.stat(data_path)
+                size = stat.st_size + (os.path.getsize(meta_path) if os.path.exists(meta_path) else 0)
+            except OSError:
+                continue  # removed by another worker
+            entries.append((stat.st_mtime, size, data_path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        cutoff = self._last_evicted - self.max_age_seconds
+        removed = 0
+        for mtime, size, data_path in entries:
+            if mtime >= cutoff and total <= self.max_disk_bytes:
+                break
+            self._remove(data_path)
+            total -= size
+            removed += 1
+        self.stats["evicted"] += removed
+        if removed:
+            logger.info("Evicted %d image assets from %s", removed, self.cache_dir)
+        return removed
+
+    def forget(self, source: str) -> int:
+        """Drop every cached size of ``source`` from memory and disk; returns the disk entries removed"""
+        prefix = self._source_key(source) + '-'
+        with self._lock:
+            for key in [key for key in self._memory if key.startswith(prefix)]:
+                del self._memory[key]
+        paths = glob.glob(os.path.join(self.cache_dir, glob.escape(prefix) + '*.img'))
+        for data_path in paths:
+            self._remove(data_path)
+        return len(paths)
+
+    # ------------------------------------------------------------------
+    # Fetch / revalidate
+    # ------------------------------------------------------------------
+    def _fetch_remote(self, url: str, size, key: str, cached: Optional[Tuple[bytes, Dict]]) -> Optional[bytes]:
+        headers = {}
+        if cached:
+            meta = cached[1]
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        try:
+            response = requests.get(url, timeout=10, headers=headers)
+        except requests.RequestException as e:
+            if cached:
+                logger.warning("Image asset revalidation failed for %s, serving cached copy: %s", url, e)
+                return cached[0]
+            raise
+
+        if response.status_code == 304 and cached:
+            self.stats["revalidated"] += 1
+            meta = dict(cached[1], checked_at=time.time())
+            self._store(key, cached[0], meta)
+            return cached[0]
+        if response.status_code != 200:
+            return cached[0] if cached else None
+
+        self.stats["fetches"] += 1
+        data = self._resize(response.content, size)
+        self._store(key, data, {
+            'source': url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'checked_at': time.time(),
+        })
+        return data
+
+    def _fetch_local(self, path: str, size, key: str, cached: Optional[Tuple[bytes, Dict]]) -> Optional[bytes]:
+        mtime = os.path.getmtime(path)
+        if cached and cached[1].get('mtime') == mtime:
+            self.stats["revalidated"] += 1
+            return cached[0]
+        self.stats["fetches"] += 1
+        with open(path, 'rb') as f:
+            data = self._resize(f.read(), size)
+        self._store(key, data, {'source': path, 'mtime': mtime, 'checked_at': time.time()})
+        return data
+
+    def get_png(self, source: str, size: Optional[Tuple[int, int]] = None) -> Optional[bytes]:
+        """
+        Image bytes for ``source`` (URL or local path), as a ``size`` PNG if given.
+
+        Returns None when a remote asset cannot be downloaded and nothing is
+        cached; raises for unreadable local files or undecodable images.
+        """
+        key = self._key(source, size)
+        remote = self._is_remote(source)
+
+        with self._lock:
+            cached = self._memory.get(key)
+            if cached:
+                self._memory.move_to_end(key)
+
+        if cached:
+            fresh = (time.time() - cached[1].get('checked_at', 0)) < self.revalidate_seconds
+            if remote and fresh:
+                self.stats["memory_hits"] += 1
+                return cached[0]
+        else:
+            cached = self._load_disk(key)
+            if cached and remote and (time.time() - cached[1].get('checked_at', 0)) < self.revalidate_seconds:
+                self.stats["disk_hits"] += 1
+                self._remember(key, *cached)
+                return cached[0]
+
+        if remote:
+            return self._fetch_remote(source, size, key, cached)
+        return self._fetch_local(source, size, key, cached)
+
+    def get_stream(self, source: str, size: Optional[Tuple[int, int]] = None) -> Optional[BytesIO]:
+        """``get_png`` wrapped in a BytesIO, ready for ``run.add_picture``"""
+        data = self.get_png(source, size)
+        return BytesIO(data) if data is not None else None
+
+
+_asset_cache: Optional[ImageAssetCache] = None
+_asset_cache_lock = threading.Lock()
+
+
+def get_image_asset_cache() -> ImageAssetCache:
+    """Process-wide asset cache shared by the report generators"""
+    global _asset_cache
+    with _asset_cache_lock:
+        if _asset_cache is None:
+            _asset_cache = ImageAssetCache()
+        return _asset_cache
+
+
+def forget_image_asset(source: str) -> int:
+    """Drop a deleted file's cached images from the process-wide cache (if one was ever written)"""
+    if _asset_cache is None and not os.path.isdir(ASSET_CACHE_DIR):
+        return 0
+    return get_image_asset_cache().forget(source)
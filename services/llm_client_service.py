@@ -0,0 +1,281 @@
+"""
+LLM Client Service - shared, rate-limited access to the Gemini model.
+
+Every ``generate_content`` call made by the PV pipeline goes through an
+``LLMClient``, which adds:
+
+  - one process-wide token bucket (``LLM_RATE_PER_SECOND`` requests per
+    second, bursts of ``LLM_BURST``), shared by all documents and jobs
+  - a shared thread pool of ``LLM_MAX_CONCURRENCY`` workers, so consensus
+    passes and the STP/MFR classification calls run concurrently
+  - exponential backoff with jitter on 429, 5xx and timeouts (the library's
+    own retry is disabled so it cannot stack with ours)
+  - a deadline per call covering rate-limit waits, attempts and backoff
+  - latency metrics per call label (``get_llm_metrics().snapshot()``)
+
+The client only needs an object with a ``generate_content(contents,
+generation_config=..., request_options=...)`` method, so tests point a real
+``genai.GenerativeModel`` at a local fake server (REST transport) and run
+offline.
+"""
+
+import os
+import time
+import random
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '4'))
+LLM_RATE_PER_SECOND = float(os.getenv('LLM_RATE_PER_SECOND', '1'))
+LLM_BURST = int(os.getenv('LLM_BURST', '4'))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '4'))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv('LLM_BACKOFF_BASE_SECONDS', '2'))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv('LLM_BACKOFF_MAX_SECONDS', '60'))
+LLM_DEADLINE_SECONDS = float(os.getenv('LLM_DEADLINE_SECONDS', '300'))
+# Latencies kept per label for the percentiles
+METRICS_WINDOW = 500
+
+RETRYABLE_STATUS_CODES = frozenset({408, 429, 500, 502, 503, 504})
+
+
+class LLMDeadlineExceeded(Exception):
+    """A call ran out of time before the model returned a usable response"""
+
+
+class TokenBucket:
+    """Thread-safe token bucket: ``rate`` tokens per second, at most ``capacity`` banked"""
+
+    def __init__(self, rate: float, capacity: int, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._clock = clock
+        self._tokens = float(self.capacity)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> float:
+        """Take a token and return 0, or return the seconds until one is available"""
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            if self.rate <= 0:
+                return float('inf')
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self, deadline: Optional[float] = None) -> bool:
+        """Block until a token is taken; False if ``deadline`` (monotonic) would pass first"""
+        while True:
+            wait = self.try_acquire()
+            if wait == 0:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class LLMMetrics:
+    """Per-label call counters and latency percentiles"""
+
+    def __init__(self, window: int = METRICS_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Dict[str, float]] = {}
+        self._latencies: Dict[str, Deque[float]] = {}
+
+    def record(self, label: str, latency: float, attempts: int, ok: bool, throttled: float = 0.0):
+        with self._lock:
+            counters = self._calls.setdefault(label, {
+                'calls': 0, 'errors': 0, 'retries': 0, 'throttled_seconds': 0.0
+            })
+            counters['calls'] += 1
+            counters['retries'] += max(0, attempts - 1)
+            counters['throttled_seconds'] += throttled
+            if not ok:
+                counters['errors'] += 1
+            self._latencies.setdefault(label, deque(maxlen=self.window)).append(latency)
+
+    @staticmethod
+    def _percentile(ordered: List[float], fraction: float) -> float:
+        index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+        return ordered[index]
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """``{label: {calls, errors, retries, throttled_seconds, p50_ms, p95_ms, max_ms}}``"""
+        with self._lock:
+            result = {}
+            for label, counters in self._calls.items():
+                ordered = sorted(self._latencies.get(label, ()))
+                entry: Dict[str, Any] = dict(counters)
+                entry['throttled_seconds'] = round(entry['throttled_seconds'], 3)
+                if ordered:
+                    entry['p50_ms'] = round(self._percentile(ordered, 0.5) * 1000, 1)
+                    entry['p95_ms'] = round(self._percentile(ordered, 0.95) * 1000, 1)
+                    entry['max_ms'] = round(ordered[-1] * 1000, 1)
+                result[label] = entry
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._calls.clear()
+            self._latencies.clear()
+
+
+def status_code(exc: BaseException) -> Optional[int]:
+    """HTTP status carried by a google.api_core or requests error, if any"""
+    code = getattr(exc, 'code', None)
+    if isinstance(code, int):
+        return code
+    response = getattr(exc, 'response', None)
+    code = getattr(response, 'status_code', None)
+    return code if isinstance(code, int) else None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """429, 5xx and transport timeouts are worth retrying; anything else is not"""
+    code = status_code(exc)
+    if code is not None:
+        return code in RETRYABLE_STATUS_CODES
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    name = type(exc).__name__
+    return name in ('ReadTimeout', 'ConnectTimeout', 'Timeout', 'ConnectionError', 'DeadlineExceeded')
+
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    response = getattr(exc, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        value = headers.get('Retry-After')
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMClient:
+    """Rate-limited, retrying, concurrent wrapper around a Gemini ``GenerativeModel``"""
+
+    def __init__(self, model, rate_limiter: Optional[TokenBucket] = None,
+                 executor: Optional[ThreadPoolExecutor] = None, metrics: Optional[LLMMetrics] = None,
+                 max_retries: int = LLM_MAX_RETRIES, backoff_base: float = LLM_BACKOFF_BASE_SECONDS,
+                 backoff_max: float = LLM_BACKOFF_MAX_SECONDS, deadline: float = LLM_DEADLINE_SECONDS):
+        self.model = model
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self.executor = executor or get_llm_executor()
+        self.metrics = metrics or get_llm_metrics()
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.deadline = deadline
+
+    def _backoff(self, attempt: int, exc: BaseException) -> float:
+        hinted = _retry_after(exc)
+        if hinted is not None:
+            return min(hinted, self.backoff_max)
+        # Full jitter keeps concurrent callers from retrying in lockstep
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def generate(self, contents: Any, generation_config: Any = None, label: str = 'generate',
+                 deadline: Optional[float] = None) -> Any:
+        """
+        Call ``model.generate_content`` and return its response.
+
+        Retries retryable errors with exponential backoff until ``deadline``
+        seconds (default ``LLM_DEADLINE_SECONDS``) have passed, then raises
+        ``LLMDeadlineExceeded``; other errors are raised immediately.
+        """
+        start = time.monotonic()
+        expires = start + (self.deadline if deadline is None else deadline)
+        attempts = 0
+        throttled = 0.0
+        ok = False
+        try:
+            while True:
+                wait_start = time.monotonic()
+                if not self.rate_limiter.acquire(expires):
+                    raise LLMDeadlineExceeded(f"{label}: deadline passed waiting for the rate limiter")
+                throttled += time.monotonic() - wait_start
+
+                attempts += 1
+                remaining = expires - time.monotonic()
+                kwargs: Dict[str, Any] = {'request_options': {'timeout': max(1.0, remaining), 'retry': None}}
+                if generation_config is not None:
+                    kwargs['generation_config'] = generation_config
+                try:
+                    response = self.model.generate_content(contents, **kwargs)
+                    ok = True
+                    return response
+                except Exception as e:
+                    if not is_retryable(e) or attempts > self.max_retries:
+                        raise
+                    delay = self._backoff(attempts - 1, e)
+                    if time.monotonic() + delay >= expires:
+                        raise LLMDeadlineExceeded(f"{label}: deadline passed after {attempts} attempts ({e})") from e
+                    logger.warning("%s attempt %d failed (%s); retrying in %.1fs", label, attempts, e, delay)
+                    time.sleep(delay)
+        finally:
+            self.metrics.record(label, time.monotonic() - start, attempts, ok, throttled)
+
+    def submit(self, contents: Any, generation_config: Any = None, label: str = 'generate',
+               deadline: Optional[float] = None) -> Future:
+        """Run ``generate`` on the shared pool"""
+        return self.executor.submit(self.generate, contents, generation_config, label, deadline)
+
+    def generate_many(self, requests: Sequence[Dict[str, Any]]) -> List[Any]:
+        """
+        Run several ``generate`` calls concurrently (each a dict of its kwargs).
+
+        Returns responses in request order; a failed call's slot holds its exception.
+        """
+        futures = [self.submit(**request) for request in requests]
+        results: List[Any] = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(e)
+        return results
+
+
+_shared_lock = threading.Lock()
+_rate_limiter: Optional[TokenBucket] = None
+_executor: Optional[ThreadPoolExecutor] = None
+_metrics: Optional[LLMMetrics] = None
+
+
+def get_rate_limiter() -> TokenBucket:
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _shared_lock:
+            if _rate_limiter is None:
+                _rate_limiter = TokenBucket(LLM_RATE_PER_SECOND, LLM_BURST)
+    return _rate_limiter
+
+
+def get_llm_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _shared_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=LLM_MAX_CONCURRENCY, thread_name_prefix='llm')
+    return _executor
+
+
+def get_llm_metrics() -> LLMMetrics:
+    global _metrics
+    if _metrics is None:
+        with _shared_lock:
+            if _metrics is None:
+                _metrics = LLMMetrics()
+    return _metrics
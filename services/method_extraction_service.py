@@ -9,6 +9,8 @@ from typing import Dict, List, Optional, Tuple
 import PyPDF2
 import io
 
+from services.pattern_scan_service import PatternSet, TextScan
+
 logger = logging.getLogger(__name__)
 
 class MethodExtractionService:
@@ -147,6 +149,45 @@ class MethodExtractionService:
             ]
         }
 
+        # Extra weight for titration-specific terms in instrument detection
+        self.titration_keywords = [
+            r'(?:by titration)',
+            r'(?:weigh.*?titrate)',
+            r'(?:each ml.*?equivalent)',
+            r'(?:vs|volumetric solution)',
+            r'(?:indicator)',
+            r'(?:endpoint)'
+        ]
+
+        # Fallbacks used by _add_smart_defaults
+        self.default_patterns = {
+            'standard_weight': [
+                r'(?:weigh\s+)(\d+\.?\d*)\s*(?:mg|g)',
+                r'(?:standard.*?weight)[\s:]*(\d+\.?\d*)\s*(?:mg|g)',
+                r'(?:reference.*?weight)[\s:]*(\d+\.?\d*)\s*(?:mg|g)'
+            ],
+            'sample_weight': [
+                r'(?:sample.*?weigh\s+)(\d+\.?\d*)\s*(?:mg|g)',
+                r'(?:weigh.*?sample)[\s:]*(\d+\.?\d*)\s*(?:mg|g)',
+                r'(?:test.*?weight)[\s:]*(\d+\.?\d*)\s*(?:mg|g)'
+            ],
+            'dilution_volume': r'(?:dilute.*?to\s+)(\d+\.?\d*)\s*(?:ml|mL)',
+            'uv_detection': r'(?:hplc|hplc-uv|uv detection)',
+            'visible': r'(?:visible|vis)',
+            'fluorescence': r'(?:fluorescence|fl)',
+            'hplc': r'(?:hplc|hplc-uv)',
+            'potency': r'(?:assay|purity|potency)[\s:]*(\d+\.?\d*)\s*%?'
+        }
+
+        # Every pattern above, behind one keyword prefilter (see pattern_scan_service)
+        all_patterns = [pattern for group in self.instrument_patterns.values() for pattern in group.values()]
+        all_patterns += list(self.concentration_patterns.values()) + list(self.validation_patterns.values())
+        all_patterns += [pattern for group in self.instrument_type_patterns.values() for pattern in group]
+        all_patterns += self.titration_keywords
+        for pattern in self.default_patterns.values():
+            all_patterns += pattern if isinstance(pattern, list) else [pattern]
+        self.pattern_set = PatternSet(all_patterns, re.IGNORECASE)
+
     def extract_method_parameters(self, pdf_content: bytes, instrument_type: str) -> Dict[str, any]:
         """
         Extract analytical method parameters from PDF content
@@ -169,20 +210,23 @@ class MethodExtractionService:
                     'raw_text_length': 0
                 }
             
+            # Index the text once; every pattern below is matched against this scan
+            scan = self.pattern_set.scan(text_content)
+            
             # Extract parameters based on instrument type
             extracted_params = {}
             
             if instrument_type in self.instrument_patterns:
-                extracted_params.update(self._extract_instrument_params(text_content, instrument_type))
+                extracted_params.update(self._extract_instrument_params(scan, instrument_type))
             
             # Extract common parameters
-            extracted_params.update(self._extract_common_params(text_content))
+            extracted_params.update(self._extract_common_params(scan))
             
             # Extract validation parameters
-            extracted_params.update(self._extract_validation_params(text_content))
+            extracted_params.update(self._extract_validation_params(scan))
             
             # Detect instrument type from content
-            detected_instrument_type = self._detect_instrument_type(text_content)
+            detected_instrument_type = self._detect_instrument_type(scan)
             if detected_instrument_type:
                 extracted_params['detected_instrument_type'] = detected_instrument_type
             
@@ -221,16 +265,15 @@ class MethodExtractionService:
                 logger.error(f"Error extracting text from PDF: {str(e)}")
                 return ""
 
-    def _extract_instrument_params(self, text: str, instrument_type: str) -> Dict[str, any]:
+    def _extract_instrument_params(self, scan: TextScan, instrument_type: str) -> Dict[str, any]:
         """Extract instrument-specific parameters"""
         params = {}
         patterns = self.instrument_patterns.get(instrument_type, {})
         
         for param_name, pattern in patterns.items():
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            if matches:
-                # Take the first match and convert to appropriate type
-                value = matches[0]
+            # Take the first match and convert to appropriate type
+            value = scan.first(pattern)
+            if value is not None:
                 if param_name in ['wavelength', 'flow_rate', 'injection_volume']:
                     try:
                         params[param_name] = float(value)
@@ -241,16 +284,15 @@ class MethodExtractionService:
         
         return params
 
-    def _extract_common_params(self, text: str) -> Dict[str, any]:
+    def _extract_common_params(self, scan: TextScan) -> Dict[str, any]:
         """Extract common analytical parameters"""
         params = {}
         
         for param_name, pattern in self.concentration_patterns.items():
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            if matches:
+            # Handle multiple matches by taking the first one
+            value = scan.first(pattern)
+            if value is not None:
                 try:
-                    # Handle multiple matches by taking the first one
-                    value = matches[0] if isinstance(matches[0], str) else matches[0]
                     if param_name in ['weight_standard', 'weight_sample', 'final_concentration_standard', 
                                     'final_concentration_sample', 'potency', 'average_weight', 'weight_per_ml',
                                     'wavelength', 'molecular_weight']:
@@ -258,26 +300,22 @@ class MethodExtractionService:
                     else:
                         params[param_name] = value
                 except ValueError:
-                    params[param_name] = matches[0]
+                    params[param_name] = value
         
         # Add smart defaults for missing parameters
-        params = self._add_smart_defaults(params, text)
+        params = self._add_smart_defaults(params, scan)
         
         return params
 
-    def _add_smart_defaults(self, params: Dict[str, any], text: str) -> Dict[str, any]:
+    def _add_smart_defaults(self, params: Dict[str, any], scan: TextScan) -> Dict[str, any]:
         """Add smart defaults for missing parameters based on context"""
+        patterns = self.default_patterns
         
         # Smart defaults for common parameters
         if 'weight_standard' not in params:
             # Look for standard weight in different formats
-            standard_weight_patterns = [
-                r'(?:weigh\s+)(\d+\.?\d*)\s*(?:mg|g)',
-                r'(?:standard.*?weight)[\s:]*(\d+\.?\d*)\s*(?:mg|g)',
-                r'(?:reference.*?weight)[\s:]*(\d+\.?\d*)\s*(?:mg|g)'
-            ]
-            for pattern in standard_weight_patterns:
-                match = re.search(pattern, text, re.IGNORECASE)
+            for pattern in patterns['standard_weight']:
+                match = scan.search(pattern)
                 if match:
                     try:
                         params['weight_standard'] = float(match.group(1))
@@ -287,13 +325,8 @@ class MethodExtractionService:
         
         if 'weight_sample' not in params:
             # Look for sample weight in different formats
-            sample_weight_patterns = [
-                r'(?:sample.*?weigh\s+)(\d+\.?\d*)\s*(?:mg|g)',
-                r'(?:weigh.*?sample)[\s:]*(\d+\.?\d*)\s*(?:mg|g)',
-                r'(?:test.*?weight)[\s:]*(\d+\.?\d*)\s*(?:mg|g)'
-            ]
-            for pattern in sample_weight_patterns:
-                match = re.search(pattern, text, re.IGNORECASE)
+            for pattern in patterns['sample_weight']:
+                match = scan.search(pattern)
                 if match:
                     try:
                         params['weight_sample'] = float(match.group(1))
@@ -304,7 +337,7 @@ class MethodExtractionService:
         # Calculate concentrations if weights are available
         if 'weight_standard' in params and 'final_concentration_standard' not in params:
             # Try to calculate from volume information
-            volume_match = re.search(r'(?:dilute.*?to\s+)(\d+\.?\d*)\s*(?:ml|mL)', text, re.IGNORECASE)
+            volume_match = scan.search(patterns['dilution_volume'])
             if volume_match:
                 try:
                     volume = float(volume_match.group(1))
@@ -315,7 +348,7 @@ class MethodExtractionService:
         
         if 'weight_sample' in params and 'final_concentration_sample' not in params:
             # Try to calculate from volume information
-            volume_match = re.search(r'(?:dilute.*?to\s+)(\d+\.?\d*)\s*(?:ml|mL)', text, re.IGNORECASE)
+            volume_match = scan.search(patterns['dilution_volume'])
             if volume_match:
                 try:
                     volume = float(volume_match.group(1))
@@ -326,24 +359,24 @@ class MethodExtractionService:
         
         # Default wavelength based on instrument type
         if 'wavelength' not in params:
-            if re.search(r'(?:hplc|hplc-uv|uv detection)', text, re.IGNORECASE):
+            if scan.search(patterns['uv_detection']):
                 params['wavelength'] = 254.0  # Common UV wavelength
-            elif re.search(r'(?:visible|vis)', text, re.IGNORECASE):
+            elif scan.search(patterns['visible']):
                 params['wavelength'] = 450.0  # Visible range
-            elif re.search(r'(?:fluorescence|fl)', text, re.IGNORECASE):
+            elif scan.search(patterns['fluorescence']):
                 params['wavelength'] = 280.0  # Common fluorescence wavelength
         
         # Default flow rate for HPLC
-        if 'flow_rate' not in params and re.search(r'(?:hplc|hplc-uv)', text, re.IGNORECASE):
+        if 'flow_rate' not in params and scan.search(patterns['hplc']):
             params['flow_rate'] = 1.0  # Common HPLC flow rate
         
         # Default injection volume for HPLC
-        if 'injection_volume' not in params and re.search(r'(?:hplc|hplc-uv)', text, re.IGNORECASE):
+        if 'injection_volume' not in params and scan.search(patterns['hplc']):
             params['injection_volume'] = 20.0  # Common injection volume
         
         # Default potency if not found
         if 'potency' not in params:
-            potency_match = re.search(r'(?:assay|purity|potency)[\s:]*(\d+\.?\d*)\s*%?', text, re.IGNORECASE)
+            potency_match = scan.search(patterns['potency'])
             if potency_match:
                 try:
                     params['potency'] = float(potency_match.group(1))
@@ -352,32 +385,21 @@ class MethodExtractionService:
         
         return params
 
-    def _detect_instrument_type(self, text: str) -> Optional[str]:
+    def _detect_instrument_type(self, scan: TextScan) -> Optional[str]:
         """Detect instrument type from PDF content"""
-        text_lower = text.lower()
-        
         # Score each instrument type based on pattern matches
         instrument_scores = {}
         
         for instrument_type, patterns in self.instrument_type_patterns.items():
             score = 0
             for pattern in patterns:
-                matches = re.findall(pattern, text_lower, re.IGNORECASE)
-                score += len(matches)
+                score += scan.count(pattern)
             
             # Special scoring for titration (very specific patterns)
             if instrument_type == 'Titration':
                 # Look for specific titration keywords
-                titration_keywords = [
-                    r'(?:by titration)',
-                    r'(?:weigh.*?titrate)',
-                    r'(?:each ml.*?equivalent)',
-                    r'(?:vs|volumetric solution)',
-                    r'(?:indicator)',
-                    r'(?:endpoint)'
-                ]
-                for keyword in titration_keywords:
-                    if re.search(keyword, text_lower):
+                for keyword in self.titration_keywords:
+                    if scan.search(keyword):
                         score += 2  # Higher weight for titration-specific terms
             
             instrument_scores[instrument_type] = score
@@ -390,22 +412,21 @@ class MethodExtractionService:
         
         return None
 
-    def _extract_validation_params(self, text: str) -> Dict[str, any]:
+    def _extract_validation_params(self, scan: TextScan) -> Dict[str, any]:
         """Extract validation parameters"""
         params = {}
         
         for param_name, pattern in self.validation_patterns.items():
-            if re.search(pattern, text, re.IGNORECASE):
+            value = scan.first(pattern)
+            if value is not None:
                 params[param_name] = True
                 
                 # Try to extract numeric values for quantitative parameters
                 if param_name in ['precision', 'linearity', 'accuracy']:
-                    matches = re.findall(pattern, text, re.IGNORECASE)
-                    if matches:
-                        try:
-                            params[f"{param_name}_value"] = float(matches[0])
-                        except ValueError:
-                            pass
+                    try:
+                        params[f"{param_name}_value"] = float(value)
+                    except ValueError:
+                        pass
         
         return params
 
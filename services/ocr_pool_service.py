@@ -0,0 +1,61 @@
+"""
+OCR Pool - parallel per-page OCR for scanned PDFs.
+
+Low-density pages are rendered and OCRed by services.page_pool_service
+workers. This module imports only pdfplumber and pytesseract so spawned
+workers start quickly.
+"""
+
+import os
+import time
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import pdfplumber
+
+from services.page_pool_service import run_page_jobs
+
+try:
+    import pytesseract
+except Exception:
+    pytesseract = None
+
+logger = logging.getLogger(__name__)
+
+OCR_RESOLUTION = 200
+# Pages with less native text than this are OCRed
+OCR_MIN_CHARS = 60
+OCR_WORKERS = int(os.getenv('PVP_OCR_WORKERS', str(min(4, os.cpu_count() or 1))))
+OCR_TIME_BUDGET_SECONDS = float(os.getenv('PVP_OCR_TIME_BUDGET', '180'))
+
+
+def ocr_page(pdf_path: str, page_number: int, resolution: int = OCR_RESOLUTION,
+             tesseract_cmd: Optional[str] = None) -> Tuple[int, str]:
+    """OCR a single 1-based page"""
+    if tesseract_cmd:
+        pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+    with pdfplumber.open(pdf_path) as pdf:
+        pil_img = pdf.pages[page_number - 1].to_image(resolution=resolution).original
+    return page_number, pytesseract.image_to_string(pil_img)
+
+
+def ocr_pages(pdf_path: str, page_numbers: List[int], workers: Optional[int] = None,
+              time_budget: Optional[float] = None, resolution: int = OCR_RESOLUTION,
+              tesseract_cmd: Optional[str] = None) -> Tuple[Dict[int, str], List[int]]:
+    """
+    OCR ``page_numbers`` and return ``(texts_by_page, truncated_pages)``;
+    see ``run_page_jobs`` for the time budget.
+    """
+    workers = OCR_WORKERS if workers is None else workers
+    time_budget = OCR_TIME_BUDGET_SECONDS if time_budget is None else time_budget
+    if not pytesseract or not page_numbers:
+        return {}, []
+
+    start = time.monotonic()
+    results, truncated = run_page_jobs(
+        ocr_page, pdf_path, [(page_num, resolution, tesseract_cmd) for page_num in page_numbers],
+        workers, time_budget, label='OCR'
+    )
+    logger.info("OCR used on %d/%d low-density pages in %.1fs",
+                len(results), len(page_numbers), time.monotonic() - start)
+    return results, truncated
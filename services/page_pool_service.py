@@ -0,0 +1,71 @@
+"""
+Page Pool - bounded per-page jobs for PDF ingestion.
+
+The OCR and Camelot stages both run one job per page in worker processes,
+bounded by a concurrency limit and a per-document time budget. Short
+documents run inline. This module imports only the standard library so
+spawned workers start quickly.
+"""
+
+import time
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Below this many pages the worker start-up cost outweighs the parallelism
+POOL_MIN_PAGES = 3
+
+
+def run_page_jobs(fn: Callable[..., Tuple[int, Any]], pdf_path: str, items: Sequence[Tuple],
+                  workers: int, budget: float, label: str = 'Page job') -> Tuple[Dict[int, Any], List[int]]:
+    """
+    Call ``fn(pdf_path, *item)`` for each of ``items`` and return
+    ``(results_by_page, truncated_pages)``.
+
+    Each item starts with its 1-based page number and ``fn`` returns
+    ``(page_number, result)``; it must be a module-level function so spawned
+    workers can import it. Pages still unfinished when ``budget`` seconds run
+    out are returned in ``truncated_pages`` instead of being waited on; pages
+    whose job raised are in neither.
+    """
+    results: Dict[int, Any] = {}
+    truncated: List[int] = []
+    start = time.monotonic()
+
+    if not items:
+        return results, truncated
+
+    if workers <= 1 or len(items) < POOL_MIN_PAGES:
+        for item in items:
+            if time.monotonic() - start > budget:
+                truncated.append(item[0])
+                continue
+            try:
+                _, results[item[0]] = fn(pdf_path, *item)
+            except Exception as e:
+                logger.debug("%s failed on page %d: %s", label, item[0], e)
+    else:
+        # spawn: gunicorn threads make fork unsafe
+        executor = ProcessPoolExecutor(max_workers=min(workers, len(items)),
+                                       mp_context=multiprocessing.get_context('spawn'))
+        futures = {executor.submit(fn, pdf_path, *item): item[0] for item in items}
+        try:
+            for future in as_completed(futures, timeout=budget):
+                page_num = futures[future]
+                try:
+                    _, results[page_num] = future.result()
+                except Exception as e:
+                    logger.debug("%s failed on page %d: %s", label, page_num, e)
+        except FuturesTimeoutError:
+            truncated = sorted(page_num for future, page_num in futures.items() if not future.done())
+        finally:
+            # Pages already running finish in the background; queued ones are dropped
+            executor.shutdown(wait=not truncated, cancel_futures=True)
+
+    if truncated:
+        logger.warning("%s time budget (%.0fs) exhausted; %d pages left unfinished: %s",
+                       label, budget, len(truncated), truncated)
+    return results, truncated
@@ -0,0 +1,344 @@
+"""
+Page Text Store - per-page text, tables and OCR output, parsed once per file.
+
+Every extraction run re-opened the source PDF and re-ran pdfplumber's page
+layout (and Tesseract for scanned pages), even when the same file had been
+processed before. ``ingest_document`` parses a document once and saves, for
+every page, the text, the OCR text of low-density pages, the page size and,
+when Camelot is installed (the only reader of the prefilter score), the
+pdfplumber tables and table prefilter score. Without Camelot the cold parse
+is text only; readers extract a page's tables on demand. Entries are keyed
+by the SHA-256 of the file bytes, so a renamed or re-uploaded copy is served
+from the same entry.
+
+One file per document under ``PAGE_STORE_DIR``:
+
+  - a fixed prefix: magic, format version, codec, flags, page count
+  - a fixed-size entry per page: frame offset, frame length, width, height
+  - one independently compressed JSON frame per page
+
+Reading pages ``a..b`` decompresses only those frames, so loading a page
+range costs O(pages requested) regardless of document length. Frames are
+zstd-compressed when ``zstandard`` is installed and zlib-compressed
+otherwise; the codec is recorded per file.
+"""
+
+import os
+import json
+import struct
+import zlib
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+PAGE_STORE_ENABLED = os.getenv('PAGE_STORE_ENABLED', '1') == '1'
+PAGE_STORE_DIR = os.getenv('PAGE_STORE_DIR', os.path.join('.cache', 'page_text'))
+PAGE_STORE_ZSTD_LEVEL = int(os.getenv('PAGE_STORE_ZSTD_LEVEL', '3'))
+
+FORMAT_VERSION = 1
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+# Set when the low-density pages were OCRed (pytesseract available, within budget)
+FLAG_OCR = 1
+_MAGIC = b'PTXT'
+_PREFIX = struct.Struct('<4sHBBI')
+_ENTRY = struct.Struct('<QIdd')
+
+
+def hash_file(path: str) -> str:
+    """SHA-256 of a file's full contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@dataclass
+class StoredPage:
+    """Everything the extractors read from one page"""
+    number: int
+    text: str = ""
+    # None when the document was parsed without tables
+    tables: Optional[List[List[List[Optional[str]]]]] = field(default_factory=list)
+    # Tesseract text for low-density pages; None when the page was not OCRed
+    ocr: Optional[str] = None
+    width: float = 0.0
+    height: float = 0.0
+    # Table prefilter score (see table_detection_service.PageTableScore)
+    table_score: Optional[Dict[str, Any]] = None
+
+    def to_payload(self) -> Dict[str, Any]:
+        return {'text': self.text, 'tables': self.tables, 'ocr': self.ocr, 'table_score': self.table_score}
+
+
+def _compress(data: bytes, codec: int) -> bytes:
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level=PAGE_STORE_ZSTD_LEVEL).compress(data)
+    return zlib.compress(data, 6)
+
+
+def _decompress(data: bytes, codec: int) -> bytes:
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+class StoredDocument:
+    """
+    An open store entry. Page sizes are read on open; page contents are
+    decompressed only when asked for.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._lock = threading.Lock()
+        try:
+            magic, version, self.codec, flags, self.page_count = _PREFIX.unpack(self._file.read(_PREFIX.size))
+            self.ocr_done = bool(flags & FLAG_OCR)
+            if magic != _MAGIC or version != FORMAT_VERSION:
+                raise ValueError(f"not a version {FORMAT_VERSION} page store entry")
+            if self.codec == CODEC_ZSTD and zstandard is None:
+                raise ValueError("entry is zstd-compressed and zstandard is not installed")
+            table = self._file.read(_ENTRY.size * self.page_count)
+            self._entries = [_ENTRY.unpack_from(table, i * _ENTRY.size) for i in range(self.page_count)]
+        except Exception:
+            self._file.close()
+            raise
+
+    def __enter__(self) -> 'StoredDocument':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self._file.close()
+
+    def page_size(self, number: int) -> Tuple[float, float]:
+        """(width, height) of a 1-based page"""
+        _, _, width, height = self._entries[number - 1]
+        return width, height
+
+    def page(self, number: int) -> StoredPage:
+        """Decompress one 1-based page"""
+        offset, length, width, height = self._entries[number - 1]
+        with self._lock:
+            self._file.seek(offset)
+            frame = self._file.read(length)
+        payload = json.loads(_decompress(frame, self.codec))
+        return StoredPage(number=number, width=width, height=height, **payload)
+
+    def pages(self, first: int = 1, last: Optional[int] = None) -> List[StoredPage]:
+        """Pages ``first``..``last`` (1-based, inclusive; clipped to the document)"""
+        last = self.page_count if last is None else min(last, self.page_count)
+        return [self.page(number) for number in range(max(first, 1), last + 1)]
+
+
+class PageTextStore:
+    """Directory of per-document page store entries, keyed by file content hash"""
+
+    def __init__(self, root: str = PAGE_STORE_DIR):
+        self.root = root
+        self.codec = CODEC_ZSTD if zstandard is not None else CODEC_ZLIB
+
+    def path_for(self, content_hash: str) -> str:
+        return os.path.join(self.root, content_hash[:2], f"{content_hash}.ptx")
+
+    def has(self, content_hash: str) -> bool:
+        return os.path.exists(self.path_for(content_hash))
+
+    def open(self, content_hash: str) -> Optional[StoredDocument]:
+        """The stored document, or None when there is no usable entry"""
+        path = self.path_for(content_hash)
+        if not os.path.exists(path):
+            return None
+        try:
+            return StoredDocument(path)
+        except Exception as e:
+            logger.warning("Ignoring unreadable page store entry %s: %s", path, e)
+            return None
+
+    def load_pages(self, content_hash: str, first: int = 1, last: Optional[int] = None) -> Optional[List[StoredPage]]:
+        """Pages ``first``..``last`` of a stored document, or None when it is not stored"""
+        stored = self.open(content_hash)
+        if stored is None:
+            return None
+        with stored:
+            return stored.pages(first, last)
+
+    def save(self, content_hash: str, pages: List[StoredPage], ocr_done: bool = False) -> str:
+        """Write (or replace) the entry for ``content_hash``; readers never see a partial file"""
+        path = self.path_for(content_hash)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        frames = [_compress(json.dumps(page.to_payload(), separators=(',', ':')).encode('utf-8'), self.codec)
+                  for page in pages]
+
+        offset = _PREFIX.size + _ENTRY.size * len(pages)
+        parts = [_PREFIX.pack(_MAGIC, FORMAT_VERSION, self.codec, FLAG_OCR if ocr_done else 0, len(pages))]
+        for page, frame in zip(pages, frames):
+            parts.append(_ENTRY.pack(offset, len(frame), page.width, page.height))
+            offset += len(frame)
+        parts.extend(frames)
+
+        partial_path = f"{path}.{os.getpid()}.{threading.get_ident()}.partial"
+        try:
+            with open(partial_path, 'wb') as f:
+                f.write(b''.join(parts))
+            os.replace(partial_path, path)
+        except BaseException:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+        return path
+
+    def delete(self, content_hash: str) -> bool:
+        try:
+            os.remove(self.path_for(content_hash))
+            return True
+        except FileNotFoundError:
+            return False
+
+
+_store: Optional[PageTextStore] = None
+_store_lock = threading.Lock()
+
+
+def get_page_text_store() -> Optional[PageTextStore]:
+    """Process-wide store, or None when PAGE_STORE_ENABLED is off"""
+    global _store
+    if not PAGE_STORE_ENABLED:
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = PageTextStore()
+    return _store
+
+
+def parse_pages(pdf_path: str, tables: bool = True) -> List[StoredPage]:
+    """
+    Text, size and (with ``tables``) tables and table score of every page of
+    ``pdf_path``, from one pdfplumber pass. Without ``tables`` the pages carry
+    ``tables=None`` and no score.
+    """
+    # Imported here: the store itself is read by modules that must import quickly
+    import pdfplumber
+    from services.table_detection_service import score_page
+
+    pages: List[StoredPage] = []
+    with pdfplumber.open(pdf_path) as pdf:
+        for number, page in enumerate(pdf.pages, start=1):
+            try:
+                text = page.extract_text() or ""
+            except Exception as e:
+                logger.debug("Text extraction failed on page %d: %s", number, e)
+                text = ""
+            if not tables:
+                pages.append(StoredPage(number=number, text=text, tables=None,
+                                        width=float(page.width), height=float(page.height)))
+                continue
+            try:
+                found = page.find_tables()
+                page_tables = [table.extract() for table in found]
+            except Exception as e:
+                logger.debug("Table extraction failed on page %d: %s", number, e)
+                found, page_tables = None, []
+            score = score_page(page, number, found)
+            pages.append(StoredPage(
+                number=number, text=text, tables=page_tables, width=float(page.width), height=float(page.height),
+                table_score={'ruled_regions': [list(region) for region in score.ruled_regions],
+                             'aligned_rows': score.aligned_rows,
+                             'region_texts': score.region_texts,
+                             'unscored': score.unscored},
+            ))
+    return pages
+
+
+def ocr_low_density_pages(pdf_path: str, pages: List[StoredPage],
+                          tesseract_cmd: Optional[str] = None) -> Tuple[bool, List[int]]:
+    """
+    OCR the low-density ``pages`` in place through the OCR pool and return
+    ``(ocr_done, truncated_pages)``; ``ocr_done`` is False when pytesseract
+    is missing or the time budget ran out.
+    """
+    from services.ocr_pool_service import OCR_MIN_CHARS, ocr_pages, pytesseract
+
+    if not pytesseract:
+        return False, []
+    low_density = [page.number for page in pages if len(page.text.strip()) < OCR_MIN_CHARS]
+    if not low_density:
+        return True, []
+    ocr_texts, truncated = ocr_pages(pdf_path, low_density, tesseract_cmd=tesseract_cmd)
+    for number, ocr_text in ocr_texts.items():
+        pages[number - 1].ocr = ocr_text
+    return not truncated, truncated
+
+
+def ingest_document(pdf_path: str, store: Optional[PageTextStore] = None, content_hash: Optional[str] = None,
+                    ocr: bool = True, tesseract_cmd: Optional[str] = None,
+                    tables: Optional[bool] = None) -> Tuple[List[StoredPage], List[int]]:
+    """
+    All pages of ``pdf_path`` and the pages OCR did not reach, from the
+    store when the file was seen before, otherwise parsed and saved.
+
+    With ``ocr`` the low-density pages are OCRed, including on an entry
+    first stored without OCR. ``tables`` (default: whether Camelot is
+    installed) adds the pdfplumber tables and table scores; an entry stored
+    without them is re-parsed once when they are asked for. ``store``
+    defaults to the process-wide store. Runs whose OCR ran out of time are
+    not saved, so a later run can complete them.
+    """
+    if tables is None:
+        from services.table_detection_service import CAMELOT_AVAILABLE
+        tables = CAMELOT_AVAILABLE
+    store = store or get_page_text_store()
+    if store is None:
+        pages = parse_pages(pdf_path, tables=tables)
+        _, truncated = ocr_low_density_pages(pdf_path, pages, tesseract_cmd) if ocr else (False, [])
+        return pages, truncated
+
+    content_hash = content_hash or hash_file(pdf_path)
+    stored = store.open(content_hash)
+    if stored is not None:
+        with stored:
+            pages, ocr_done = stored.pages(), stored.ocr_done
+        missing_tables = tables and any(page.tables is None for page in pages)
+        if missing_tables:
+            # Stored by a caller that did not need tables; text and OCR are kept
+            for page, parsed in zip(pages, parse_pages(pdf_path, tables=True)):
+                page.tables, page.table_score = parsed.tables, parsed.table_score
+        elif ocr_done or not ocr:
+            return pages, []
+        truncated = []
+        if ocr and not ocr_done:
+            # Stored by a caller that did not need OCR; the parse is reused
+            ocr_done, truncated = ocr_low_density_pages(pdf_path, pages, tesseract_cmd)
+        if missing_tables or ocr_done:
+            _save(store, content_hash, pages, ocr_done, pdf_path)
+        return pages, truncated
+
+    pages = parse_pages(pdf_path, tables=tables)
+    ocr_done, truncated = ocr_low_density_pages(pdf_path, pages, tesseract_cmd) if ocr else (False, [])
+    if truncated:
+        logger.info("Not storing %s: OCR left %d pages unread", pdf_path, len(truncated))
+    else:
+        _save(store, content_hash, pages, ocr_done, pdf_path)
+    return pages, truncated
+
+
+def _save(store: PageTextStore, content_hash: str, pages: List[StoredPage], ocr_done: bool, pdf_path: str):
+    try:
+        store.save(content_hash, pages, ocr_done)
+    except OSError as e:
+        logger.warning("Could not save page store entry for %s: %s", pdf_path, e)
@@ -0,0 +1,297 @@
+"""
+Pattern Scan Service - one keyword pass, then precise regexes at candidate positions.
+
+The method extractors run dozens of case-insensitive regexes (instrument
+parameters, concentrations, validation terms, instrument detection) over the
+full text of an uploaded method PDF, and ``re`` has no fast path for
+IGNORECASE, so every pattern costs a full scan of the text.
+
+Almost all of these patterns start with a keyword alternation, e.g.
+``(?:flow rate|flowrate|flow)[\\s:]*...``, so any match must begin where one
+of those keywords ("anchors") occurs. A ``PatternSet`` extracts the anchors
+of every pattern and compiles them into a single trie-shaped regex; scanning
+a text runs that regex once over the lowercased text to record where each
+anchor starts. A pattern is then only tried (``regex.match(text, pos)``) at
+the start positions of its own anchors, in text order, which yields exactly
+the matches ``re.finditer`` would, in the same order.
+
+Patterns without a literal prefix, or whose prefix is a single letter (e.g.
+``(?:absorbance|abs|A)``, which would make every "a" a candidate), are run
+directly, as are texts containing characters IGNORECASE folds differently
+from ``str.lower()``.
+"""
+
+import re
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# IGNORECASE equates these with "i"/"s", but str.lower() leaves them alone
+# ("İ" lowers to two characters, which the length check catches)
+_FOLD_EXCEPTIONS = 'ıſ'
+_METACHARS = set('\\.^$*+?{}[]|()')
+
+
+def _split_alternatives(pattern: str) -> List[str]:
+    """Top-level ``|`` alternatives of a pattern"""
+    alternatives, current, depth, i = [], [], 0, 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '\\':
+            current.append(pattern[i:i + 2])
+            i += 2
+            continue
+        if char == '[':
+            end = i + 1
+            if pattern[end:end + 1] == '^':
+                end += 1
+            if pattern[end:end + 1] == ']':
+                end += 1
+            while end < len(pattern) and pattern[end] != ']':
+                end += 2 if pattern[end] == '\\' else 1
+            current.append(pattern[i:end + 1])
+            i = end + 1
+            continue
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        if char == '|' and depth == 0:
+            alternatives.append(''.join(current))
+            current = []
+        else:
+            current.append(char)
+        i += 1
+    alternatives.append(''.join(current))
+    return alternatives
+
+
+def _group_end(pattern: str) -> int:
+    """Index of the ``)`` closing the group that opens at index 0"""
+    depth, i = 0, 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '\\':
+            i += 2
+            continue
+        if char == '[':
+            i += 1
+            while i < len(pattern) and pattern[i] != ']':
+                i += 2 if pattern[i] == '\\' else 1
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+            if depth == 0:
+                return i
+        i += 1
+    return -1
+
+
+def leading_literals(pattern: str) -> Optional[List[str]]:
+    """
+    Literal strings one of which every match of ``pattern`` starts with.
+
+    None when some alternative has no literal prefix (character class,
+    escape, optional group, lookaround, anchor...), in which case the
+    pattern cannot be prefiltered.
+    """
+    literals: List[str] = []
+    for alternative in _split_alternatives(pattern):
+        if alternative.startswith('('):
+            end = _group_end(alternative)
+            if end == -1:
+                return None
+            inner = alternative[1:end]
+            if inner.startswith('?:'):
+                inner = inner[2:]
+            elif inner.startswith('?P<'):
+                inner = inner[inner.index('>') + 1:]
+            elif inner.startswith('?'):
+                return None
+            if alternative[end + 1:end + 2] in ('?', '*', '{'):
+                return None
+            nested = leading_literals(inner)
+            if not nested:
+                return None
+            literals.extend(nested)
+            continue
+
+        prefix = []
+        for char in alternative:
+            if char in _METACHARS:
+                # The last literal is optional under ?, * and {m,n}
+                if char in '?*{' and prefix:
+                    prefix.pop()
+                break
+            prefix.append(char)
+        if not prefix:
+            return None
+        literals.append(''.join(prefix))
+    return literals
+
+
+def _trie_regex(words: Iterable[str]) -> str:
+    """Regex matching the longest of ``words`` at a position, factored as a trie"""
+    trie: Dict[str, dict] = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node: Dict[str, dict]) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return f'(?:{body})?' if '' in node else body
+
+    return build(trie)
+
+
+def _findall_item(match: re.Match):
+    """The value ``re.findall`` would produce for ``match``"""
+    groups = match.re.groups
+    if groups == 0:
+        return match.group(0)
+    if groups == 1:
+        value = match.group(1)
+        return '' if value is None else value
+    return tuple('' if value is None else value for value in match.groups())
+
+
+class PatternSet:
+    """
+    A fixed set of regexes sharing one keyword prefilter.
+
+    Compiled on first ``scan`` so importing a module that defines one stays
+    cheap. Patterns not registered up front can still be used with a scan;
+    they are compiled on demand and run directly.
+    """
+
+    def __init__(self, patterns: Iterable[str], flags: int = re.IGNORECASE):
+        self.patterns = list(dict.fromkeys(patterns))
+        self.flags = flags
+        self._fold = bool(flags & re.IGNORECASE)
+        # Whitespace in a VERBOSE pattern is not literal, so its prefix cannot be read off
+        self._anchored = not flags & re.VERBOSE
+        self._entries: Dict[str, Tuple[re.Pattern, Optional[List[str]]]] = {}
+        self._prefilter: Optional[re.Pattern] = None
+        self._closure: Dict[str, List[str]] = {}
+        self._compiled = False
+        self._lock = threading.Lock()
+
+    def _compile(self):
+        if self._compiled:
+            return
+        with self._lock:
+            if self._compiled:
+                return
+            anchors_seen = set()
+            for pattern in self.patterns:
+                anchors = leading_literals(pattern) if self._anchored else None
+                if anchors is not None:
+                    anchors = sorted({anchor.lower() if self._fold else anchor for anchor in anchors})
+                    # A single ASCII letter or digit would make a large share of the text a candidate
+                    if any(len(anchor) == 1 and anchor.isascii() and anchor.isalnum() for anchor in anchors):
+                        anchors = None
+                    else:
+                        anchors_seen.update(anchors)
+                self._entries[pattern] = (re.compile(pattern, self.flags), anchors)
+            if anchors_seen:
+                self._prefilter = re.compile(_trie_regex(anchors_seen))
+                # The prefilter reports the longest anchor at a position; the
+                # anchors that are its prefixes start there too
+                self._closure = {anchor: [other for other in anchors_seen if anchor.startswith(other)]
+                                 for anchor in anchors_seen}
+            self._compiled = True
+
+    def entry(self, pattern: str) -> Tuple[re.Pattern, Optional[List[str]]]:
+        """(compiled regex, anchors or None) for ``pattern``"""
+        entry = self._entries.get(pattern)
+        if entry is None:
+            entry = (re.compile(pattern, self.flags), None)
+            self._entries[pattern] = entry
+        return entry
+
+    def scan(self, text: str, indexed: bool = True) -> 'TextScan':
+        """
+        Index ``text`` for this pattern set.
+
+        ``indexed=False`` skips the prefilter, so every lookup runs its
+        regex over the whole text (the behaviour the prefilter must match).
+        """
+        self._compile()
+        positions = None
+        if indexed and self._prefilter is not None:
+            haystack = text.lower() if self._fold else text
+            if len(haystack) == len(text) and not (self._fold and any(c in text for c in _FOLD_EXCEPTIONS)):
+                positions = self._anchor_positions(haystack)
+        return TextScan(self, text, positions)
+
+    def _anchor_positions(self, haystack: str) -> Dict[str, List[int]]:
+        positions: Dict[str, List[int]] = {}
+        search = self._prefilter.search
+        match = search(haystack)
+        while match:
+            start = match.start()
+            for anchor in self._closure[match.group()]:
+                positions.setdefault(anchor, []).append(start)
+            # Restart one character on so anchors overlapping this one are found too
+            match = search(haystack, start + 1)
+        return positions
+
+
+class TextScan:
+    """One text indexed by a ``PatternSet``; lookups mirror the ``re`` module functions"""
+
+    def __init__(self, pattern_set: PatternSet, text: str, positions: Optional[Dict[str, List[int]]]):
+        self.text = text
+        self.indexed = positions is not None
+        self._set = pattern_set
+        self._positions = positions
+        self._candidates: Dict[str, List[int]] = {}
+
+    def candidates(self, pattern: str) -> Optional[List[int]]:
+        """Positions where a match of ``pattern`` may start; None if it is run directly"""
+        regex, anchors = self._set.entry(pattern)
+        if self._positions is None or anchors is None:
+            return None
+        candidates = self._candidates.get(pattern)
+        if candidates is None:
+            found = set()
+            for anchor in anchors:
+                found.update(self._positions.get(anchor, ()))
+            candidates = self._candidates[pattern] = sorted(found)
+        return candidates
+
+    def finditer(self, pattern: str) -> Iterator[re.Match]:
+        """Same matches, in the same order, as ``re.finditer(pattern, text, flags)``"""
+        regex, _ = self._set.entry(pattern)
+        candidates = self.candidates(pattern)
+        if candidates is None:
+            yield from regex.finditer(self.text)
+            return
+        end = 0
+        for position in candidates:
+            if position < end:
+                continue
+            match = regex.match(self.text, position)
+            if match:
+                yield match
+                # Matches are never empty: they start with a non-empty anchor
+                end = match.end()
+
+    def search(self, pattern: str) -> Optional[re.Match]:
+        return next(self.finditer(pattern), None)
+
+    def findall(self, pattern: str) -> List:
+        return [_findall_item(match) for match in self.finditer(pattern)]
+
+    def first(self, pattern: str):
+        """``re.findall(...)[0]``, or None when there is no match, without finding the rest"""
+        match = self.search(pattern)
+        return None if match is None else _findall_item(match)
+
+    def count(self, pattern: str) -> int:
+        return sum(1 for _ in self.finditer(pattern))
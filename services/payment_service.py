@@ -6,7 +6,7 @@ import stripe
 import logging
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
-from models import User, Subscription, Payment, SubscriptionPlan, Document
+from models import User, Subscription, Payment, SubscriptionPlan
 from database import db
 from utils.helpers import log_activity
 
@@ -320,18 +320,10 @@ class SubscriptionManager:
     @staticmethod
     def get_usage_stats(user: User) -> Dict[str, Any]:
         """Get current usage statistics for the user"""
-        from datetime import datetime
-        from sqlalchemy import extract
+        from services.usage_snapshot_service import get_usage_snapshot
         
-        current_month = datetime.now().month
-        current_year = datetime.now().year
-        
-        # Count documents created this month
-        monthly_docs = Document.query.filter(
-            Document.user_id == user.id,
-            extract('month', Document.created_at) == current_month,
-            extract('year', Document.created_at) == current_year
-        ).count()
+        # Documents created this month (cached snapshot, range query on created_at)
+        monthly_docs = get_usage_snapshot(user.id)['monthly_documents']
         
         limits = user.get_plan_limits()
         
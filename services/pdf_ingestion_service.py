@@ -0,0 +1,376 @@
+"""
+PDF Ingestion Context - open a source document once, parse each page once.
+
+Every extractor in the STP/MFR pipeline used to call ``pdfplumber.open`` on
+its own and re-run the page layout. ``PDFIngestionContext`` keeps a single
+open handle per document and memoizes per-page text, words and tables so
+downstream stages read from the same page model.
+
+When the file has been ingested into the page store (see
+page_text_store_service), page text and tables are read from there and the
+PDF is only opened for what the store does not keep (words, raw pages,
+rasterization).
+
+Scanned pages are rasterized lazily: only the requested page range is
+rendered, one page per poppler call, at a DPI picked from the page size and
+bounded by a per-job image memory budget. Pages rendered to be read (OCR or
+a vision model) never go below the OCR resolution.
+"""
+
+import os
+import time
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+from services.page_text_store_service import PageTextStore, StoredDocument, get_page_text_store, hash_file
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Rasterization defaults (200 DPI was the old fixed value)
+RASTER_MAX_DPI = int(os.environ.get('RASTER_MAX_DPI', '200'))
+RASTER_MIN_DPI = int(os.environ.get('RASTER_MIN_DPI', '100'))
+RASTER_TARGET_LONG_EDGE_PX = int(os.environ.get('RASTER_TARGET_LONG_EDGE_PX', '2000'))
+RASTER_MEMORY_BUDGET_MB = int(os.environ.get('RASTER_MEMORY_BUDGET_MB', '96'))
+
+
+@dataclass
+class IngestionStats:
+    """Counters used by the ingestion benchmark"""
+    opens: int = 0
+    page_layouts: int = 0
+    text_calls: int = 0
+    table_calls: int = 0
+    word_calls: int = 0
+    cache_hits: int = 0
+    store_pages: int = 0
+
+    def to_dict(self) -> Dict[str, int]:
+        return {
+            "opens": self.opens,
+            "page_layouts": self.page_layouts,
+            "text_calls": self.text_calls,
+            "table_calls": self.table_calls,
+            "word_calls": self.word_calls,
+            "cache_hits": self.cache_hits,
+            "store_pages": self.store_pages,
+        }
+
+
+@dataclass
+class RasterStats:
+    """Per-document rasterization metrics"""
+    pages: int = 0
+    skipped_for_budget: int = 0
+    image_bytes: int = 0
+    peak_rss_mb: float = 0.0
+    dpis: List[int] = field(default_factory=list)
+    page_seconds: List[float] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        total = sum(self.page_seconds)
+        return {
+            "pages": self.pages,
+            "skipped_for_budget": self.skipped_for_budget,
+            "image_mb": round(self.image_bytes / (1024 * 1024), 2),
+            "peak_rss_mb": round(self.peak_rss_mb, 1),
+            "dpis": self.dpis,
+            "seconds_total": round(total, 3),
+            "seconds_per_page": round(total / self.pages, 3) if self.pages else 0.0,
+        }
+
+
+def adaptive_dpi(width_pt: float, height_pt: float,
+                 target_long_edge_px: int = RASTER_TARGET_LONG_EDGE_PX,
+                 min_dpi: int = RASTER_MIN_DPI, max_dpi: int = RASTER_MAX_DPI) -> int:
+    """DPI that renders the page's long edge at roughly ``target_long_edge_px``"""
+    long_edge_pt = max(width_pt, height_pt)
+    if long_edge_pt <= 0:
+        return max_dpi
+    dpi = int(target_long_edge_px * 72 / long_edge_pt)
+    return max(min_dpi, min(max_dpi, dpi))
+
+
+def _peak_rss_mb() -> float:
+    if resource is None:
+        return 0.0
+    # ru_maxrss is KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+@dataclass
+class PageModel:
+    """Memoized view of a single page"""
+    number: int
+    text: Optional[str] = None
+    words: Optional[List[Dict[str, Any]]] = None
+    tables: Optional[List[List[List[Optional[str]]]]] = None
+    width: float = 0.0
+    height: float = 0.0
+    layout_done: bool = field(default=False, repr=False)
+
+
+class PDFIngestionContext:
+    """
+    Per-document ingestion context shared by all extraction stages.
+
+    Use as a context manager:
+
+        with PDFIngestionContext(pdf_path) as doc:
+            text = doc.page_text(0)
+            tables = doc.page_tables(0)
+
+    Plain text files (the mock STP/MFR inputs) are exposed as a single page.
+    ``store`` defaults to the process-wide page store.
+    """
+
+    def __init__(self, pdf_path: str, store: Optional[PageTextStore] = None):
+        self.pdf_path = str(pdf_path)
+        self.is_text_file = self.pdf_path.lower().endswith('.txt')
+        self.stats = IngestionStats()
+        self._pdf = None
+        self._store = store
+        self._stored: Optional[StoredDocument] = None
+        self._pages: Optional[List[PageModel]] = None
+        self._pypdf2_text: Optional[str] = None
+        self._content_hash: Optional[str] = None
+        self.raster_stats = RasterStats()
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+    def __enter__(self) -> "PDFIngestionContext":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        """Release the underlying pdfplumber handle"""
+        if self._stored is not None:
+            self._stored.close()
+            self._stored = None
+        if self._pdf is not None:
+            try:
+                self._pdf.close()
+            except Exception as e:
+                logger.debug("Error closing %s: %s", self.pdf_path, e)
+            self._pdf = None
+
+    def _open(self):
+        if self._pdf is None:
+            # Imported on first open: pdfminer is a large share of the PV pipeline's import time
+            import pdfplumber
+            self._pdf = pdfplumber.open(self.pdf_path)
+            self.stats.opens += 1
+        return self._pdf
+
+    @property
+    def content_hash(self) -> str:
+        """SHA-256 of the full file bytes, computed once"""
+        if self._content_hash is None:
+            self._content_hash = hash_file(self.pdf_path)
+        return self._content_hash
+
+    def _open_stored(self) -> Optional[StoredDocument]:
+        store = self._store or get_page_text_store()
+        if store is None:
+            return None
+        try:
+            return store.open(self.content_hash)
+        except OSError as e:
+            logger.debug("Page store unavailable for %s: %s", self.pdf_path, e)
+            return None
+
+    # ------------------------------------------------------------------
+    # Page model
+    # ------------------------------------------------------------------
+    @property
+    def pages(self) -> List[PageModel]:
+        if self._pages is None:
+            if self.is_text_file:
+                with open(self.pdf_path, 'r', encoding='utf-8') as f:
+                    content = f.read()
+                self.stats.opens += 1
+                self._pages = [PageModel(number=1, text=content, words=[], tables=[], layout_done=True)]
+            else:
+                self._stored = self._open_stored()
+                if self._stored is not None:
+                    sizes = [self._stored.page_size(number) for number in range(1, self._stored.page_count + 1)]
+                    self._pages = [
+                        PageModel(number=i + 1, width=width, height=height)
+                        for i, (width, height) in enumerate(sizes)
+                    ]
+                else:
+                    pdf = self._open()
+                    self._pages = [
+                        PageModel(number=i + 1, width=float(p.width), height=float(p.height))
+                        for i, p in enumerate(pdf.pages)
+                    ]
+        return self._pages
+
+    def _load_stored(self, page_model: PageModel) -> bool:
+        """Fill text and tables from the page store; False when the page must be parsed"""
+        if self._stored is None:
+            return False
+        try:
+            stored = self._stored.page(page_model.number)
+        except Exception as e:
+            logger.warning("Page store read failed for %s page %d: %s", self.pdf_path, page_model.number, e)
+            self._stored = None
+            return False
+        page_model.text = stored.text
+        page_model.tables = stored.tables
+        self.stats.store_pages += 1
+        return True
+
+    @property
+    def page_count(self) -> int:
+        return len(self.pages)
+
+    def _plumber_page(self, index: int):
+        page_model = self.pages[index]
+        page = self._open().pages[index]
+        if not page_model.layout_done:
+            page_model.layout_done = True
+            self.stats.page_layouts += 1
+        return page
+
+    def page_text(self, index: int) -> str:
+        """Extracted text for a 0-based page index"""
+        page_model = self.pages[index]
+        if page_model.text is not None:
+            self.stats.cache_hits += 1
+            return page_model.text
+        if self._load_stored(page_model):
+            return page_model.text
+        self.stats.text_calls += 1
+        try:
+            page_model.text = self._plumber_page(index).extract_text() or ""
+        except Exception as e:
+            logger.debug("Text extraction failed on page %d: %s", index + 1, e)
+            page_model.text = ""
+        return page_model.text
+
+    def page_words(self, index: int) -> List[Dict[str, Any]]:
+        """Positioned words for a 0-based page index"""
+        page_model = self.pages[index]
+        if page_model.words is not None:
+            self.stats.cache_hits += 1
+            return page_model.words
+        self.stats.word_calls += 1
+        try:
+            page_model.words = self._plumber_page(index).extract_words() or []
+        except Exception as e:
+            logger.debug("Word extraction failed on page %d: %s", index + 1, e)
+            page_model.words = []
+        return page_model.words
+
+    def page_tables(self, index: int) -> List[List[List[Optional[str]]]]:
+        """Raw pdfplumber tables for a 0-based page index"""
+        page_model = self.pages[index]
+        if page_model.tables is not None:
+            self.stats.cache_hits += 1
+            return page_model.tables
+        # Entries stored without tables (no Camelot) leave them to be parsed here
+        if self._load_stored(page_model) and page_model.tables is not None:
+            return page_model.tables
+        self.stats.table_calls += 1
+        try:
+            page_model.tables = self._plumber_page(index).extract_tables() or []
+        except Exception as e:
+            logger.debug("Table extraction failed on page %d: %s", index + 1, e)
+            page_model.tables = []
+        return page_model.tables
+
+    def plumber_page(self, index: int):
+        """Underlying pdfplumber page, for stages that need raw objects"""
+        if self.is_text_file:
+            return None
+        return self._plumber_page(index)
+
+    # ------------------------------------------------------------------
+    # Rasterization
+    # ------------------------------------------------------------------
+    def iter_page_images(self, max_pages: int = 3, first_page: int = 1,
+                         memory_budget_mb: Optional[int] = None, for_ocr: bool = False) -> Iterator[Any]:
+        """
+        Yield PIL images for pages ``first_page``..``first_page + max_pages - 1``.
+
+        Each page is rendered on demand with its own DPI, at least
+        OCR_RESOLUTION when the text will be read from the image
+        (``for_ocr``). Rendering stops early once the decoded images would
+        exceed ``memory_budget_mb``.
+        """
+        if self.is_text_file:
+            return
+        from pdf2image import convert_from_path
+        from services.ocr_pool_service import OCR_RESOLUTION
+
+        min_dpi = max(RASTER_MIN_DPI, OCR_RESOLUTION) if for_ocr else RASTER_MIN_DPI
+
+        budget = (RASTER_MEMORY_BUDGET_MB if memory_budget_mb is None else memory_budget_mb) * 1024 * 1024
+        last_page = min(self.page_count, first_page + max_pages - 1)
+        stats = self.raster_stats
+
+        for number in range(first_page, last_page + 1):
+            page_model = self.pages[number - 1]
+            dpi = adaptive_dpi(page_model.width, page_model.height, min_dpi=min_dpi)
+            estimate = int(page_model.width * dpi / 72) * int(page_model.height * dpi / 72) * 3
+            if stats.pages and stats.image_bytes + estimate > budget:
+                stats.skipped_for_budget = last_page - number + 1
+                logger.info("Raster budget reached after %d pages of %s", stats.pages, self.pdf_path)
+                break
+
+            start = time.perf_counter()
+            rendered = convert_from_path(self.pdf_path, dpi=dpi, first_page=number, last_page=number)
+            if not rendered:
+                continue
+            image = rendered[0]
+            stats.page_seconds.append(time.perf_counter() - start)
+            stats.dpis.append(dpi)
+            stats.pages += 1
+            stats.image_bytes += image.width * image.height * len(image.getbands())
+            stats.peak_rss_mb = max(stats.peak_rss_mb, _peak_rss_mb())
+            yield image
+
+    # ------------------------------------------------------------------
+    # Whole-document helpers
+    # ------------------------------------------------------------------
+    def iter_text(self, max_pages: Optional[int] = None):
+        """Yield (page_number, text) for the first ``max_pages`` pages"""
+        count = self.page_count if max_pages is None else min(max_pages, self.page_count)
+        for i in range(count):
+            yield i + 1, self.page_text(i)
+
+    def full_text(self, separator: str = "\n") -> str:
+        return separator.join(text for _, text in self.iter_text() if text)
+
+    def iter_tables(self):
+        """Yield (page_number, table) across the document"""
+        for i in range(self.page_count):
+            for table in self.page_tables(i):
+                yield i + 1, table
+
+    def pypdf2_text(self) -> str:
+        """Secondary text layer via PyPDF2, read once and memoized"""
+        if self._pypdf2_text is None:
+            self._pypdf2_text = ""
+            if self.is_text_file:
+                return self._pypdf2_text
+            try:
+                import PyPDF2
+                with open(self.pdf_path, 'rb') as f:
+                    self.stats.opens += 1
+                    reader = PyPDF2.PdfReader(f)
+                    self._pypdf2_text = "".join(
+                        (page.extract_text() or "") + "\n" for page in reader.pages
+                    )
+            except Exception as e:
+                logger.debug("PyPDF2 fallback failed for %s: %s", self.pdf_path, e)
+        return self._pypdf2_text
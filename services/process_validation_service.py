@@ -7,34 +7,50 @@ import os
 import json
 import re
 import io
-import pickle
+import sqlite3
 import hashlib
+import threading
+import time
 from datetime import datetime
-from typing import Dict, List, Tuple, Any, Optional, Union
+from typing import TYPE_CHECKING, BinaryIO, Dict, List, Tuple, Any, Optional
 from dataclasses import dataclass, field, asdict
 from enum import Enum
 import uuid
 from pathlib import Path
 import base64
-import PyPDF2
-from pdf2image import convert_from_path
-import pdfplumber
-import google.generativeai as genai
-from google.generativeai.types import HarmCategory, HarmBlockThreshold
-import PIL.Image
+import sys
+import importlib.util
+from contextlib import contextmanager
 from dotenv import load_dotenv
+from services.pdf_ingestion_service import PDFIngestionContext
+from services.llm_client_service import LLMClient, get_llm_metrics
+from services.document_classifier_service import classify_text, get_classifier_stats
+from services.chunked_extraction_service import map_chunks, merge_extractions, split_into_chunks
+
+if TYPE_CHECKING:
+    import PIL.Image
 
 # Load environment variables
 load_dotenv()
 
-# Try to import OCR libraries
-try:
-    import pytesseract
-    OCR_AVAILABLE = True
-except ImportError:
+# Heavy dependencies (google.generativeai, pdfplumber, PyPDF2, PIL) load on
+# first use so importing this module - and pv_routes with it - stays cheap;
+# test_import_time.py holds the budget.
+OCR_AVAILABLE = importlib.util.find_spec("pytesseract") is not None
+if not OCR_AVAILABLE:
     print("Warning: pytesseract not installed. OCR features disabled.")
-    OCR_AVAILABLE = False
-    pytesseract = None
+
+
+def _genai():
+    """google.generativeai, imported on first use"""
+    import google.generativeai as genai
+    return genai
+
+
+def _is_pil_image(content: Any) -> bool:
+    # PIL can only have produced ``content`` if it is already imported
+    image_module = sys.modules.get("PIL.Image")
+    return image_module is not None and isinstance(content, image_module.Image)
 
 # ==================== CONFIGURATION ====================
 
@@ -51,6 +67,8 @@ class Config:
     # Cache Configuration
     CACHE_DIR = ".cache"
     CACHE_ENABLED = True
+    CACHE_MAX_BYTES = int(os.getenv("EXTRACTION_CACHE_MAX_MB", "256")) * 1024 * 1024
+    CACHE_VERSION = "2"  # Bump when prompts/sanitizers change shape of cached results
     
     # Processing Configuration
     MAX_PAGES_FOR_OCR = 10
@@ -98,52 +116,193 @@ class Config:
 # ==================== CACHING SYSTEM ====================
 
 class CacheManager:
-    """Cache manager to avoid redundant API calls"""
+    """
+    Content-addressed extraction cache.
+    
+    Keys are SHA-256 digests of the full source (file bytes when known, otherwise
+    the complete content payload) plus the prompt, model and cache version.
+    Entries are stored as JSON in a single SQLite file so gunicorn threads and
+    pool worker processes can share it; the least recently used entries are
+    evicted once the total payload size exceeds ``max_bytes``.
+    """
     
-    def __init__(self, cache_dir: str = Config.CACHE_DIR):
+    def __init__(self, cache_dir: str = Config.CACHE_DIR, max_bytes: int = Config.CACHE_MAX_BYTES):
         self.cache_dir = cache_dir
-        os.makedirs(cache_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.db_path = os.path.join(cache_dir, "extraction_cache.db")
+        self.hits = 0
+        self.misses = 0
+        if Config.CACHE_ENABLED:
+            os.makedirs(cache_dir, exist_ok=True)
+            with self._connect() as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS entries (
+                        key TEXT PRIMARY KEY,
+                        document_type TEXT,
+                        data TEXT NOT NULL,
+                        size INTEGER NOT NULL,
+                        created_at REAL NOT NULL,
+                        last_access REAL NOT NULL
+                    )
+                """)
+                conn.execute("CREATE INDEX IF NOT EXISTS ix_entries_last_access ON entries (last_access)")
+                conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+    
+    @contextmanager
+    def _connect(self):
+        """Autocommit connection, closed on exit (``with sqlite3.connect()`` alone never closes it)"""
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
     
-    def get_cache_key(self, content: str, prompt: str) -> str:
-        """Generate cache key from content and prompt"""
-        combined = f"{content[:1000]}{prompt[:500]}"
-        return hashlib.md5(combined.encode()).hexdigest()
+    @staticmethod
+    def _update_with_content(digest, content: Any):
+        if isinstance(content, (list, tuple)):
+            for item in content:
+                CacheManager._update_with_content(digest, item)
+                digest.update(b"\x1e")
+        elif _is_pil_image(content):
+            digest.update(f"{content.mode}:{content.size}".encode())
+            digest.update(content.tobytes())
+        elif isinstance(content, bytes):
+            digest.update(content)
+        else:
+            digest.update(str(content).encode('utf-8', errors='replace'))
+    
+    def get_cache_key(self, content: Any, prompt: str, source_hash: Optional[str] = None) -> str:
+        """Generate cache key from the full source and prompt"""
+        digest = hashlib.sha256(f"{Config.CACHE_VERSION}|{Config.GEMINI_MODEL}".encode())
+        if source_hash:
+            digest.update(f"file:{source_hash}".encode())
+        else:
+            self._update_with_content(digest, content)
+        digest.update(b"\x00")
+        digest.update(prompt.encode('utf-8', errors='replace'))
+        return digest.hexdigest()
+    
+    def _bump(self, conn: sqlite3.Connection, counter: str):
+        conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (counter,)
+        )
     
     def get(self, cache_key: str, document_type: str = None) -> Optional[Dict]:
         """Get cached result"""
         if not Config.CACHE_ENABLED:
             return None
-            
-        cache_path = os.path.join(self.cache_dir, f"{cache_key}.pkl")
-        if os.path.exists(cache_path):
-            try:
-                with open(cache_path, 'rb') as f:
-                    cached = pickle.load(f)
-                    if document_type is None or cached.get('document_type') == document_type:
-                        age = datetime.now() - cached.get('timestamp', datetime.min)
-                        if age.days < 1:  # Cache valid for 1 day
-                            print(f"Using cached result for {document_type or 'unknown'}")
-                            return cached.get('data', {})
-            except Exception as e:
-                print(f"Cache read error: {e}")
+        
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT data, document_type FROM entries WHERE key = ?", (cache_key,)
+                ).fetchone()
+                if row and (document_type is None or row[1] == document_type):
+                    conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), cache_key))
+                    self._bump(conn, "hits")
+                    self.hits += 1
+                    print(f"Using cached result for {document_type or 'unknown'}")
+                    return json.loads(row[0])
+                self._bump(conn, "misses")
+                self.misses += 1
+        except Exception as e:
+            print(f"Cache read error: {e}")
         
         return None
     
     def set(self, cache_key: str, data: Dict, document_type: str = None):
-        """Cache result"""
+        """Cache result and evict least recently used entries beyond the size bound"""
         if not Config.CACHE_ENABLED:
             return
-            
-        cache_path = os.path.join(self.cache_dir, f"{cache_key}.pkl")
+        
         try:
-            with open(cache_path, 'wb') as f:
-                pickle.dump({
-                    'document_type': document_type,
-                    'data': data,
-                    'timestamp': datetime.now()
-                }, f)
+            payload = json.dumps(data, default=str)
+            now = time.time()
+            with self._connect() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO entries (key, document_type, data, size, created_at, last_access) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (cache_key, document_type, payload, len(payload), now, now)
+                    )
+                    self._evict(conn)
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
         except Exception as e:
             print(f"Cache write error: {e}")
+    
+    def _evict(self, conn: sqlite3.Connection):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY last_access").fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        if evicted:
+            conn.execute(
+                "INSERT INTO counters (name, value) VALUES ('evictions', ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + ?",
+                (evicted, evicted)
+            )
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters (across all processes) and current size"""
+        if not Config.CACHE_ENABLED:
+            return {"enabled": False}
+        with self._connect() as conn:
+            counters = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        hits, misses = counters.get("hits", 0), counters.get("misses", 0)
+        return {
+            "enabled": True,
+            "hits": hits,
+            "misses": misses,
+            "evictions": counters.get("evictions", 0),
+            "hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes
+        }
+
+# ==================== STAGE TIMING ====================
+
+class StageTimer:
+    """Accumulates wall time per pipeline stage (extract, classify, consensus, render, zip)"""
+    
+    def __init__(self, on_change=None):
+        self.on_change = on_change
+        self.timings: Dict[str, float] = {}
+        self._lock = threading.Lock()
+    
+    @contextmanager
+    def stage(self, name: str):
+        """Time a block; STP and MFR run in parallel, so durations are summed per stage"""
+        if self.on_change:
+            try:
+                self.on_change(name)
+            except Exception as e:
+                print(f"Stage callback error: {e}")
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.timings[name] = round(self.timings.get(name, 0.0) + elapsed, 3)
+    
+    def to_dict(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self.timings)
 
 # ==================== DATA SANITIZER ====================
 
@@ -341,289 +500,6 @@ class MFRData:
     yield_calculations: Dict[str, str] = field(default_factory=dict)
     raw_data: str = ""
 
-# ==================== DOCUMENT CLASSIFIER ====================
-
-class DocumentClassifier:
-    """Classify document type before extraction"""
-    
-    def __init__(self, api_key: str = None):
-        self.api_key = api_key or Config.GEMINI_API_KEY
-        genai.configure(api_key=self.api_key)
-        self.model = genai.GenerativeModel(Config.GEMINI_MODEL)
-        self.cache = CacheManager()
-    
-    def classify(self, content: str, filename: str = "") -> Dict[str, Any]:
-        """Classify document type and extract basic metadata"""
-        cache_key = self.cache.get_cache_key(content[:1000], "classification")
-        cached = self.cache.get(cache_key, "classification")
-        if cached:
-            return cached
-        
-        prompt = """
-        You are a pharmaceutical document classification system. Analyze the document and classify it.
-        
-        Document types:
-        - STP: Standard Testing Procedure (contains test methods, specifications, acceptance criteria)
-        - MFR: Master Formula Record (contains manufacturing steps, raw materials, batch size)
-        - BMR: Batch Manufacturing Record (batch-specific manufacturing record)
-        - PVP: Process Validation Protocol
-        - PVR: Process Validation Report
-        - SPEC: Specification document
-        - COA: Certificate of Analysis
-        - SOP: Standard Operating Procedure
-        - OTHER: Other document types
-        
-        Extract basic metadata and return JSON:
-        {
-            "document_type": "STP",
-            "confidence": 0.95,
-            "product_name": "Product name if found",
-            "product_code": "Product code if found (format: XX/XXX or XX/YYY/XXX)",
-            "version": "Document version",
-            "contains_tables": true/false,
-            "is_scanned": true/false (based on text quality),
-            "keywords_found": ["list", "of", "relevant", "keywords"]
-        }
-        
-        Document content (first 5000 chars):
-        """
-        
-        try:
-            response = self.model.generate_content(
-                [prompt, content[:5000]],
-                safety_settings={
-                    HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-                    HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-                    HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-                    HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE
-                }
-            )
-            
-            result = self._extract_json(response.text)
-            if result:
-                # Add filename to result
-                result["filename"] = filename
-                self.cache.set(cache_key, result, "classification")
-                return result
-        
-        except Exception as e:
-            print(f"Classification error: {e}")
-        
-        # Fallback classification based on content
-        return self._fallback_classify(content, filename)
-    
-    def _extract_json(self, text: str) -> Optional[Dict]:
-        """Extract JSON from text"""
-        try:
-            # Remove markdown code blocks
-            text = re.sub(r'```json\s*', '', text, flags=re.IGNORECASE)
-            text = re.sub(r'```', '', text)
-            
-            # Find JSON structure
-            start_idx = text.find('{')
-            end_idx = text.rfind('}')
-            
-            if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
-                json_str = text[start_idx:end_idx+1]
-                return json.loads(json_str)
-        except:
-            pass
-        return None
-    
-    def _fallback_classify(self, content: str, filename: str) -> Dict:
-        """Fallback classification using keywords"""
-        content_lower = content.lower()
-        
-        # Check for document type keywords
-        doc_type = "OTHER"
-        confidence = 0.5
-        
-        if any(keyword in content_lower for keyword in ["standard testing procedure", "stp", "test method", "specification"]):
-            doc_type = "STP"
-            confidence = 0.8
-        elif any(keyword in content_lower for keyword in ["master formula record", "mfr", "batch size", "manufacturing steps"]):
-            doc_type = "MFR"
-            confidence = 0.8
-        elif any(keyword in content_lower for keyword in ["batch manufacturing record", "bmr"]):
-            doc_type = "BMR"
-            confidence = 0.7
-        elif any(keyword in content_lower for keyword in ["process validation protocol", "pvp"]):
-            doc_type = "PVP"
-            confidence = 0.9
-        elif any(keyword in content_lower for keyword in ["process validation report", "pvr"]):
-            doc_type = "PVR"
-            confidence = 0.9
-        
-        # Check if scanned (low text density)
-        is_scanned = len(content.strip()) < Config.MIN_TEXT_LENGTH_FOR_OCR
-        
-        # Extract product code
-        product_code_match = re.search(r'([A-Z]{2,4}(?:/[A-Z]{2,4})?/\d{3})', content, re.IGNORECASE)
-        product_code = product_code_match.group(1) if product_code_match else ""
-        
-        return {
-            "document_type": doc_type,
-            "confidence": confidence,
-            "product_name": "",
-            "product_code": product_code,
-            "version": "",
-            "contains_tables": "table" in content_lower,
-            "is_scanned": is_scanned,
-            "keywords_found": [],
-            "filename": filename
-        }
-
-# ==================== CONSENSUS EXTRACTOR ====================
-
-class ConsensusExtractor:
-    """Multi-pass consensus extraction for reliability"""
-    
-    def __init__(self, model):
-        self.model = model
-        self.cache = CacheManager()
-    
-    def extract_with_consensus(self, content: Union[str, List[PIL.Image.Image]], 
-                              prompt: str, document_type: str, 
-                              passes: int = Config.CONSENSUS_PASSES) -> Dict[str, Any]:
-        """Run multiple extractions and select consensus"""
-        cache_key = self.cache.get_cache_key(str(content)[:1000], prompt)
-        cached = self.cache.get(cache_key, document_type)
-        if cached:
-            return cached
-        
-        results = []
-        
-        for i in range(passes):
-            try:
-                print(f"  Pass {i+1}/{passes}...")
-                
-                # Prepare content for this pass
-                submission = [prompt]
-                if isinstance(content, list):
-                    # Multimodal: Add images (limit to first few for speed)
-                    submission.extend(content[:3])
-                else:
-                    # Text only - use different chunks for each pass to get variety
-                    chunk_size = min(20000, len(content))
-                    start = (i * chunk_size) // passes
-                    end = ((i + 1) * chunk_size) // passes
-                    chunk = content[start:end] if len(content) > chunk_size else content
-                    submission.append(f"Document Text (Pass {i+1}):\n{chunk}")
-                
-                response = self.model.generate_content(
-                    submission,
-                    safety_settings={
-                        HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-                        HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-                        HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-                        HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE
-                    }
-                )
-                
-                extracted = self._extract_json(response.text)
-                if extracted:
-                    results.append(extracted)
-                    
-            except Exception as e:
-                print(f"    Pass {i+1} failed: {e}")
-        
-        # Get consensus result
-        if len(results) >= 2:
-            consensus_result = self._get_consensus(results)
-        elif results:
-            consensus_result = results[0]
-        else:
-            consensus_result = {}
-        
-        # Cache the result
-        self.cache.set(cache_key, consensus_result, document_type)
-        
-        return consensus_result
-    
-    def _get_consensus(self, results: List[Dict]) -> Dict:
-        """Get consensus from multiple extractions"""
-        if not results:
-            return {}
-        
-        if len(results) == 1:
-            return results[0]
-        
-        # Initialize consensus structure
-        consensus = {}
-        
-        # Get all unique keys
-        all_keys = set()
-        for result in results:
-            all_keys.update(result.keys())
-        
-        for key in all_keys:
-            values = []
-            for result in results:
-                if key in result:
-                    val = result[key]
-                    if val is not None and val != "":
-                        values.append(val)
-            
-            if not values:
-                continue
-            
-            # For lists, merge unique items
-            if isinstance(values[0], list):
-                merged_list = []
-                for val_list in values:
-                    if isinstance(val_list, list):
-                        merged_list.extend(val_list)
-                consensus[key] = list(dict.fromkeys(merged_list))  # Remove duplicates preserving order
-            
-            # For dicts, merge recursively
-            elif isinstance(values[0], dict):
-                dict_results = [v for v in values if isinstance(v, dict)]
-                if dict_results:
-                    # Get consensus for each subkey
-                    sub_consensus = {}
-                    sub_keys = set()
-                    for d in dict_results:
-                        sub_keys.update(d.keys())
-                    
-                    for sub_key in sub_keys:
-                        sub_vals = [d.get(sub_key) for d in dict_results if sub_key in d]
-                        sub_vals = [v for v in sub_vals if v is not None and v != ""]
-                        if sub_vals:
-                            # Take most common non-empty value
-                            freq = {}
-                            for v in sub_vals:
-                                freq[v] = freq.get(v, 0) + 1
-                            sub_consensus[sub_key] = max(freq.items(), key=lambda x: x[1])[0]
-                    
-                    consensus[key] = sub_consensus
-            
-            # For simple values, take most common
-            else:
-                freq = {}
-                for v in values:
-                    freq[v] = freq.get(v, 0) + 1
-                consensus[key] = max(freq.items(), key=lambda x: x[1])[0]
-        
-        return consensus
-    
-    def _extract_json(self, text: str) -> Optional[Dict]:
-        """Extract JSON from text"""
-        try:
-            # Remove markdown code blocks
-            text = re.sub(r'```json\s*', '', text, flags=re.IGNORECASE)
-            text = re.sub(r'```', '', text)
-            
-            # Find JSON structure
-            start_idx = text.find('{')
-            end_idx = text.rfind('}')
-            
-            if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
-                json_str = text[start_idx:end_idx+1]
-                return json.loads(json_str)
-        except:
-            pass
-        return None
-
 # ==================== ENHANCED AI UTILITIES ====================
 
 class DocumentClassifier:
@@ -633,198 +509,61 @@ class DocumentClassifier:
     """
     
     @staticmethod
-    def classify_document(text: str) -> str:
+    def classify_document(text: str, model=None, client: Optional[LLMClient] = None) -> str:
         """
-        Classifies document based on keywords in the first few pages.
+        Classifies document with the local keyword model, and asks the LLM
+        only when that is not confident. The LLM call goes through ``client``
+        (built around ``model`` if not given).
         Returns: "STP" or "MFR"
         """
-        text_lower = text.lower()[:5000] # Check header/intro
-        
-        # MFR Signals
-        mfr_score = 0
-        if "master formula" in text_lower: mfr_score += 3
-        if "manufacturing record" in text_lower: mfr_score += 3
-        if "batch manufacturing" in text_lower: mfr_score += 2
-        if "mfr" in text_lower: mfr_score += 1
-        if "bill of materials" in text_lower or "bom" in text_lower: mfr_score += 2
-        
-        # STP Signals
-        stp_score = 0
-        if "standard testing" in text_lower: stp_score += 3
-        if "stp" in text_lower: stp_score += 1
-        if "specification" in text_lower and "method" in text_lower: stp_score += 1
-        if "finished product specification" in text_lower: stp_score += 2
-        
-        if mfr_score > stp_score:
-            return "MFR"
-        return "STP"
-
-class ConsensusExtractor:
-    """
-    Automated Consensus Engine for AI Extraction.
-    Runs extraction multiple times and consolidates results to eliminate hallucinations.
-    """
-    
-    def __init__(self, model):
-        self.model = model
-    
-    def robust_extract(self, content: list, prompt_template: str, document_type: str, context: str = "") -> Dict[str, Any]:
-        """
-        Performs 3-pass extraction and 1-pass consolidation.
-        """
-        candidates = []
-        
-        # 1. Run 3 extraction passes (simulating diversity)
-        # Note: We use the same prompt. In a real stochastic setting, we rely on temperature.
-        # Here we will append a small "Seed" instruction to vary the output slightly if needed,
-        # but modern models are deterministic at temp 0. We will assume the caller configures temp > 0.4.
-        # For this implementation, we will append Iteration counts to the prompt to potentially influence the model.
-        
-        print(f"    - Starting Consensus Loop (3 passes)...")
-        for i in range(3):
-            # Add iteration marker to force fresh generation path
-            iteration_prompt = f"{prompt_template}\n\n[System Note: Extraction Pass {i+1}/3. Ensure strict adherence to JSON format.]"
+        text_preview = text[:5000]
+        stats = get_classifier_stats()
+        
+        # 1. Local scoring over the first pages
+        local = classify_text(text)
+        heuristic_result = local.label
+        if local.is_confident():
+            print(f"  > Local classifier: {local.label} (confidence {local.confidence:.2f}, scores {local.scores})")
+            stats.record_local()
+            return heuristic_result
+        if client is None and model is not None:
+            client = LLMClient(model)
+        if not client:
+            print(f"  > Local classifier unsure: {local.label} (confidence {local.confidence:.2f}), no LLM to verify")
+            stats.record_unverified()
+            return heuristic_result
+        
+        # 2. LLM Verification when the local model is unsure
+        try:
+            print(f"  > Heuristic classifies as: {heuristic_result}. Verifying with LLM...")
+            prompt = f"""
+            Classify this pharmaceutical document content into exactly one category: "STP" (Standard Testing Procedure) or "MFR" (Master Formula Record).
             
-            try:
-                response = self.model.generate_content(
-                    content + [iteration_prompt],
-                     generation_config=genai.types.GenerationConfig(
-                        temperature=0.0 # Zero temperature for strict anti-hallucination
-                    )
-                )
-                
-                # Extract JSON
-                json_data = self._clean_json(response.text)
-                if json_data:
-                    candidates.append(json_data)
-                    print(f"      > Pass {i+1}: Success")
-                else:
-                    print(f"      > Pass {i+1}: Failed (No JSON)")
-            except Exception as e:
-                print(f"      > Pass {i+1}: Error ({e})")
-        
-        if not candidates:
-            return {}
+            Content Preview:
+            {text_preview}
             
-        if len(candidates) == 1:
-            return candidates[0]
+            Rules:
+            - STP contains tests, methods, specifications, limits.
+            - MFR contains manufacturing steps, equipment, batch size, raw materials.
             
-        # 2. Consolidation Phase (The "Judge")
-        return self._consolidate(candidates, document_type)
-
-    def _clean_json(self, text: str) -> Optional[Dict]:
-        """Helper to extract JSON from response"""
-        try:
-             # Remove markdown code blocks
-            text = re.sub(r'```json\s*', '', text, flags=re.IGNORECASE)
-            text = re.sub(r'```', '', text)
-            start = text.find('{')
-            end = text.rfind('}')
-            if start != -1 and end != -1:
-                return json.loads(text[start:end+1])
-        except:
-            return None
-        return None
-
-    def _consolidate(self, candidates: List[Dict], doc_type: str) -> Dict[str, Any]:
-        """
-        Uses the LLM to merge candidate extractions into a single truth.
-        """
-        print("    - Running Consensus Judge...")
-        
-        judge_prompt = f"""
-        Role: Validated Data Arbiter.
-        Task: You are provided with {len(candidates)} extraction candidates for a {doc_type} document.
-        Your job is to merge them into a SINGLE, FINAL JSON object.
-        
-        Rules for Consolidation:
-        1. Majority Vote: If 2 or more candidates agree on a value (e.g., "50mg"), use strictly that.
-        2. Conservative Selection: If values differ/conflict (e.g., "50mg" vs "500mg"), choose the one that makes most sense for a Pharma {doc_type}, or keeping the most detailed one.
-        3. No Hallucinations: Do not add fields not present in the candidates.
-        4. Array Merging: For lists (tests/steps), merge them to ensure no items are missed. Deduplicate identical items.
-        
-        Candidates:
-        {json.dumps(candidates, indent=2)}
-        
-        Output: Return ONLY the final JSON.
-        """
-        
-        try:
-            # Low temperature for the Judge to be strict
-            response = self.model.generate_content(
-                judge_prompt,
-                generation_config=genai.types.GenerationConfig(temperature=0.0)
-            )
-            final_json = self._clean_json(response.text)
-            if final_json:
-                print("      > Consensus Achieved.")
-                return final_json
-            else:
-                print("      > Consensus Failed (JSON error). Using Candidate 1.")
-                return candidates[0]
+            Return ONLY the category name.
+            """
+            response = client.generate(prompt, label="classify")
+            ai_classification = response.text.strip().upper()
+            
+            # Simple cleanup
+            if "STP" in ai_classification: ai_classification = "STP"
+            elif "MFR" in ai_classification: ai_classification = "MFR"
+            
+            if ai_classification in ["STP", "MFR"]:
+                if ai_classification != heuristic_result:
+                    print(f"  > LLM corrected classification to: {ai_classification}")
+                stats.record_llm(overridden=ai_classification != heuristic_result)
+                return ai_classification
+            stats.record_llm(failed=True)
         except Exception as e:
-            print(f"      > Consensus Error: {e}. Using Candidate 1.")
-            return candidates[0]
-# ==================== ENHANCED AI UTILITIES ====================
-
-class DocumentClassifier:
-    """
-    Intelligent Document Classification
-    Determines if a document is STP or MFR based on content analysis.
-    """
-    
-    @staticmethod
-    def classify_document(text: str, model=None) -> str:
-        """
-        Classifies document based on keywords + LLM Verification.
-        Returns: "STP" or "MFR"
-        """
-        text_preview = text[:5000]
-        text_lower = text_preview.lower()
-        
-        # 1. Heuristic Check
-        mfr_score = 0
-        if "master formula" in text_lower: mfr_score += 3
-        if "manufacturing record" in text_lower: mfr_score += 3
-        if "batch manufacturing" in text_lower: mfr_score += 2
-        if "mfr" in text_lower: mfr_score += 1
-        
-        stp_score = 0
-        if "standard testing" in text_lower: stp_score += 3
-        if "stp" in text_lower: stp_score += 1
-        if "specification" in text_lower and "method" in text_lower: stp_score += 1
-        
-        heuristic_result = "MFR" if mfr_score > stp_score else "STP"
-        
-        # 2. LLM Verification (Robustness)
-        if model:
-            try:
-                print(f"  > Heuristic classifies as: {heuristic_result}. Verifying with LLM...")
-                prompt = f"""
-                Classify this pharmaceutical document content into exactly one category: "STP" (Standard Testing Procedure) or "MFR" (Master Formula Record).
-                
-                Content Preview:
-                {text_preview}
-                
-                Rules:
-                - STP contains tests, methods, specifications, limits.
-                - MFR contains manufacturing steps, equipment, batch size, raw materials.
-                
-                Return ONLY the category name.
-                """
-                response = model.generate_content(prompt)
-                ai_classification = response.text.strip().upper()
-                
-                # Simple cleanup
-                if "STP" in ai_classification: ai_classification = "STP"
-                elif "MFR" in ai_classification: ai_classification = "MFR"
-                
-                if ai_classification in ["STP", "MFR"]:
-                    if ai_classification != heuristic_result:
-                        print(f"  > LLM corrected classification to: {ai_classification}")
-                    return ai_classification
-            except Exception as e:
-                print(f"  > LLM Classification failed: {e}. Falling back to heuristic.")
+            print(f"  > LLM Classification failed: {e}. Falling back to heuristic.")
+            stats.record_llm(failed=True)
         
         return heuristic_result
 
@@ -834,66 +573,114 @@ class ConsensusExtractor:
     Runs extraction multiple times and consolidates results to eliminate hallucinations.
     """
     
-    def __init__(self, model):
+    def __init__(self, model, client: Optional[LLMClient] = None, cache: Optional[CacheManager] = None):
         self.model = model
+        self.client = client or LLMClient(model)
+        self.cache = cache or CacheManager()
     
-    def robust_extract(self, content: list, prompt_template: str, document_type: str, context: str = "") -> Dict[str, Any]:
+    def robust_extract(self, content: list, prompt_template: str, document_type: str, context: str = "",
+                       source_hash: Optional[str] = None) -> Dict[str, Any]:
         """
-        Performs 3-pass extraction and 1-pass consolidation.
+        Performs the extraction passes concurrently, then 1-pass consolidation.
+        Results are cached by source file hash (or full content) plus prompt.
         """
-        candidates = []
-        
-        # 1. Run 3 extraction passes (simulating diversity)
-        # Note: We use the same prompt regarding user instruction.
-        # We vary the system note slightly to encourage independence.
+        cache_key = self.cache.get_cache_key(
+            content, f"{document_type}|passes={Config.CONSENSUS_PASSES}|{prompt_template}", source_hash
+        )
+        cached = self.cache.get(cache_key, document_type)
+        if cached:
+            return cached
         
+        # 1. Run the extraction passes concurrently on the shared LLM pool.
+        # Rate limiting and backoff live in the client, so a pass only
+        # retries here when the model answers without usable JSON.
         print(f"    - Starting Consensus Loop ({Config.CONSENSUS_PASSES} passes) for {document_type}...")
-        for i in range(Config.CONSENSUS_PASSES):
-            # Add iteration marker to force fresh generation path or just rely on non-zero temp if set
-            iteration_prompt = f"{prompt_template}\n\n[System Note: Extraction Iteration {i+1}/3. Strict JSON only.]"
-            
-            # Retry logic
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    # We assume self.model is configured by caller (or we re-config here if needed)
-                    response = self.model.generate_content(
-                        content + [iteration_prompt],
-                         generation_config=genai.types.GenerationConfig(
-                            temperature=0.7 # Higher temp for diversity
-                        )
-                    )
-                    
-                    # Extract JSON
-                    json_data = self._clean_json(response.text)
-                    if json_data:
-                        candidates.append(json_data)
-                        print(f"      > Pass {i+1}: Success")
-                        break # Success, move to next pass
-                    else:
-                        print(f"      > Pass {i+1} (Attempt {attempt+1}): No JSON found")
-                except Exception as e:
-                    print(f"      > Pass {i+1} (Attempt {attempt+1}): Error ({e})")
-                    if "429" in str(e):
-                        # Extract wait time if possible or default to robust backoff
-                        wait_time = 30 * (attempt + 1) # 30s, 60s, 90s
-                        print(f"        ! Rate limit hit. Waiting {wait_time}s...")
-                        import time
-                        time.sleep(wait_time)
-                    else:
-                        break # Don't retry non-transient errors
+        futures = [
+            self.client.executor.submit(self._extraction_pass, content, prompt_template, i)
+            for i in range(Config.CONSENSUS_PASSES)
+        ]
+        candidates = [candidate for candidate in (future.result() for future in futures) if candidate]
             
-        if not candidates:
-            return {}
-        
         if not candidates:
             return {}
             
         if len(candidates) == 1:
-            return candidates[0]
-            
-        # 2. Consolidation Phase (The "Judge")
-        return self._consolidate(candidates, document_type)
+            result = candidates[0]
+        else:
+            # 2. Consolidation Phase (The "Judge")
+            result = self._consolidate(candidates, document_type)
+        
+        if result:
+            self.cache.set(cache_key, result, document_type)
+        return result
+
+    def chunked_extract(self, text: str, prompt_template: str, document_type: str,
+                        source_hash: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Extract from the full document text, in page-aligned chunks if it is long.
+        
+        Chunks are extracted concurrently (each with its own consensus passes)
+        and merged with ``_get_consensus``; per-chunk results are cached so a
+        revised document only re-sends the chunks that changed.
+        """
+        chunks = split_into_chunks(text)
+        if len(chunks) <= 1:
+            return self.robust_extract([prompt_template, f"Document Content:\n{text}"], prompt_template,
+                                       document_type, source_hash=source_hash)
+        
+        namespace = f"{document_type}|passes={Config.CONSENSUS_PASSES}|{prompt_template}"
+        cache_key = self.cache.get_cache_key(text, f"chunked|{namespace}", source_hash)
+        cached = self.cache.get(cache_key, document_type)
+        if cached:
+            return cached
+        
+        def extract_chunk(chunk):
+            content = [prompt_template, f"Document Content ({chunk.describe(len(chunks))}):\n{chunk.text}"]
+            # Passes run in this worker: chunks already occupy the shared pool
+            candidates = [candidate for candidate in (
+                self._extraction_pass(content, prompt_template, i) for i in range(Config.CONSENSUS_PASSES)
+            ) if candidate]
+            if len(candidates) > 1:
+                return self._consolidate(candidates, document_type)
+            return candidates[0] if candidates else None
+        
+        print(f"    - Chunked extraction for {document_type}: {len(chunks)} chunks ({len(text)} chars)")
+        results, stats = map_chunks(chunks, extract_chunk, self.client.executor, self.cache, namespace)
+        self.chunk_stats = stats
+        print(f"      > {stats}")
+        
+        result = self._get_consensus([chunk_result for chunk_result in results if chunk_result])
+        if result and not stats.failed:
+            self.cache.set(cache_key, result, document_type)
+        return result
+    
+    def _get_consensus(self, results: List[Dict]) -> Dict:
+        """Merge per-chunk results: lists are combined, nested dicts merged, scalars voted"""
+        return merge_extractions(results)
+
+    def _extraction_pass(self, content: list, prompt_template: str, index: int) -> Optional[Dict]:
+        """One extraction pass; retried only when the response has no JSON"""
+        # Vary the system note slightly to encourage independent passes
+        iteration_prompt = f"{prompt_template}\n\n[System Note: Extraction Iteration {index+1}/{Config.CONSENSUS_PASSES}. Strict JSON only.]"
+        for attempt in range(3):
+            try:
+                response = self.client.generate(
+                    content + [iteration_prompt],
+                    generation_config=_genai().types.GenerationConfig(
+                        temperature=0.7 # Higher temp for diversity
+                    ),
+                    label="consensus_pass"
+                )
+            except Exception as e:
+                # The client has already retried rate limits and server errors
+                print(f"      > Pass {index+1}: Error ({e})")
+                return None
+            json_data = self._clean_json(response.text)
+            if json_data:
+                print(f"      > Pass {index+1}: Success")
+                return json_data
+            print(f"      > Pass {index+1} (Attempt {attempt+1}): No JSON found")
+        return None
 
     def _clean_json(self, text: str) -> Optional[Dict]:
         """Helper to extract JSON from response"""
@@ -934,9 +721,10 @@ class ConsensusExtractor:
         
         try:
             # Low temperature for the Judge to be strict
-            response = self.model.generate_content(
+            response = self.client.generate(
                 judge_prompt,
-                generation_config=genai.types.GenerationConfig(temperature=0.0)
+                generation_config=_genai().types.GenerationConfig(temperature=0.0),
+                label="consensus_judge"
             )
             final_json = self._clean_json(response.text)
             if final_json:
@@ -954,11 +742,14 @@ class ConsensusExtractor:
 class EnhancedDocumentParser:
     """Enhanced parser for STP and MFR PDFs using Gemini AI with OCR"""
     
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, stage_timer: Optional[StageTimer] = None):
         self.api_key = api_key or Config.GEMINI_API_KEY
+        genai = _genai()
         genai.configure(api_key=self.api_key)
         self.model = genai.GenerativeModel(Config.GEMINI_MODEL)
-        self.consensus_extractor = ConsensusExtractor(self.model)
+        self.llm_client = LLMClient(self.model)
+        self.consensus_extractor = ConsensusExtractor(self.model, self.llm_client)
+        self.stage_timer = stage_timer or StageTimer()
         # self.cache = CacheManager() # Cache disabled for now or missing class
         
         # Enhanced regex patterns
@@ -977,7 +768,16 @@ class EnhancedDocumentParser:
             'specification': r'(\w+(?:\s+\w+)*)\s*[:=]\s*(.+?)(?:\n|;)'
         }
     
-    def extract_content_with_tables(self, pdf_path: str) -> str:
+    @contextmanager
+    def _document_context(self, pdf_path: str, doc: Optional[PDFIngestionContext] = None):
+        """Reuse the caller's ingestion context, or open a private one"""
+        if doc is not None:
+            yield doc
+        else:
+            with PDFIngestionContext(pdf_path) as owned:
+                yield owned
+
+    def extract_content_with_tables(self, pdf_path: str, doc: Optional[PDFIngestionContext] = None) -> str:
         """
         Smart Extraction Strategy (The "Reddit Approach"):
         1. Try pdfplumber (Text + Table structure).
@@ -989,16 +789,18 @@ class EnhancedDocumentParser:
         total_chars = 0
         total_pages = 0
         
-        try:
-            with pdfplumber.open(pdf_path) as pdf:
-                total_pages = len(pdf.pages)
-                for i, page in enumerate(pdf.pages):
+        with self._document_context(pdf_path, doc) as doc:
+            if doc.is_text_file:
+                return self.extract_text_with_ocr_fallback(pdf_path, doc)
+            try:
+                total_pages = doc.page_count
+                for i in range(total_pages):
                     # 1. Extract Text
-                    text = page.extract_text() or ""
+                    text = doc.page_text(i)
                     total_chars += len(text.strip())
                     
                     # 2. Extract Tables and convert to Markdown
-                    tables = page.extract_tables()
+                    tables = doc.page_tables(i)
                     markdown_tables = []
                     for table in tables:
                         if not table: continue
@@ -1022,71 +824,66 @@ class EnhancedDocumentParser:
                         page_content += "\n[DETECTED TABLES (Markdown View)]:\n" + "\n".join(markdown_tables)
                     
                     full_text += page_content + "\n"
-            
-            # --- Density Check ---
-            avg_chars = total_chars / total_pages if total_pages > 0 else 0
-            print(f"  Text Density: {avg_chars:.0f} chars/page")
-            
-            if avg_chars < 50:
-                print("  ! Low text density detected. Attempting OCR fallback...")
-                ocr_text = self.extract_text_with_ocr_fallback(pdf_path)
-                if len(ocr_text) > len(full_text):
-                    print("  > OCR yield better results. Using OCR text.")
-                    full_text = ocr_text
+                
+                # --- Density Check ---
+                avg_chars = total_chars / total_pages if total_pages > 0 else 0
+                print(f"  Text Density: {avg_chars:.0f} chars/page")
+                
+                if avg_chars < 50:
+                    print("  ! Low text density detected. Attempting OCR fallback...")
+                    ocr_text = self.extract_text_with_ocr_fallback(pdf_path, doc)
+                    if len(ocr_text) > len(full_text):
+                        print("  > OCR yield better results. Using OCR text.")
+                        full_text = ocr_text
 
-            # --- Cleanup ---
-            return DataSanitizer.preprocess_text(full_text)
+                # --- Cleanup ---
+                return DataSanitizer.preprocess_text(full_text)
 
-        except Exception as e:
-            print(f"Borked PDF read: {e}. Falling back to standard OCR.")
-            return self.extract_text_with_ocr_fallback(pdf_path)
+            except Exception as e:
+                print(f"Borked PDF read: {e}. Falling back to standard OCR.")
+                return self.extract_text_with_ocr_fallback(pdf_path, doc)
 
-    def extract_text_with_ocr_fallback(self, pdf_path: str) -> str:
+    def extract_text_with_ocr_fallback(self, pdf_path: str, doc: Optional[PDFIngestionContext] = None) -> str:
         """Original OCR fallback method (Tesseract)"""
         text = ""
         try:
-            # Check if it's a text file
-            if pdf_path.endswith('.txt'):
-                with open(pdf_path, 'r', encoding='utf-8') as f:
-                    return f.read()
-            
-            # Use pdfplumber as base
-            try:
-                with pdfplumber.open(pdf_path) as pdf:
-                    for page in pdf.pages:
-                        extracted = page.extract_text()
+            with self._document_context(pdf_path, doc) as doc:
+                # Check if it's a text file
+                if doc.is_text_file:
+                    return doc.page_text(0)
+                
+                # Use pdfplumber as base (served from the shared page model)
+                try:
+                    for _, extracted in doc.iter_text():
                         if extracted:
                             text += extracted + "\n"
-            except: pass
-
-            # If Tesseract is available (mock check)
-            if Config.TESSERACT_PATH and os.path.exists(Config.TESSERACT_PATH):
-                # We would call pytesseract here if installed.
-                # Since strict environment control is tricky, we treat this as a placeholder
-                # that strictly returns what we found or tries PyPDF2
-                if len(text) < 100:
-                    try:
-                        import PyPDF2
-                        with open(pdf_path, 'rb') as f:
-                            reader = PyPDF2.PdfReader(f)
-                            for page in reader.pages:
-                                text += page.extract_text() + "\n"
-                    except: pass
-            
-            return text
+                except: pass
+
+                # If Tesseract is available (mock check)
+                if Config.TESSERACT_PATH and os.path.exists(Config.TESSERACT_PATH):
+                    # We would call pytesseract here if installed.
+                    # Since strict environment control is tricky, we treat this as a placeholder
+                    # that strictly returns what we found or tries PyPDF2
+                    if len(text) < 100:
+                        text += doc.pypdf2_text()
+                
+                return text
             
         except Exception as e:
             print(f"Error reading PDF: {e}")
             return ""
     
-    def extract_images_from_pdf(self, pdf_path: str, max_pages: int = 3) -> List[PIL.Image.Image]:
+    def extract_images_from_pdf(self, pdf_path: str, max_pages: int = 3,
+                                doc: Optional[PDFIngestionContext] = None) -> List['PIL.Image.Image']:
         """Extract images from PDF for multimodal processing"""
         images = []
         try:
             if pdf_path.lower().endswith('.pdf'):
-                pdf_images = convert_from_path(pdf_path, dpi=200)
-                images = pdf_images[:max_pages]
-                print(f"  Extracted {len(images)} pages as images")
+                with self._document_context(pdf_path, doc) as doc:
+                    # Only the requested pages are rendered, at a per-page adaptive DPI.
+                    # The model reads scanned text off these, so they keep the OCR resolution
+                    images = list(doc.iter_page_images(max_pages=max_pages, for_ocr=True))
+                    print(f"  Extracted {len(images)} pages as images: {doc.raster_stats.to_dict()}")
         except Exception as e:
             print(f"  Image extraction failed: {e}")
         return images
@@ -1098,9 +895,19 @@ class EnhancedDocumentParser:
         """
         print(f"\nProcessing document: {pdf_path}")
         
+        # Open and lay out the document once; every stage below reads from it
+        with PDFIngestionContext(pdf_path) as doc:
+            result = self._parse_ingested_document(doc, pdf_path, product_name, dosage_form)
+            print(f"  Ingestion stats: {doc.stats.to_dict()}")
+        return result
+    
+    def _parse_ingested_document(self, doc: PDFIngestionContext, pdf_path: str,
+                                 product_name: str, dosage_form: str) -> Dict[str, Any]:
+        """Run classification and extraction against an open ingestion context"""
         # Step 1: Extract text with OCR fallback
         print("Step 1: Extracting text (with smart table detection)...")
-        text_content = self.extract_content_with_tables(pdf_path)
+        with self.stage_timer.stage("extract"):
+            text_content = self.extract_content_with_tables(pdf_path, doc)
         
         if not text_content.strip():
             print("  ERROR: No text extracted from document")
@@ -1108,7 +915,8 @@ class EnhancedDocumentParser:
         
         # Step 2: Classify document
         print("Step 2: Classifying document...")
-        doc_type = DocumentClassifier.classify_document(text_content, self.model)
+        with self.stage_timer.stage("classify"):
+            doc_type = DocumentClassifier.classify_document(text_content, self.model, self.llm_client)
         print(f"  Document type: {doc_type}")
         
         # Create minimal classification object for compatibility
@@ -1124,9 +932,9 @@ class EnhancedDocumentParser:
         print("Step 3: Extracting content...")
         
         if doc_type == "STP":
-            return self._parse_stp_document(text_content, pdf_path, product_name, dosage_form, classification)
+            return self._parse_stp_document(text_content, pdf_path, product_name, dosage_form, classification, doc)
         elif doc_type == "MFR":
-            return self._parse_mfr_document(text_content, pdf_path, product_name, dosage_form, classification)
+            return self._parse_mfr_document(text_content, pdf_path, product_name, dosage_form, classification, doc)
         else:
             print(f"  Warning: Document type {doc_type} not fully supported")
             return {
@@ -1138,7 +946,8 @@ class EnhancedDocumentParser:
     
     def _parse_stp_document(self, text_content: str, pdf_path: str, 
                            product_name: str, dosage_form: str, 
-                           classification: Dict) -> Dict[str, Any]:
+                           classification: Dict,
+                           doc: Optional[PDFIngestionContext] = None) -> Dict[str, Any]:
         """Parse STP document with consensus extraction"""
         # Extract images for multimodal processing if needed
         # Extract images for multimodal processing if needed
@@ -1211,11 +1020,16 @@ class EnhancedDocumentParser:
         
         # Extract with consensus
         print("  Running consensus extraction...")
-        extracted_data = self.consensus_extractor.robust_extract(
-            [prompt] + (images if images else [f"Document Content:\n{text_content[:60000]}"]), # Increased context window
-            prompt,
-            "STP"
-        )
+        with self.stage_timer.stage("consensus"):
+            if images:
+                extracted_data = self.consensus_extractor.robust_extract(
+                    [prompt] + images, prompt, "STP", source_hash=doc.content_hash if doc else None
+                )
+            else:
+                # Whole document, chunked on page boundaries (no truncation)
+                extracted_data = self.consensus_extractor.chunked_extract(
+                    text_content, prompt, "STP", source_hash=doc.content_hash if doc else None
+                )
         
         # Sanitize extracted data
         if extracted_data:
@@ -1234,15 +1048,16 @@ class EnhancedDocumentParser:
     
     def _parse_mfr_document(self, text_content: str, pdf_path: str,
                            product_name: str, dosage_form: str,
-                           classification: Dict) -> Dict[str, Any]:
+                           classification: Dict,
+                           doc: Optional[PDFIngestionContext] = None) -> Dict[str, Any]:
         """Parse MFR document with consensus extraction"""
         # Extract images for multimodal processing if needed
         images = []
         if classification.get("is_scanned", False):
-            images = self.extract_images_from_pdf(pdf_path, max_pages=2)
+            images = self.extract_images_from_pdf(pdf_path, max_pages=2, doc=doc)
         
         # Also extract equipment table deterministically
-        equipment_table = self._extract_equipment_table_deterministic(pdf_path)
+        equipment_table = self._extract_equipment_table_deterministic(pdf_path, doc)
         
         # Prepare context
         context = {
@@ -1327,11 +1142,16 @@ class EnhancedDocumentParser:
         
         # Extract with consensus
         print("  Running consensus extraction...")
-        extracted_data = self.consensus_extractor.robust_extract(
-            [prompt] + (images if images else [f"Document Content:\n{text_content[:60000]}"]),
-            prompt,
-            "MFR"
-        )
+        with self.stage_timer.stage("consensus"):
+            if images:
+                extracted_data = self.consensus_extractor.robust_extract(
+                    [prompt] + images, prompt, "MFR", source_hash=doc.content_hash if doc else None
+                )
+            else:
+                # Whole document, chunked on page boundaries (no truncation)
+                extracted_data = self.consensus_extractor.chunked_extract(
+                    text_content, prompt, "MFR", source_hash=doc.content_hash if doc else None
+                )
         
         # Add deterministically extracted equipment table
         if equipment_table and extracted_data:
@@ -1354,7 +1174,7 @@ class EnhancedDocumentParser:
             extracted_data = self._sanitize_mfr_data(extracted_data)
             # Try to extract batch size if missing
             if not extracted_data.get("batch_size"):
-                extracted_data["batch_size"] = self._vacuum_batch_size(pdf_path)
+                extracted_data["batch_size"] = self._vacuum_batch_size(pdf_path, doc)
         
         # Combine with classification
         result = {
@@ -1426,15 +1246,16 @@ class EnhancedDocumentParser:
         
         return data
     
-    def _extract_equipment_table_deterministic(self, pdf_path: str) -> List[Dict[str, str]]:
+    def _extract_equipment_table_deterministic(self, pdf_path: str,
+                                               doc: Optional[PDFIngestionContext] = None) -> List[Dict[str, str]]:
         """Deterministic extraction of equipment list from table"""
         equipment = []
         
         try:
-            with pdfplumber.open(pdf_path) as pdf:
-                for page in pdf.pages:
-                    # Try to extract tables
-                    tables = page.extract_tables()
+            with self._document_context(pdf_path, doc) as doc:
+                for page_index in range(doc.page_count):
+                    # Tables were already laid out by extract_content_with_tables
+                    tables = doc.page_tables(page_index)
                     for table in tables:
                         if not table or len(table) < 2:
                             continue
@@ -1493,14 +1314,11 @@ class EnhancedDocumentParser:
         
         return equipment
     
-    def _vacuum_batch_size(self, pdf_path: str) -> Optional[str]:
+    def _vacuum_batch_size(self, pdf_path: str, doc: Optional[PDFIngestionContext] = None) -> Optional[str]:
         """Secondary search for batch size"""
         try:
-            with pdfplumber.open(pdf_path) as pdf:
-                for i in range(min(2, len(pdf.pages))):
-                    page = pdf.pages[i]
-                    text = page.extract_text() or ""
-                    
+            with self._document_context(pdf_path, doc) as doc:
+                for _, text in doc.iter_text(max_pages=2):
                     # Regex for "Batch Size : 50.0 L" or similar
                     match = re.search(
                         r"(?:batch\s*size|volume|batch\s*volume)\s*[:\.-]?\s*([\d\.,]+\s*[a-zA-Z]+)", 
@@ -1899,9 +1717,12 @@ class EnhancedPDFGenerator:
         elements.append(self.Paragraph(title, self.heading_style))
         elements.append(self.Spacer(1, 0.1 * self.inch))
 
-    def generate_pvp(self, data: Dict) -> io.BytesIO:
-        """Generate Process Validation Protocol (PVP) - 21 Sections"""
-        buffer = io.BytesIO()
+    def generate_pvp(self, data: Dict, output: Optional[BinaryIO] = None) -> BinaryIO:
+        """Generate Process Validation Protocol (PVP) - 21 Sections
+
+        Written to ``output`` (any writable binary stream) when given, else a new BytesIO.
+        """
+        buffer = output if output is not None else io.BytesIO()
         if not self.available: return buffer
         
         doc = self.SimpleDocTemplate(buffer, pagesize=self.A4)
@@ -2087,12 +1908,16 @@ class EnhancedPDFGenerator:
         elements.append(self._create_standard_table(approval_data, col_widths=[1.5*self.inch, 2*self.inch, 1.5*self.inch, 1.5*self.inch]))
 
         doc.build(elements)
-        buffer.seek(0)
+        if output is None:
+            buffer.seek(0)
         return buffer
 
-    def generate_pvr(self, data: Dict) -> io.BytesIO:
-        """Generate Process Validation Report (PVR) - 13 Sections"""
-        buffer = io.BytesIO()
+    def generate_pvr(self, data: Dict, output: Optional[BinaryIO] = None) -> BinaryIO:
+        """Generate Process Validation Report (PVR) - 13 Sections
+
+        Written to ``output`` (any writable binary stream) when given, else a new BytesIO.
+        """
+        buffer = output if output is not None else io.BytesIO()
         if not self.available: return buffer
         
         doc = self.SimpleDocTemplate(buffer, pagesize=self.A4)
@@ -2250,21 +2075,22 @@ class EnhancedPDFGenerator:
         elements.append(self._create_standard_table(approval_data, col_widths=[1.5*self.inch, 2*self.inch, 1.5*self.inch, 1.5*self.inch]))
 
         doc.build(elements)
-        buffer.seek(0)
+        if output is None:
+            buffer.seek(0)
         return buffer
 
 # ==================== ENHANCED MAIN PIPELINE ====================
 
 
-# Import templates and reasoning engine
-from services.validation_templates import ValidationTemplates
+# Import reasoning engine
 from services.regulatory_reasoning import RegulatoryReasoningEngine
 
 class EnhancedPharmaDocAI:
     """Enhanced main PharmaDoc AI pipeline"""
     
-    def __init__(self, gemini_api_key: str = None):
-        self.parser = EnhancedDocumentParser(gemini_api_key)
+    def __init__(self, gemini_api_key: str = None, stage_timer: Optional[StageTimer] = None):
+        self.stage_timer = stage_timer or StageTimer()
+        self.parser = EnhancedDocumentParser(gemini_api_key, stage_timer=self.stage_timer)
         self.rule_engine = EnhancedRegulatoryRuleEngine()
         self.validator = ValidationPipeline()
         self.reasoning_engine = RegulatoryReasoningEngine()
@@ -2328,6 +2154,8 @@ class EnhancedPharmaDocAI:
             mfr_result = future_mfr.result()
             
         print("\nParallel processing completed.")
+        print(f"LLM call metrics: {json.dumps(get_llm_metrics().snapshot())}")
+        print(f"Classifier: {json.dumps(get_classifier_stats().to_dict())}")
         
         # Cross-reference validation
         cross_ref_errors = []
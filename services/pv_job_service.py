@@ -0,0 +1,435 @@
+"""
+Background jobs for the AI process validation pipeline.
+
+Uploads to /pv/upload_ai used to run extraction, Gemini consensus, two
+ReportLab renders and the zip build inside the request thread. Jobs are now
+recorded in a small SQLite queue file (independent of the main database so
+worker processes can write progress without touching the ORM session) and
+executed by a process pool. The request returns a job id immediately and the
+browser polls the job for its current stage and per-stage timings.
+"""
+
+import io
+import os
+import json
+import uuid
+import sqlite3
+import logging
+import tempfile
+import threading
+import zipfile
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+JOB_DB_PATH = os.environ.get('PV_JOB_DB', os.path.join('instance', 'pv_jobs.db'))
+JOB_WORKERS = int(os.environ.get('PV_JOB_WORKERS', '2'))
+# Running workers touch their job this often; a job whose heartbeat is older
+# than JOB_STALE_SECONDS and whose owner process is gone is treated as orphaned
+JOB_HEARTBEAT_SECONDS = int(os.environ.get('PV_JOB_HEARTBEAT_SECONDS', '15'))
+JOB_STALE_SECONDS = int(os.environ.get('PV_JOB_STALE_SECONDS', '120'))
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_COMPLETED = 'completed'
+STATUS_FAILED = 'failed'
+
+PIPELINE_STAGES = ['extract', 'classify', 'consensus', 'render', 'zip']
+
+
+class JobStore:
+    """SQLite-backed job table shared by the web process and pool workers"""
+
+    def __init__(self, db_path: str = JOB_DB_PATH):
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS pv_jobs (
+                    id TEXT PRIMARY KEY,
+                    user_id INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    stage TEXT,
+                    params TEXT NOT NULL,
+                    stage_timings TEXT,
+                    error TEXT,
+                    pvr_report_id INTEGER,
+                    created_at TEXT NOT NULL,
+                    started_at TEXT,
+                    finished_at TEXT,
+                    owner_pid INTEGER,
+                    heartbeat_at TEXT
+                )
+            """)
+            # Job files created before the owner columns existed
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(pv_jobs)")}
+            for column, kind in (('owner_pid', 'INTEGER'), ('heartbeat_at', 'TEXT')):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE pv_jobs ADD COLUMN {column} {kind}")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_pv_jobs_status ON pv_jobs (status)")
+
+    @contextmanager
+    def _connect(self):
+        """Connection committed on success, rolled back on error and always closed"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def create(self, user_id: int, params: Dict[str, Any], pvr_report_id: Optional[int] = None) -> str:
+        job_id = uuid.uuid4().hex
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO pv_jobs (id, user_id, status, params, stage_timings, pvr_report_id, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, user_id, STATUS_QUEUED, json.dumps(params), json.dumps({}),
+                 pvr_report_id, datetime.now().isoformat())
+            )
+        return job_id
+
+    def update(self, job_id: str, **fields):
+        if not fields:
+            return
+        if 'stage_timings' in fields:
+            fields['stage_timings'] = json.dumps(fields['stage_timings'])
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE pv_jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def claim(self, job_id: str) -> bool:
+        """Atomically move a queued job to running for this process; False if someone else has it"""
+        now = datetime.now().isoformat()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE pv_jobs SET status = ?, started_at = ?, owner_pid = ?, heartbeat_at = ? "
+                "WHERE id = ? AND status = ?",
+                (STATUS_RUNNING, now, os.getpid(), now, job_id, STATUS_QUEUED)
+            )
+            return cursor.rowcount == 1
+
+    def heartbeat(self, job_id: str):
+        with self._connect() as conn:
+            conn.execute("UPDATE pv_jobs SET heartbeat_at = ? WHERE id = ? AND status = ?",
+                         (datetime.now().isoformat(), job_id, STATUS_RUNNING))
+
+    def orphaned_ids(self, stale_seconds: int = JOB_STALE_SECONDS) -> List[str]:
+        """Running jobs with a stale heartbeat whose owner process is no longer alive"""
+        now = datetime.now()
+        with self._connect() as conn:
+            rows = conn.execute("SELECT id, owner_pid, heartbeat_at, started_at FROM pv_jobs WHERE status = ?",
+                                (STATUS_RUNNING,)).fetchall()
+        orphaned = []
+        for row in rows:
+            beat = row['heartbeat_at'] or row['started_at']
+            if beat and (now - datetime.fromisoformat(beat)).total_seconds() < stale_seconds:
+                continue
+            if row['owner_pid'] and _pid_alive(row['owner_pid']):
+                continue
+            orphaned.append(row['id'])
+        return orphaned
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM pv_jobs WHERE id = ?", (job_id,)).fetchone()
+        if not row:
+            return None
+        job = dict(row)
+        job['params'] = json.loads(job['params'] or '{}')
+        job['stage_timings'] = json.loads(job['stage_timings'] or '{}')
+        return job
+
+    def ids_with_status(self, status: str) -> List[str]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT id FROM pv_jobs WHERE status = ? ORDER BY created_at", (status,)).fetchall()
+        return [row['id'] for row in rows]
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+
+class PVJobQueue:
+    """Dispatches queued jobs to a process pool (created at app startup or on first submit)"""
+
+    def __init__(self, store: Optional[JobStore] = None, max_workers: int = JOB_WORKERS):
+        self.store = store or JobStore()
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: gunicorn threads make fork unsafe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+                self._recover_jobs()
+            return self._executor
+
+    def start(self):
+        """
+        Create the pool and run the recovery pass now rather than on the
+        first submit, so jobs left over from before a restart are picked up
+        as soon as the app is up. Needs an app context to mark reports.
+        """
+        self._get_executor()
+
+    def _recover_jobs(self):
+        """
+        Re-dispatch jobs queued before a restart and fail the running ones
+        whose worker died, together with their PVR_Report rows. Jobs still
+        owned by a live worker (in this or another web process) are left
+        alone; a queued job picked up by more than one pool only runs once
+        because workers claim it atomically.
+        """
+        failed_reports = []
+        for job_id in self.store.orphaned_ids():
+            self.store.update(job_id, status=STATUS_FAILED, error='Interrupted by server restart',
+                              finished_at=datetime.now().isoformat())
+            job = self.store.get(job_id)
+            if job['pvr_report_id']:
+                failed_reports.append(job['pvr_report_id'])
+        if failed_reports:
+            mark_reports_failed(failed_reports)
+        for job_id in self.store.ids_with_status(STATUS_QUEUED):
+            self._executor.submit(run_pv_job, job_id, self.store.db_path)
+
+    def submit(self, user_id: int, params: Dict[str, Any], pvr_report_id: Optional[int] = None) -> str:
+        # The executor (and the recovery pass) comes first so the new row is not re-dispatched
+        executor = self._get_executor()
+        job_id = self.store.create(user_id, params, pvr_report_id)
+        try:
+            executor.submit(run_pv_job, job_id, self.store.db_path)
+        except Exception as e:
+            # Not left queued: a later recovery pass would run it after the caller gave up on it
+            self.store.update(job_id, status=STATUS_FAILED, error=f'Could not dispatch: {e}'[:500],
+                              finished_at=datetime.now().isoformat())
+            raise
+        logger.info("Queued PV job %s for user %s", job_id, user_id)
+        return job_id
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.get(job_id)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+
+_queue: Optional[PVJobQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> PVJobQueue:
+    """Process-wide queue used by the PV routes"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = PVJobQueue()
+        return _queue
+
+
+def mark_reports_failed(report_ids: List[int]):
+    """
+    Set the PVR_Report rows of interrupted jobs to 'Failed'. Written on its
+    own connection so a caller's request session is neither flushed nor
+    committed; logged instead of raised, the job rows are already failed.
+    """
+    from database import db
+    from models import PVR_Report
+
+    table = PVR_Report.__table__
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(table.update().where(table.c.id.in_(report_ids)).values(status='Failed'))
+    except Exception as e:
+        logger.warning("Could not mark reports %s of interrupted PV jobs as failed: %s", report_ids, e)
+
+
+def start_job_queue(app):
+    """
+    Server-start hook (gunicorn.conf.py, main.py): start the pool and
+    re-dispatch jobs left over from before a restart. Not run on import, so
+    migrations, scripts and tests never pick up queued jobs.
+    """
+    with app.app_context():
+        get_job_queue().start()
+
+
+_worker_app = None
+
+
+def _get_worker_app():
+    """One Flask app (and engine) per pool worker process, reused across its jobs"""
+    global _worker_app
+    if _worker_app is None:
+        from database import create_app
+        _worker_app = create_app()
+    return _worker_app
+
+
+def build_validation_package(pharmadoc, results: Dict[str, Any], zip_path: str, stage_timer) -> str:
+    """Render PVP/PVR PDFs and stream the downloadable zip to ``zip_path``.
+
+    Entries are written straight into ``<zip_path>.partial`` on disk (PDFs
+    render into their zip entry, exported files are copied in chunks), and
+    the file is renamed into place once complete so a half-written package is
+    never served. Memory use is bounded by the largest single PDF, not by the
+    package size.
+    """
+    from services.process_validation_service import EnhancedPDFGenerator
+
+    partial_path = zip_path + '.partial'
+    try:
+        with zipfile.ZipFile(partial_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+            with stage_timer.stage('render'):
+                pdf_gen = EnhancedPDFGenerator()
+                with zf.open('Process_Validation_Protocol.pdf', 'w') as entry:
+                    pdf_gen.generate_pvp(results['pvp'], entry)
+                with zf.open('Process_Validation_Report.pdf', 'w') as entry:
+                    pdf_gen.generate_pvr(results['pvr'], entry)
+
+            with stage_timer.stage('zip'):
+                written = set()
+                with tempfile.TemporaryDirectory(prefix='pv_export_') as output_dir:
+                    try:
+                        pharmadoc.export_results(output_dir)
+                        for file_name in sorted(os.listdir(output_dir)):
+                            file_path = os.path.join(output_dir, file_name)
+                            if os.path.isfile(file_path):
+                                zf.write(file_path, file_name)
+                                written.add(file_name)
+                    except Exception as export_error:
+                        logger.warning(f"Could not export text files: {export_error}")
+                        if 'validation_data.json' not in written:
+                            with zf.open('validation_data.json', 'w') as entry:
+                                with io.TextIOWrapper(entry, encoding='utf-8') as text:
+                                    json.dump(results, text, indent=4, default=str)
+        os.replace(partial_path, zip_path)
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    return zip_path
+
+
+def ingest_uploads(paths: List[str]):
+    """Parse uploaded PDFs into the page store so every later read skips the PDF"""
+    from services.page_text_store_service import ingest_document
+    from services.upload_store_service import get_upload_store
+
+    uploads = get_upload_store()
+    for path in paths:
+        if not path or not path.lower().endswith('.pdf'):
+            continue
+        try:
+            # The STP/MFR pipeline reads native text and tables only. Stored
+            # uploads are named by their SHA-256, so they need no re-hashing
+            ingest_document(path, ocr=False, content_hash=uploads.content_hash(path), tables=True)
+        except Exception as e:
+            logger.warning("Page store ingestion failed for %s: %s", path, e)
+
+
+def run_pv_job(job_id: str, db_path: str = JOB_DB_PATH):
+    """Worker entry point: run the full pipeline and attach the package to the PVR_Report row"""
+    store = JobStore(db_path)
+    if not store.claim(job_id):
+        return
+    job = store.get(job_id)
+
+    stop_heartbeat = threading.Event()
+
+    def beat():
+        while not stop_heartbeat.wait(JOB_HEARTBEAT_SECONDS):
+            try:
+                store.heartbeat(job_id)
+            except sqlite3.Error as e:
+                logger.warning("Heartbeat for PV job %s failed: %s", job_id, e)
+
+    threading.Thread(target=beat, name=f'pv-job-heartbeat-{job_id}', daemon=True).start()
+    try:
+        _run_claimed_job(store, job_id, job)
+    finally:
+        stop_heartbeat.set()
+
+
+def _run_claimed_job(store: JobStore, job_id: str, job: Dict[str, Any]):
+    """Pipeline body of ``run_pv_job``, run while this process owns the job"""
+    params = job['params']
+
+    # Imported here so the web process does not pay for them at enqueue time
+    from services.process_validation_service import EnhancedPharmaDocAI, StageTimer
+    from database import db
+    from models import PVR_Report
+    from services.search_index_service import register_index_listeners, wait_for_index_updates
+
+    register_index_listeners()
+
+    def on_stage(stage: str):
+        store.update(job_id, stage=stage, stage_timings=timer.to_dict())
+
+    timer = StageTimer(on_change=on_stage)
+    app = _get_worker_app()
+
+    with app.app_context():
+        report = db.session.get(PVR_Report, job['pvr_report_id']) if job['pvr_report_id'] else None
+        try:
+            with timer.stage('extract'):
+                ingest_uploads([params['stp_path'], params['mfr_path']])
+
+            pharmadoc = EnhancedPharmaDocAI(os.environ.get('GEMINI_API_KEY'), stage_timer=timer)
+            results = pharmadoc.process_documents(
+                product_name=params['product_name'],
+                dosage_form=params['dosage_form'],
+                stp_pdf_path=params['stp_path'],
+                mfr_pdf_path=params['mfr_path']
+            )
+
+            zip_path = os.path.join(params['report_folder'], params['zip_filename'])
+            build_validation_package(pharmadoc, results, zip_path, timer)
+
+            if report:
+                report.pdf_filepath = zip_path
+                report.status = 'AI Generated'
+                report.protocol_number = results.get('pvp', {}).get('protocol_number', '')
+                if report.template:
+                    report.template.batch_size = results.get('pvp', {}).get('mfr_summary', {}).get('batch_size', '')
+                db.session.commit()
+
+            store.update(job_id, status=STATUS_COMPLETED, stage=None, stage_timings=timer.to_dict(),
+                         finished_at=datetime.now().isoformat())
+            logger.info("PV job %s completed: %s", job_id, timer.to_dict())
+
+        except Exception as e:
+            logger.error(f"PV job {job_id} failed: {e}", exc_info=True)
+            db.session.rollback()
+            if report:
+                report.status = 'Failed'
+                db.session.commit()
+            store.update(job_id, status=STATUS_FAILED, error=str(e)[:500], stage_timings=timer.to_dict(),
+                         finished_at=datetime.now().isoformat())
+        finally:
+            # The report's index entry is written by a background thread of this worker
+            wait_for_index_updates(timeout=30)
@@ -8,6 +8,9 @@ import os
 from dotenv import load_dotenv
 import logging
 
+from services.chunked_extraction_service import extract_array_chunked
+from services.llm_client_service import LLMClient
+
 #disable debug logging
 logging.getLogger('pdfminer').setLevel(logging.ERROR)
 logging.getLogger('pdfplumber').setLevel(logging.ERROR)
@@ -22,7 +25,7 @@ if GEMINI_API_KEY:
 
 def extract_text_from_pdf(pdf_path):
     """
-    Extract all text from PDF file
+    Extract all text from PDF file (pages separated by form feeds)
     """
     full_text = ""
     try:
@@ -30,7 +33,7 @@ def extract_text_from_pdf(pdf_path):
             for page in pdf.pages:
                 text = page.extract_text(x_tolerance=2)
                 if text:
-                    full_text += text + "\n"
+                    full_text += text + "\n\f\n"
         return full_text
     except Exception as e:
         print(f"Error reading PDF: {e}")
@@ -39,12 +42,15 @@ def extract_text_from_pdf(pdf_path):
 
 def extract_with_ai(pdf_text):
     """
-    Use Gemini AI to extract test criteria from PVP text
+    Use Gemini AI to extract test criteria from PVP text.
+    Long documents are split into page-aligned chunks that are extracted
+    concurrently; the criteria are merged by test_id.
     """
     try:
-        model = genai.GenerativeModel('gemini-1.5-flash')
+        client = LLMClient(genai.GenerativeModel('gemini-1.5-flash'))
         
-        prompt = f"""
+        def build_prompt(chunk_text):
+            return f"""
 You are an expert pharmaceutical documentation analyst. Analyze this Process Validation Protocol (PVP) document and extract ALL test parameters and their acceptance criteria.
 
 Extract information in this EXACT JSON format:
@@ -57,7 +63,7 @@ Extract information in this EXACT JSON format:
 ]
 
 DOCUMENT TEXT:
-{pdf_text[:15000]}
+{chunk_text}
 
 EXTRACT:
 1. Manufacturing process parameters (pH, temperature, mixing time, assay, etc.)
@@ -69,22 +75,12 @@ EXTRACT:
 Return ONLY valid JSON array, no explanation.
 """
         
-        response = model.generate_content(prompt)
-        result_text = response.text.strip()
-        
-        # Clean JSON response
-        if result_text.startswith('```json'):
-            result_text = result_text[7:]
-        if result_text.startswith('```'):
-            result_text = result_text[3:]
-        if result_text.endswith('```'):
-            result_text = result_text[:-3]
-        
-        result_text = result_text.strip()
-        
-        # Parse JSON
-        import json
-        criteria = json.loads(result_text)
+        criteria, stats = extract_array_chunked(
+            pdf_text, build_prompt, client, 'pvp_criteria', key=lambda item: item.get('test_id') if isinstance(item, dict) else None
+        )
+        print(f"AI extraction chunks: {stats}")
+        if criteria is None:
+            raise ValueError("no chunk returned a JSON array")
         
         return criteria
         
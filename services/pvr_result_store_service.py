@@ -0,0 +1,212 @@
+"""
+PVR Result Store Service - columnar storage of PVR batch results.
+
+``PVR_Data`` keeps one row per (batch, test_id), so reading a report meant
+loading thousands of ORM objects and re-parsing every ``test_result`` string
+to a float. Each report's results are also kept as one ``PVR_ResultBlock``:
+a zlib-compressed buffer holding
+
+  - a JSON header: batch numbers, test ids, per-batch manufacturing date and
+    batch size, and the dictionary of distinct result strings
+  - a float64 ``batches x tests`` matrix of parsed numeric results (NaN when
+    missing or non-numeric)
+  - an int32 ``batches x tests`` matrix of codes into the string dictionary
+    (-1 when missing)
+
+Decoding is one decompress plus ``np.frombuffer`` views over the buffer, so
+the numeric matrix goes straight into the statistics code without copies or
+per-cell parsing. The EAV rows stay the source of truth: any ORM write to
+PVR_Data drops the report's block (see models.py). ``load_report_results``
+then falls back to one column query over the committed PVR_Data rows and
+writes the block back on a connection of its own, so only the first read
+after a change pays for it and read paths never flush or commit the
+request's session.
+"""
+
+import json
+import struct
+import zlib
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+
+from database import db
+from models import PVR_Data, PVR_ResultBlock
+from services.batch_statistics_service import parse_numeric
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+_MAGIC = b'PVRB'
+_PREFIX = struct.Struct('<4sI')
+
+
+class BatchResults:
+    """A report's batch results as NumPy columns"""
+
+    def __init__(self, batches: List[str], test_ids: List[str], values: np.ndarray, codes: np.ndarray,
+                 texts: List[str], manufacturing_dates: List[Optional[str]], batch_sizes: List[Optional[str]]):
+        self.batches = batches
+        self.test_ids = test_ids
+        self.values = values
+        self.codes = codes
+        self.texts = texts
+        self.manufacturing_dates = manufacturing_dates
+        self.batch_sizes = batch_sizes
+        self.batch_index = {batch: i for i, batch in enumerate(batches)}
+        self.test_index = {test_id: i for i, test_id in enumerate(test_ids)}
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Sequence[Any]]) -> 'BatchResults':
+        """Build from (batch_number, test_id, test_result, manufacturing_date, batch_size)
+        tuples; the first row for a (batch, test) pair wins, as ``.first()`` did."""
+        batches: Dict[str, int] = {}
+        tests: Dict[str, int] = {}
+        cells: Dict[Tuple[int, int], Optional[str]] = {}
+        dates: List[Optional[str]] = []
+        sizes: List[Optional[str]] = []
+        for batch_number, test_id, test_result, manufacturing_date, batch_size in rows:
+            if batch_number not in batches:
+                batches[batch_number] = len(batches)
+                dates.append(manufacturing_date)
+                sizes.append(batch_size)
+            if test_id not in tests:
+                tests[test_id] = len(tests)
+            cells.setdefault((batches[batch_number], tests[test_id]), test_result)
+
+        shape = (len(batches), len(tests))
+        values = np.full(shape, np.nan)
+        codes = np.full(shape, -1, dtype=np.int32)
+        texts: Dict[str, int] = {}
+        for (row, column), text in cells.items():
+            if text is None:
+                continue
+            codes[row, column] = texts.setdefault(text, len(texts))
+            values[row, column] = parse_numeric(text)
+        return cls(list(batches), list(tests), values, codes, list(texts), dates, sizes)
+
+    @property
+    def data_points(self) -> int:
+        return int((self.codes >= 0).sum())
+
+    def result(self, batch_number: str, test_id: str) -> Optional[str]:
+        """Raw result string for one cell (None if missing)"""
+        row = self.batch_index.get(batch_number)
+        column = self.test_index.get(test_id)
+        if row is None or column is None:
+            return None
+        code = self.codes[row, column]
+        return self.texts[code] if code >= 0 else None
+
+    def numeric_matrix(self, test_ids: Sequence[str]) -> np.ndarray:
+        """``batches x len(test_ids)`` float matrix (NaN columns for unknown tests).
+
+        Returns the stored matrix itself when ``test_ids`` is the stored order.
+        """
+        if list(test_ids) == self.test_ids:
+            return self.values
+        matrix = np.full((len(self.batches), len(test_ids)), np.nan)
+        for i, test_id in enumerate(test_ids):
+            column = self.test_index.get(test_id)
+            if column is not None:
+                matrix[:, i] = self.values[:, column]
+        return matrix
+
+    def text_grid(self, test_ids: Sequence[str]) -> List[List[Optional[str]]]:
+        """Result strings per test (rows) and batch (columns)"""
+        return [[self.result(batch, test_id) for batch in self.batches] for test_id in test_ids]
+
+
+def encode_results(results: BatchResults) -> bytes:
+    header = json.dumps({
+        'version': FORMAT_VERSION,
+        'batches': results.batches,
+        'test_ids': results.test_ids,
+        'texts': results.texts,
+        'manufacturing_dates': results.manufacturing_dates,
+        'batch_sizes': results.batch_sizes,
+    }).encode('utf-8')
+    # Pad so the float64 matrix starts 8-byte aligned in the decoded buffer
+    header += b' ' * (-(len(header) + _PREFIX.size) % 8)
+    payload = b''.join([
+        _PREFIX.pack(_MAGIC, len(header)),
+        header,
+        np.ascontiguousarray(results.values, dtype='<f8').tobytes(),
+        np.ascontiguousarray(results.codes, dtype='<i4').tobytes(),
+    ])
+    return zlib.compress(payload, 6)
+
+
+def decode_results(blob: bytes) -> BatchResults:
+    buffer = zlib.decompress(blob)
+    magic, header_length = _PREFIX.unpack_from(buffer)
+    if magic != _MAGIC:
+        raise ValueError("Not a PVR result block")
+    header = json.loads(buffer[_PREFIX.size:_PREFIX.size + header_length])
+    if header['version'] != FORMAT_VERSION:
+        raise ValueError(f"Unsupported PVR result block version {header['version']}")
+
+    shape = (len(header['batches']), len(header['test_ids']))
+    cells = shape[0] * shape[1]
+    offset = _PREFIX.size + header_length
+    values = np.frombuffer(buffer, dtype='<f8', count=cells, offset=offset).reshape(shape)
+    codes = np.frombuffer(buffer, dtype='<i4', count=cells, offset=offset + cells * 8).reshape(shape)
+    return BatchResults(header['batches'], header['test_ids'], values, codes, header['texts'],
+                        header['manufacturing_dates'], header['batch_sizes'])
+
+
+def _rows_statement(report_id: int):
+    return select(
+        PVR_Data.batch_number, PVR_Data.test_id, PVR_Data.test_result,
+        PVR_Data.manufacturing_date, PVR_Data.batch_size
+    ).where(PVR_Data.pvr_report_id == report_id).order_by(PVR_Data.id)
+
+
+def _write_block(execute, report_id: int, results: BatchResults):
+    # Core statements: flush listeners may already have deleted the row behind the ORM's back
+    table = PVR_ResultBlock.__table__
+    execute(table.delete().where(table.c.pvr_report_id == report_id))
+    execute(table.insert(), {
+        'pvr_report_id': report_id,
+        'format_version': FORMAT_VERSION,
+        'batch_count': len(results.batches),
+        'test_count': len(results.test_ids),
+        'data': encode_results(results),
+    })
+
+
+def _store_committed_block(report_id: int) -> BatchResults:
+    """
+    Build a report's block from its committed PVR_Data rows and store it, in
+    a transaction of its own so the caller's session is neither flushed nor
+    committed. If the block cannot be written (another writer holds the
+    database) the rows are still returned and the next read tries again.
+    """
+    try:
+        with db.engine.begin() as conn:
+            results = BatchResults.from_rows(conn.execute(_rows_statement(report_id)).all())
+            _write_block(conn.execute, report_id, results)
+        return results
+    except SQLAlchemyError as e:
+        logger.warning("Could not store the result block of PVR report %s: %s", report_id, e)
+    with db.engine.connect() as conn:
+        return BatchResults.from_rows(conn.execute(_rows_statement(report_id)).all())
+
+
+def load_report_results(report_id: int) -> BatchResults:
+    """
+    Committed results for a report, from its block or, when there is none,
+    from PVR_Data (storing the block). Reads on its own connection and
+    leaves the caller's session alone.
+    """
+    table = PVR_ResultBlock.__table__
+    with db.engine.connect() as conn:
+        block = conn.execute(
+            select(table.c.format_version, table.c.data).where(table.c.pvr_report_id == report_id)
+        ).first()
+    if block is not None and block.format_version == FORMAT_VERSION:
+        return decode_results(block.data)
+    return _store_committed_block(report_id)
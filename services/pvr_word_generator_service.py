@@ -9,7 +9,8 @@ from docx.oxml import OxmlElement
 from datetime import datetime
 import os
 
-from models import PVR_Report, PVR_Data, PVP_Criteria
+from models import PVR_Report, PVP_Criteria
+from services.pvr_result_store_service import load_report_results
 
 
 def set_cell_background(cell, color):
@@ -28,10 +29,10 @@ def generate_pvr_word(report_id, product_name, template, criteria):
     if not report:
         raise Exception("Report not found")
     
-    batch_data = PVR_Data.query.filter_by(pvr_report_id=report_id).all()
+    batch_results = load_report_results(report_id)
     
     # Get unique batch numbers
-    batch_numbers = sorted(list(set([d.batch_number for d in batch_data])))
+    batch_numbers = sorted(batch_results.batches)
     
     # Create output folder
     output_folder = os.path.join(os.getcwd(), 'uploads', 'pvr_reports')
@@ -148,11 +149,7 @@ def generate_pvr_word(report_id, product_name, template, criteria):
         
         # Results for each batch
         for col_idx, batch in enumerate(batch_numbers):
-            result = next(
-                (d.test_result for d in batch_data 
-                 if d.test_id == criterion.test_id and d.batch_number == batch),
-                '-'
-            )
+            result = batch_results.result(batch, criterion.test_id) or '-'
             cell = row.cells[2 + col_idx]
             cell.text = result
             cell.paragraphs[0].alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
@@ -0,0 +1,787 @@
+"""
+Search Index Service - ranked full-text search over templates, reports and documents.
+
+The list pages (PVP templates, AMV and AMV verification documents, document
+history) loaded a user's whole list and offered no way to search inside the
+documents. Every PVP template, PVR report and Document (with its AMV / AMV
+verification details) now has one search entry:
+
+  - title: template name or document title
+  - metadata: product name, protocol / document number, active ingredient,
+    label claim, instrument and the other key fields
+  - body: the extracted page text from the page store (see
+    page_text_store_service) and the document's JSON metadata values
+
+Two backends share one interface:
+
+  - ``SQLiteSearchBackend``: an FTS5 table in its own SQLite file (the local
+    default). The owner and kind are indexed as tokens and put in the MATCH
+    expression, so a user's search only touches that user's postings.
+  - ``PostgresSearchBackend``: a weighted ``tsvector`` column with a GIN
+    index in the main Postgres database, used when DATABASE_URL is Postgres.
+
+Results are ranked with bm25 (title over metadata over body); a query
+matching more than SEARCH_RANK_LIMIT entries, where ranking every match
+would dominate the response time, is listed newest first instead.
+
+The index is fed incrementally: ORM flush events queue the changed rows and,
+once the transaction commits (nothing on rollback), a background thread
+rebuilds their entries from the committed rows and writes them, so neither
+the flush nor the commit waits for the index. When an update cannot be
+applied the owners are marked unseeded, and their next search reindexes
+them. Users whose documents predate the index are indexed on their first
+search.
+"""
+
+import os
+import re
+import json
+import time
+import queue
+import atexit
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from markupsafe import escape
+from sqlalchemy import event, select, text
+from sqlalchemy.orm import Session, object_session
+
+from database import db
+from models import AMVDocument, AMVVerificationDocument, Document, PVP_Template, PVR_Report
+
+logger = logging.getLogger(__name__)
+
+# 'sqlite', 'postgres', or empty to follow DATABASE_URL
+SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND', '')
+SEARCH_INDEX_PATH = os.environ.get('SEARCH_INDEX_PATH', os.path.join('instance', 'search_index.db'))
+SEARCH_MAX_BODY_CHARS = int(os.environ.get('SEARCH_MAX_BODY_CHARS', '200000'))
+SEARCH_MAX_PER_PAGE = 50
+# Queries matching more entries than this are listed newest first instead of by rank
+SEARCH_RANK_LIMIT = int(os.environ.get('SEARCH_RANK_LIMIT', '20000'))
+# Query terms beyond this are ignored
+SEARCH_MAX_TERMS = 12
+
+# Entry ids are (source code << 40) | row id, so one integer key covers all sources
+SOURCE_CODES = {'document': 1, 'pvp_template': 2, 'pvr_report': 3}
+_SOURCES = {code: source for source, code in SOURCE_CODES.items()}
+_ID_BITS = 40
+
+_TERM = re.compile(r'\w+', re.UNICODE)
+# Snippet markers, replaced by <mark> after HTML escaping
+_OPEN, _CLOSE = '\x02', '\x03'
+
+
+def entry_id(source: str, source_id: int) -> int:
+    return (SOURCE_CODES[source] << _ID_BITS) | source_id
+
+
+def split_entry_id(value: int) -> Tuple[str, int]:
+    return _SOURCES[value >> _ID_BITS], value & ((1 << _ID_BITS) - 1)
+
+
+def kind_token(kind: str) -> str:
+    """A document kind as a single index token ('AMV_VERIFICATION' -> 'amvverification')"""
+    return re.sub(r'[^0-9a-z]', '', (kind or '').lower()) or 'other'
+
+
+def query_terms(query: str) -> List[str]:
+    return _TERM.findall((query or '').lower())[:SEARCH_MAX_TERMS]
+
+
+def _highlight(snippet: Optional[str]) -> str:
+    if not snippet:
+        return ''
+    return str(escape(snippet)).replace(_OPEN, '<mark>').replace(_CLOSE, '</mark>')
+
+
+@dataclass
+class IndexEntry:
+    """What is indexed for one row"""
+    source: str
+    source_id: int
+    user_id: int
+    kind: str
+    title: str
+    metadata: str = ''
+    body: str = ''
+
+    @property
+    def entry_id(self) -> int:
+        return entry_id(self.source, self.source_id)
+
+
+@dataclass
+class SearchHit:
+    source: str
+    source_id: int
+    kind: str
+    title: str
+    snippet: str
+    score: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass
+class SearchPage:
+    hits: List[SearchHit]
+    total: int
+    page: int
+    per_page: int
+
+    @property
+    def pages(self) -> int:
+        return (self.total + self.per_page - 1) // self.per_page if self.per_page else 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'results': [hit.to_dict() for hit in self.hits],
+            'total': self.total,
+            'page': self.page,
+            'per_page': self.per_page,
+            'pages': self.pages,
+        }
+
+
+# ==================== BACKENDS ====================
+
+class SQLiteSearchBackend:
+    """FTS5 index in its own SQLite file"""
+
+    # bm25 weights per column: owner, kind, title, metadata, body. Spelled out
+    # in the query: about twice as fast as a configured ``rank``
+    RANK = 'bm25(search_entries, 0.0, 0.0, 10.0, 4.0, 1.0)'
+
+    def __init__(self, path: str = SEARCH_INDEX_PATH):
+        self.path = path
+        self._ready = False
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            if not self._ready:
+                with self._lock:
+                    if not self._ready:
+                        self._create(conn)
+                        self._ready = True
+            yield conn
+        finally:
+            conn.close()
+
+    def _create(self, conn: sqlite3.Connection):
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS search_entries USING fts5(
+                owner, kind, title, metadata, body, tokenize = 'porter unicode61'
+            )
+        """)
+        conn.execute("CREATE TABLE IF NOT EXISTS seeded_users (user_id INTEGER PRIMARY KEY)")
+
+    def apply(self, entries: List[IndexEntry], deleted: List[int]):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                ids = deleted + [entry.entry_id for entry in entries]
+                conn.executemany("DELETE FROM search_entries WHERE rowid = ?", [(i,) for i in ids])
+                conn.executemany(
+                    "INSERT INTO search_entries (rowid, owner, kind, title, metadata, body) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(entry.entry_id, f"u{entry.user_id}", kind_token(entry.kind), entry.title, entry.metadata,
+                      entry.body) for entry in entries]
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    @staticmethod
+    def _text_match(terms: List[str]) -> str:
+        phrases = [f'"{term}"' for term in terms]
+        # The last term is matched as a prefix, for search-as-you-type
+        phrases[-1] += '*'
+        return '{title metadata body}:(' + ' '.join(phrases) + ')'
+
+    @classmethod
+    def _match(cls, user_id: int, terms: List[str], kinds: Optional[List[str]]) -> str:
+        expression = f'owner:u{int(user_id)}'
+        if kinds:
+            expression += ' AND kind:(' + ' OR '.join(kind_token(kind) for kind in kinds) + ')'
+        return expression + ' AND ' + cls._text_match(terms)
+
+    def search(self, user_id: int, terms: List[str], kinds: Optional[List[str]],
+               limit: int, offset: int) -> Tuple[List[SearchHit], int]:
+        match = self._match(user_id, terms, kinds)
+        with self._connect() as conn:
+            # Counting is cheap; ranking costs a bm25 evaluation per match
+            total = conn.execute(
+                "SELECT count(*) FROM search_entries WHERE search_entries MATCH ?", (match,)
+            ).fetchone()[0]
+            order = self.RANK if total <= SEARCH_RANK_LIMIT else 'rowid DESC'
+            rows = conn.execute(
+                f"SELECT rowid, kind, title, {self.RANK} FROM search_entries WHERE search_entries MATCH ? "
+                f"ORDER BY {order} LIMIT ? OFFSET ?", (match, limit, offset)
+            ).fetchall() if offset < total else []
+            snippets = {}
+            if rows:
+                # Snippets only for the page's rows, from one scan of the matches
+                # in their rowid range: seeking each rowid costs milliseconds
+                # per row on a large, unmerged index. The rows are known to be
+                # the user's, so only the text is matched.
+                ids = [row[0] for row in rows]
+                placeholders = ','.join('?' * len(ids))
+                # Body first, then metadata; a column without a match yields unhighlighted text
+                for rowid, *columns in conn.execute(
+                    f"SELECT rowid, snippet(search_entries, 4, '{_OPEN}', '{_CLOSE}', '…', 16), "
+                    f"snippet(search_entries, 3, '{_OPEN}', '{_CLOSE}', '…', 16) "
+                    f"FROM search_entries WHERE search_entries MATCH ? AND rowid BETWEEN ? AND ? "
+                    f"AND +rowid IN ({placeholders})",
+                    [self._text_match(terms), min(ids), max(ids)] + ids
+                ):
+                    snippets[rowid] = next((column for column in columns if column and _OPEN in column), '')
+        hits = []
+        for rowid, kind, title, rank in rows:
+            source, source_id = split_entry_id(rowid)
+            hits.append(SearchHit(source, source_id, kind, title, _highlight(snippets.get(rowid)), -rank))
+        return hits, total
+
+    def entry_ids(self, user_id: int) -> List[int]:
+        with self._connect() as conn:
+            return [row[0] for row in conn.execute(
+                "SELECT rowid FROM search_entries WHERE search_entries MATCH ?", (f'owner:u{int(user_id)}',))]
+
+    def is_seeded(self, user_id: int) -> bool:
+        with self._connect() as conn:
+            return conn.execute("SELECT 1 FROM seeded_users WHERE user_id = ?", (user_id,)).fetchone() is not None
+
+    def mark_seeded(self, user_id: int):
+        with self._connect() as conn:
+            conn.execute("INSERT OR IGNORE INTO seeded_users (user_id) VALUES (?)", (user_id,))
+
+    def mark_unseeded(self, user_id: int):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM seeded_users WHERE user_id = ?", (user_id,))
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM search_entries")
+            conn.execute("DELETE FROM seeded_users")
+
+
+class PostgresSearchBackend:
+    """Weighted tsvector column with a GIN index in the main Postgres database"""
+
+    CONFIG = 'english'
+
+    def __init__(self, engine=None):
+        self._engine = engine
+        self._ready = False
+        self._lock = threading.Lock()
+
+    @property
+    def engine(self):
+        return self._engine if self._engine is not None else db.engine
+
+    def _begin(self):
+        if not self._ready:
+            with self._lock:
+                if not self._ready:
+                    with self.engine.begin() as conn:
+                        self._create(conn)
+                    self._ready = True
+        return self.engine.begin()
+
+    def _create(self, conn):
+        conn.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS search_entries (
+                entry_id BIGINT PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                kind VARCHAR(50) NOT NULL,
+                title TEXT NOT NULL,
+                metadata TEXT,
+                body TEXT,
+                document tsvector GENERATED ALWAYS AS (
+                    setweight(to_tsvector('{self.CONFIG}', coalesce(title, '')), 'A') ||
+                    setweight(to_tsvector('{self.CONFIG}', coalesce(metadata, '')), 'B') ||
+                    setweight(to_tsvector('{self.CONFIG}', coalesce(body, '')), 'C')
+                ) STORED
+            )
+        """))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_search_entries_document "
+                          "ON search_entries USING GIN (document)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_search_entries_user_kind ON search_entries (user_id, kind)"))
+        conn.execute(text("CREATE TABLE IF NOT EXISTS search_seeded_users (user_id INTEGER PRIMARY KEY)"))
+
+    def apply(self, entries: List[IndexEntry], deleted: List[int]):
+        with self._begin() as conn:
+            if deleted:
+                conn.execute(text("DELETE FROM search_entries WHERE entry_id = ANY(:ids)"), {'ids': deleted})
+            for entry in entries:
+                conn.execute(text("""
+                    INSERT INTO search_entries (entry_id, user_id, kind, title, metadata, body)
+                    VALUES (:entry_id, :user_id, :kind, :title, :metadata, :body)
+                    ON CONFLICT (entry_id) DO UPDATE SET user_id = EXCLUDED.user_id, kind = EXCLUDED.kind,
+                        title = EXCLUDED.title, metadata = EXCLUDED.metadata, body = EXCLUDED.body
+                """), {'entry_id': entry.entry_id, 'user_id': entry.user_id, 'kind': kind_token(entry.kind),
+                       'title': entry.title, 'metadata': entry.metadata, 'body': entry.body})
+
+    def search(self, user_id: int, terms: List[str], kinds: Optional[List[str]],
+               limit: int, offset: int) -> Tuple[List[SearchHit], int]:
+        # Terms are \w+ only, so they need no tsquery escaping; the last one is a prefix
+        tsquery = ' & '.join(terms[:-1] + [terms[-1] + ':*'])
+        kind_filter = "AND kind = ANY(:kinds)" if kinds else ""
+        # Headlines are computed for the page only, outside the ranked subquery
+        sql = text(f"""
+            SELECT page.entry_id, page.kind, page.title, page.score, page.total,
+                   ts_headline('{self.CONFIG}', coalesce(nullif(page.body, ''), page.metadata, ''), page.query,
+                               'StartSel={_OPEN}, StopSel={_CLOSE}, MaxWords=24, MinWords=8') AS snippet
+            FROM (
+                SELECT entry_id, kind, title, metadata, body, query,
+                       ts_rank_cd(document, query) AS score, count(*) OVER () AS total
+                FROM search_entries, to_tsquery('{self.CONFIG}', :tsquery) AS query
+                WHERE user_id = :user_id {kind_filter} AND document @@ query
+                ORDER BY score DESC, entry_id
+                LIMIT :limit OFFSET :offset
+            ) AS page
+            ORDER BY page.score DESC, page.entry_id
+        """)
+        params = {'tsquery': tsquery, 'user_id': user_id, 'limit': limit, 'offset': offset,
+                  'kinds': [kind_token(kind) for kind in kinds or []]}
+        with self._begin() as conn:
+            rows = conn.execute(sql, params).fetchall()
+            total = rows[0].total if rows else 0
+            if not rows and offset:
+                total = conn.execute(text(f"""
+                    SELECT count(*) FROM search_entries
+                    WHERE user_id = :user_id {kind_filter} AND document @@ to_tsquery('{self.CONFIG}', :tsquery)
+                """), params).scalar()
+        hits = []
+        for row in rows:
+            source, source_id = split_entry_id(row.entry_id)
+            hits.append(SearchHit(source, source_id, row.kind, row.title, _highlight(row.snippet), float(row.score)))
+        return hits, total
+
+    def entry_ids(self, user_id: int) -> List[int]:
+        with self._begin() as conn:
+            return list(conn.execute(text("SELECT entry_id FROM search_entries WHERE user_id = :user_id"),
+                                     {'user_id': user_id}).scalars())
+
+    def is_seeded(self, user_id: int) -> bool:
+        with self._begin() as conn:
+            return conn.execute(text("SELECT 1 FROM search_seeded_users WHERE user_id = :user_id"),
+                                {'user_id': user_id}).first() is not None
+
+    def mark_seeded(self, user_id: int):
+        with self._begin() as conn:
+            conn.execute(text("INSERT INTO search_seeded_users (user_id) VALUES (:user_id) ON CONFLICT DO NOTHING"),
+                         {'user_id': user_id})
+
+    def mark_unseeded(self, user_id: int):
+        with self._begin() as conn:
+            conn.execute(text("DELETE FROM search_seeded_users WHERE user_id = :user_id"), {'user_id': user_id})
+
+    def clear(self):
+        with self._begin() as conn:
+            conn.execute(text("DELETE FROM search_entries"))
+            conn.execute(text("DELETE FROM search_seeded_users"))
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_search_index():
+    """Process-wide search backend, picked from SEARCH_BACKEND or DATABASE_URL"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                backend = SEARCH_BACKEND or (
+                    'postgres' if os.environ.get('DATABASE_URL', '').startswith('postgres') else 'sqlite'
+                )
+                if backend == 'postgres':
+                    # Bound now: background updates run outside the app context
+                    _index = PostgresSearchBackend(db.engine)
+                else:
+                    os.makedirs(os.path.dirname(SEARCH_INDEX_PATH) or '.', exist_ok=True)
+                    _index = SQLiteSearchBackend(SEARCH_INDEX_PATH)
+    return _index
+
+
+def set_search_index(index):
+    """Replace the process-wide backend (tests, scripts)"""
+    global _index
+    _index = index
+
+
+# ==================== ENTRIES ====================
+
+def _join(*values) -> str:
+    return ' '.join(str(value) for value in values if value not in (None, ''))
+
+
+def _json_text(raw: Optional[str]) -> str:
+    """String and number leaves of a JSON column, space separated"""
+    if not raw:
+        return ''
+    try:
+        data = json.loads(raw)
+    except (TypeError, ValueError):
+        return raw
+    leaves: List[str] = []
+
+    def walk(value):
+        if isinstance(value, dict):
+            for item in value.values():
+                walk(item)
+        elif isinstance(value, list):
+            for item in value:
+                walk(item)
+        elif isinstance(value, (str, int, float)) and not isinstance(value, bool):
+            leaves.append(str(value))
+
+    walk(data)
+    return ' '.join(leaves)
+
+
+def _stored_text(path: Optional[str]) -> str:
+    """Extracted text of an uploaded file, if the page store has it (never parses the file)"""
+    if not path or not os.path.isfile(path):
+        return ''
+    from services.page_text_store_service import get_page_text_store, hash_file
+    from services.upload_store_service import get_upload_store
+
+    store = get_page_text_store()
+    if store is None:
+        return ''
+    try:
+        # Stored uploads are named by their SHA-256; only files saved before
+        # the upload store existed are hashed (entries are built off the request path)
+        stored = store.open(get_upload_store().content_hash(path) or hash_file(path))
+        if stored is None:
+            return ''
+        with stored:
+            texts, size = [], 0
+            for number in range(1, stored.page_count + 1):
+                page = stored.page(number)
+                texts.append(page.text if page.ocr is None else page.text + '\n' + page.ocr)
+                size += len(texts[-1])
+                if size >= SEARCH_MAX_BODY_CHARS:
+                    break
+        return '\n'.join(texts)
+    except Exception as e:
+        logger.debug("No stored text for %s: %s", path, e)
+        return ''
+
+
+def _cap(body: str) -> str:
+    return body[:SEARCH_MAX_BODY_CHARS]
+
+
+def _document_entries(conn, ids: List[int]) -> List[IndexEntry]:
+    documents = Document.__table__
+    amv = AMVDocument.__table__
+    verification = AMVVerificationDocument.__table__
+    details: Dict[int, List[str]] = {}
+    for row in conn.execute(select(amv).where(amv.c.document_id.in_(ids))).mappings():
+        details.setdefault(row['document_id'], []).append(_join(
+            row['product_name'], row['active_ingredient'], row['label_claim'], row['strength'],
+            row['instrument_type']))
+    for row in conn.execute(select(verification).where(verification.c.document_id.in_(ids))).mappings():
+        details.setdefault(row['document_id'], []).append(_join(
+            row['product_name'], row['active_ingredient'], row['label_claim'], row['test_method'],
+            row['company_name'], row['protocol_number'], row['molecular_formula']))
+    verification_text = {row.document_id: _join(_json_text(row.method_parameters),
+                                                _json_text(row.validation_parameters))
+                         for row in conn.execute(select(verification.c.document_id, verification.c.method_parameters,
+                                                        verification.c.validation_parameters)
+                                                 .where(verification.c.document_id.in_(ids)))}
+
+    entries = []
+    for row in conn.execute(select(documents).where(documents.c.id.in_(ids))).mappings():
+        body = _join(_json_text(row['document_metadata']), verification_text.get(row['id']),
+                     _stored_text(row['stp_file_url']), _stored_text(row['method_analysis_file_url']))
+        entries.append(IndexEntry(
+            'document', row['id'], row['user_id'], row['document_type'], row['title'],
+            _join(row['document_number'], row['document_type'], *details.get(row['id'], [])), _cap(body)))
+    return entries
+
+
+def _template_entries(conn, ids: List[int]) -> List[IndexEntry]:
+    templates = PVP_Template.__table__
+    return [
+        IndexEntry('pvp_template', row.id, row.user_id, 'pvp', row.template_name,
+                   _join(row.product_name, row.product_type, row.batch_size), _cap(_stored_text(row.original_filepath)))
+        for row in conn.execute(select(templates.c.id, templates.c.user_id, templates.c.template_name,
+                                       templates.c.product_name, templates.c.product_type, templates.c.batch_size,
+                                       templates.c.original_filepath).where(templates.c.id.in_(ids)))
+    ]
+
+
+def _report_entries(conn, ids: List[int]) -> List[IndexEntry]:
+    reports = PVR_Report.__table__
+    templates = PVP_Template.__table__
+    query = select(reports, templates.c.template_name, templates.c.product_name, templates.c.product_type) \
+        .select_from(reports.outerjoin(templates, reports.c.pvp_template_id == templates.c.id)) \
+        .where(reports.c.id.in_(ids))
+    return [
+        IndexEntry('pvr_report', row['id'], row['user_id'], 'pvr', _join(row['template_name'], 'PVR'),
+                   _join(row['product_name'], row['product_type'], row['protocol_number'], row['validation_type'],
+                         row['manufacturing_site'], row['prepared_by'], row['checked_by'], row['approved_by'],
+                         row['status']))
+        for row in conn.execute(query).mappings()
+    ]
+
+
+_BUILDERS = {'document': _document_entries, 'pvp_template': _template_entries, 'pvr_report': _report_entries}
+
+
+def build_entries(conn, keys: Iterable[Tuple[str, int]]) -> Tuple[List[IndexEntry], List[int]]:
+    """Entries for ``(source, id)`` keys from the current rows, and the ids of rows that no longer exist"""
+    by_source: Dict[str, Set[int]] = {}
+    for source, source_id in keys:
+        by_source.setdefault(source, set()).add(source_id)
+    # A template's reports carry its product name
+    template_ids = sorted(by_source.get('pvp_template', ()))
+    if template_ids:
+        reports = PVR_Report.__table__
+        by_source.setdefault('pvr_report', set()).update(
+            conn.execute(select(reports.c.id).where(reports.c.pvp_template_id.in_(template_ids))).scalars())
+
+    entries: List[IndexEntry] = []
+    deleted: List[int] = []
+    for source, ids in by_source.items():
+        ids = sorted(ids)
+        built = []
+        for start in range(0, len(ids), 500):
+            built.extend(_BUILDERS[source](conn, ids[start:start + 500]))
+        found = {entry.source_id for entry in built}
+        entries.extend(built)
+        deleted.extend(entry_id(source, source_id) for source_id in ids if source_id not in found)
+    return entries, deleted
+
+
+# ==================== INCREMENTAL UPDATES ====================
+
+_PENDING = 'search_index_pending'
+
+
+def _keys_for(target) -> Dict[Tuple[str, int], Optional[int]]:
+    """Index keys a changed row affects, with their owner when it is known without a query"""
+    if isinstance(target, Document):
+        return {('document', target.id): target.user_id}
+    if isinstance(target, (AMVDocument, AMVVerificationDocument)):
+        if not target.document_id:
+            return {}
+        # Only an already loaded parent; a lazy load inside a flush is not allowed
+        document = target.__dict__.get('document')
+        return {('document', target.document_id): document.user_id if document is not None else None}
+    if isinstance(target, PVP_Template):
+        return {('pvp_template', target.id): target.user_id}
+    if isinstance(target, PVR_Report):
+        return {('pvr_report', target.id): target.user_id}
+    return {}
+
+
+def _queue_change(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        pending = session.info.setdefault(_PENDING, {})
+        for key, user_id in _keys_for(target).items():
+            if pending.get(key) is None:
+                pending[key] = user_id
+
+
+def apply_index_updates(engine, keys: Dict[Tuple[str, int], Optional[int]], index=None):
+    """
+    Rebuild the entries for ``keys`` from the committed rows and write them.
+    On failure the known owners are marked unseeded, so their next search
+    reindexes them instead of serving stale entries for good.
+    """
+    index = index or get_search_index()
+    try:
+        with engine.connect() as conn:
+            entries, deleted = build_entries(conn, keys)
+        index.apply(entries, deleted)
+    except Exception as e:
+        owners = sorted({user_id for user_id in keys.values() if user_id is not None})
+        logger.warning("Search index update failed (%d rows, users %s marked for reindex): %s", len(keys), owners, e)
+        for user_id in owners:
+            try:
+                index.mark_unseeded(user_id)
+            except Exception as unseed_error:
+                logger.error("Could not mark user %s for reindex: %s", user_id, unseed_error)
+
+
+class _IndexUpdater:
+    """Single background thread applying committed changes, in commit order"""
+
+    def __init__(self):
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, engine, index, keys: Dict[Tuple[str, int], Optional[int]]):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='search-index-updater', daemon=True)
+                self._thread.start()
+        self._queue.put((engine, index, keys))
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            # Coalesce a burst of commits into one rebuild per engine and index
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            merged: Dict[Tuple[int, int], Tuple[Any, Any, Dict]] = {}
+            for engine, index, keys in batch:
+                _, _, combined = merged.setdefault((id(engine), id(index)), (engine, index, {}))
+                for key, user_id in keys.items():
+                    if combined.get(key) is None:
+                        combined[key] = user_id
+            try:
+                for engine, index, keys in merged.values():
+                    apply_index_updates(engine, keys, index)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until every submitted update is applied; False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+
+_updater = _IndexUpdater()
+# Give queued updates a moment to land when the process exits
+atexit.register(_updater.wait, 10)
+
+
+def wait_for_index_updates(timeout: Optional[float] = None) -> bool:
+    """Wait for this process's queued index updates (worker processes, tests)"""
+    return _updater.wait(timeout)
+
+
+def _apply_after_commit(session):
+    pending = session.info.pop(_PENDING, None)
+    if not pending:
+        return
+    try:
+        _updater.submit(session.get_bind(), get_search_index(), pending)
+    except Exception as e:
+        logger.warning("Could not queue search index update: %s", e)
+
+
+def _discard_after_rollback(session):
+    session.info.pop(_PENDING, None)
+
+
+_listeners_registered = False
+
+
+def register_index_listeners():
+    """Keep the index in step with ORM writes (idempotent)"""
+    global _listeners_registered
+    if _listeners_registered:
+        return
+    for model in (Document, AMVDocument, AMVVerificationDocument, PVP_Template, PVR_Report):
+        for name in ('after_insert', 'after_update', 'after_delete'):
+            event.listen(model, name, _queue_change)
+    event.listen(Session, 'after_commit', _apply_after_commit)
+    event.listen(Session, 'after_rollback', _discard_after_rollback)
+    _listeners_registered = True
+
+
+def remove_index_listeners():
+    """Undo register_index_listeners (tests, one-off scripts)"""
+    global _listeners_registered
+    if not _listeners_registered:
+        return
+    for model in (Document, AMVDocument, AMVVerificationDocument, PVP_Template, PVR_Report):
+        for name in ('after_insert', 'after_update', 'after_delete'):
+            event.remove(model, name, _queue_change)
+    event.remove(Session, 'after_commit', _apply_after_commit)
+    event.remove(Session, 'after_rollback', _discard_after_rollback)
+    _listeners_registered = False
+
+
+# ==================== SEARCH ====================
+
+def _user_keys(conn, user_id: int) -> List[Tuple[str, int]]:
+    keys: List[Tuple[str, int]] = []
+    for source, table in (('document', Document.__table__), ('pvp_template', PVP_Template.__table__),
+                          ('pvr_report', PVR_Report.__table__)):
+        keys.extend((source, source_id) for source_id in
+                    conn.execute(select(table.c.id).where(table.c.user_id == user_id)).scalars())
+    return keys
+
+
+def reindex_user(user_id: int, index=None) -> int:
+    """(Re)index every row owned by ``user_id``; returns the number of entries"""
+    index = index or get_search_index()
+    entries, _ = build_entries(db.session.connection(), _user_keys(db.session.connection(), user_id))
+    # Entries of rows deleted while the user was unseeded go too
+    current = {entry.entry_id for entry in entries}
+    stale = [value for value in index.entry_ids(user_id) if value not in current]
+    for start in range(0, max(len(entries), len(stale), 1), 500):
+        index.apply(entries[start:start + 500], stale[start:start + 500])
+    index.mark_seeded(user_id)
+    return len(entries)
+
+
+def search_documents(user_id: int, query: str, kinds: Optional[List[str]] = None,
+                     page: int = 1, per_page: int = 20, index=None) -> SearchPage:
+    """
+    Ranked page of ``user_id``'s entries matching every term of ``query``
+    (the last term as a prefix), optionally restricted to ``kinds``
+    ('pvp', 'pvr' or a Document.document_type such as 'AMV').
+    """
+    index = index or get_search_index()
+    page = max(1, page)
+    per_page = max(1, min(per_page, SEARCH_MAX_PER_PAGE))
+    terms = query_terms(query)
+    if not terms:
+        return SearchPage([], 0, page, per_page)
+    if not index.is_seeded(user_id):
+        logger.info("Indexing documents of user %s for search", user_id)
+        reindex_user(user_id, index)
+    hits, total = index.search(user_id, terms, kinds, per_page, (page - 1) * per_page)
+    return SearchPage(hits, total, page, per_page)
+
+
+def rebuild_search_index(index=None) -> int:
+    """Drop and rebuild the whole index from the database"""
+    index = index or get_search_index()
+    index.clear()
+    user_ids: Set[int] = set()
+    for table in (Document.__table__, PVP_Template.__table__, PVR_Report.__table__):
+        user_ids.update(db.session.execute(select(table.c.user_id).distinct()).scalars())
+    return sum(reindex_user(user_id, index) for user_id in sorted(user_ids))
+
+
+def search_rows(model, user_id: int, query: str, kinds: Optional[List[str]] = None,
+                page: int = 1, per_page: int = SEARCH_MAX_PER_PAGE) -> Tuple[list, SearchPage]:
+    """
+    ``model`` rows (PVP_Template, PVR_Report or Document) of one search
+    page, in rank order, with the SearchPage they came from.
+    """
+    source = {Document: 'document', PVP_Template: 'pvp_template', PVR_Report: 'pvr_report'}[model]
+    result = search_documents(user_id, query, kinds, page, per_page)
+    ids = [hit.source_id for hit in result.hits if hit.source == source]
+    rows = {row.id: row for row in model.query.filter(model.id.in_(ids), model.user_id == user_id)} if ids else {}
+    return [rows[source_id] for source_id in ids if source_id in rows], result
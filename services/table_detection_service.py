@@ -0,0 +1,272 @@
+"""
+Table Detection - find likely table pages before running Camelot.
+
+Camelot renders every page it is given (Ghostscript for lattice, layout
+analysis for stream), which made ``pages='all'`` the slowest step of PVP
+extraction. Here each page is scored from objects pdfplumber has already
+parsed for text extraction:
+
+* ruled regions: ``page.find_tables()`` over the page's line and rect
+  edges (the vector equivalent of Camelot's lattice line detection);
+* text-grid alignment: rows of words outside those regions whose cell
+  start positions line up with other rows, i.e. whitespace-separated
+  columns that only Camelot's stream flavor can read.
+
+Ruled regions that recur at the same position on most pages with the same
+text (the boxed document header on every page of a protocol), or at the
+same position within the header/footer band whatever their text (a header
+carrying "Page 3 of 12"), are page furniture; only the first page carrying
+one is still sent to Camelot. A table that merely starts at the same place
+on every page, with different rows, is not. Each remaining page gets
+the flavors worth trying (lattice first when it has ruled tables, stream
+when it has aligned text), and the per-page Camelot jobs run on
+services.page_pool_service workers. This module
+imports only pdfplumber so spawned workers start quickly; Camelot is
+imported inside the worker.
+"""
+
+import os
+import time
+import hashlib
+import logging
+import importlib.util
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pdfplumber
+
+from services.page_pool_service import run_page_jobs
+
+logger = logging.getLogger(__name__)
+
+CAMELOT_AVAILABLE = importlib.util.find_spec('camelot') is not None
+
+TABLE_WORKERS = int(os.getenv('PVP_TABLE_WORKERS', str(min(4, os.cpu_count() or 1))))
+TABLE_TIME_BUDGET_SECONDS = float(os.getenv('PVP_TABLE_TIME_BUDGET', '300'))
+# Rows of aligned text needed before a page is worth a stream pass
+MIN_ALIGNED_ROWS = int(os.getenv('PVP_TABLE_MIN_ALIGNED_ROWS', '4'))
+
+# Horizontal gap (points) that starts a new cell within a row of words
+CELL_GAP = 12.0
+# Words whose tops are this close (points) are on the same row
+ROW_TOLERANCE = 3.0
+# Cell starts this close (points) are in the same column
+COLUMN_TOLERANCE = 4.0
+# A column needs this many rows before it counts as a column
+MIN_COLUMN_ROWS = 3
+# Cells (in shared columns) a row needs to count as a table row; two would
+# also match bulleted and "label: value" lists
+MIN_ROW_CELLS = 3
+# A ruled region at the same place on at least this share of pages is furniture
+RUNNING_REGION_SHARE = 0.5
+# Share of the page height at the top and bottom where running headers and footers sit
+HEADER_FOOTER_BAND = 0.12
+
+
+def _region_key(bbox) -> Tuple[int, int, int, int]:
+    return tuple(int(round(value / 2.0)) for value in bbox)
+
+
+def _text_digest(words: List[Dict]) -> str:
+    """Short digest of the words inside a region, to tell repeated boxes from repeated positions"""
+    text = ' '.join(word['text'] for word in sorted(words, key=lambda w: (round(w['top']), w['x0'])))
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=8).hexdigest()
+
+
+@dataclass
+class PageTableScore:
+    """What a page looks like to the table prefilter"""
+    page_number: int
+    ruled_regions: List[Tuple[int, int, int, int]] = field(default_factory=list)
+    aligned_rows: int = 0
+    # Digest of the text inside each ruled region (parallel to ruled_regions)
+    region_texts: List[str] = field(default_factory=list)
+    page_height: Optional[float] = None
+    # Set by plan_table_pages: ruled regions that are page furniture here
+    running_regions: int = 0
+    # Scoring failed; the page is sent to Camelot as before
+    unscored: bool = False
+
+    @classmethod
+    def from_stored(cls, page_number: int, data: Optional[Dict],
+                    page_height: Optional[float] = None) -> 'PageTableScore':
+        """Rebuild from the ``table_score`` saved in the page store"""
+        if not data:
+            return cls(page_number, unscored=True)
+        return cls(page_number, [tuple(region) for region in data.get('ruled_regions', [])],
+                   data.get('aligned_rows', 0), list(data.get('region_texts', [])), page_height,
+                   unscored=data.get('unscored', False))
+
+    def in_band(self, region: Tuple[int, int, int, int]) -> bool:
+        """Whether a ruled region lies wholly in the header or footer band"""
+        if not self.page_height:
+            return False
+        band = HEADER_FOOTER_BAND * self.page_height
+        top, bottom = region[1] * 2.0, region[3] * 2.0
+        return bottom <= band or top >= self.page_height - band
+
+    def furniture_keys(self) -> List[Tuple]:
+        """
+        One key per ruled region; regions with equal keys on many pages are
+        furniture. Outside the header/footer band the key includes the
+        region's text, so a table that only repeats its position differs.
+        """
+        keys = []
+        for i, region in enumerate(self.ruled_regions):
+            if self.in_band(region):
+                keys.append((region, None))
+            else:
+                # Scores stored without text digests never match on text
+                text = self.region_texts[i] if i < len(self.region_texts) else ('page', self.page_number)
+                keys.append((region, text))
+        return keys
+
+    @property
+    def flavors(self) -> List[str]:
+        """Camelot flavors to try on this page, in order; empty to skip it"""
+        if self.unscored:
+            return ['lattice', 'stream']
+        flavors = []
+        if len(self.ruled_regions) > self.running_regions:
+            flavors.append('lattice')
+        if self.aligned_rows >= MIN_ALIGNED_ROWS:
+            flavors.append('stream')
+        return flavors
+
+
+def _aligned_rows(words: List[Dict]) -> int:
+    """Rows with at least ``MIN_ROW_CELLS`` cells starting in shared columns"""
+    rows: List[List[Dict]] = []
+    for word in sorted(words, key=lambda w: (w['top'], w['x0'])):
+        if rows and abs(word['top'] - rows[-1][0]['top']) <= ROW_TOLERANCE:
+            rows[-1].append(word)
+        else:
+            rows.append([word])
+
+    row_starts: List[List[float]] = []
+    for row in rows:
+        row.sort(key=lambda w: w['x0'])
+        starts = [row[0]['x0']]
+        for previous, word in zip(row, row[1:]):
+            if word['x0'] - previous['x1'] > CELL_GAP:
+                starts.append(word['x0'])
+        if len(starts) >= MIN_ROW_CELLS:
+            row_starts.append(starts)
+
+    columns = Counter(int(start // COLUMN_TOLERANCE) for starts in row_starts for start in set(starts))
+
+    def shared(start: float) -> bool:
+        # Tolerate starts that straddle a bucket boundary
+        bucket = int(start // COLUMN_TOLERANCE)
+        return max(columns[bucket - 1], columns[bucket], columns[bucket + 1]) >= MIN_COLUMN_ROWS
+
+    return sum(1 for starts in row_starts if sum(shared(start) for start in starts) >= MIN_ROW_CELLS)
+
+
+def score_page(page, page_number: int, tables: Optional[List] = None) -> PageTableScore:
+    """
+    Score one pdfplumber page (1-based ``page_number``); ``tables`` is the
+    page's ``find_tables()`` result when the caller already has it.
+    """
+    try:
+        if tables is None:
+            tables = page.find_tables()
+        regions = [table.bbox for table in tables]
+
+        def outside(word):
+            return not any(x0 <= word['x0'] and word['x1'] <= x1 and top <= word['top'] and word['bottom'] <= bottom
+                           for x0, top, x1, bottom in regions)
+
+        all_words = page.extract_words()
+        region_texts = [_text_digest([word for word in all_words
+                                      if x0 <= word['x0'] and word['x1'] <= x1 and top <= word['top']
+                                      and word['bottom'] <= bottom])
+                        for x0, top, x1, bottom in regions]
+        words = [word for word in all_words if outside(word)]
+        return PageTableScore(page_number, [_region_key(bbox) for bbox in regions], _aligned_rows(words),
+                              region_texts, float(page.height))
+    except Exception as e:
+        logger.debug("Table scoring failed on page %d: %s", page_number, e)
+        return PageTableScore(page_number, unscored=True)
+
+
+def plan_table_pages(scores: List[PageTableScore]) -> List[PageTableScore]:
+    """
+    Mark running (repeated) ruled regions and return the pages worth a Camelot pass.
+
+    A region is running when the same furniture key (position, plus text
+    outside the header/footer band) is on enough pages. The first page
+    carrying a running region keeps it, so its table is still extracted once.
+    """
+    scored = [score for score in scores if not score.unscored]
+    pages_with = Counter(key for score in scored for key in set(score.furniture_keys()))
+    running = {key for key, count in pages_with.items()
+               if count >= 2 and count >= RUNNING_REGION_SHARE * len(scored)}
+    kept = set()
+    for score in scored:
+        score.running_regions = 0
+        for key in set(score.furniture_keys()) & running:
+            if key in kept:
+                score.running_regions += 1
+            else:
+                kept.add(key)
+    return [score for score in scores if score.flavors]
+
+
+def detect_table_pages(pdf_path: str) -> List[PageTableScore]:
+    """Score every page of ``pdf_path``; see ``plan_table_pages`` for the selection"""
+    with pdfplumber.open(pdf_path) as pdf:
+        return [score_page(page, number) for number, page in enumerate(pdf.pages, start=1)]
+
+
+def read_page_tables(pdf_path: str, page_number: int, flavors: List[str]) -> Tuple[int, List]:
+    """
+    Camelot tables (as DataFrames) on one page, trying ``flavors`` in order
+    until one finds a table.
+    """
+    import camelot
+
+    for flavor in flavors:
+        try:
+            tables = camelot.read_pdf(pdf_path, pages=str(page_number), flavor=flavor)
+        except Exception as e:
+            logger.debug("Camelot %s failed on page %d: %s", flavor, page_number, e)
+            continue
+        frames = []
+        for table in tables:
+            if table.df is not None and table.df.shape[0] > 0:
+                frames.append(table.df)
+            try:
+                if hasattr(table, '_close_temp_files'):
+                    table._close_temp_files()
+            except Exception:
+                pass
+        if frames:
+            return page_number, frames
+    return page_number, []
+
+
+def extract_tables(pdf_path: str, pages: List[PageTableScore], workers: Optional[int] = None,
+                   time_budget: Optional[float] = None,
+                   reader: Callable[[str, int, List[str]], Tuple[int, List]] = read_page_tables
+                   ) -> Tuple[List, List[int]]:
+    """
+    Run ``reader`` (Camelot by default) on each of ``pages`` and return
+    ``(tables_in_page_order, truncated_pages)``; see ``run_page_jobs`` for
+    the time budget.
+    """
+    workers = TABLE_WORKERS if workers is None else workers
+    time_budget = TABLE_TIME_BUDGET_SECONDS if time_budget is None else time_budget
+    if not pages:
+        return [], []
+
+    start = time.monotonic()
+    results, truncated = run_page_jobs(
+        reader, pdf_path, [(score.page_number, score.flavors) for score in pages],
+        workers, time_budget, label='Table extraction'
+    )
+    tables = [table for page_num in sorted(results) for table in results[page_num]]
+    logger.info("Camelot read %d candidate pages (%d tables) in %.1fs",
+                len(results), len(tables), time.monotonic() - start)
+    return tables, truncated
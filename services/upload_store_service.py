@@ -0,0 +1,252 @@
+"""
+Upload Store - content-addressed storage for uploaded files, shared across users.
+
+Uploads used to be written under their (secured) original filename, some
+with a timestamp prefix and some without, so two users uploading
+``method.pdf`` overwrote each other, and the same STP uploaded ten times was
+stored, and parsed, ten times.
+
+``UploadStore.save`` spools the upload stream to a temporary file while
+hashing it, then keeps one blob per content under
+
+    UPLOAD_STORE_DIR/<sha256[:2]>/<sha256[2:4]>/<sha256><ext>
+
+A small SQLite index (independent of the main database, like the PV job
+queue) counts the references to each blob: every save of the same bytes
+adds a reference instead of a file, and ``release`` drops one, deleting the
+blob with the last. Because the blob name is the SHA-256 of the content,
+the page text store and the extraction caches, which are keyed by the same
+hash, serve a repeat upload without re-extracting it.
+"""
+
+import os
+import re
+import sqlite3
+import hashlib
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Optional
+
+from werkzeug.utils import secure_filename
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_STORE_DIR = os.environ.get('UPLOAD_STORE_DIR', os.path.join('uploads', 'blobs'))
+UPLOAD_STORE_DB = os.environ.get('UPLOAD_STORE_DB', os.path.join('instance', 'upload_store.db'))
+CHUNK_SIZE = 1024 * 1024
+
+_BLOB_NAME = re.compile(r'^([0-9a-f]{64})(\.[0-9a-z]{1,10})?$')
+
+
+@dataclass
+class StoredUpload:
+    """Result of saving one upload"""
+    path: str
+    sha256: str
+    size: int
+    original_name: str
+    # True when the content was already stored and only a reference was added
+    deduplicated: bool
+
+
+def _extension(filename: str) -> str:
+    """Lowercased extension of an upload's name ('.pdf'), kept so readers can dispatch on it"""
+    ext = os.path.splitext(secure_filename(filename or ''))[1].lower()
+    return ext if re.fullmatch(r'\.[0-9a-z]{1,10}', ext) else ''
+
+
+class UploadStore:
+    """Sharded content-addressed blob directory with a reference-counted index"""
+
+    def __init__(self, root: str = UPLOAD_STORE_DIR, db_path: str = UPLOAD_STORE_DB):
+        self.root = root
+        self.db_path = db_path
+        os.makedirs(os.path.join(root, 'tmp'), exist_ok=True)
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS upload_blobs (
+                    blob_name TEXT PRIMARY KEY,
+                    sha256 TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    ref_count INTEGER NOT NULL,
+                    created_at TEXT NOT NULL,
+                    last_used_at TEXT NOT NULL
+                )
+            """)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def path_for(self, blob_name: str) -> str:
+        return os.path.join(self.root, blob_name[:2], blob_name[2:4], blob_name)
+
+    def blob_name(self, path: Optional[str]) -> Optional[str]:
+        """Blob name of a path inside this store, None for any other path"""
+        if not path:
+            return None
+        name = os.path.basename(path)
+        if not _BLOB_NAME.match(name):
+            return None
+        if os.path.abspath(path) != os.path.abspath(self.path_for(name)):
+            return None
+        return name
+
+    def content_hash(self, path: Optional[str]) -> Optional[str]:
+        """SHA-256 of a stored blob, read from its name (no hashing)"""
+        name = self.blob_name(path)
+        return _BLOB_NAME.match(name).group(1) if name else None
+
+    def save(self, file, filename: Optional[str] = None) -> StoredUpload:
+        """
+        Store an upload (a werkzeug FileStorage or any binary file object)
+        and return where it lives. The stream is read once, in chunks:
+        hashed while it is written to a temporary file in the store.
+        """
+        original_name = filename or getattr(file, 'filename', None) or ''
+        stream = getattr(file, 'stream', file)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.join(self.root, 'tmp'), suffix='.upload')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                    digest.update(chunk)
+                    tmp.write(chunk)
+                    size += len(chunk)
+            sha256 = digest.hexdigest()
+            blob_name = sha256 + _extension(original_name)
+            path = self.path_for(blob_name)
+            now = datetime.now().isoformat()
+
+            with self._connect() as conn:
+                # Serialises savers and releasers of the same blob
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    row = conn.execute("SELECT ref_count FROM upload_blobs WHERE blob_name = ?",
+                                       (blob_name,)).fetchone()
+                    deduplicated = row is not None and os.path.exists(path)
+                    if not deduplicated:
+                        os.makedirs(os.path.dirname(path), exist_ok=True)
+                        os.replace(tmp_path, path)
+                    # A row whose blob went missing is restored; its references point at it again
+                    conn.execute("""
+                        INSERT INTO upload_blobs (blob_name, sha256, size, ref_count, created_at, last_used_at)
+                        VALUES (?, ?, ?, 1, ?, ?)
+                        ON CONFLICT (blob_name) DO UPDATE SET
+                            ref_count = ref_count + 1, last_used_at = excluded.last_used_at
+                    """, (blob_name, sha256, size, now, now))
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        if deduplicated:
+            logger.info("Upload %s matches stored blob %s", original_name, blob_name)
+        return StoredUpload(path, sha256, size, original_name, deduplicated)
+
+    def release(self, path: Optional[str]) -> bool:
+        """
+        Drop one reference to a stored blob; the blob is deleted with its
+        last reference. Returns True when the blob was deleted. Paths outside
+        the store are ignored.
+        """
+        blob_name = self.blob_name(path)
+        if blob_name is None:
+            return False
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT ref_count FROM upload_blobs WHERE blob_name = ?", (blob_name,)).fetchone()
+                # Without a row the references are unknown: the blob is left alone
+                deleted = row is not None and row[0] <= 1
+                if deleted:
+                    conn.execute("DELETE FROM upload_blobs WHERE blob_name = ?", (blob_name,))
+                    if os.path.exists(path):
+                        os.remove(path)
+                elif row is not None:
+                    conn.execute("UPDATE upload_blobs SET ref_count = ref_count - 1 WHERE blob_name = ?", (blob_name,))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return deleted
+
+    def ref_count(self, path: Optional[str]) -> int:
+        blob_name = self.blob_name(path)
+        if blob_name is None:
+            return 0
+        with self._connect() as conn:
+            row = conn.execute("SELECT ref_count FROM upload_blobs WHERE blob_name = ?", (blob_name,)).fetchone()
+        return row[0] if row else 0
+
+    def stats(self) -> Dict[str, int]:
+        """Blobs, references, bytes stored and bytes the references would take without sharing"""
+        with self._connect() as conn:
+            blobs, refs, stored, referenced = conn.execute(
+                "SELECT count(*), coalesce(sum(ref_count), 0), coalesce(sum(size), 0), "
+                "coalesce(sum(size * ref_count), 0) FROM upload_blobs"
+            ).fetchone()
+        return {'blobs': blobs, 'references': refs, 'bytes_stored': stored, 'bytes_referenced': referenced}
+
+
+_store: Optional[UploadStore] = None
+_store_lock = threading.Lock()
+
+
+def get_upload_store() -> UploadStore:
+    """Process-wide upload store"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = UploadStore()
+    return _store
+
+
+def release_upload(path: Optional[str]) -> bool:
+    """Drop one reference to ``path`` in the process-wide store, logging instead of raising"""
+    if not path:
+        return False
+    try:
+        deleted = get_upload_store().release(path)
+    except (OSError, sqlite3.Error) as e:
+        logger.warning("Could not release upload %s: %s", path, e)
+        return False
+    if deleted:
+        _drop_derived_data(path)
+    return deleted
+
+
+def _drop_derived_data(path: str):
+    """Remove what other caches derived from a blob that has just been deleted"""
+    # Imported here: the upload store is used by modules that must import quickly
+    from services.image_asset_service import forget_image_asset
+    from services.page_text_store_service import get_page_text_store
+
+    try:
+        forget_image_asset(path)
+    except OSError as e:
+        logger.warning("Could not drop cached images of %s: %s", path, e)
+    content_hash = get_upload_store().content_hash(path)
+    page_store = get_page_text_store() if content_hash else None
+    if page_store is not None:
+        try:
+            page_store.delete(content_hash)
+        except OSError as e:
+            logger.warning("Could not drop the page store entry of %s: %s", path, e)
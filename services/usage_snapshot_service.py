@@ -0,0 +1,129 @@
+"""
+Usage Snapshot Service - per-user document counts for templates and limits.
+
+The template context processor runs on every render and used to issue
+several COUNT queries (monthly usage twice, AMV and AMV verification totals)
+each time. A snapshot gathers all of them in one conditional-aggregate query
+over ``documents``, is memoized on ``flask.g`` for the rest of the request,
+and is cached per user for USAGE_SNAPSHOT_TTL seconds. Inserting or deleting
+a Document invalidates the owner's cached snapshot.
+
+Monthly usage is counted with a ``created_at`` range (month start inclusive,
+next month start exclusive) so the (user_id, created_at) index can be used;
+``extract(month)``/``extract(year)`` comparisons cannot use an index.
+"""
+
+import os
+import time
+import threading
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from flask import g, has_app_context
+from sqlalchemy import and_, case, event, func
+
+from database import db
+from models import Document, User
+
+USAGE_SNAPSHOT_TTL = float(os.environ.get('USAGE_SNAPSHOT_TTL', '30'))
+
+
+def month_bounds(now: Optional[datetime] = None) -> Tuple[datetime, datetime]:
+    """[start, end) datetimes for the calendar month containing ``now``"""
+    now = now or datetime.now()
+    start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    if start.month == 12:
+        end = start.replace(year=start.year + 1, month=1)
+    else:
+        end = start.replace(month=start.month + 1)
+    return start, end
+
+
+def count_monthly_documents(user_id: int, now: Optional[datetime] = None) -> int:
+    """Uncached count of documents the user created this month"""
+    start, end = month_bounds(now)
+    return Document.query.filter(
+        Document.user_id == user_id,
+        Document.created_at >= start,
+        Document.created_at < end
+    ).count()
+
+
+class UsageSnapshotCache:
+    """Process-local TTL cache of usage snapshots keyed by user id"""
+
+    def __init__(self, ttl: float = USAGE_SNAPSHOT_TTL):
+        self.ttl = ttl
+        self._entries: Dict[int, Tuple[float, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[0] > time.monotonic():
+                return entry[1]
+            self._entries.pop(user_id, None)
+        return None
+
+    def set(self, user_id: int, snapshot: Dict[str, Any]):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, snapshot)
+
+    def invalidate(self, user_id: Optional[int] = None):
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+
+snapshot_cache = UsageSnapshotCache()
+
+
+def _load_snapshot(user_id: int) -> Dict[str, Any]:
+    start, end = month_bounds()
+    monthly, amv, amv_verification = db.session.query(
+        func.count(case((and_(Document.created_at >= start, Document.created_at < end), 1))),
+        func.count(case((Document.document_type == 'AMV', 1))),
+        func.count(case((Document.document_type == 'AMV_VERIFICATION', 1))),
+    ).filter(Document.user_id == user_id).one()
+    return {
+        'monthly_documents': monthly or 0,
+        'amv_documents': amv or 0,
+        'amv_verification_documents': amv_verification or 0,
+        'month_start': start,
+    }
+
+
+def get_usage_snapshot(user_id: int) -> Dict[str, Any]:
+    """Usage counts for ``user_id``: request-memoized, then TTL-cached"""
+    memo = g.setdefault('_usage_snapshots', {}) if has_app_context() else {}
+    if user_id in memo:
+        return memo[user_id]
+
+    snapshot = snapshot_cache.get(user_id)
+    # A cached snapshot from last month is stale regardless of TTL
+    if snapshot is None or snapshot['month_start'] != month_bounds()[0]:
+        snapshot = _load_snapshot(user_id)
+        snapshot_cache.set(user_id, snapshot)
+
+    memo[user_id] = snapshot
+    return snapshot
+
+
+def get_request_user(user_id: int) -> Optional[User]:
+    """User row for the current request, loaded once"""
+    if not has_app_context():
+        return db.session.get(User, user_id)
+    users = g.setdefault('_request_users', {})
+    if user_id not in users:
+        users[user_id] = db.session.get(User, user_id)
+    return users[user_id]
+
+
+@event.listens_for(Document, 'after_insert')
+@event.listens_for(Document, 'after_delete')
+def _invalidate_owner_snapshot(mapper, connection, target):
+    snapshot_cache.invalidate(target.user_id)
+    if has_app_context():
+        g.pop('_usage_snapshots', None)
@@ -0,0 +1,154 @@
+"""
+Activity Log Writer Tests - batches are flushed by size, by time and on shutdown.
+
+A full queue drops entries instead of blocking the request, a bad row only
+costs itself rather than its whole batch, and log_activity never commits
+the caller's session.
+
+Run with pytest, or directly: python test_activity_log.py
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+from datetime import datetime
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask
+
+from database import db
+from models import ActivityLog, User
+from services import activity_log_service
+from services.activity_log_service import ActivityLogWriter
+from utils.helpers import log_activity
+
+
+def make_app(workdir):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(workdir, 'activity.db')
+    db.init_app(app)
+    return app
+
+
+def row(action):
+    return {'user_id': 1, 'action': action, 'details': None, 'ip_address': None,
+            'timestamp': datetime.utcnow()}
+
+
+def logged_actions():
+    return sorted(entry.action for entry in ActivityLog.query.all())
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return condition()
+
+
+def run_with_writer(test_body, **writer_args):
+    workdir = tempfile.mkdtemp()
+    app = make_app(workdir)
+    writer = ActivityLogWriter(**writer_args)
+    try:
+        with app.app_context():
+            db.create_all()
+            writer.bind(db.engine)
+            test_body(writer)
+    finally:
+        writer.shutdown()
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_a_full_batch_is_flushed_before_the_interval():
+    def body(writer):
+        for action in ('a', 'b', 'c'):
+            assert writer.enqueue(row(action))
+        assert wait_for(lambda: writer.metrics()['written'] == 3)
+        assert writer.metrics()['flushes'] == 1
+        assert logged_actions() == ['a', 'b', 'c']
+
+    run_with_writer(body, batch_size=3, flush_interval=60, synchronous=False)
+
+
+def test_a_partial_batch_is_flushed_after_the_interval():
+    def body(writer):
+        writer.enqueue(row('a'))
+        writer.enqueue(row('b'))
+        assert wait_for(lambda: writer.metrics()['written'] == 2)
+        assert writer.metrics()['flushes'] == 1
+        assert logged_actions() == ['a', 'b']
+
+    run_with_writer(body, batch_size=100, flush_interval=0.3, synchronous=False)
+
+
+def test_shutdown_drains_the_queue():
+    def body(writer):
+        for i in range(5):
+            writer.enqueue(row(f'a{i}'))
+        writer.shutdown()
+        metrics = writer.metrics()
+        assert metrics['written'] == 5
+        assert metrics['queue_depth'] == 0
+        assert len(logged_actions()) == 5
+
+    run_with_writer(body, batch_size=100, flush_interval=60, synchronous=False)
+
+
+def test_a_full_queue_drops_entries():
+    def body(writer):
+        # Keep the consumer thread from emptying the queue
+        writer._ensure_started = lambda: None
+        assert writer.enqueue(row('a'))
+        assert writer.enqueue(row('b'))
+        assert not writer.enqueue(row('c'))
+        metrics = writer.metrics()
+        assert (metrics['enqueued'], metrics['dropped'], metrics['queue_depth']) == (2, 1, 2)
+
+    run_with_writer(body, max_queue=2, synchronous=False)
+
+
+def test_a_bad_row_does_not_fail_its_batch():
+    def body(writer):
+        writer._flush([row('a'), row(None), row('c')])  # action is NOT NULL
+        metrics = writer.metrics()
+        assert (metrics['written'], metrics['failed']) == (2, 1)
+        assert logged_actions() == ['a', 'c']
+
+    run_with_writer(body, synchronous=True)
+
+
+def test_log_activity_does_not_commit_the_callers_session():
+    def body(writer):
+        previous = activity_log_service._writer
+        activity_log_service._writer = writer
+        try:
+            db.session.add(User(id=1, firebase_uid='u1', email='u1@example.com', name='U1'))
+            log_activity(1, 'login')
+            db.session.rollback()
+        finally:
+            activity_log_service._writer = previous
+        assert User.query.count() == 0
+        assert logged_actions() == ['login']
+
+    run_with_writer(body, synchronous=True)
+
+
+if __name__ == '__main__':
+    for test in (test_a_full_batch_is_flushed_before_the_interval,
+                 test_a_partial_batch_is_flushed_after_the_interval,
+                 test_shutdown_drains_the_queue,
+                 test_a_full_queue_drops_entries,
+                 test_a_bad_row_does_not_fail_its_batch,
+                 test_log_activity_does_not_commit_the_callers_session):
+        test()
+        print(f"[  ok] {test.__name__}")
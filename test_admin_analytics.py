@@ -0,0 +1,164 @@
+"""
+Admin Analytics Tests - bucketed trends match hand-counted rows.
+
+Closed buckets are cached for the life of the process, so rows inserted
+behind a cached bucket stay invisible until the cache is cleared; a bucket
+only partly covered by the requested range must never be cached.
+
+Run with pytest, or directly: python test_admin_analytics.py
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask
+
+from database import db
+from models import User
+from app_routes import admin
+from services.admin_analytics_service import MAX_BUCKETS, clear_closed_bucket_cache, get_trend
+
+NOW = datetime(2024, 4, 3, 12, 0)
+
+# Saturday, Sunday night, the following Monday twice, a Wednesday, April
+CREATED = [
+    datetime(2024, 3, 9, 10, 0),
+    datetime(2024, 3, 10, 23, 30),
+    datetime(2024, 3, 11, 0, 0),
+    datetime(2024, 3, 11, 12, 0),
+    datetime(2024, 3, 20, 9, 0),
+    datetime(2024, 4, 2, 8, 0),
+]
+
+
+def make_app(workdir):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(workdir, 'analytics.db')
+    app.secret_key = 'test'
+    db.init_app(app)
+    app.register_blueprint(admin.bp)
+    return app
+
+
+def add_user(created_at, is_admin=False):
+    uid = f'u{User.query.count() + 1}'
+    db.session.add(User(firebase_uid=uid, email=f'{uid}@example.com', name=uid,
+                        is_admin=is_admin, created_at=created_at))
+    db.session.commit()
+
+
+def counts(trend):
+    return [(point['period'], point['count']) for point in trend]
+
+
+def run_with_users(test_body):
+    workdir = tempfile.mkdtemp()
+    app = make_app(workdir)
+    clear_closed_bucket_cache()
+    try:
+        with app.app_context():
+            db.create_all()
+            for created_at in CREATED:
+                add_user(created_at)
+            test_body(app)
+    finally:
+        clear_closed_bucket_cache()
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_day_week_and_month_counts():
+    def body(app):
+        day = get_trend('users', 'day', datetime(2024, 3, 9), datetime(2024, 3, 12), now=NOW)
+        assert counts(day) == [('2024-03-09', 1), ('2024-03-10', 1), ('2024-03-11', 2)]
+
+        # Sunday night belongs to the week before; Monday midnight starts a new one
+        week = get_trend('users', 'week', datetime(2024, 3, 4), datetime(2024, 3, 25), now=NOW)
+        assert counts(week) == [('2024-03-04', 2), ('2024-03-11', 2), ('2024-03-18', 1)]
+
+        month = get_trend('users', 'month', datetime(2024, 2, 1), datetime(2024, 5, 1), now=NOW)
+        assert counts(month) == [('2024-02', 0), ('2024-03', 5), ('2024-04', 1)]
+        assert month[1]['month'] == '2024-03'
+
+    run_with_users(body)
+
+
+def test_repeat_call_only_queries_the_current_bucket():
+    def body(app):
+        first = get_trend('users', 'month', datetime(2024, 1, 1), now=NOW)
+        assert counts(first) == [('2024-01', 0), ('2024-02', 0), ('2024-03', 5), ('2024-04', 1)]
+
+        add_user(datetime(2024, 3, 15))  # behind a cached, closed bucket
+        add_user(datetime(2024, 4, 3))
+        second = get_trend('users', 'month', datetime(2024, 1, 1), now=NOW)
+        assert counts(second) == [('2024-01', 0), ('2024-02', 0), ('2024-03', 5), ('2024-04', 2)]
+
+        clear_closed_bucket_cache()
+        third = get_trend('users', 'month', datetime(2024, 1, 1), now=NOW)
+        assert counts(third)[2] == ('2024-03', 6)
+
+    run_with_users(body)
+
+
+def test_partial_start_bucket_is_not_cached():
+    def body(app):
+        partial = get_trend('users', 'month', datetime(2024, 3, 15), datetime(2024, 4, 1), now=NOW)
+        assert counts(partial) == [('2024-03', 1)]
+
+        whole = get_trend('users', 'month', datetime(2024, 3, 1), datetime(2024, 4, 1), now=NOW)
+        assert counts(whole) == [('2024-03', 5)]
+
+    run_with_users(body)
+
+
+def test_max_buckets():
+    def body(app):
+        start = datetime(2020, 1, 1)
+        assert len(get_trend('users', 'day', start, start + timedelta(days=MAX_BUCKETS), now=NOW)) == MAX_BUCKETS
+        try:
+            get_trend('users', 'day', start, start + timedelta(days=MAX_BUCKETS + 1), now=NOW)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("a range over MAX_BUCKETS must be rejected")
+
+    run_with_users(body)
+
+
+def test_analytics_route_rejects_bad_parameters():
+    def body(app):
+        add_user(datetime(2024, 1, 1), is_admin=True)
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = User.query.filter_by(is_admin=True).one().id
+
+        response = client.get('/admin/analytics?granularity=week&start=2024-03-04&end=2024-03-24')
+        assert response.status_code == 200
+        assert counts(response.get_json()['user_trends']) == [
+            ('2024-03-04', 2), ('2024-03-11', 2), ('2024-03-18', 1)]
+
+        for query in ('granularity=year',
+                      'start=2024-13-01',
+                      'end=yesterday',
+                      'granularity=day&start=2020-01-01&end=2024-01-01'):
+            response = client.get(f'/admin/analytics?{query}')
+            assert response.status_code == 400, query
+            assert 'error' in response.get_json()
+
+    run_with_users(body)
+
+
+if __name__ == '__main__':
+    for test in (test_day_week_and_month_counts, test_repeat_call_only_queries_the_current_bucket,
+                 test_partial_start_bucket_is_not_cached, test_max_buckets,
+                 test_analytics_route_rejects_bad_parameters):
+        test()
+        print(f"[  ok] {test.__name__}")
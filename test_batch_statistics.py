@@ -0,0 +1,99 @@
+"""
+Batch Statistics Tests - tests that share a name keep their own statistics,
+and the printed figures match hand-computed values.
+
+Run with pytest, or directly: python test_batch_statistics.py
+"""
+
+import os
+import sys
+import math
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services.batch_statistics_service import statistics_for_tests, summarize_test_results, summarize_values
+
+# Two-sided 95% Student t quantile for 2 degrees of freedom
+T_975_2 = 4.302653
+
+
+def test_tests_with_the_same_name_are_kept_apart():
+    stats = summarize_test_results(
+        ['blend_assay', 'tablet_assay', 'hardness'],
+        ['Assay', 'Assay', 'Hardness'],
+        ['95.0% - 105.0%', '90.0% - 110.0%', None],
+        [['99.0', '92.0', 'n/a'], ['101.0', '94.0', ''], ['100.0', '96.0', None]],
+    )
+    # Hardness has no numeric result
+    assert list(stats) == ['blend_assay', 'tablet_assay']
+    assert [record['name'] for record in stats.values()] == ['Assay', 'Assay']
+    assert stats['blend_assay']['mean'] == 100.0 and stats['tablet_assay']['mean'] == 94.0
+
+    records = statistics_for_tests({'ph_bulk': [8.6, 8.8], 'ph_final': [6.0]},
+                                   test_names={'ph_bulk': 'pH', 'ph_final': 'pH'})
+    assert records['ph_bulk']['name'] == records['ph_final']['name'] == 'pH'
+    assert records['ph_bulk']['count'] == 2 and records['ph_final']['mean'] == 6.0
+
+
+
+def close(actual, expected, tolerance=1e-6):
+    return math.isclose(actual, expected, rel_tol=0, abs_tol=tolerance)
+
+
+def test_sd_rsd_and_confidence_interval():
+    # 98, 100, 102: mean 100, squared deviations 4 + 0 + 4
+    summary = summarize_values([98, 100, 102])
+    assert summary['n'] == 3 and summary['mean'] == 100.0
+    assert close(summary['sd'], math.sqrt(8 / 2)) and close(summary['rsd'], 2.0)
+    half_width = T_975_2 * 2.0 / math.sqrt(3)
+    assert close(summary['ci_low'], 100 - half_width) and close(summary['ci_high'], 100 + half_width)
+
+    population = summarize_values([98, 100, 102], ddof=0)
+    assert close(population['sd'], math.sqrt(8 / 3)) and close(population['rsd'], math.sqrt(8 / 3))
+
+
+def test_rsd_is_zero_when_the_mean_is_zero():
+    summary = summarize_values([-1, 0, 1])
+    assert summary['mean'] == 0.0 and close(summary['sd'], 1.0) and summary['rsd'] == 0.0
+
+
+def test_missing_and_non_numeric_results_are_masked():
+    masked = summarize_values([98, None, 'n/a', '', '102 %', 100])
+    assert masked['n'] == 3 and masked['mean'] == 100.0 and close(masked['sd'], 2.0)
+    assert masked['min'] == 98.0 and masked['max'] == 102.0
+
+
+def test_two_sided_and_one_sided_capability():
+    # 99, 101, 103 against 95 - 105: mean 101, sd 2
+    two_sided = summarize_values([99, 101, 103], lower=95, upper=105)
+    assert close(two_sided['cp'], 10 / 12)
+    assert close(two_sided['cpk'], min((105 - 101) / 6, (101 - 95) / 6))
+
+    stats = summarize_test_results(
+        ['assay', 'impurity'], ['Assay', 'Impurity'], ['NLT 95.0%', 'NMT 105'],
+        [['98', None], ['n/a', '99'], ['102', '101'], ['100', '103']],
+    )
+    # One-sided limits have no Cp; Cpk is the index of the bounded side
+    assert stats['assay']['cp'] is None and stats['assay']['cpk'] == round((100 - 95) / 6, 2)
+    assert stats['impurity']['cp'] is None and stats['impurity']['cpk'] == round((105 - 101) / 6, 2)
+    assert stats['assay']['count'] == 3 and stats['assay']['ci_low'] == round(100 - T_975_2 * 2 / math.sqrt(3), 2)
+
+
+def test_single_result_has_no_spread():
+    summary = summarize_values([5.0], lower=0, upper=10)
+    assert summary['n'] == 1 and summary['mean'] == 5.0 and summary['min'] == summary['max'] == 5.0
+    for key in ('sd', 'rsd', 'cp', 'cpk', 'ci_low', 'ci_high'):
+        assert math.isnan(summary[key]), key
+
+    record = statistics_for_tests({'ph': ['6.0']}, limits={'ph': (5.0, 7.0)})['ph']
+    assert record['count'] == 1 and record['mean'] == 6.0
+    assert record['sd'] is record['cpk'] is record['ci_low'] is None
+
+
+if __name__ == '__main__':
+    for test in (test_tests_with_the_same_name_are_kept_apart, test_sd_rsd_and_confidence_interval,
+                 test_rsd_is_zero_when_the_mean_is_zero, test_missing_and_non_numeric_results_are_masked,
+                 test_two_sided_and_one_sided_capability, test_single_result_has_no_spread):
+        test()
+        print(f"[  ok] {test.__name__}")
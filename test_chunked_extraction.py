@@ -0,0 +1,156 @@
+"""
+Chunked Extraction Tests - long documents are extracted in full, chunk by chunk.
+
+A stub LLM client answers each request with the step ids present in the
+text it was sent, so the merged result shows which pages reached the model
+and the request count shows which chunks were re-sent.
+
+Run with pytest, or directly: python test_chunked_extraction.py
+"""
+
+import os
+import re
+import sys
+import json
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services.chunked_extraction_service import extract_array_chunked, split_into_chunks
+import services.chunked_extraction_service as chunked_service
+
+PAGES = 40
+CHUNK_CHARS = 20000
+
+
+def build_document(pages=PAGES, revised_page=None):
+    text = []
+    for page in range(1, pages + 1):
+        marker = " (revised)" if page == revised_page else ""
+        lines = [f"STEP-{page}-{line} Charge and mix for {line} minutes{marker}. " + "x" * 60 for line in range(20)]
+        text.append(f"--- Page {page} ---\n" + "\n".join(lines))
+    return "\n".join(text)
+
+
+class EchoClient:
+    """Stands in for LLMClient; returns the step ids found in each request"""
+
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(max_workers=4)
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def generate(self, contents, generation_config=None, label='generate', deadline=None):
+        with self._lock:
+            self.requests += 1
+        text = contents if isinstance(contents, str) else "\n".join(str(part) for part in contents)
+        steps = sorted(set(re.findall(r'STEP-(\d+)-(\d+)', text)))
+        payload = {"product_name": "Fluorouracil Injection",
+                   "manufacturing_steps": [{"step": f"{page}.{line}"} for page, line in steps]}
+        return type('Response', (), {'text': json.dumps(payload)})()
+
+
+def make_cache(workdir):
+    from services.process_validation_service import CacheManager
+    return CacheManager(cache_dir=workdir)
+
+
+def test_split_keeps_every_page_and_respects_the_limit():
+    text = build_document()
+    chunks = split_into_chunks(text, CHUNK_CHARS)
+    assert len(chunks) > 1
+    assert all(len(chunk.text) <= CHUNK_CHARS for chunk in chunks)
+    # Only the line breaks the chunks were cut at are dropped
+    assert "".join(chunk.text for chunk in chunks).replace("\n", "") == text.replace("\n", "")
+    assert chunks[0].first_page == 1 and chunks[-1].last_page == PAGES
+
+
+def test_long_document_is_extracted_in_full_and_reuses_unchanged_chunks():
+    from services import process_validation_service as pvs
+
+    workdir = tempfile.mkdtemp()
+    chunk_chars = chunked_service.CHUNK_MAX_CHARS
+    chunked_service.CHUNK_MAX_CHARS = CHUNK_CHARS
+    try:
+        client = EchoClient()
+        extractor = pvs.ConsensusExtractor(None, client, make_cache(workdir))
+        text = build_document()
+        assert len(text) > 60000
+        result = extractor.chunked_extract(text, "Extract steps as JSON", "MFR")
+        steps = {step["step"] for step in result["manufacturing_steps"]}
+        assert steps == {f"{page}.{line}" for page in range(1, PAGES + 1) for line in range(20)}
+        assert result["product_name"] == "Fluorouracil Injection"
+        first_run = client.requests
+        assert first_run == extractor.chunk_stats.chunks > 1
+
+        # Revise one page: only its chunk goes back to the model
+        revised = build_document(revised_page=PAGES)
+        extractor.chunked_extract(revised, "Extract steps as JSON", "MFR")
+        assert client.requests == first_run + 1
+        assert extractor.chunk_stats.reused == extractor.chunk_stats.chunks - 1
+    finally:
+        chunked_service.CHUNK_MAX_CHARS = chunk_chars
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_array_extraction_merges_chunks_by_key():
+    workdir = tempfile.mkdtemp()
+    original = chunked_service._cache
+    chunked_service._cache = make_cache(workdir)
+    try:
+        class ArrayClient(EchoClient):
+            def generate(self, contents, generation_config=None, label='generate', deadline=None):
+                pages = sorted({int(page) for page in re.findall(r'STEP-(\d+)-0 ', contents)})
+                # Every chunk also reports the same "pH" test
+                items = [{"test_id": "ph", "test_name": "pH"}] + [{"test_id": f"step_{page}"} for page in pages]
+                return type('Response', (), {'text': "```json\n" + json.dumps(items) + "\n```"})()
+
+        criteria, stats = extract_array_chunked(
+            build_document(), lambda chunk: f"Extract tests:\n{chunk}", ArrayClient(), 'test_criteria',
+            key=lambda item: item.get('test_id'), max_chars=CHUNK_CHARS
+        )
+        ids = [item["test_id"] for item in criteria]
+        assert ids.count("ph") == 1
+        assert {f"step_{page}" for page in range(1, PAGES + 1)} <= set(ids)
+        assert stats.extracted == stats.chunks > 1
+    finally:
+        chunked_service._cache = original
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+
+def test_product_info_reads_only_the_leading_chunks():
+    from services import enhanced_pvp_extraction_service as pvp
+
+    class MissingPackSizeClient(EchoClient):
+        def generate(self, contents, generation_config=None, label='generate', deadline=None):
+            with self._lock:
+                self.requests += 1
+            return type('Response', (), {'text': json.dumps({"product_name": "Fluorouracil Injection"})})()
+
+    chunk_chars, client = chunked_service.CHUNK_MAX_CHARS, pvp._llm_client
+    chunked_service.CHUNK_MAX_CHARS = CHUNK_CHARS
+    try:
+        pvp._llm_client = MissingPackSizeClient()
+        extractor = pvp.EnhancedPVPExtractor('protocol.pdf')
+        extractor.full_text = build_document()
+        assert len(split_into_chunks(extractor.full_text)) > pvp.PRODUCT_INFO_MAX_CHUNKS
+        # pack_size never turns up, yet the rest of the document is not read for it
+        info = extractor._extract_product_info_with_ai()
+        assert info == {"product_name": "Fluorouracil Injection"}
+        assert pvp._llm_client.requests == pvp.PRODUCT_INFO_MAX_CHUNKS
+    finally:
+        chunked_service.CHUNK_MAX_CHARS = chunk_chars
+        pvp._llm_client = client
+
+
+if __name__ == '__main__':
+    for test in (test_split_keeps_every_page_and_respects_the_limit,
+                 test_long_document_is_extracted_in_full_and_reuses_unchanged_chunks,
+                 test_array_extraction_merges_chunks_by_key, test_product_info_reads_only_the_leading_chunks):
+        test()
+        print(f"[  ok] {test.__name__}")
@@ -0,0 +1,76 @@
+"""
+Company Inventory Tests - cached records are dropped when the change commits.
+
+An inventory row moved to another company must disappear from its old
+company's cache as well as show up under the new one, and a flush that is
+later rolled back must not touch the cache.
+
+Run with pytest, or directly: python test_company_inventory.py
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask
+
+from database import db
+from models import Company, Equipment, User
+from services.company_inventory_service import inventory_cache, load_selected
+
+
+def make_app(workdir):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(workdir, 'inventory.db')
+    db.init_app(app)
+    return app
+
+
+def names(company_id, ids):
+    return [record['name'] for record in load_selected(company_id, 'equipment', ids)]
+
+
+def test_moving_equipment_invalidates_both_companies_on_commit():
+    workdir = tempfile.mkdtemp()
+    app = make_app(workdir)
+    inventory_cache.invalidate()
+    try:
+        with app.app_context():
+            db.create_all()
+            db.session.add(User(id=1, firebase_uid='u1', email='u1@example.com', name='U1'))
+            db.session.add_all([Company(id=1, user_id=1, name='A'), Company(id=2, user_id=1, name='B')])
+            db.session.add(Equipment(id=10, company_id=1, name='HPLC'))
+            db.session.commit()
+            assert names(1, [10]) == ['HPLC']
+            assert names(2, [10]) == []
+
+            equipment = db.session.get(Equipment, 10)
+            equipment.company_id = 2
+            equipment.name = 'HPLC 2'
+            db.session.flush()
+            assert names(1, [10]) == ['HPLC']  # still cached until the commit
+
+            db.session.rollback()
+            assert names(1, [10]) == ['HPLC']
+
+            equipment = db.session.get(Equipment, 10)
+            equipment.company_id = 2
+            db.session.commit()
+            assert names(1, [10]) == []
+            assert names(2, [10]) == ['HPLC']
+    finally:
+        inventory_cache.invalidate()
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    for test in (test_moving_equipment_invalidates_both_companies_on_commit,):
+        test()
+        print(f"[  ok] {test.__name__}")
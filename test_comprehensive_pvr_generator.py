@@ -0,0 +1,40 @@
+"""
+Comprehensive PVR Generator Tests - criteria that share a name read their own results.
+
+Run with pytest, or directly: python test_comprehensive_pvr_generator.py
+"""
+
+import os
+import sys
+from types import SimpleNamespace
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from reportlab.platypus import Table
+
+from services.comprehensive_pvr_generator import ComprehensivePVRGenerator
+
+
+def test_statistics_rows_use_each_criterions_own_results():
+    criteria = [
+        SimpleNamespace(test_id='blend_assay', test_name='Assay', acceptance_criteria='95.0% - 105.0%'),
+        SimpleNamespace(test_id='tablet_assay', test_name='Assay', acceptance_criteria='90.0% - 110.0%'),
+        SimpleNamespace(test_id='hardness', test_name='Hardness', acceptance_criteria=None),
+    ]
+    batches = [
+        {'batch_number': 'B1', 'test_results': {'blend_assay': '99.0', 'tablet_assay': '92.0', 'Hardness': '50'}},
+        {'batch_number': 'B2', 'test_results': {'blend_assay': '101.0', 'tablet_assay': '96.0', 'Hardness': '54'}},
+    ]
+    generator = ComprehensivePVRGenerator(SimpleNamespace(criteria=criteria), batches)
+
+    table = next(element for element in generator._build_statistical_analysis() if isinstance(element, Table))
+    rows = {(row[0], row[2]) for row in table._cellvalues[1:]}
+    # Each Assay reads its own test id; Hardness has no id key and falls back to its name
+    assert rows == {('Assay', '100.00'), ('Assay', '94.00'), ('Hardness', '52.00')}
+
+
+if __name__ == '__main__':
+    for test in (test_statistics_rows_use_each_criterions_own_results,):
+        test()
+        print(f"[  ok] {test.__name__}")
@@ -0,0 +1,104 @@
+"""
+Dashboard Stats Tests - counters are seeded once per user and then trusted.
+
+Documents inserted behind the ORM's back stand in for rows that existed
+before the counter table; a later ORM insert leaves the user with partial
+counter rows, which must not be mistaken for complete ones.
+
+Run with pytest, or directly: python test_dashboard_stats.py
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask
+from sqlalchemy import insert, update
+
+from database import db
+from models import Document, User, UserDocumentCounter, UserDocumentCounterSeed, _bump_document_counter
+from services.dashboard_stats_service import get_document_stats, rebuild_document_counters
+
+
+def make_app(workdir):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(workdir, 'stats.db')
+    db.init_app(app)
+    return app
+
+
+def test_partial_counters_are_seeded_from_documents():
+    workdir = tempfile.mkdtemp()
+    app = make_app(workdir)
+    try:
+        with app.app_context():
+            db.create_all()
+            db.session.add(User(id=1, firebase_uid='u1', email='u1@example.com', name='U1'))
+            db.session.commit()
+            # Existing documents: no flush events, so no counters
+            db.session.execute(insert(Document.__table__), [
+                {'user_id': 1, 'company_id': 1, 'document_type': 'AMV', 'title': 'old', 'status': 'draft'},
+                {'user_id': 1, 'company_id': 1, 'document_type': 'AMV', 'title': 'old', 'status': 'completed'},
+                {'user_id': 1, 'company_id': 1, 'document_type': 'PV', 'title': 'old', 'status': 'draft'},
+            ])
+            db.session.commit()
+            db.session.add(Document(user_id=1, company_id=1, document_type='PV', title='new'))
+            db.session.commit()
+            assert db.session.query(UserDocumentCounter).count() == 1
+
+        with app.app_context():
+            stats = get_document_stats(1)
+            assert stats == {'total': 4, 'by_type': {'AMV': 2, 'PV': 2}, 'by_status': {'draft': 3, 'completed': 1}}
+            assert db.session.get(UserDocumentCounterSeed, 1) is not None
+
+        with app.app_context():
+            # Seeded users read the counters only
+            db.session.execute(update(UserDocumentCounter.__table__)
+                               .where(UserDocumentCounter.document_type == 'AMV',
+                                      UserDocumentCounter.status == 'draft').values(count=5))
+            db.session.commit()
+            assert get_document_stats(1)['total'] == 8
+            assert rebuild_document_counters() == 3
+            db.session.expire_all()
+            assert get_document_stats(1)['total'] == 8  # memoized for the request
+
+        with app.app_context():
+            assert get_document_stats(1)['total'] == 4
+    finally:
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_first_document_counter_is_upserted():
+    workdir = tempfile.mkdtemp()
+    app = make_app(workdir)
+    try:
+        with app.app_context():
+            db.create_all()
+            db.session.add(User(id=1, firebase_uid='u1', email='u1@example.com', name='U1'))
+            db.session.commit()
+            # Another transaction created the row for the same key first
+            with db.engine.begin() as conn:
+                _bump_document_counter(conn, 1, 'AMV', 'draft', 1)
+                _bump_document_counter(conn, 1, 'AMV', 'draft', 1)
+            db.session.add(Document(user_id=1, company_id=1, document_type='AMV', title='new'))
+            db.session.commit()
+            counter = db.session.get(UserDocumentCounter, (1, 'AMV', 'draft'))
+            assert counter.count == 3
+    finally:
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    for test in (test_partial_counters_are_seeded_from_documents, test_first_document_counter_is_upserted):
+        test()
+        print(f"[  ok] {test.__name__}")
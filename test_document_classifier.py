@@ -0,0 +1,89 @@
+"""
+Document Classifier Tests - the local STP/MFR classifier skips the LLM when confident.
+
+Run with pytest, or directly: python test_document_classifier.py
+"""
+
+import os
+import sys
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services.document_classifier_service import ClassifierStats, classify_text
+import services.document_classifier_service as classifier_service
+
+STP_TEXT = """--- Page 1 ---
+STANDARD TESTING PROCEDURE
+STP No: STP/FU/001
+--- Page 2 ---
+Assay by HPLC. Mobile phase: buffer and methanol. System suitability: %RSD NMT 2.0.
+"""
+
+MFR_TEXT = """--- Page 1 ---
+MASTER FORMULA RECORD
+MFR No: MFR/FU/001
+--- Page 2 ---
+Batch size: 100 L. Line clearance, dispensing, mixing at 300 rpm, filling and yield.
+"""
+
+AMBIGUOUS_TEXT = """--- Page 1 ---
+Fluorouracil Injection 50 mg/ml
+Equipment list and assay limit.
+"""
+
+
+class RecordingClient:
+    """Stands in for LLMClient; answers every call with ``answer``"""
+
+    def __init__(self, answer):
+        self.answer = answer
+        self.calls = 0
+
+    def generate(self, prompt, label='generate', **kwargs):
+        self.calls += 1
+        return type('Response', (), {'text': self.answer})()
+
+
+def test_title_pages_are_confident():
+    stp = classify_text(STP_TEXT)
+    mfr = classify_text(MFR_TEXT)
+    assert (stp.label, mfr.label) == ('STP', 'MFR')
+    assert stp.is_confident() and mfr.is_confident()
+
+
+def test_ambiguous_text_is_not_confident():
+    assert not classify_text(AMBIGUOUS_TEXT).is_confident()
+    assert not classify_text("").is_confident()
+
+
+def test_classifier_skips_llm_only_when_confident():
+    from services.process_validation_service import DocumentClassifier
+
+    stats = ClassifierStats()
+    original = classifier_service._stats
+    classifier_service._stats = stats
+    try:
+        client = RecordingClient("MFR")
+        assert DocumentClassifier.classify_document(STP_TEXT, client=client) == 'STP'
+        assert DocumentClassifier.classify_document(MFR_TEXT, client=client) == 'MFR'
+        assert client.calls == 0
+
+        assert DocumentClassifier.classify_document(AMBIGUOUS_TEXT, client=client) == 'MFR'
+        assert client.calls == 1
+
+        # Without an LLM the unsure label is kept, but not counted as a skip
+        assert DocumentClassifier.classify_document(AMBIGUOUS_TEXT) == classify_text(AMBIGUOUS_TEXT).label
+    finally:
+        classifier_service._stats = original
+
+    summary = stats.to_dict()
+    assert summary['llm_skipped'] == 2 and summary['llm_calls'] == 1 and summary['llm_unavailable'] == 1
+    assert summary['classified'] == 4 and summary['skip_rate'] == round(2 / 3, 3)
+
+
+if __name__ == '__main__':
+    for test in (test_title_pages_are_confident, test_ambiguous_text_is_not_confident,
+                 test_classifier_skips_llm_only_when_confident):
+        test()
+        print(f"[  ok] {test.__name__}")
@@ -0,0 +1,67 @@
+"""
+Extraction Cache Tests - LRU eviction past the size bound, with hit/miss
+counters shared by every process using the cache file.
+
+Run with pytest, or directly: python test_extraction_cache.py
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import subprocess
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services.process_validation_service import CacheManager
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def entry(name):
+    return {"value": name * 96}
+
+
+ENTRY_BYTES = len(json.dumps(entry('a')))
+
+
+def test_least_recently_used_entries_are_evicted():
+    workdir = tempfile.mkdtemp()
+    try:
+        cache = CacheManager(cache_dir=workdir, max_bytes=350)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, entry(key), 'STP')
+            time.sleep(0.01)
+        # 'a' is read, so 'b' becomes the least recently used
+        assert cache.get('a', 'STP') == entry('a')
+        assert cache.get('missing', 'STP') is None
+        # A stored entry of another document type is a miss
+        assert cache.get('c', 'MFR') is None
+        time.sleep(0.01)
+
+        # Written by another process: the fourth entry passes the bound
+        subprocess.run([sys.executable, '-c', (
+            "import sys; sys.path.insert(0, sys.argv[1])\n"
+            "from services.process_validation_service import CacheManager\n"
+            "CacheManager(cache_dir=sys.argv[2], max_bytes=350).set('d', {'value': 'd' * 96}, 'STP')"
+        ), ROOT, workdir], check=True)
+
+        stats = cache.stats()
+        assert stats['entries'] == 3 and stats['bytes'] == 3 * ENTRY_BYTES <= stats['max_bytes']
+        assert (stats['hits'], stats['misses'], stats['evictions']) == (1, 2, 1)
+        assert (cache.hits, cache.misses) == (1, 2)
+
+        assert cache.get('b', 'STP') is None
+        assert [cache.get(key, 'STP') for key in ('a', 'c', 'd')] == [entry('a'), entry('c'), entry('d')]
+        assert CacheManager(cache_dir=workdir, max_bytes=350).stats()['hits'] == 4
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    for test in (test_least_recently_used_entries_are_evicted,):
+        test()
+        print(f"[  ok] {test.__name__}")
@@ -0,0 +1,121 @@
+"""
+Image Asset Cache Tests - the disk copy is bounded and follows deleted uploads,
+and a report embeds its header logo once.
+
+Run with pytest, or directly: python test_image_assets.py
+"""
+
+import io
+import os
+import re
+import sys
+import time
+import shutil
+import zipfile
+import tempfile
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+
+import services.image_asset_service as image_assets
+import services.upload_store_service as upload_store
+from services.image_asset_service import ImageAssetCache, LOGO_SIZE
+from services.upload_store_service import UploadStore, release_upload
+
+
+def write_png(path, color):
+    Image.new('RGB', (300, 168), color).save(path, format='PNG')
+
+
+def disk_entries(cache):
+    return sorted(name for name in os.listdir(cache.cache_dir) if name.endswith('.img'))
+
+
+def test_disk_cache_evicts_old_and_least_recently_used_entries():
+    workdir = tempfile.mkdtemp()
+    try:
+        cache = ImageAssetCache(os.path.join(workdir, 'assets'), max_age_seconds=3600)
+        logos = []
+        for i, color in enumerate(('red', 'green', 'blue')):
+            logos.append(os.path.join(workdir, f'logo{i}.png'))
+            write_png(logos[-1], color)
+            cache.get_png(logos[-1], LOGO_SIZE)
+        assert len(disk_entries(cache)) == 3
+
+        # Unused for longer than the maximum age
+        stale = time.time() - 7200
+        os.utime(os.path.join(cache.cache_dir, cache._key(logos[0], LOGO_SIZE) + '.img'), (stale, stale))
+        assert cache.evict() == 1
+        assert disk_entries(cache) == sorted(cache._key(logo, LOGO_SIZE) + '.img' for logo in logos[1:])
+
+        # Over the size limit, the least recently used entry goes first
+        older = time.time() - 60
+        os.utime(os.path.join(cache.cache_dir, cache._key(logos[2], LOGO_SIZE) + '.img'), (older, older))
+        entry_size = sum(os.path.getsize(os.path.join(cache.cache_dir, name))
+                         for name in os.listdir(cache.cache_dir)) // 2
+        cache.max_disk_bytes = entry_size + 1
+        assert cache.evict() == 1
+        assert disk_entries(cache) == [cache._key(logos[1], LOGO_SIZE) + '.img']
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_deleted_upload_drops_its_cached_images():
+    workdir = tempfile.mkdtemp()
+    original = upload_store._store, image_assets._asset_cache
+    try:
+        upload_store._store = UploadStore(os.path.join(workdir, 'blobs'), os.path.join(workdir, 'index.db'))
+        cache = image_assets._asset_cache = ImageAssetCache(os.path.join(workdir, 'assets'))
+        buffer = io.BytesIO()
+        Image.new('RGB', (120, 40), 'black').save(buffer, format='PNG')
+        signature = upload_store._store.save(FileStorage(io.BytesIO(buffer.getvalue()), filename='sig.png')).path
+        other = os.path.join(workdir, 'logo.png')
+        write_png(other, 'red')
+        cache.get_png(signature)
+        cache.get_png(signature, LOGO_SIZE)
+        cache.get_png(other, LOGO_SIZE)
+
+        assert release_upload(signature) is True
+        assert disk_entries(cache) == [cache._key(other, LOGO_SIZE) + '.img']
+        assert all(not key.startswith(cache._source_key(signature)) for key in cache._memory)
+    finally:
+        upload_store._store, image_assets._asset_cache = original
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+
+def test_report_headers_share_one_logo_part():
+    from services.amv_report_service import AMVReportGenerator
+
+    workdir = tempfile.mkdtemp()
+    original = image_assets._asset_cache
+    try:
+        image_assets._asset_cache = ImageAssetCache(os.path.join(workdir, 'assets'))
+        logo = os.path.join(workdir, 'logo.png')
+        write_png(logo, 'red')
+        generator = AMVReportGenerator({'method_parameters': {'instrument': 'HPLC'}, 'company_logo_url': logo})
+        for page in range(1, 6):
+            generator.add_header_section(page)
+        report = os.path.join(workdir, 'report.docx')
+        generator.doc.save(report)
+
+        with zipfile.ZipFile(report) as docx:
+            media = [name for name in docx.namelist() if name.startswith('word/media/')]
+            body = docx.read('word/document.xml').decode('utf-8')
+        # One image part, referenced from every header
+        assert len(media) == 1
+        assert body.count('r:embed=') == 5
+        assert len(set(re.findall(r'r:embed="([^"]+)"', body))) == 1
+    finally:
+        image_assets._asset_cache = original
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    for test in (test_disk_cache_evicts_old_and_least_recently_used_entries,
+                 test_deleted_upload_drops_its_cached_images, test_report_headers_share_one_logo_part):
+        test()
+        print(f"[  ok] {test.__name__}")
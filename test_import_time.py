@@ -0,0 +1,65 @@
+"""
+Import Time Tests - the PV pipeline must stay cheap to import.
+
+``app_routes.pv_routes`` is imported by every gunicorn worker at startup, so
+the PDF, Gemini and SciPy stacks must only load when a document is actually
+processed. Each check runs ``python -X importtime`` in a fresh interpreter
+and reads the cumulative time and module list from its report.
+
+Run with pytest, or directly: python test_import_time.py
+"""
+
+import os
+import re
+import sys
+import subprocess
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Cumulative import budget for the PV pipeline module alone, in milliseconds
+# (about 70 ms on a developer machine; it was about 800 ms before heavy
+# dependencies were deferred)
+PIPELINE_BUDGET_MS = float(os.getenv('PV_IMPORT_BUDGET_MS', '400'))
+
+HEAVY_MODULES = ('google.generativeai', 'pdfplumber', 'PyPDF2', 'PIL', 'pdf2image', 'pytesseract',
+                 'camelot', 'scipy.stats')
+
+_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$')
+
+
+def import_report(module):
+    """{module: cumulative microseconds} for importing ``module`` in a fresh interpreter"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, capture_output=True, text=True, timeout=120,
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+    report = {}
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            report[match.group(4)] = int(match.group(2))
+    return report
+
+
+def loaded_heavy_modules(report):
+    return sorted(name for name in report
+                  if any(name == heavy or name.startswith(heavy + '.') for heavy in HEAVY_MODULES))
+
+
+def test_pipeline_import_is_within_budget():
+    report = import_report('services.process_validation_service')
+    cumulative_ms = report['services.process_validation_service'] / 1000
+    assert cumulative_ms < PIPELINE_BUDGET_MS, \
+        f"import took {cumulative_ms:.0f} ms (budget {PIPELINE_BUDGET_MS:.0f} ms)"
+    assert loaded_heavy_modules(report) == []
+
+
+def test_pv_routes_defer_heavy_dependencies():
+    assert loaded_heavy_modules(import_report('app_routes.pv_routes')) == []
+
+
+if __name__ == '__main__':
+    for test in (test_pipeline_import_is_within_budget, test_pv_routes_defer_heavy_dependencies):
+        test()
+        print(f"[  ok] {test.__name__}")
@@ -0,0 +1,174 @@
+"""
+LLM Client Tests - rate limiting, retries, deadlines and concurrency.
+
+Runs offline: a local HTTP server stands in for the Gemini REST endpoint and
+a real ``genai.GenerativeModel`` (REST transport) is pointed at it, so the
+tests cover the same calls the pipeline makes.
+
+Run with pytest, or directly: python test_llm_client.py
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import google.generativeai as genai
+
+from services.llm_client_service import LLMClient, LLMDeadlineExceeded, LLMMetrics, TokenBucket
+
+
+class FakeModelServer:
+    """
+    Local stand-in for ``models/{model}:generateContent``.
+
+    ``script`` is consumed one entry per request: an int is an HTTP error
+    status, a string is the response text. When it runs out, ``default`` is
+    used. Every request waits ``latency`` seconds before answering.
+    """
+
+    def __init__(self, default='{"ok": true}', latency=0.0):
+        self.default = default
+        self.latency = latency
+        self.script = []
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                with server._lock:
+                    server.requests += 1
+                    server.in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server.in_flight)
+                    step = server.script.pop(0) if server.script else server.default
+                time.sleep(server.latency)
+                with server._lock:
+                    server.in_flight -= 1
+                if isinstance(step, int):
+                    status = step
+                    body = {"error": {"code": step, "message": "fake error", "status": "UNAVAILABLE"}}
+                else:
+                    status = 200
+                    body = {"candidates": [{"content": {"parts": [{"text": step}], "role": "model"},
+                                            "finishReason": "STOP", "index": 0}]}
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        genai.configure(api_key='offline-test', transport='rest', client_options={'api_endpoint': self.url})
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def make_client(rate=1000.0, burst=100, workers=4, **kwargs):
+    return LLMClient(
+        genai.GenerativeModel('gemini-2.5-flash'),
+        rate_limiter=TokenBucket(rate, burst),
+        executor=ThreadPoolExecutor(max_workers=workers),
+        metrics=LLMMetrics(),
+        backoff_base=0.05,
+        **kwargs
+    )
+
+
+def test_retries_rate_limit_and_server_errors():
+    with FakeModelServer() as server:
+        server.script = [429, 503, 'STP']
+        client = make_client()
+        response = client.generate('classify this', label='classify')
+        assert response.text == 'STP'
+        assert server.requests == 3
+        metrics = client.metrics.snapshot()['classify']
+        assert metrics['calls'] == 1 and metrics['retries'] == 2 and metrics['errors'] == 0
+        assert metrics['p50_ms'] > 0
+
+
+def test_client_errors_are_not_retried():
+    with FakeModelServer() as server:
+        server.script = [400]
+        client = make_client()
+        try:
+            client.generate('bad request')
+        except Exception as e:
+            assert getattr(e, 'code', None) == 400
+        else:
+            raise AssertionError("a 400 should be raised")
+        assert server.requests == 1
+        assert client.metrics.snapshot()['generate']['errors'] == 1
+
+
+def test_deadline_bounds_retries():
+    with FakeModelServer(default=503) as server:
+        client = make_client(max_retries=100)
+        start = time.monotonic()
+        try:
+            client.generate('never succeeds', deadline=0.5)
+        except LLMDeadlineExceeded:
+            pass
+        else:
+            raise AssertionError("the deadline should be exceeded")
+        assert time.monotonic() - start < 1.5
+        assert server.requests >= 2
+
+
+def test_token_bucket_limits_request_rate():
+    with FakeModelServer() as server:
+        client = make_client(rate=10.0, burst=1)
+        start = time.monotonic()
+        client.generate_many([{'contents': f'call {i}'} for i in range(6)])
+        # One token up front, then 10 per second for the other 5
+        assert time.monotonic() - start >= 0.45
+        assert server.requests == 6
+
+
+def test_consensus_passes_run_concurrently():
+    from services import process_validation_service as pvs
+
+    with FakeModelServer(default='{"tests": [{"name": "Assay"}]}', latency=0.3) as server:
+        client = make_client()
+        passes, cache_enabled = pvs.Config.CONSENSUS_PASSES, pvs.Config.CACHE_ENABLED
+        pvs.Config.CONSENSUS_PASSES, pvs.Config.CACHE_ENABLED = 3, False
+        try:
+            extractor = pvs.ConsensusExtractor(client.model, client)
+            start = time.monotonic()
+            result = extractor.robust_extract(['Document Content: ...'], 'Extract JSON', 'STP')
+            elapsed = time.monotonic() - start
+        finally:
+            pvs.Config.CONSENSUS_PASSES, pvs.Config.CACHE_ENABLED = passes, cache_enabled
+        assert result == {"tests": [{"name": "Assay"}]}
+        # 3 passes + 1 judge call; sequential passes would take >= 1.2s
+        assert server.requests == 4
+        assert server.max_in_flight == 3
+        assert elapsed < 1.0, f"took {elapsed:.2f}s"
+
+
+if __name__ == '__main__':
+    for test in (test_retries_rate_limit_and_server_errors, test_client_errors_are_not_retried,
+                 test_deadline_bounds_retries, test_token_bucket_limits_request_rate,
+                 test_consensus_passes_run_concurrently):
+        test()
+        print(f"[  ok] {test.__name__}")
@@ -0,0 +1,100 @@
+"""
+Method Extraction Tests - the keyword-prefiltered scan returns what plain ``re`` does.
+
+Every pattern of MethodExtractionService is checked against ``re.findall``
+on a fixture corpus of method text, and the full extraction is compared
+with the same service running every regex over the whole text.
+
+Run with pytest, or directly: python test_method_extraction.py
+"""
+
+import os
+import re
+import sys
+import random
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services.method_extraction_service import MethodExtractionService
+from services.pattern_scan_service import PatternSet, leading_literals
+
+SNIPPETS = [
+    "Chromatographic conditions: Column: C18, 250 mm x 4.6 mm, 5 um. Flow rate: 1.5 ml/min. Injection volume: 20 ul.",
+    "Mobile phase: Buffer pH 3.0 and acetonitrile (60:40). Detection wavelength: 254 nm. Column temp: 30 C.",
+    "Standard preparation: Weigh accurately about 50 mg of working standard into a 100 ml flask and dilute to 100 ml.",
+    "Sample preparation: Weigh and powder 20 tablets; transfer powder equivalent to 50 mg into a 100 ml flask.",
+    "System suitability: tailing factor NMT 2.0, theoretical plates NLT 2000, RSD 1.2% for six injections.",
+    "Add a quantity of the powder containing 1 g to 100ml of water and titrate with 1M sodium hydroxide VS.",
+    "Using methyl orange solution as indicator. Each ml of 1M hydrochloric acid VS is equivalent to 36.95 mg.",
+    "Measure the absorbance at the maximum at about 276 nm in a 1 cm cell against the blank.",
+    "Carrier gas: nitrogen, split ratio 10:1. The retention time of the principal peak is about 8.5 minutes.",
+    "Linearity correlation 0.999; accuracy recovery 99.2%; specificity and robustness were demonstrated.",
+    # Keywords inside other words, values on the next line, overlapping keywords
+    "Start 5 min after equilibration; flow rate:\n1.0 ml/min; flowrate 0.8 mL/min; injection\n10 UL.",
+    "UPLC on a Waters Acquity with sub-2 μm particles; headspace GC (HS-GC) with FID detector; λ 210 nm.",
+]
+
+
+def build_corpus(pages=12, seed=7):
+    rng = random.Random(seed)
+    return "\n".join(f"--- Page {page} ---\n" + "\n".join(rng.choice(SNIPPETS) for _ in range(12))
+                     for page in range(1, pages + 1))
+
+
+class UnindexedPatternSet:
+    """Runs every lookup as a plain regex over the whole text"""
+
+    def __init__(self, pattern_set):
+        self.pattern_set = pattern_set
+
+    def scan(self, text):
+        return self.pattern_set.scan(text, indexed=False)
+
+
+def test_leading_literals():
+    assert leading_literals(r'(?:flow rate|flowrate|flow)[\s:]*(\d+)') == ['flow rate', 'flowrate', 'flow']
+    assert leading_literals(r'(?:each\s+ml.*?equivalent)') == ['each']
+    assert leading_literals(r'(?:vs|volumetric solution)|titrant') == ['vs', 'volumetric solution', 'titrant']
+    assert leading_literals(r'mls?') == ['ml']
+    assert leading_literals(r'[A-Z]+') is None
+    assert leading_literals(r'(?:at\s+)?(\d+)') is None
+
+
+def test_every_pattern_matches_like_re():
+    service = MethodExtractionService()
+    texts = [build_corpus(), build_corpus(seed=8),
+             # ſ folds to "s" under IGNORECASE but not under str.lower(): must fall back
+             "ſtandard weight 50 mg; flow rate 1.0 ml/min"]
+    for text in texts:
+        scan = service.pattern_set.scan(text)
+        assert scan.indexed == ('ſ' not in text)
+        for pattern in service.pattern_set.patterns:
+            expected = re.findall(pattern, text, re.IGNORECASE)
+            assert scan.findall(pattern) == expected, pattern
+            assert scan.first(pattern) == (expected[0] if expected else None), pattern
+
+
+def test_extraction_is_identical_to_full_text_regexes():
+    indexed = MethodExtractionService()
+    reference = MethodExtractionService()
+    reference.pattern_set = UnindexedPatternSet(reference.pattern_set)
+    for seed in range(5):
+        content = build_corpus(pages=6, seed=seed).encode('utf-8')
+        for instrument in ('hplc', 'uv', 'titration', 'aas', 'gc'):
+            result = indexed.extract_method_parameters(content, instrument)
+            assert 'error' not in result
+            assert result == reference.extract_method_parameters(content, instrument)
+
+
+def test_unregistered_pattern_runs_directly():
+    scan = PatternSet([r'(?:flow)\s*(\d+)']).scan("Flow 5, flow 6")
+    assert scan.findall(r'(?:flow)\s*(\d+)') == ['5', '6']
+    assert scan.candidates(r'(\d+)') is None and scan.findall(r'(\d+)') == ['5', '6']
+
+
+if __name__ == '__main__':
+    for test in (test_leading_literals, test_every_pattern_matches_like_re,
+                 test_extraction_is_identical_to_full_text_regexes, test_unregistered_pattern_runs_directly):
+        test()
+        print(f"[  ok] {test.__name__}")
@@ -0,0 +1,172 @@
+"""
+Page Text Store Tests - a document is parsed once, then served per page from the store.
+
+Run with pytest, or directly: python test_page_text_store.py
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+import services.page_text_store_service as page_store
+from services.page_text_store_service import PageTextStore, StoredPage, hash_file, ingest_document
+from services.pdf_ingestion_service import PDFIngestionContext
+
+
+class NoStore:
+    """A store that never has an entry: the context parses the PDF"""
+
+    def open(self, content_hash):
+        return None
+
+
+def build_pdf(path, pages=4):
+    pdf = canvas.Canvas(path, pagesize=A4)
+    for number in range(1, pages + 1):
+        pdf.drawString(40, 780, f"Process Validation Protocol - page {number}")
+        # A small ruled table on every other page
+        if number % 2 == 0:
+            for i in range(4):
+                pdf.line(40, 700 - i * 20, 400, 700 - i * 20)
+            for x in (40, 160, 280, 400):
+                pdf.line(x, 700, x, 640)
+            for i in range(3):
+                for j, text in enumerate(["Stage %d" % i, "Mixing", "NMT 30 min"]):
+                    pdf.drawString(44 + j * 120, 685 - i * 20, text)
+        pdf.showPage()
+    pdf.save()
+
+
+def test_pages_round_trip_and_load_by_range():
+    workdir = tempfile.mkdtemp()
+    try:
+        store = PageTextStore(workdir)
+        pages = [StoredPage(number, text=f"page {number} text ü", tables=[[["a", None], ["b", "c"]]],
+                            ocr="scanned" if number == 2 else None, width=595.5, height=842.0)
+                 for number in range(1, 7)]
+        store.save('ab' * 32, pages, ocr_done=True)
+
+        with store.open('ab' * 32) as stored:
+            assert stored.page_count == 6 and stored.ocr_done
+            assert stored.codec == store.codec
+            assert stored.page_size(3) == (595.5, 842.0)
+        assert store.load_pages('ab' * 32) == pages
+        assert store.load_pages('ab' * 32, 5, 99) == pages[4:]
+        assert store.load_pages('cd' * 32) is None
+
+        # Pages are independent frames: a damaged page 1 does not affect pages 5-6
+        with open(store.path_for('ab' * 32), 'r+b') as f:
+            f.seek(page_store._PREFIX.size)
+            offset, length, _, _ = page_store._ENTRY.unpack(f.read(page_store._ENTRY.size))
+            f.seek(offset)
+            f.write(b'\0' * length)
+        with store.open('ab' * 32) as stored:
+            assert [page.text for page in stored.pages(5, 6)] == ["page 5 text ü", "page 6 text ü"]
+            try:
+                stored.page(1)
+                assert False, "damaged frame decoded"
+            except Exception:
+                pass
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_ingested_document_is_read_without_the_pdf():
+    workdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(workdir, 'protocol.pdf')
+        build_pdf(path)
+        store = PageTextStore(os.path.join(workdir, 'store'))
+
+        with PDFIngestionContext(path, store=NoStore()) as doc:
+            cold = [(doc.page_text(i), doc.page_tables(i), doc.pages[i].width) for i in range(doc.page_count)]
+        assert cold[1][1] == [[["Stage 0", "Mixing", "NMT 30 min"], ["Stage 1", "Mixing", "NMT 30 min"],
+                               ["Stage 2", "Mixing", "NMT 30 min"]]]
+
+        ingest_document(path, store=store, ocr=False, tables=True)
+        with PDFIngestionContext(path, store=store) as doc:
+            warm = [(doc.page_text(i), doc.page_tables(i), doc.pages[i].width) for i in range(doc.page_count)]
+            assert doc.stats.opens == 0 and doc.stats.page_layouts == 0
+            assert doc.stats.store_pages == 4
+        assert warm == cold
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_ingest_parses_once_per_content():
+    workdir = tempfile.mkdtemp()
+    parse_pages, ocr_low_density_pages = page_store.parse_pages, page_store.ocr_low_density_pages
+    calls = {'parse': 0, 'ocr': 0}
+
+    def counting_parse(pdf_path, **kwargs):
+        calls['parse'] += 1
+        return parse_pages(pdf_path, **kwargs)
+
+    def fake_ocr(pdf_path, pages, tesseract_cmd=None):
+        calls['ocr'] += 1
+        pages[0].ocr = "ocr text"
+        return True, []
+
+    page_store.parse_pages, page_store.ocr_low_density_pages = counting_parse, fake_ocr
+    try:
+        path = os.path.join(workdir, 'protocol.pdf')
+        build_pdf(path)
+        store = PageTextStore(os.path.join(workdir, 'store'))
+
+        pages, truncated = ingest_document(path, store=store, ocr=False)
+        assert len(pages) == 4 and truncated == [] and calls == {'parse': 1, 'ocr': 0}
+
+        # A copy under another name is the same content
+        copy = os.path.join(workdir, 'renamed.pdf')
+        shutil.copyfile(path, copy)
+        assert ingest_document(copy, store=store, ocr=False)[0] == pages
+        assert calls == {'parse': 1, 'ocr': 0}
+
+        # OCR is added to the stored parse once, then served from the store
+        for _ in range(2):
+            pages, _ = ingest_document(path, store=store)
+            assert pages[0].ocr == "ocr text"
+        assert calls == {'parse': 1, 'ocr': 1}
+        with store.open(hash_file(path)) as stored:
+            assert stored.ocr_done
+
+        # Tables are added to a text-only entry once, keeping its OCR
+        for _ in range(2):
+            pages, _ = ingest_document(path, store=store, tables=True)
+            assert pages[0].ocr == "ocr text" and pages[1].tables and pages[1].table_score
+        assert calls == {'parse': 2, 'ocr': 1}
+    finally:
+        page_store.parse_pages, page_store.ocr_low_density_pages = parse_pages, ocr_low_density_pages
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_text_only_entry_leaves_tables_to_the_reader():
+    workdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(workdir, 'protocol.pdf')
+        build_pdf(path)
+        store = PageTextStore(os.path.join(workdir, 'store'))
+
+        pages, _ = ingest_document(path, store=store, ocr=False, tables=False)
+        assert all(page.tables is None and page.table_score is None for page in pages)
+        with PDFIngestionContext(path, store=store) as doc:
+            assert doc.page_text(1) == pages[1].text
+            assert doc.stats.page_layouts == 0
+            assert doc.page_tables(1)[0][0] == ["Stage 0", "Mixing", "NMT 30 min"]
+            assert doc.stats.table_calls == 1
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    for test in (test_pages_round_trip_and_load_by_range, test_ingested_document_is_read_without_the_pdf,
+                 test_ingest_parses_once_per_content, test_text_only_entry_leaves_tables_to_the_reader):
+        test()
+        print(f"[  ok] {test.__name__}")
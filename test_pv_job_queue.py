@@ -0,0 +1,179 @@
+"""
+PV Job Queue Tests - a job runs once, live jobs survive recovery and
+the MFR upload stays referenced by its template.
+
+Run with pytest, or directly: python test_pv_job_queue.py
+"""
+
+import io
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+from datetime import datetime, timedelta
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask
+from werkzeug.datastructures import FileStorage
+
+from database import db
+from models import PVP_Template, PVP_Upload, PVR_Report, User
+
+import services.upload_store_service as upload_store
+from services.upload_store_service import UploadStore
+from services.pv_job_service import (JobStore, PVJobQueue, STATUS_FAILED, STATUS_QUEUED, STATUS_RUNNING,
+                                     run_pv_job)
+
+
+class RecordingExecutor:
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, fn, *args):
+        self.submitted.append(args[0])
+
+
+def dead_pid() -> int:
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def test_job_is_claimed_once():
+    workdir = tempfile.mkdtemp()
+    try:
+        store = JobStore(os.path.join(workdir, 'jobs.db'))
+        job_id = store.create(1, {})
+        assert store.claim(job_id) is True
+        assert store.claim(job_id) is False
+        job = store.get(job_id)
+        assert job['status'] == STATUS_RUNNING and job['owner_pid'] == os.getpid() and job['heartbeat_at']
+        # A second dispatch of a claimed job returns without touching it
+        run_pv_job(job_id, store.db_path)
+        assert store.get(job_id)['status'] == STATUS_RUNNING
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_recovery_fails_only_orphaned_jobs_and_skips_new_submissions():
+    workdir = tempfile.mkdtemp()
+    try:
+        store = JobStore(os.path.join(workdir, 'jobs.db'))
+        stale = (datetime.now() - timedelta(hours=1)).isoformat()
+        live, orphaned, queued = store.create(1, {}), store.create(1, {}), store.create(1, {})
+        store.claim(live)
+        store.update(orphaned, status=STATUS_RUNNING, owner_pid=dead_pid(), started_at=stale, heartbeat_at=stale)
+
+        queue = PVJobQueue(store)
+        executor = RecordingExecutor()
+        queue._get_executor = lambda: queue._recover_jobs() or executor
+        queue._executor = executor
+        new_id = queue.submit(1, {})
+
+        assert store.get(live)['status'] == STATUS_RUNNING
+        assert store.get(orphaned)['status'] == STATUS_FAILED
+        assert store.get(queued)['status'] == STATUS_QUEUED
+        # The queued job is re-dispatched once; the new job only by submit
+        assert executor.submitted == [queued, new_id]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_startup_recovery_fails_orphaned_reports_and_dispatches_queued_jobs():
+    workdir = tempfile.mkdtemp()
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(workdir, 'app.db')
+    db.init_app(app)
+    try:
+        with app.app_context():
+            db.create_all()
+            db.session.add(User(id=1, firebase_uid='u1', email='u1@example.com', name='U1'))
+            db.session.add(PVP_Template(id=1, template_name='t', original_filepath='stp.pdf', user_id=1))
+            db.session.add_all([PVR_Report(id=1, pvp_template_id=1, user_id=1, status='Processing'),
+                                PVR_Report(id=2, pvp_template_id=1, user_id=1, status='Processing')])
+            db.session.commit()
+
+            store = JobStore(os.path.join(workdir, 'jobs.db'))
+            stale = (datetime.now() - timedelta(hours=1)).isoformat()
+            orphaned, queued = store.create(1, {}, pvr_report_id=1), store.create(1, {}, pvr_report_id=2)
+            store.update(orphaned, status=STATUS_RUNNING, owner_pid=dead_pid(), started_at=stale, heartbeat_at=stale)
+
+            queue = PVJobQueue(store)
+            executor = RecordingExecutor()
+            queue._get_executor = lambda: queue._recover_jobs() or executor
+            queue._executor = executor
+            queue.start()
+
+            assert store.get(orphaned)['status'] == STATUS_FAILED
+            assert executor.submitted == [queued]
+            db.session.expire_all()
+            assert db.session.get(PVR_Report, 1).status == 'Failed'
+            assert db.session.get(PVR_Report, 2).status == 'Processing'
+            db.session.remove()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_importing_the_app_does_not_start_the_job_pool():
+    import services.pv_job_service as pv_job_service
+    import app  # noqa: F401
+
+    # Only the server-start hook (gunicorn.conf.py, main.py) starts it
+    assert pv_job_service._queue is None or pv_job_service._queue._executor is None
+
+
+def test_the_mfr_upload_lives_as_long_as_its_template():
+    workdir = tempfile.mkdtemp()
+    original = upload_store._store
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(workdir, 'app.db')
+    db.init_app(app)
+    try:
+        uploads = upload_store._store = UploadStore(os.path.join(workdir, 'blobs'), os.path.join(workdir, 'index.db'))
+        stp = uploads.save(FileStorage(io.BytesIO(b'%PDF-1.4 stp'), filename='stp.pdf')).path
+        mfr = uploads.save(FileStorage(io.BytesIO(b'%PDF-1.4 mfr'), filename='mfr.pdf')).path
+
+        with app.app_context():
+            db.create_all()
+            db.session.add(User(id=1, firebase_uid='u1', email='u1@example.com', name='U1'))
+            template = PVP_Template(id=1, template_name='t', original_filepath=stp, user_id=1)
+            template.uploads.append(PVP_Upload(role='mfr', filepath=mfr))
+            db.session.add(template)
+            db.session.add(PVR_Report(id=1, pvp_template_id=1, user_id=1, status='Processing'))
+            db.session.commit()
+
+            # An interrupted job leaves the MFR with its template
+            store = JobStore(os.path.join(workdir, 'jobs.db'))
+            stale = (datetime.now() - timedelta(hours=1)).isoformat()
+            job_id = store.create(1, {'stp_path': stp, 'mfr_path': mfr}, pvr_report_id=1)
+            store.update(job_id, status=STATUS_RUNNING, owner_pid=dead_pid(), started_at=stale, heartbeat_at=stale)
+            queue = PVJobQueue(store)
+            queue._executor = RecordingExecutor()
+            queue._recover_jobs()
+            assert store.get(job_id)['status'] == STATUS_FAILED
+            assert os.path.exists(mfr) and uploads.ref_count(mfr) == 1
+
+            # A rolled back deletion keeps it; a committed one releases it
+            db.session.delete(db.session.get(PVP_Template, 1))
+            db.session.flush()
+            db.session.rollback()
+            assert uploads.ref_count(mfr) == 1
+            db.session.delete(db.session.get(PVP_Template, 1))
+            db.session.commit()
+            assert not os.path.exists(mfr) and uploads.ref_count(mfr) == 0
+            assert os.path.exists(stp) and uploads.ref_count(stp) == 1
+            db.session.remove()
+    finally:
+        upload_store._store = original
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    for test in (test_job_is_claimed_once, test_recovery_fails_only_orphaned_jobs_and_skips_new_submissions,
+                 test_startup_recovery_fails_orphaned_reports_and_dispatches_queued_jobs,
+                 test_importing_the_app_does_not_start_the_job_pool,
+                 test_the_mfr_upload_lives_as_long_as_its_template):
+        test()
+        print(f"[  ok] {test.__name__}")
@@ -0,0 +1,104 @@
+"""
+PVR Result Store Tests - reads build the block on their own connection.
+
+Run with pytest, or directly: python test_pvr_result_store.py
+"""
+
+import os
+import sys
+import math
+import shutil
+import tempfile
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask
+from sqlalchemy import event
+
+from database import db
+from models import PVP_Template, PVR_Data, PVR_Report, PVR_ResultBlock, User
+from services.pvr_result_store_service import load_report_results
+
+
+def make_app(workdir):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(workdir, 'results.db')
+    db.init_app(app)
+    return app
+
+
+def test_load_stores_the_block_without_touching_the_session():
+    workdir = tempfile.mkdtemp()
+    app = make_app(workdir)
+    try:
+        with app.app_context():
+            db.create_all()
+            db.session.add(User(id=1, firebase_uid='u1', email='u1@example.com', name='U1'))
+            db.session.add(PVP_Template(id=1, template_name='t', original_filepath='stp.pdf', user_id=1))
+            db.session.add(PVR_Report(id=1, pvp_template_id=1, user_id=1))
+            db.session.add_all([
+                PVR_Data(pvr_report_id=1, batch_number='B1', test_id='assay', test_result='99.5'),
+                PVR_Data(pvr_report_id=1, batch_number='B2', test_id='assay', test_result='Complies'),
+            ])
+            db.session.commit()
+
+            # An unflushed write of the caller's stays pending and is not read
+            pending = PVR_Data(pvr_report_id=1, batch_number='B3', test_id='assay', test_result='101.0')
+            db.session.add(pending)
+            results = load_report_results(1)
+            assert pending in db.session.new
+            assert results.batches == ['B1', 'B2'] and results.result('B2', 'assay') == 'Complies'
+            assert results.values[0, 0] == 99.5 and math.isnan(results.values[1, 0])
+            db.session.rollback()
+
+            assert db.session.get(PVR_ResultBlock, 1).batch_count == 2
+            assert load_report_results(1).text_grid(['assay']) == [['99.5', 'Complies']]
+
+            # An ORM write drops the block; the next read rebuilds it
+            db.session.add(PVR_Data(pvr_report_id=1, batch_number='B3', test_id='assay', test_result='101.0'))
+            db.session.commit()
+            assert db.session.get(PVR_ResultBlock, 1) is None
+            assert load_report_results(1).batches == ['B1', 'B2', 'B3']
+            db.session.expire_all()
+            assert db.session.get(PVR_ResultBlock, 1).batch_count == 3
+    finally:
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_deleting_a_report_deletes_its_block_first():
+    workdir = tempfile.mkdtemp()
+    app = make_app(workdir)
+    try:
+        with app.app_context():
+            # Enforce foreign keys the way PostgreSQL does
+            event.listen(db.engine, 'connect',
+                         lambda dbapi_connection, record: dbapi_connection.execute('PRAGMA foreign_keys=ON'))
+            db.engine.dispose()
+            db.create_all()
+            db.session.add(User(id=1, firebase_uid='u1', email='u1@example.com', name='U1'))
+            db.session.add(PVP_Template(id=1, template_name='t', original_filepath='stp.pdf', user_id=1))
+            db.session.add(PVR_Report(id=1, pvp_template_id=1, user_id=1))
+            db.session.commit()
+            assert load_report_results(1).batches == []
+            assert db.session.get(PVR_ResultBlock, 1) is not None
+
+            db.session.delete(db.session.get(PVR_Report, 1))
+            db.session.commit()
+            db.session.expire_all()
+            assert db.session.get(PVR_ResultBlock, 1) is None
+    finally:
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    for test in (test_load_stores_the_block_without_touching_the_session,
+                 test_deleting_a_report_deletes_its_block_first):
+        test()
+        print(f"[  ok] {test.__name__}")
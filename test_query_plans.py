@@ -0,0 +1,95 @@
+"""
+Query Plan Regression Tests - dashboard filters must stay on an index.
+
+Builds the schema from models.py in an in-memory SQLite database, runs
+EXPLAIN QUERY PLAN for each hot dashboard query and fails if any of them
+falls back to a full table scan or a temp B-tree sort.
+
+Run with pytest, or directly: python test_query_plans.py
+"""
+
+import os
+import sys
+from datetime import datetime
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine, desc, func, select, text
+
+from database import db
+from models import ActivityLog, Document, PVP_Template, PVR_Report, Subscription
+from services.usage_snapshot_service import month_bounds
+
+MONTH_START, MONTH_END = month_bounds(datetime(2026, 1, 15))
+
+# name -> statement; mirrors the filters used by the dashboard/admin/billing routes
+HOT_QUERIES = {
+    'documents by user and type': select(func.count()).select_from(Document).where(
+        Document.user_id == 1, Document.document_type == 'AMV'),
+    'documents by user and status': select(func.count()).select_from(Document).where(
+        Document.user_id == 1, Document.status == 'completed'),
+    'documents this month': select(func.count()).select_from(Document).where(
+        Document.user_id == 1, Document.created_at >= MONTH_START, Document.created_at < MONTH_END),
+    'recent documents': select(Document).where(
+        Document.user_id == 1).order_by(desc(Document.created_at)).limit(5),
+    'recent pvp templates': select(PVP_Template).where(
+        PVP_Template.user_id == 1).order_by(desc(PVP_Template.created_at)).limit(5),
+    'recent pvr reports': select(PVR_Report).where(
+        PVR_Report.user_id == 1).order_by(desc(PVR_Report.created_at)).limit(5),
+    'user activity': select(ActivityLog).where(
+        ActivityLog.user_id == 1).order_by(desc(ActivityLog.timestamp)).limit(20),
+    'admin recent activity': select(ActivityLog).order_by(desc(ActivityLog.timestamp)).limit(10),
+    'razorpay webhook lookup': select(Subscription).where(
+        Subscription.razorpay_subscription_id == 'sub_123'),
+    'active subscription': select(Subscription).where(
+        Subscription.user_id == 1, Subscription.status == 'active'),
+}
+
+
+def _engine():
+    engine = create_engine('sqlite://')
+    db.metadata.create_all(engine)
+    return engine
+
+
+def explain(engine, statement):
+    """EXPLAIN QUERY PLAN detail lines for a SQLAlchemy statement"""
+    sql = str(statement.compile(engine, compile_kwargs={'literal_binds': True}))
+    with engine.connect() as conn:
+        return [row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+
+
+def plan_problems(plan):
+    """Plan lines that indicate a full scan or an unindexed sort"""
+    problems = []
+    for line in plan:
+        if line.startswith('SCAN') and 'USING' not in line:
+            problems.append(line)
+        if 'TEMP B-TREE' in line:
+            problems.append(line)
+    return problems
+
+
+def test_hot_queries_use_indexes():
+    engine = _engine()
+    failures = {}
+    for name, statement in HOT_QUERIES.items():
+        problems = plan_problems(explain(engine, statement))
+        if problems:
+            failures[name] = problems
+    assert not failures, f"Dashboard queries regressed to table scans: {failures}"
+
+
+def test_plan_checker_flags_full_scans():
+    engine = _engine()
+    unindexed = select(Document).where(Document.title == 'x')
+    assert plan_problems(explain(engine, unindexed))
+
+
+if __name__ == '__main__':
+    engine = _engine()
+    for name, statement in HOT_QUERIES.items():
+        plan = explain(engine, statement)
+        status = 'FAIL' if plan_problems(plan) else 'ok'
+        print(f"[{status:>4}] {name}: {' | '.join(plan)}")
@@ -0,0 +1,204 @@
+"""
+Search Index Tests - ranked full-text search over templates, reports and AMV documents.
+
+Runs against a temporary database and FTS5 index file; the index is fed by
+the ORM commit hooks and the background updater, as in the app.
+
+Run with pytest, or directly: python test_search_index.py
+"""
+
+import os
+import sys
+import json
+import shutil
+import sqlite3
+import tempfile
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+from sqlalchemy import insert
+
+import services.page_text_store_service as page_store
+from database import db
+from models import AMVVerificationDocument, Document, PVP_Template, PVR_Report
+from services.page_text_store_service import PageTextStore, ingest_document
+from services.search_index_service import (
+    SQLiteSearchBackend, register_index_listeners, remove_index_listeners, search_documents, search_rows,
+    set_search_index, wait_for_index_updates,
+)
+
+
+class SearchEnv:
+    """Flask app on a temporary database, with a temporary index and page store"""
+
+    def __enter__(self):
+        self.workdir = tempfile.mkdtemp()
+        self.app = Flask(__name__)
+        # A file, not :memory:, so the background updater gets its own connection
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(self.workdir, 'app.db')
+        db.init_app(self.app)
+        self.context = self.app.app_context()
+        self.context.push()
+        db.create_all()
+        self.index = SQLiteSearchBackend(os.path.join(self.workdir, 'search.db'))
+        set_search_index(self.index)
+        self.original_store = page_store._store
+        page_store._store = PageTextStore(os.path.join(self.workdir, 'pages'))
+        register_index_listeners()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wait_for_index_updates()
+        remove_index_listeners()
+        page_store._store = self.original_store
+        set_search_index(None)
+        db.session.remove()
+        db.drop_all()
+        db.engine.dispose()
+        self.context.pop()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+def add_verification(user_id, title, product, ingredient, protocol_number):
+    document = Document(user_id=user_id, company_id=1, document_type='AMV_VERIFICATION', title=title,
+                        document_metadata=json.dumps({'notes': {'column': 'C18, 250 x 4.6 mm'}}))
+    db.session.add(document)
+    db.session.flush()
+    db.session.add(AMVVerificationDocument(
+        document_id=document.id, product_name=product, active_ingredient=ingredient, label_claim='500 mg',
+        test_method='HPLC', company_name='ACME Pharma', protocol_number=protocol_number))
+    return document
+
+
+def hits(user_id, query, kinds=None):
+    wait_for_index_updates()
+    return [(hit.source, hit.source_id) for hit in search_documents(user_id, query, kinds).hits]
+
+
+def test_index_follows_commits():
+    with SearchEnv():
+        assert hits(1, 'paracetamol') == []  # indexes the (empty) account
+
+        document = add_verification(1, 'Assay verification', 'Calpol Tablets', 'Paracetamol', 'AMVP-0042')
+        db.session.commit()
+        assert hits(1, 'paracetamol') == [('document', document.id)]
+        assert hits(1, 'AMVP 0042') == [('document', document.id)]
+        assert hits(1, 'C18') == [('document', document.id)]
+        # Prefix match on the last term; other users and kinds see nothing
+        assert hits(1, 'parace') == [('document', document.id)]
+        assert hits(2, 'paracetamol') == []
+        assert hits(1, 'paracetamol', kinds=['AMV']) == []
+        assert hits(1, 'paracetamol', kinds=['AMV_VERIFICATION', 'pvp']) == [('document', document.id)]
+        assert '<mark>' in search_documents(1, 'paracetamol').hits[0].snippet
+
+        # Rolled back writes never reach the index
+        add_verification(1, 'Dissolution', 'Brufen', 'Ibuprofen', 'AMVP-0043')
+        db.session.rollback()
+        assert hits(1, 'ibuprofen') == []
+
+        # Updates replace the entry; deletes remove it
+        document.title = 'Related substances verification'
+        db.session.commit()
+        assert hits(1, 'related substances') == [('document', document.id)]
+        assert hits(1, 'assay') == []
+        db.session.delete(document.amv_verification_details)
+        db.session.delete(document)
+        db.session.commit()
+        assert hits(1, 'related') == []
+
+
+def test_first_search_indexes_existing_rows_and_pdf_text():
+    with SearchEnv() as env:
+        pdf_path = os.path.join(env.workdir, 'pvp.pdf')
+        pdf = canvas.Canvas(pdf_path, pagesize=A4)
+        pdf.drawString(40, 780, 'Granulation in rapid mixer granulator, impeller speed 150 RPM')
+        pdf.save()
+        ingest_document(pdf_path, ocr=False)
+
+        # Rows written before the index existed (no ORM events)
+        template_id = db.session.execute(insert(PVP_Template).values(
+            template_name='PVP Metformin', original_filepath=pdf_path, user_id=7,
+            product_name='Metformin Hydrochloride Tablets')).inserted_primary_key[0]
+        report_id = db.session.execute(insert(PVR_Report).values(
+            pvp_template_id=template_id, user_id=7, protocol_number='PVR/2026/118')).inserted_primary_key[0]
+        db.session.commit()
+
+        assert hits(7, 'impeller') == [('pvp_template', template_id)]
+        assert hits(7, 'metformin', kinds=['pvr']) == [('pvr_report', report_id)]
+        assert sorted(hits(7, 'metformin')) == [('pvp_template', template_id), ('pvr_report', report_id)]
+        # Renaming the product reaches the report entry too
+        template = db.session.get(PVP_Template, template_id)
+        template.product_name = 'Glucophage'
+        db.session.commit()
+        assert hits(7, 'glucophage', kinds=['pvr']) == [('pvr_report', report_id)]
+
+
+def test_ranked_and_paginated():
+    with SearchEnv():
+        search_documents(1, 'seed')
+        body_ids = [add_verification(1, f'Verification {i}', 'Tablets', 'Cefixime', f'AMVP-{i}').id
+                    for i in range(23)]
+        title_id = add_verification(1, 'Amlodipine besylate verification', 'Tablets', 'Amlodipine',
+                                    'AMVP-99').id
+        for document_id in body_ids[:2]:
+            document = db.session.get(Document, document_id)
+            document.document_metadata = json.dumps({'reference': 'compared against amlodipine standard'})
+        db.session.commit()
+        wait_for_index_updates()
+
+        # The title match outranks the ones mentioning it in the body
+        assert [hit.source_id for hit in search_documents(1, 'amlodipine').hits][0] == title_id
+
+        pages = [search_documents(1, 'cefixime', page=page, per_page=10) for page in (1, 2, 3, 4)]
+        assert [page.total for page in pages] == [23] * 4
+        assert [len(page.hits) for page in pages] == [10, 10, 3, 0]
+        assert pages[0].pages == 3
+        assert sorted(hit.source_id for page in pages for hit in page.hits) == body_ids
+
+        rows, result = search_rows(Document, 1, 'cefixime', kinds=['AMV_VERIFICATION'], page=3, per_page=10)
+        assert [row.id for row in rows] == [hit.source_id for hit in result.hits] and len(rows) == 3
+
+
+class FailingIndex(SQLiteSearchBackend):
+    """Index whose next ``apply`` calls fail"""
+
+    failures = 0
+
+    def apply(self, entries, deleted):
+        if self.failures:
+            self.failures -= 1
+            raise sqlite3.OperationalError('database is locked')
+        super().apply(entries, deleted)
+
+
+def test_failed_update_reindexes_the_user_on_next_search():
+    with SearchEnv() as env:
+        index = FailingIndex(os.path.join(env.workdir, 'failing.db'))
+        set_search_index(index)
+        kept = add_verification(1, 'Assay verification', 'Calpol Tablets', 'Paracetamol', 'AMVP-0042')
+        removed = add_verification(1, 'Dissolution', 'Brufen', 'Ibuprofen', 'AMVP-0043')
+        db.session.commit()
+        assert hits(1, 'paracetamol') == [('document', kept.id)] and index.is_seeded(1)
+
+        index.failures = 1
+        kept.title = 'Related substances verification'
+        db.session.delete(removed.amv_verification_details)
+        db.session.delete(removed)
+        db.session.commit()
+        wait_for_index_updates()
+        assert not index.is_seeded(1)
+
+        # The next search rebuilds the user's entries, dropping the deleted row's
+        assert hits(1, 'related') == [('document', kept.id)]
+        assert hits(1, 'ibuprofen') == [] and index.is_seeded(1)
+
+
+if __name__ == '__main__':
+    for test in (test_index_follows_commits, test_first_search_indexes_existing_rows_and_pdf_text,
+                 test_ranked_and_paginated, test_failed_update_reindexes_the_user_on_next_search):
+        test()
+        print(f"[  ok] {test.__name__}")
@@ -0,0 +1,176 @@
+"""
+Table Detection Tests - only likely table pages reach Camelot, with the right flavor.
+
+A four-page protocol is generated with reportlab: every page carries the
+same boxed header (with its page number); page 1 is prose, page 2 a ruled
+table, page 3 a whitespace-aligned table and page 4 a bulleted list. A
+second document has a long ruled table continued at the same position on
+every page, which must not be mistaken for furniture.
+
+Run with pytest, or directly: python test_table_detection.py
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+from services.page_text_store_service import PageTextStore
+from services.table_detection_service import detect_table_pages, extract_tables, plan_table_pages
+
+WIDTH, HEIGHT = A4
+PROSE = ("The purpose of this protocol is to establish documented evidence that the manufacturing "
+         "process consistently produces a product meeting its predetermined specifications.")
+
+
+def draw_header(pdf, page_number):
+    """Boxed document header, 2 rows x 3 columns, on every page"""
+    top, row, cols = HEIGHT - 30, 20, [30, 200, 400, 565]
+    for i in range(3):
+        pdf.line(cols[0], top - i * row, cols[-1], top - i * row)
+    for x in cols:
+        pdf.line(x, top, x, top - 2 * row)
+    pdf.drawString(35, top - 14, "ACME Pharma")
+    pdf.drawString(205, top - 14, "Process Validation Protocol")
+    pdf.drawString(405, top - 34, "Page %d of 4" % page_number)
+
+
+def draw_prose(pdf, y):
+    for line in range(12):
+        pdf.drawString(40, y - line * 14, PROSE[line * 7 % 60:][:90])
+
+
+def build_protocol(path):
+    pdf = canvas.Canvas(path, pagesize=A4)
+
+    draw_header(pdf, 1)
+    draw_prose(pdf, 700)
+    pdf.showPage()
+
+    draw_header(pdf, 2)
+    top, row, cols = 700, 18, [40, 140, 300, 450, 560]
+    for i in range(7):
+        pdf.line(cols[0], top - i * row, cols[-1], top - i * row)
+    for x in cols:
+        pdf.line(x, top, x, top - 6 * row)
+    for i in range(6):
+        for j, text in enumerate(["EQ-%02d" % i, "Vessel", "SS 316", "Qualified"]):
+            pdf.drawString(cols[j] + 4, top - i * row - 13, text)
+    pdf.showPage()
+
+    draw_header(pdf, 3)
+    for i, cells in enumerate([("Stage", "Test", "Acceptance criteria")] +
+                              [("Bulk", "pH %d" % i, "8.5 to 9.1")] * 6):
+        for x, text in zip((40, 220, 400), cells):
+            pdf.drawString(x, 700 - i * 16, text)
+    pdf.showPage()
+
+    draw_header(pdf, 4)
+    for i in range(8):
+        pdf.drawString(50, 700 - i * 16, "•")
+        pdf.drawString(80, 700 - i * 16, "Review of protocol and summary report, item %d." % i)
+    pdf.showPage()
+    pdf.save()
+
+
+def build_batch_record(path, pages=4, rows=30):
+    """One ruled grid per page, same position, different rows"""
+    pdf = canvas.Canvas(path, pagesize=A4)
+    top, row, cols = 760, 20, [40, 140, 300, 450, 560]
+    for page in range(pages):
+        for i in range(rows + 1):
+            pdf.line(cols[0], top - i * row, cols[-1], top - i * row)
+        for x in cols:
+            pdf.line(x, top, x, top - rows * row)
+        for i in range(rows):
+            cells = ["%d" % (page * rows + i + 1), "Granule %d" % (page * rows + i), "%.2f" % (i * 0.37), "Pass"]
+            for x, text in zip(cols, cells):
+                pdf.drawString(x + 4, top - i * row - 14, text)
+        pdf.showPage()
+    pdf.save()
+
+
+def fake_reader(pdf_path, page_number, flavors):
+    """Stands in for Camelot; must be importable by spawned workers"""
+    return page_number, [f"page {page_number} via {flavors[0]}"]
+
+
+def test_prefilter_picks_table_pages_and_flavors():
+    workdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(workdir, 'protocol.pdf')
+        build_protocol(path)
+        scores = detect_table_pages(path)
+        assert [len(score.ruled_regions) for score in scores] == [1, 2, 1, 1]
+
+        planned = {score.page_number: score.flavors for score in plan_table_pages(scores)}
+        # The header is page furniture: kept once (page 1), skipped elsewhere
+        assert planned == {1: ['lattice'], 2: ['lattice'], 3: ['stream']}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_continued_table_on_every_page_is_not_furniture():
+    workdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(workdir, 'batch_record.pdf')
+        build_batch_record(path)
+        scores = detect_table_pages(path)
+        assert [len(score.ruled_regions) for score in scores] == [1, 1, 1, 1]
+        assert len({score.ruled_regions[0] for score in scores}) == 1
+
+        planned = {score.page_number: score.flavors for score in plan_table_pages(scores)}
+        assert planned == {1: ['lattice'], 2: ['lattice'], 3: ['lattice'], 4: ['lattice']}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_page_jobs_run_in_parallel_and_keep_page_order():
+    workdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(workdir, 'protocol.pdf')
+        build_protocol(path)
+        pages = plan_table_pages(detect_table_pages(path))
+        tables, truncated = extract_tables(path, pages, workers=2, reader=fake_reader)
+        assert tables == ["page 1 via lattice", "page 2 via lattice", "page 3 via stream"]
+        assert truncated == []
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_pvp_extractor_sends_only_planned_pages():
+    import services.enhanced_pvp_extraction_service as pvp
+
+    workdir = tempfile.mkdtemp()
+    calls = []
+
+    def recording_extract(pdf_path, pages):
+        calls.append([(score.page_number, score.flavors) for score in pages])
+        return [], []
+
+    original = pvp.CAMELOT_AVAILABLE, pvp.extract_tables
+    pvp.CAMELOT_AVAILABLE, pvp.extract_tables = True, recording_extract
+    try:
+        path = os.path.join(workdir, 'protocol.pdf')
+        build_protocol(path)
+        extractor = pvp.EnhancedPVPExtractor(path, page_store=PageTextStore(os.path.join(workdir, 'store')))
+        assert extractor._extract_text_from_pdf()
+        assert extractor._extract_tables_from_pdf() == []
+        assert calls == [[(1, ['lattice']), (2, ['lattice']), (3, ['stream'])]]
+    finally:
+        pvp.CAMELOT_AVAILABLE, pvp.extract_tables = original
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    for test in (test_prefilter_picks_table_pages_and_flavors, test_continued_table_on_every_page_is_not_furniture,
+                 test_page_jobs_run_in_parallel_and_keep_page_order,
+                 test_pvp_extractor_sends_only_planned_pages):
+        test()
+        print(f"[  ok] {test.__name__}")
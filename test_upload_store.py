@@ -0,0 +1,130 @@
+"""
+Upload Store Tests - repeat uploads share one blob and skip re-extraction.
+
+Run with pytest, or directly: python test_upload_store.py
+"""
+
+import io
+import os
+import sys
+import shutil
+import tempfile
+import threading
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+from werkzeug.datastructures import FileStorage
+
+import services.page_text_store_service as page_store
+import services.upload_store_service as upload_store
+from services.page_text_store_service import PageTextStore
+from services.pv_job_service import ingest_uploads
+from services.upload_store_service import UploadStore
+
+
+def upload(data: bytes, filename: str) -> FileStorage:
+    return FileStorage(io.BytesIO(data), filename=filename)
+
+
+def blob_files(store: UploadStore):
+    return sorted(name for _, dirs, files in os.walk(store.root) for name in files if not name.endswith('.upload'))
+
+
+def test_same_content_is_stored_once_and_reference_counted():
+    workdir = tempfile.mkdtemp()
+    try:
+        store = UploadStore(os.path.join(workdir, 'blobs'), os.path.join(workdir, 'index.db'))
+        first = store.save(upload(b'%PDF-1.4 stp', 'STP Method.PDF'))
+        second = store.save(upload(b'%PDF-1.4 stp', '../../other name.pdf'))
+        other = store.save(upload(b'%PDF-1.4 mfr', 'STP Method.pdf'))
+
+        assert first.path == second.path != other.path
+        assert not first.deduplicated and second.deduplicated
+        assert first.path.endswith('.pdf') and os.path.basename(first.path) == first.sha256 + '.pdf'
+        assert os.path.dirname(first.path) == os.path.join(store.root, first.sha256[:2], first.sha256[2:4])
+        assert store.content_hash(first.path) == first.sha256 and store.content_hash('/tmp/x.pdf') is None
+        assert blob_files(store) == sorted([os.path.basename(first.path), os.path.basename(other.path)])
+        assert store.stats() == {'blobs': 2, 'references': 3, 'bytes_stored': 24, 'bytes_referenced': 36}
+
+        # The blob outlives all but its last reference
+        assert store.ref_count(first.path) == 2
+        assert store.release(first.path) is False and os.path.exists(first.path)
+        assert store.release(second.path) is True and not os.path.exists(first.path)
+        assert store.ref_count(first.path) == 0
+        # Paths outside the store are never touched
+        outside = os.path.join(workdir, 'keep.pdf')
+        open(outside, 'wb').close()
+        assert store.release(outside) is False and os.path.exists(outside)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_concurrent_uploads_of_one_file_share_a_blob():
+    workdir = tempfile.mkdtemp()
+    try:
+        store = UploadStore(os.path.join(workdir, 'blobs'), os.path.join(workdir, 'index.db'))
+        data = os.urandom(3 * 1024 * 1024 + 17)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(store.save(upload(data, 'stp.pdf'))))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len({result.path for result in results}) == 1
+        assert sum(not result.deduplicated for result in results) == 1
+        assert store.ref_count(results[0].path) == 8
+        with open(results[0].path, 'rb') as f:
+            assert f.read() == data
+        # No spooled temporaries are left behind
+        assert os.listdir(os.path.join(store.root, 'tmp')) == []
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_repeat_upload_skips_re_extraction_and_release_drops_the_entry():
+    workdir = tempfile.mkdtemp()
+    original = upload_store._store, page_store._store, page_store.parse_pages
+    parses = []
+
+    def counting_parse(pdf_path, **kwargs):
+        parses.append(pdf_path)
+        return original[2](pdf_path, **kwargs)
+
+    try:
+        upload_store._store = UploadStore(os.path.join(workdir, 'blobs'), os.path.join(workdir, 'index.db'))
+        page_store._store = PageTextStore(os.path.join(workdir, 'pages'))
+        page_store.parse_pages = counting_parse
+
+        buffer = io.BytesIO()
+        pdf = canvas.Canvas(buffer, pagesize=A4)
+        pdf.drawString(40, 780, 'Standard Testing Procedure')
+        pdf.save()
+
+        paths = [upload_store.get_upload_store().save(upload(buffer.getvalue(), name)).path
+                 for name in ('stp.pdf', 'stp (1).pdf', 'copy of stp.pdf')]
+        for path in paths:
+            ingest_uploads([path])
+        assert len(set(paths)) == 1 and len(parses) == 1
+        content_hash = upload_store.get_upload_store().content_hash(paths[0])
+        assert page_store._store.has(content_hash)
+
+        # The entry goes with the last reference to the blob
+        for path in paths:
+            upload_store.release_upload(path)
+        assert not os.path.exists(paths[0]) and not page_store._store.has(content_hash)
+    finally:
+        upload_store._store, page_store._store, page_store.parse_pages = original
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    for test in (test_same_content_is_stored_once_and_reference_counted,
+                 test_concurrent_uploads_of_one_file_share_a_blob,
+                 test_repeat_upload_skips_re_extraction_and_release_drops_the_entry):
+        test()
+        print(f"[  ok] {test.__name__}")
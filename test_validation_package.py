@@ -0,0 +1,120 @@
+"""
+Validation Package Tests - the AI validation zip is streamed to disk.
+
+Builds a package whose exported files are much larger than the memory
+ceiling and checks, with tracemalloc, that peak Python allocation during the
+build stays under the ceiling. Also checks that the export scratch directory
+is removed and that a failed build leaves no partial zip behind.
+
+Run with pytest, or directly: python test_validation_package.py
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import tracemalloc
+import zipfile
+from contextlib import contextmanager
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services.pv_job_service import build_validation_package
+# Imported lazily by build_validation_package; load it before tracing memory
+import services.process_validation_service  # noqa: F401
+
+EXPORT_FILES = 4
+EXPORT_FILE_MB = 8
+MEMORY_CEILING_MB = 8
+
+
+class NullTimer:
+    @contextmanager
+    def stage(self, name):
+        yield
+
+
+class FakePharmaDoc:
+    """Writes large incompressible export files in 1 MB chunks"""
+
+    def __init__(self, files=EXPORT_FILES, size_mb=EXPORT_FILE_MB, fail=False):
+        self.files = files
+        self.size_mb = size_mb
+        self.fail = fail
+        self.export_dir = None
+
+    def export_results(self, output_dir):
+        self.export_dir = output_dir
+        for index in range(self.files):
+            with open(os.path.join(output_dir, f"export_{index}.bin"), 'wb') as f:
+                for _ in range(self.size_mb):
+                    f.write(os.urandom(1024 * 1024))
+        if self.fail:
+            raise RuntimeError("export failed")
+
+
+RESULTS = {'pvp': {}, 'pvr': {}}
+
+
+def test_package_memory_is_bounded():
+    workdir = tempfile.mkdtemp()
+    try:
+        zip_path = os.path.join(workdir, 'package.zip')
+        pharmadoc = FakePharmaDoc()
+
+        tracemalloc.start()
+        build_validation_package(pharmadoc, RESULTS, zip_path, NullTimer())
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        package_mb = os.path.getsize(zip_path) / (1024 * 1024)
+        assert package_mb > EXPORT_FILES * EXPORT_FILE_MB * 0.9
+        assert peak < MEMORY_CEILING_MB * 1024 * 1024, \
+            f"peak {peak / 1024 / 1024:.1f} MB for a {package_mb:.0f} MB package"
+
+        with zipfile.ZipFile(zip_path) as zf:
+            names = zf.namelist()
+        assert 'Process_Validation_Protocol.pdf' in names
+        assert 'Process_Validation_Report.pdf' in names
+        assert len([name for name in names if name.startswith('export_')]) == EXPORT_FILES
+        assert not os.path.exists(pharmadoc.export_dir)
+        assert not os.path.exists(zip_path + '.partial')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_export_failure_falls_back_to_json():
+    workdir = tempfile.mkdtemp()
+    try:
+        zip_path = os.path.join(workdir, 'package.zip')
+        pharmadoc = FakePharmaDoc(files=1, size_mb=1, fail=True)
+        build_validation_package(pharmadoc, RESULTS, zip_path, NullTimer())
+
+        with zipfile.ZipFile(zip_path) as zf:
+            assert 'validation_data.json' in zf.namelist()
+        assert not os.path.exists(pharmadoc.export_dir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_failed_build_leaves_no_partial_file():
+    workdir = tempfile.mkdtemp()
+    try:
+        zip_path = os.path.join(workdir, 'package.zip')
+        try:
+            build_validation_package(FakePharmaDoc(files=0), {'pvr': {}}, zip_path, NullTimer())
+        except KeyError:
+            pass
+        else:
+            raise AssertionError("missing PVP data should fail the build")
+        assert os.listdir(workdir) == []
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    for test in (test_package_memory_is_bounded, test_export_failure_falls_back_to_json,
+                 test_failed_build_leaves_no_partial_file):
+        test()
+        print(f"[  ok] {test.__name__}")
@@ -3,14 +3,17 @@
 
 import logging
 from datetime import datetime
-from flask import request
-from models import ActivityLog
+from flask import request, has_request_context
 from database import db
+from services.activity_log_service import get_activity_log_writer
 
 def log_activity(user_id, action, details=None):
     """
     Log user activity.
 
+    The entry is queued and bulk-inserted by the background activity log
+    writer, so this neither commits nor touches the caller's session.
+
     Args:
         user_id: ID of the user performing the action
         action: Action being performed
@@ -18,21 +21,24 @@ def log_activity(user_id, action, details=None):
     """
     try:
         # Get client IP address
-        ip_address = request.environ.get('HTTP_X_FORWARDED_FOR', request.remote_addr)
-        if ip_address:
-            ip_address = ip_address.split(',')[0].strip()
-
-        # Create activity log entry
-        activity = ActivityLog(
-            user_id=user_id,
-            action=action,
-            details=details,
-            ip_address=ip_address,
-            timestamp=datetime.utcnow()
-        )
-
-        db.session.add(activity)
-        db.session.commit()
+        ip_address = None
+        if has_request_context():
+            ip_address = request.environ.get('HTTP_X_FORWARDED_FOR', request.remote_addr)
+            if ip_address:
+                ip_address = ip_address.split(',')[0].strip()
+
+        writer = get_activity_log_writer()
+        if not writer.is_bound:
+            writer.bind(db.engine)
+
+        # Queue activity log entry
+        writer.enqueue({
+            'user_id': user_id,
+            'action': action,
+            'details': details,
+            'ip_address': ip_address,
+            'timestamp': datetime.utcnow()
+        })
 
         logging.info(f"Activity logged: {action} by user {user_id}")
 
@@ -135,20 +141,17 @@ def calculate_rsd(values):
     Returns:
         float: RSD percentage
     """
-    import statistics
+    from services.batch_statistics_service import summarize_values
 
     try:
         if not values or len(values) < 2:
             return 0.0
 
-        mean = statistics.mean(values)
-        if mean == 0:
+        summary = summarize_values(values)
+        if summary['n'] < 2 or summary['mean'] == 0:
             return 0.0
 
-        stdev = statistics.stdev(values)
-        rsd = (stdev / mean) * 100
-
-        return round(rsd, 2)
+        return round(summary['rsd'], 2)
 
     except Exception as e:
         logging.error(f"Error calculating RSD: {str(e)}")
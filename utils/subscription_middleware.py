@@ -5,6 +5,7 @@ from functools import wraps
 from flask import session, request, jsonify, redirect, url_for, flash
 from models import User
 from services.payment_service import SubscriptionManager
+from services.usage_snapshot_service import get_request_user
 import logging
 
 def subscription_required(action='general'):
@@ -183,12 +184,13 @@ class SubscriptionMiddleware:
         return feature in features
     
     @staticmethod
-    def get_usage_warning(user):
+    def get_usage_warning(user, usage_stats=None):
         """Get usage warning message if user is approaching limits"""
         if not user:
             return None
         
-        usage_stats = SubscriptionManager.get_usage_stats(user)
+        if usage_stats is None:
+            usage_stats = SubscriptionManager.get_usage_stats(user)
         warnings = []
         
         # Check document usage
@@ -227,12 +229,13 @@ def inject_subscription_context():
         context = {}
         
         if 'user_id' in session:
-            user = User.query.get(session['user_id'])
+            user = get_request_user(session['user_id'])
             if user:
+                usage_stats = SubscriptionManager.get_usage_stats(user)
                 context.update({
                     'user_limits': user.get_plan_limits(),
-                    'user_usage': SubscriptionManager.get_usage_stats(user),
-                    'subscription_warnings': SubscriptionMiddleware.get_usage_warning(user),
+                    'user_usage': usage_stats,
+                    'subscription_warnings': SubscriptionMiddleware.get_usage_warning(user, usage_stats),
                     'is_subscription_active': user.is_subscription_active()
                 })
         